@@ -0,0 +1,43 @@
+"""
+Absence warnings for many students at once.
+
+`Student.has_exceeded_warning_threshold` answers for one student; serializing
+a list with it costs a ledger read and two setting reads per row.
+`warning_statuses` answers for a whole list with a fixed number of queries:
+the students' program types, their ledgers (see attendance_management.ledger)
+and the thresholds of every program type. The list serializer of
+AttendanceRecordSerializer puts the result in its context, so
+`get_warning_status` only reads a dict.
+"""
+from .ledger import student_ledgers
+from .models import Student
+from .settings_models import ApplicationSetting
+
+CONTEXT_KEY = 'warning_statuses'
+
+
+def warning_type(unexcused, excused, thresholds):
+    """'unexcused', 'excused' or None for the given counts, like Student.has_exceeded_warning_threshold."""
+    if unexcused >= thresholds['unexcused']:
+        return 'unexcused'
+    if excused >= thresholds['excused']:
+        return 'excused'
+    return None
+
+
+def warning_statuses(student_ids):
+    """Return {student_id: 'unexcused' | 'excused' | None} for `student_ids`."""
+    student_ids = {student_id for student_id in student_ids if student_id is not None}
+    if not student_ids:
+        return {}
+    program_types = dict(Student.objects.filter(pk__in=student_ids).values_list('id', 'track__program_type'))
+    thresholds = ApplicationSetting.get_absence_thresholds()
+    ledgers = student_ledgers(program_types)
+    return {
+        student_id: warning_type(
+            ledgers[student_id].unexcused_absences, ledgers[student_id].excused_absences,
+            # Other program types use the nine-month thresholds, as the single-student lookups do
+            thresholds.get(program_type, thresholds['nine_months']),
+        )
+        for student_id, program_type in program_types.items()
+    }
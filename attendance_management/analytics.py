@@ -0,0 +1,73 @@
+"""
+Attendance analytics queries shared by the dashboard endpoints.
+
+Everything here runs a fixed number of queries however many tracks or days
+are asked for: per-track/per-day attendance comes from the daily rollup (one
+read, plus one grouped recount of any stale days) and enrollment from one
+GROUP BY over students. Callers pass the tracks they are allowed to see as a
+queryset (or list of ids); it is used as a subquery, never iterated.
+"""
+from typing import NamedTuple
+from datetime import date as date_type
+
+from django.db.models import Count
+
+from .models import Student
+from .rollups import daily_rollup
+
+
+class TrackDayStats(NamedTuple):
+    track_id: int
+    track_name: str
+    date: date_type
+    expected: int  # Attendance records for the day's schedule
+    checked_in: int
+    late: int
+    excused: int
+    absent: int
+    enrolled: int  # Students currently in the track
+
+    @property
+    def percentage(self):
+        return self.checked_in / self.expected * 100 if self.expected else 0
+
+
+def _track_ids(tracks):
+    return tracks.values('id') if hasattr(tracks, 'values') else tracks
+
+
+def track_student_counts(tracks):
+    """{track_id: number of students} for `tracks`, in one query."""
+    return dict(
+        Student.objects.filter(track_id__in=_track_ids(tracks))
+        .values('track_id').annotate(student_count=Count('id'))
+        .values_list('track_id', 'student_count').order_by()
+    )
+
+
+def track_day_stats(tracks, start_date, end_date=None):
+    """
+    TrackDayStats for every scheduled (track, day) of `tracks` between
+    `start_date` and `end_date` inclusive, ordered by date then track.
+    """
+    track_ids = _track_ids(tracks)
+    enrolled = track_student_counts(track_ids)
+    return [
+        TrackDayStats(
+            track_id=row.track_id,
+            track_name=row.track.name,
+            date=row.date,
+            expected=row.expected_count,
+            checked_in=row.checked_in_count,
+            late=row.late_count,
+            excused=row.excused_count,
+            absent=row.absent_count,
+            enrolled=enrolled.get(row.track_id, 0),
+        )
+        for row in daily_rollup(track_ids, start_date, end_date)
+    ]
+
+
+def track_day_map(tracks, start_date, end_date=None):
+    """track_day_stats keyed by (track_id, date)."""
+    return {(stats.track_id, stats.date): stats for stats in track_day_stats(tracks, start_date, end_date)}
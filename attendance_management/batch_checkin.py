@@ -0,0 +1,350 @@
+"""
+Batched check-in/check-out ingestion.
+
+Mobile clients queue check-in/check-out events while offline (or while the
+campus network is saturated) and submit them in one request. Each event is
+signed with a per-device sync key so the server can trust the client
+timestamp. Events are validated in bulk - one query per table and a single
+vectorized geofence check - and applied with bulk_create/bulk_update.
+"""
+import hmac
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.dateparse import parse_datetime
+
+from .checkin_context import CheckInContext
+from .geofence import haversine_distance
+from .models import AttendanceRecord, PermissionRequest, Student
+from .heatmap import invalidate_schedules
+from .response_cache import bump_schedules
+from .ledger import mark_ledgers_stale
+from .rollups import mark_schedules_stale
+from .schedule_index import get_schedule_index
+from .status_engine import derive_status
+from .write_behind import flush_pending
+
+logger = logging.getLogger(__name__)
+
+SYNC_KEY_SALT = 'attendance_management.batch_checkin.sync_key'
+MAX_EVENTS_PER_BATCH = getattr(settings, 'BATCH_CHECK_IN_MAX_EVENTS', 500)
+# Tolerated drift between the device clock and ours for events "from the future"
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+# How long a device may hold events while offline; older events are rejected
+MAX_EVENT_AGE = timedelta(seconds=getattr(settings, 'ATTENDANCE_BATCH_MAX_AGE', 12 * 60 * 60))
+
+CHECK_IN = 'check_in'
+CHECK_OUT = 'check_out'
+EVENT_TYPES = (CHECK_IN, CHECK_OUT)
+
+
+def sync_key_for(student):
+    """
+    Secret the student's registered device uses to sign queued events.
+    It is bound to the device UUID, so re-registering a device rotates it.
+    """
+    return salted_hmac(SYNC_KEY_SALT, f"{student.id}:{student.phone_uuid}").hexdigest()
+
+
+def event_signing_payload(event):
+    """Canonical string a client signs: event_id|user_id|uuid|type|timestamp|latitude|longitude."""
+    return "|".join(str(event.get(field)) for field in (
+        'event_id', 'user_id', 'uuid', 'type', 'timestamp', 'latitude', 'longitude'
+    ))
+
+
+def sign_event(event, sync_key):
+    return hmac.new(sync_key.encode(), event_signing_payload(event).encode(), 'sha256').hexdigest()
+
+
+class _PendingEvent:
+    __slots__ = ('index', 'raw', 'event_id', 'user_id', 'uuid', 'type', 'timestamp',
+                 'latitude', 'longitude', 'day', 'student', 'entry', 'distance', 'inside')
+
+    def __init__(self, index, raw):
+        self.index = index
+        self.raw = raw
+        self.event_id = raw.get('event_id')
+        self.student = None
+        self.entry = None
+        self.distance = None
+        self.inside = False
+
+
+def _result(event, result_status, message, error_code=None, **extra):
+    result = {"event_id": event.event_id, "status": result_status, "message": message}
+    if error_code:
+        result["error_code"] = error_code
+    result.update(extra)
+    return result
+
+
+def _parse(index, raw, now):
+    """Validate an event's shape. Returns (_PendingEvent, None) or (None, error result)."""
+    event = _PendingEvent(index, raw if isinstance(raw, dict) else {})
+    if not isinstance(raw, dict):
+        return None, _result(event, "error", "Each event must be an object.", "invalid_event")
+
+    missing = [field for field in ('event_id', 'user_id', 'uuid', 'type', 'timestamp', 'latitude', 'longitude', 'signature')
+               if raw.get(field) in (None, '')]
+    if missing:
+        return None, _result(event, "error", f"Missing required fields: {', '.join(missing)}.", "invalid_event")
+
+    if raw['type'] not in EVENT_TYPES:
+        return None, _result(event, "error", f"Unknown event type '{raw['type']}'.", "invalid_event")
+
+    try:
+        event.latitude = float(raw['latitude'])
+        event.longitude = float(raw['longitude'])
+        event.user_id = int(raw['user_id'])
+    except (TypeError, ValueError):
+        return None, _result(event, "error", "Invalid user_id, latitude or longitude format.", "invalid_event")
+
+    timestamp = parse_datetime(str(raw['timestamp']))
+    if timestamp is None:
+        return None, _result(event, "error", "Invalid timestamp format. Use ISO 8601.", "invalid_event")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    if timestamp > now + MAX_CLOCK_SKEW:
+        return None, _result(event, "error", "Event timestamp is in the future.", "invalid_timestamp")
+    if timestamp < now - MAX_EVENT_AGE:
+        return None, _result(event, "error", "Event timestamp is too old to be synced.", "invalid_timestamp")
+
+    event.timestamp = timezone.localtime(timestamp)
+    event.day = event.timestamp.date()
+    event.uuid = str(raw['uuid'])
+    event.type = raw['type']
+    return event, None
+
+
+def _earliest(a, b):
+    return min(a, b) if a is not None and b is not None else a or b
+
+
+def _latest(a, b):
+    return max(a, b) if a is not None and b is not None else a or b
+
+
+def _merge_records(records, entries, permissions, checked_in_students):
+    """
+    Write the batch's `records` ({(student_id, schedule_id): record}) over the
+    rows as they are now, locked: online check-ins may have written them since
+    they were read. Keeps the earliest check-in and latest check-out of both
+    and re-derives the status when the other writer's times won.
+    `checked_in_students` ({key: student}, today's records only) get
+    is_checked_in set to match the merged record.
+    """
+    current = {}
+    for row in (AttendanceRecord.objects.select_for_update()
+                .filter(student_id__in={key[0] for key in records}, schedule_id__in={key[1] for key in records})
+                .order_by('id')):
+        current.setdefault((row.student_id, row.schedule_id), row)
+    merged = []
+    for key, record in records.items():
+        row = current.get(key)
+        if row is None:
+            continue
+        check_in_time = _earliest(row.check_in_time, record.check_in_time)
+        check_out_time = _latest(row.check_out_time, record.check_out_time)
+        status = record.status
+        if (check_in_time, check_out_time) != (record.check_in_time, record.check_out_time):
+            entry = entries[key]
+            status = derive_status(
+                AttendanceRecord(check_in_time=check_in_time, check_out_time=check_out_time, status=row.status),
+                entry.first_session_start, entry.last_session_end, permissions.get(key, ()),
+            )
+        if (row.check_in_time, row.check_out_time, row.status) != (check_in_time, check_out_time, status):
+            row.check_in_time, row.check_out_time, row.status = check_in_time, check_out_time, status
+            merged.append(row)
+        record.pk, record.check_in_time, record.check_out_time, record.status = row.pk, check_in_time, check_out_time, status
+        if key in checked_in_students:
+            checked_in_students[key].is_checked_in = check_out_time is None
+    if merged:
+        AttendanceRecord.objects.bulk_update(merged, ['check_in_time', 'check_out_time', 'status'])
+
+
+def ingest_events(raw_events):
+    """
+    Validate and apply a batch of signed check-in/check-out events.
+
+    Returns (results, applied_count); `results` has one entry per input event, in input order.
+    """
+    # Bulk writes below would race with rows still sitting in the write-behind buffer
+    flush_pending()
+
+    now = timezone.localtime()
+    results = [None] * len(raw_events)
+    events = []
+    for index, raw in enumerate(raw_events):
+        event, error = _parse(index, raw, now)
+        if error:
+            results[index] = error
+        else:
+            events.append(event)
+
+    # Students (and their users) for every event in one query
+    students = {
+        student.user_id: student
+        for student in Student.objects.select_related('user').filter(user_id__in={e.user_id for e in events})
+    }
+
+    valid = []
+    for event in events:
+        student = students.get(event.user_id)
+        if student is None:
+            results[event.index] = _result(event, "error", "No student record found for this user.", "student_not_found")
+            continue
+        if not student.user.is_active:
+            results[event.index] = _result(event, "error", "Your account is not active. Please contact an administrator.", "account_not_active")
+            continue
+        if not student.phone_uuid or student.phone_uuid != event.uuid:
+            # Offline events can only come from a device that already registered online
+            results[event.index] = _result(event, "error", "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.", "uuid_mismatch")
+            continue
+        expected = sign_event(event.raw, sync_key_for(student))
+        if not hmac.compare_digest(expected, str(event.raw['signature'])):
+            results[event.index] = _result(event, "error", "Invalid event signature.", "invalid_signature")
+            continue
+
+        entry = get_schedule_index(event.day).get(student.track_id)
+        if entry is None:
+            results[event.index] = _result(event, "error", "No schedule found for this day.", "no_schedule_today")
+            continue
+        event.student = student
+        event.entry = entry
+        valid.append(event)
+
+    # One vectorized geofence check for the whole batch
+    if valid:
+        distances = haversine_distance(
+            np.array([e.latitude for e in valid]),
+            np.array([e.longitude for e in valid]),
+            np.array([e.entry.branch_latitude for e in valid]),
+            np.array([e.entry.branch_longitude for e in valid]),
+        )
+        for event, distance in zip(valid, distances):
+            event.distance = float(distance)
+            event.inside = event.distance <= event.entry.geofence_radius
+
+    schedule_ids = {e.entry.schedule_id for e in valid}
+    student_ids = {e.student.id for e in valid}
+    records = {}
+    for record in AttendanceRecord.objects.filter(student_id__in=student_ids, schedule_id__in=schedule_ids).order_by('id'):
+        records.setdefault((record.student_id, record.schedule_id), record)
+    permissions = {}
+    for permission in (PermissionRequest.objects
+                       .filter(student_id__in=student_ids, schedule_id__in=schedule_ids, status='approved')
+                       .only('id', 'student_id', 'schedule_id', 'request_type', 'adjusted_time')
+                       .order_by('id')):
+        permissions.setdefault((permission.student_id, permission.schedule_id), []).append(permission)
+
+    new_records = {}
+    changed_records = {}
+    changed_students = {}
+    entries = {}
+    today_students = {}
+    today = timezone.localdate()
+
+    # Apply each student's events in the order they happened on the device
+    for event in sorted(valid, key=lambda e: (e.student.id, e.timestamp, e.index)):
+        student, entry = event.student, event.entry
+        key = (student.id, entry.schedule_id)
+        geofence = {"distance": event.distance, "geofence_radius": entry.geofence_radius}
+
+        if not event.inside:
+            results[event.index] = _result(event, "fail", "You are outside the allowed geofence area", **geofence)
+            continue
+
+        record = records.get(key)
+        context = CheckInContext(
+            student=student,
+            day=event.day,
+            schedule_id=entry.schedule_id,
+            schedule_name=entry.schedule_name,
+            first_session_start=entry.first_session_start,
+            last_session_end=entry.last_session_end,
+            attendance_record=record,
+            permissions=permissions.get(key),
+        )
+
+        if event.type == CHECK_IN:
+            if record is None and event.day != today:
+                # Events for past days may only complete records that already exist
+                results[event.index] = _result(event, "error", "No attendance record found for that day.", "attendance_record_not_found")
+                continue
+            if record is None:
+                record = AttendanceRecord(student=student, schedule_id=entry.schedule_id)
+                records[key] = new_records[key] = record
+                context.attendance_record = record
+            if record.check_in_time:
+                if record.check_in_time == event.timestamp:
+                    # Client retried an event we already applied
+                    results[event.index] = _result(event, "success", "Check-in already recorded", duplicate=True,
+                                                   attendance_status=record.status, **geofence)
+                else:
+                    results[event.index] = _result(event, "error", "You have already checked in for today's session.", "already_checked_in")
+                continue
+            if context.has_sessions:
+                record.status = context.check_in_status(event.timestamp)
+            else:
+                record.status = 'no_sessions'
+            record.check_in_time = event.timestamp
+            if event.day == today:
+                student.is_checked_in = True
+                changed_students[student.id] = student
+        else:
+            if record is None or not record.check_in_time:
+                results[event.index] = _result(event, "error", "You haven't checked in yet. Please check in first.", "not_checked_in")
+                continue
+            if record.check_out_time:
+                if record.check_out_time == event.timestamp:
+                    results[event.index] = _result(event, "success", "Check-out already recorded", duplicate=True,
+                                                   attendance_status=record.status, **geofence)
+                else:
+                    results[event.index] = _result(event, "error", "You have already checked out for this session.", "already_checked_out")
+                continue
+            if event.timestamp < record.check_in_time:
+                results[event.index] = _result(event, "error", "Check-out cannot be earlier than check-in.", "invalid_timestamp")
+                continue
+            if context.has_sessions:
+                record.status = context.check_out_status(event.timestamp)
+            else:
+                record.status = 'no_sessions'
+            record.check_out_time = event.timestamp
+            if event.day == today:
+                student.is_checked_in = False
+                changed_students[student.id] = student
+
+        if key not in new_records:
+            changed_records[key] = record
+        entries[key] = entry
+        if event.day == today:
+            today_students[key] = student
+        results[event.index] = _result(
+            event, "success", "Check-in recorded" if event.type == CHECK_IN else "Check-out recorded",
+            attendance_status=record.status, schedule_name=entry.schedule_name, **geofence
+        )
+
+    with transaction.atomic():
+        if new_records:
+            # A concurrent single check-in may have created some of these meanwhile; merged below
+            AttendanceRecord.objects.bulk_create(new_records.values(), ignore_conflicts=True)
+        if new_records or changed_records:
+            _merge_records({**changed_records, **new_records}, entries, permissions, today_students)
+        if changed_students:
+            Student.objects.bulk_update(changed_students.values(), ['is_checked_in'])
+    touched_schedules = {record.schedule_id for record in (*new_records.values(), *changed_records.values())}
+    mark_schedules_stale(touched_schedules)
+    mark_ledgers_stale(record.student_id for record in (*new_records.values(), *changed_records.values()))
+    invalidate_schedules(touched_schedules)
+    bump_schedules(touched_schedules)
+
+    applied = sum(1 for result in results if result["status"] == "success" and not result.get("duplicate"))
+    logger.info(f"Batch check-in applied {applied} of {len(raw_events)} events "
+                f"({len(new_records)} records created, {len(changed_records)} updated)")
+    return results, applied
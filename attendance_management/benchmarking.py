@@ -0,0 +1,271 @@
+"""
+Helpers for benchmarking the check-in path in-process.
+
+`BenchmarkFixture` seeds throwaway branches/tracks/schedules with N students
+(bulk inserts, no signals fan-out) and removes them again; `asgi_request`
+drives a request through Django's ASGI handler the way uvicorn would, so sync
+DRF views are adapted to threads exactly as in production, and counts the
+queries it made; `http_request` does the same against a running server.
+Used by the `benchmark_checkin_modes` and `loadtest_checkin` commands.
+"""
+import asyncio
+import contextvars
+import json
+import math
+import random
+import time
+import uuid
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.contrib.auth.models import Group
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+from .management.commands.generate_test_data import build_day_sessions
+from .modality import refresh_schedule_modality
+from .models import AttendanceRecord, Branch, Schedule, Session, Student, Track
+from .schedule_index import build_schedule_index
+
+BENCH_EMAIL_DOMAIN = 'bench.invalid'
+BENCH_LATITUDE = 30.0722
+BENCH_LONGITUDE = 31.0177
+
+# Per-request query counter; contextvars follow the request into Django's sync threads
+_query_counter = contextvars.ContextVar('benchmark_query_counter', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install_query_counter():
+    """Count queries per in-process request on every connection opened from now on."""
+    connection_created.connect(_install_query_counter, dispatch_uid='benchmark_query_counter')
+
+
+class BenchmarkFixture:
+    """
+    A throwaway set of branches and tracks, each track with a schedule for
+    today (sessions picked like `generate_test_data` does), and `size`
+    registered students spread round-robin over the tracks.
+    """
+
+    def __init__(self, size, tracks=1, branches=1, seed=None):
+        self.size = size
+        self.track_count = max(tracks, 1)
+        self.branch_count = max(min(branches, self.track_count), 1)
+        self.rng = random.Random(seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.branches = []
+        self.tracks = []
+        self.schedules = []
+        self.supervisor = None
+        self.students = []
+        self.tokens = {}
+
+    def create(self):
+        today = timezone.localdate()
+        with transaction.atomic():
+            self.supervisor = CustomUser.objects.create_user(
+                email=f"supervisor-{self.run_id}@{BENCH_EMAIL_DOMAIN}",
+                first_name='Bench', last_name=f"Supervisor {self.run_id}",
+            )
+            for i in range(self.branch_count):
+                # Branches a few kilometres apart so nearest-branch lookups have something to choose from
+                self.branches.append(Branch.objects.create(
+                    name=f"Bench Branch {self.run_id} {i}",
+                    latitude=BENCH_LATITUDE + 0.05 * i, longitude=BENCH_LONGITUDE, radius=150,
+                ))
+            sessions = []
+            for i in range(self.track_count):
+                branch = self.branches[i % self.branch_count]
+                track = Track.objects.create(
+                    name=f"Bench Track {self.run_id} {i}", intake=1, supervisor=self.supervisor,
+                    start_date=today, default_branch=branch,
+                )
+                schedule = Schedule.objects.create(
+                    name=f"Bench Schedule {self.run_id} {i}", track=track,
+                    custom_branch=branch, created_at=today,
+                )
+                sessions += build_day_sessions(schedule, today, is_online=False, rng=self.rng)
+                self.tracks.append(track)
+                self.schedules.append(schedule)
+            # bulk_create skips the session notification signals
+            Session.objects.bulk_create(sessions)
+            refresh_schedule_modality(schedule.id for schedule in self.schedules)
+
+            password = make_password(None)
+            users = CustomUser.objects.bulk_create([
+                CustomUser(
+                    email=f"student-{self.run_id}-{i}@{BENCH_EMAIL_DOMAIN}",
+                    first_name='Bench', last_name=f"Student {self.run_id} {i}",
+                    slug_name=f"bench-student-{self.run_id}-{i}", password=password,
+                )
+                for i in range(self.size)
+            ])
+            if not users or users[0].pk is None:
+                # Backends without RETURNING support
+                users = list(CustomUser.objects.filter(email__endswith=f"-{self.run_id}@{BENCH_EMAIL_DOMAIN}",
+                                                       email__startswith='student-').order_by('id'))
+            student_group = Group.objects.filter(name='student').first()
+            if student_group:
+                CustomUser.groups.through.objects.bulk_create([
+                    CustomUser.groups.through(customuser_id=user.pk, group_id=student_group.pk) for user in users
+                ])
+            Student.objects.bulk_create([
+                Student(user=user, track=self.tracks[i % self.track_count], phone_uuid=f"bench-device-{user.pk}")
+                for i, user in enumerate(users)
+            ])
+        self.students = list(Student.objects.filter(track__in=self.tracks)
+                             .select_related('user', 'track__default_branch').order_by('id'))
+        self.tokens = {student.user_id: str(AccessToken.for_user(student.user)) for student in self.students}
+        build_schedule_index(today)
+        return self
+
+    def reset(self):
+        """Forget every check-in so the next run starts from the same state."""
+        AttendanceRecord.objects.filter(schedule__in=self.schedules).delete()
+        Student.objects.filter(track__in=self.tracks).update(is_checked_in=False)
+
+    def payload(self, student):
+        branch = student.track.default_branch
+        return {
+            'user_id': student.user_id,
+            'uuid': student.phone_uuid,
+            'latitude': branch.latitude,
+            'longitude': branch.longitude,
+        }
+
+    def destroy(self):
+        with transaction.atomic():
+            AttendanceRecord.objects.filter(schedule__in=self.schedules).delete()
+            CustomUser.objects.filter(student_profile__track__in=self.tracks).delete()
+            Schedule.objects.filter(id__in=[schedule.id for schedule in self.schedules]).delete()
+            Track.objects.filter(id__in=[track.id for track in self.tracks]).delete()
+            Branch.objects.filter(id__in=[branch.id for branch in self.branches]).delete()
+            self.supervisor.delete()
+
+
+async def asgi_request(application, method, path, body=None, token=None, headers=None, query=None):
+    """
+    Send one HTTP request through an ASGI application in-process.
+    Returns (status_code, parsed JSON body or None, elapsed seconds, query count).
+    Query counts are only collected after install_query_counter().
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    raw_headers = [
+        (b'host', b'localhost'),
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(payload)).encode()),
+    ]
+    if token:
+        raw_headers.append((b'authorization', f"Bearer {token}".encode()))
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), str(value).encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'https',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': urlencode(query or {}).encode(),
+        'root_path': '',
+        'headers': raw_headers,
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 443),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            # Django watches for disconnects while the view runs; the client never leaves
+            await asyncio.Event().wait()
+        sent = True
+        return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+    response = {'status': None, 'body': b''}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    counter = [0]
+    _query_counter.set(counter)
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    elapsed = time.perf_counter() - started
+    _query_counter.set(None)
+    return response['status'], _json_or_none(response['body']), elapsed, counter[0]
+
+
+def _http_request(base_url, method, path, payload, headers):
+    request = Request(f"{base_url.rstrip('/')}{path}", data=payload or None, method=method, headers=headers)
+    try:
+        with urlopen(request, timeout=60) as response:
+            return response.status, response.read()
+    except HTTPError as e:
+        return e.code, e.read()
+    except URLError as e:
+        return 0, json.dumps({'error_code': f"connection_error: {e.reason}"}).encode()
+
+
+async def http_request(base_url, method, path, body=None, token=None, headers=None, query=None, executor=None):
+    """
+    Same as asgi_request() but against a running server (e.g. a local uvicorn).
+    Query counts are not available from outside the server and are None.
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    all_headers = {'Content-Type': 'application/json'}
+    if token:
+        all_headers['Authorization'] = f"Bearer {token}"
+    all_headers.update(headers or {})
+    if query:
+        path = f"{path}?{urlencode(query)}"
+    started = time.perf_counter()
+    status_code, raw = await asyncio.get_running_loop().run_in_executor(
+        executor, _http_request, base_url, method, path, payload, all_headers
+    )
+    return status_code, _json_or_none(raw), time.perf_counter() - started, None
+
+
+def _json_or_none(raw):
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def arrival_offsets(count, window_seconds, rng, peak=0.6):
+    """
+    Seconds after the start of the window at which each of `count` students
+    arrives: a triangular curve that builds up to `peak` of the window (the
+    rush just before the first session) and tails off. Sorted.
+    """
+    return sorted(rng.triangular(0, window_seconds, window_seconds * peak) for _ in range(count))
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1
+    return sorted_values[index]
@@ -0,0 +1,196 @@
+"""
+Check-in context loader.
+
+`check_in` and `check_out` both need the same picture of a student's day: the
+student and their user, today's schedule for their track, the geofence of the
+branch the schedule runs at, the first/last session bounds, the attendance
+record and any approved permission requests. This module loads all of that in
+two queries instead of the ten or so separate lookups the views used to make;
+the schedule, branch and session bounds come from the day's schedule index.
+`aload_check_in_context` is the async-ORM twin used by the async views.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import Http404
+from django.utils import timezone
+
+from users.models import CustomUser
+from . import status_engine
+from .models import AttendanceRecord, PermissionRequest, Student
+from .schedule_index import aget_track_schedule, get_track_schedule, refresh_tracks
+from .write_behind import aget_write_behind, overlay_record, overlay_student
+
+
+class CheckInContext:
+    """
+    Everything check-in/check-out needs to know about a student's day.
+
+    `attendance_record` is None when today's schedule exists but no record has
+    been created for the student yet; `schedule_id` is None when the student's
+    track has no schedule today.
+    """
+
+    def __init__(self, student, day, schedule_id=None, schedule_name=None, branch_id=None,
+                 branch_name=None, branch_latitude=None, branch_longitude=None, geofence_radius=None,
+                 first_session_start=None, last_session_end=None, attendance_record=None,
+                 permissions=None):
+        self.student = student
+        self.user = student.user
+        self.day = day
+        self.schedule_id = schedule_id
+        self.schedule_name = schedule_name
+        self.branch_id = branch_id
+        self.branch_name = branch_name
+        self.branch_latitude = branch_latitude
+        self.branch_longitude = branch_longitude
+        self.geofence_radius = geofence_radius
+        self.first_session_start = first_session_start
+        self.last_session_end = last_session_end
+        self.attendance_record = attendance_record
+        self.permissions = permissions or []
+
+    @property
+    def has_schedule(self):
+        return self.schedule_id is not None
+
+    @property
+    def has_sessions(self):
+        return self.first_session_start is not None
+
+    def approved_permission(self, request_type=None):
+        """Return the first approved permission request, optionally of a given type."""
+        for permission in self.permissions:
+            if request_type is None or permission.request_type == request_type:
+                return permission
+        return None
+
+    def check_in_status(self, at):
+        """Status an attendance record should get when the student checks in at `at`."""
+        return status_engine.check_in_status(at, self.first_session_start, self.permissions)
+
+    def check_out_status(self, at):
+        """Status an attendance record should get when the student checks out at `at`."""
+        return status_engine.check_out_status(at, self.last_session_end, self.attendance_record.status, self.permissions)
+
+
+def _schedule_entry(track_id, day, schedule_id=None):
+    """
+    Look up today's schedule for a track in the schedule index. When the caller
+    already knows which schedule the student's record points at and the index
+    disagrees, the track's entry is resynced from the database first.
+    """
+    entry = get_track_schedule(track_id, day)
+    if schedule_id is not None and (entry is None or entry.schedule_id != schedule_id):
+        refresh_tracks([track_id], [day])
+        entry = get_track_schedule(track_id, day)
+    return entry
+
+
+async def _aschedule_entry(track_id, day, schedule_id=None):
+    entry = await aget_track_schedule(track_id, day)
+    if schedule_id is not None and (entry is None or entry.schedule_id != schedule_id):
+        await sync_to_async(refresh_tracks)([track_id], [day])
+        entry = await aget_track_schedule(track_id, day)
+    return entry
+
+
+def _build_context(student, day, entry, attendance_record=None):
+    if entry is None:
+        return CheckInContext(student=student, day=day)
+    return CheckInContext(
+        student=student,
+        day=day,
+        schedule_id=entry.schedule_id,
+        schedule_name=entry.schedule_name,
+        branch_id=entry.branch_id,
+        branch_name=entry.branch_name,
+        branch_latitude=entry.branch_latitude,
+        branch_longitude=entry.branch_longitude,
+        geofence_radius=entry.geofence_radius,
+        first_session_start=entry.first_session_start,
+        last_session_end=entry.last_session_end,
+        attendance_record=attendance_record,
+    )
+
+
+def _record_query(user_id, day):
+    return (
+        AttendanceRecord.objects
+        .filter(
+            student__user_id=user_id,
+            schedule__created_at=day,
+            schedule__track_id=F('student__track_id'),
+        )
+        .select_related('student__user')
+        .order_by('id')
+    )
+
+
+def _permissions_query(student_id, schedule_id):
+    return (
+        PermissionRequest.objects
+        .filter(student_id=student_id, schedule_id=schedule_id, status='approved')
+        .only('id', 'request_type', 'adjusted_time')
+        .order_by('id')
+    )
+
+
+def load_check_in_context(user_id, day=None):
+    """
+    Load the check-in context for the student owning `user_id` on `day` (defaults to today).
+
+    Raises Http404 if the user does not exist and Student.DoesNotExist if the
+    user has no student profile.
+    """
+    day = day or timezone.localdate()
+
+    # One joined query: record + student + user. Schedule, branch and session
+    # bounds come from the schedule index.
+    record = _record_query(user_id, day).first()
+    if record is not None:
+        # Check-ins acknowledged but not yet flushed by the write-behind buffer
+        overlay_record(record)
+        student = overlay_student(record.student)
+        entry = _schedule_entry(student.track_id, day, record.schedule_id)
+        context = _build_context(student, day, entry, record if entry else None)
+    else:
+        # No record yet: resolve the student separately so the views can report the right error
+        student = Student.objects.select_related('user').filter(user_id=user_id).first()
+        if student is None:
+            if not CustomUser.objects.filter(id=user_id).exists():
+                raise Http404("No CustomUser matches the given query.")
+            raise Student.DoesNotExist()
+        overlay_student(student)
+        context = _build_context(student, day, _schedule_entry(student.track_id, day))
+
+    if context.has_schedule:
+        context.permissions = list(_permissions_query(student.id, context.schedule_id))
+    return context
+
+
+async def aload_check_in_context(user_id, day=None):
+    """Async load_check_in_context(), built on the async ORM."""
+    day = day or timezone.localdate()
+    # Make sure the buffer is running so the overlays below never block the event loop
+    await aget_write_behind()
+
+    record = await _record_query(user_id, day).afirst()
+    if record is not None:
+        overlay_record(record)
+        student = overlay_student(record.student)
+        entry = await _aschedule_entry(student.track_id, day, record.schedule_id)
+        context = _build_context(student, day, entry, record if entry else None)
+    else:
+        student = await Student.objects.select_related('user').filter(user_id=user_id).afirst()
+        if student is None:
+            if not await CustomUser.objects.filter(id=user_id).aexists():
+                raise Http404("No CustomUser matches the given query.")
+            raise Student.DoesNotExist()
+        overlay_student(student)
+        context = _build_context(student, day, await _aschedule_entry(student.track_id, day))
+
+    if context.has_schedule:
+        context.permissions = [
+            permission async for permission in _permissions_query(student.id, context.schedule_id)
+        ]
+    return context
@@ -0,0 +1,296 @@
+"""
+Intake (cohort) analytics over a columnar snapshot of attendance records.
+
+An IntakeSnapshot holds every attendance record of an intake's tracks up to
+today as a handful of NumPy columns - student, track, day, status code,
+whether they checked in and the check-in delay after the day's first session -
+plus one row of labels (name, program type, branch) per track. It is read with
+three queries (tracks, records, first session start per schedule) and cached
+per intake for ATTENDANCE_COHORT_SNAPSHOT_TTL seconds, so it may trail live
+attendance by that much.
+
+`cohort_report` groups the tracks of one or more snapshots by intake, program
+type, branch or track and computes attendance, late and excused rates, the
+distribution of per-student attendance rates (percentiles and a histogram)
+and check-in delays with bincount/sort based group-bys over the columns.
+Status semantics match the daily rollup.
+"""
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import AttendanceRecord, Session, Track
+from .rollups import EXCUSED_STATUSES
+
+SNAPSHOT_TTL = getattr(settings, 'ATTENDANCE_COHORT_SNAPSHOT_TTL', 10 * 60)
+CHUNK_SIZE = 5000
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10  # Per-student attendance rate in 10% buckets
+GROUP_BY = ('intake', 'program_type', 'branch', 'track')
+
+STATUS_CODES = {value: code for code, (value, _) in enumerate(AttendanceRecord.STATUS_CHOICES)}
+UNKNOWN_STATUS = len(STATUS_CODES)
+# Indexed by status code; the extra last entry is for statuses missing from STATUS_CHOICES
+LATE_STATUS = np.array(
+    [value == 'late' or value.startswith('late-check-in') for value in STATUS_CODES] + [False]
+)
+EXCUSED_STATUS = np.array([value in EXCUSED_STATUSES for value in STATUS_CODES] + [False])
+
+
+class IntakeSnapshot(NamedTuple):
+    intake: int
+    # One entry per track, in id order
+    track_ids: np.ndarray
+    track_names: list
+    program_types: list
+    branch_ids: np.ndarray  # -1 for tracks without a default branch
+    branch_names: list
+    # One entry per attendance record
+    student: np.ndarray  # Student id
+    track: np.ndarray  # Index into the per-track arrays
+    day: np.ndarray  # datetime64[D]
+    status: np.ndarray  # Index into STATUS_CODES, UNKNOWN_STATUS otherwise
+    checked_in: np.ndarray  # bool
+    delay: np.ndarray  # Minutes from the day's first session start to check-in; NaN if either is missing
+
+
+def _timestamps(values):
+    return np.array([value.timestamp() if value else np.nan for value in values], dtype=np.float64)
+
+
+def load_snapshot(intake):
+    """Read the IntakeSnapshot of `intake` from the database."""
+    today = timezone.localdate()
+    tracks = list(
+        Track.objects.filter(intake=intake).order_by('id')
+        .values_list('id', 'name', 'program_type', 'default_branch_id', 'default_branch__name')
+    )
+    track_ids = np.array([row[0] for row in tracks], dtype=np.int64)
+
+    columns = ([], [], [], [], [], [])
+    rows = AttendanceRecord.objects.filter(
+        schedule__track__intake=intake, schedule__created_at__lte=today
+    ).values_list(
+        'student_id', 'schedule__track_id', 'schedule_id', 'schedule__created_at', 'status', 'check_in_time'
+    ).order_by()
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        for column, value in zip(columns, row):
+            column.append(value)
+    students, record_tracks, schedules, days, statuses, check_ins = columns
+
+    first_sessions = sorted(
+        Session.objects.filter(schedule__track__intake=intake, schedule__created_at__lte=today)
+        .values('schedule_id').annotate(start=Min('start_time')).order_by().values_list('schedule_id', 'start')
+    )
+    session_schedules = np.array([schedule_id for schedule_id, _ in first_sessions], dtype=np.int64)
+    session_starts = _timestamps([start for _, start in first_sessions])
+
+    schedules = np.array(schedules, dtype=np.int64)
+    position = np.minimum(np.searchsorted(session_schedules, schedules), max(len(session_schedules) - 1, 0))
+    has_session = (
+        session_schedules[position] == schedules if len(session_schedules) else np.zeros(len(schedules), dtype=bool)
+    )
+    check_in_at = _timestamps(check_ins)
+    delay = np.full(len(schedules), np.nan)
+    if len(session_schedules):
+        delay[has_session] = (check_in_at[has_session] - session_starts[position[has_session]]) / 60
+
+    return IntakeSnapshot(
+        intake=intake,
+        track_ids=track_ids,
+        track_names=[row[1] for row in tracks],
+        program_types=[row[2] for row in tracks],
+        branch_ids=np.array([-1 if row[3] is None else row[3] for row in tracks], dtype=np.int64),
+        branch_names=[row[4] for row in tracks],
+        student=np.array(students, dtype=np.int64),
+        track=np.searchsorted(track_ids, np.array(record_tracks, dtype=np.int64)).astype(np.int32),
+        day=np.array(days, dtype='datetime64[D]'),
+        status=np.array([STATUS_CODES.get(value, UNKNOWN_STATUS) for value in statuses], dtype=np.int16),
+        checked_in=np.array([value is not None for value in check_ins], dtype=bool),
+        delay=delay.astype(np.float32),
+    )
+
+
+def intake_snapshot(intake):
+    """The cached IntakeSnapshot of `intake`, loading it on a miss."""
+    key = f"cohort_snapshot:{intake}:{timezone.localdate().isoformat()}"
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = load_snapshot(intake)
+        cache.set(key, snapshot, SNAPSHOT_TTL)
+    return snapshot
+
+
+# -- reporting ---------------------------------------------------------------
+
+def _group_percentiles(values, groups, group_count, percentiles):
+    """(group_count x len(percentiles)) linear-interpolated percentiles of `values` per group; NaN for empty groups."""
+    order = np.lexsort((values, groups))
+    values = values[order]
+    sizes = np.bincount(groups, minlength=group_count)
+    starts = np.cumsum(sizes) - sizes
+    position = starts[:, None] + np.array(percentiles)[None, :] / 100 * np.maximum(sizes - 1, 0)[:, None]
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    if not len(values):
+        return np.full((group_count, len(percentiles)), np.nan)
+    low, high = np.minimum(low, len(values) - 1), np.minimum(high, len(values) - 1)
+    result = values[low] + (values[high] - values[low]) * (position - low)
+    result[sizes == 0] = np.nan
+    return result
+
+
+def _divide(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def _ratio(numerator, denominator):
+    return _divide(numerator, denominator) * 100
+
+
+def _number(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def _concat(snapshots):
+    """Merge snapshots of different intakes into one set of columns."""
+    offsets = np.cumsum([0] + [len(s.track_ids) for s in snapshots])
+    return {
+        'track_ids': np.concatenate([s.track_ids for s in snapshots]),
+        'intakes': np.concatenate([np.full(len(s.track_ids), s.intake, dtype=np.int64) for s in snapshots]),
+        'track_names': [name for s in snapshots for name in s.track_names],
+        'program_types': [value for s in snapshots for value in s.program_types],
+        'branch_ids': np.concatenate([s.branch_ids for s in snapshots]),
+        'branch_names': [name for s in snapshots for name in s.branch_names],
+        'track': np.concatenate([s.track.astype(np.int64) + offset for s, offset in zip(snapshots, offsets)]),
+        **{
+            field: np.concatenate([getattr(s, field) for s in snapshots])
+            for field in ('student', 'day', 'status', 'checked_in', 'delay')
+        },
+    }
+
+
+def _group_labels(columns, group_by, index):
+    """Response fields naming the group that track `index` belongs to."""
+    if group_by == 'intake':
+        return {'intake': int(columns['intakes'][index])}
+    if group_by == 'program_type':
+        return {'program_type': columns['program_types'][index]}
+    branch_id = int(columns['branch_ids'][index])
+    branch = {'branch_id': None if branch_id < 0 else branch_id, 'branch_name': columns['branch_names'][index]}
+    if group_by == 'branch':
+        return branch
+    return {
+        'track_id': int(columns['track_ids'][index]), 'track_name': columns['track_names'][index],
+        'intake': int(columns['intakes'][index]), 'program_type': columns['program_types'][index], **branch,
+    }
+
+
+def cohort_report(snapshots, group_by='branch', track_ids=None, start_date=None, end_date=None):
+    """
+    Attendance statistics of the snapshots' tracks grouped by `group_by`
+    (one of GROUP_BY), limited to `track_ids` if given and to days between
+    `start_date` and `end_date`. Returns a list of dicts, one per group.
+    """
+    snapshots = list(snapshots)
+    if not snapshots:
+        return []
+    columns = _concat(snapshots)
+
+    keys = {
+        'intake': columns['intakes'],
+        'program_type': np.array(columns['program_types'], dtype=str),
+        'branch': columns['branch_ids'],
+        'track': columns['track_ids'],
+    }[group_by]
+    visible = np.ones(len(columns['track_ids']), dtype=bool)
+    if track_ids is not None:
+        visible = np.isin(columns['track_ids'], np.fromiter(track_ids, dtype=np.int64))
+    if not visible.any():
+        return []
+    group_keys, track_group = np.unique(keys[visible], return_inverse=True)
+    group_count = len(group_keys)
+    # First visible track of every group, for its labels
+    visible_index = np.flatnonzero(visible)
+    first_track = np.full(group_count, len(visible_index))
+    np.minimum.at(first_track, track_group, np.arange(len(visible_index)))
+    group_of_track = np.full(len(columns['track_ids']), -1)
+    group_of_track[visible_index] = track_group
+
+    keep = visible[columns['track']]
+    if start_date:
+        keep &= columns['day'] >= np.datetime64(start_date)
+    if end_date:
+        keep &= columns['day'] <= np.datetime64(end_date)
+    track = columns['track'][keep]
+    student = columns['student'][keep]
+    status_code = columns['status'][keep]
+    checked_in = columns['checked_in'][keep]
+    delay = columns['delay'][keep]
+    group = group_of_track[track]
+
+    late = checked_in & LATE_STATUS[status_code]
+    excused = EXCUSED_STATUS[status_code]
+    absent = ~checked_in & ~excused
+
+    def total(mask=None):
+        return np.bincount(group, weights=mask, minlength=group_count)
+
+    records = total()
+    attended, late_count, excused_count, absent_count = total(checked_in), total(late), total(excused), total(absent)
+    tracks = np.bincount(track_group, minlength=group_count)
+
+    # Per-student rates; a student who moved track counts once per track
+    units, unit_index = np.unique(track * (int(student.max(initial=0)) + 1) + student, return_inverse=True)
+    unit_rate = _ratio(np.bincount(unit_index, weights=checked_in), np.bincount(unit_index))
+    unit_group = np.zeros(len(units), dtype=np.int64)
+    unit_group[unit_index] = group
+    students = np.bincount(unit_group, minlength=group_count)
+    rate_mean = _divide(np.bincount(unit_group, weights=unit_rate, minlength=group_count), students)
+    rate_percentiles = _group_percentiles(unit_rate, unit_group, group_count, PERCENTILES)
+    bucket = np.minimum((unit_rate // (100 / HISTOGRAM_BINS)).astype(np.int64), HISTOGRAM_BINS - 1)
+    histogram = np.bincount(
+        unit_group * HISTOGRAM_BINS + bucket, minlength=group_count * HISTOGRAM_BINS
+    ).reshape(group_count, HISTOGRAM_BINS)
+
+    timed = checked_in & ~np.isnan(delay)
+    delay_counts = np.bincount(group[timed], minlength=group_count)
+    delay_mean = _divide(np.bincount(group[timed], weights=delay[timed], minlength=group_count), delay_counts)
+    delay_percentiles = _group_percentiles(delay[timed].astype(np.float64), group[timed], group_count, (50, 90))
+
+    attendance_rate = _ratio(attended, records)
+    late_rate = _ratio(late_count, attended)
+    excused_ratio = _ratio(excused_count, excused_count + absent_count)
+
+    report = []
+    for g in range(group_count):
+        report.append({
+            **_group_labels(columns, group_by, visible_index[first_track[g]]),
+            'tracks': int(tracks[g]),
+            'students': int(students[g]),
+            'records': int(records[g]),
+            'attended': int(attended[g]),
+            'late': int(late_count[g]),
+            'excused': int(excused_count[g]),
+            'absent': int(absent_count[g]),
+            'attendance_rate': _number(attendance_rate[g]),
+            'late_rate': _number(late_rate[g]),  # Of check-ins
+            'excused_ratio': _number(excused_ratio[g]),  # Of absences
+            'student_attendance_rate': {
+                'mean': _number(rate_mean[g]),
+                **{f'p{q}': _number(value) for q, value in zip(PERCENTILES, rate_percentiles[g])},
+                'histogram': histogram[g].tolist(),
+            },
+            'check_in_delay_minutes': {
+                'mean': _number(delay_mean[g]),
+                'p50': _number(delay_percentiles[g, 0]),
+                'p90': _number(delay_percentiles[g, 1]),
+            },
+        })
+    return report
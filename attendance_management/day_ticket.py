@@ -0,0 +1,314 @@
+"""
+Signed daily check-in tickets.
+
+A student's app fetches a day ticket once per day (the `day-ticket` action).
+It is a SimpleJWT token, signed with the same key and backend as the access
+tokens but with its own token type, so it can never be used to authenticate.
+It carries everything check-in/check-out would otherwise read from the
+database: the AttendanceRecord id, the schedule and its first/last session
+bounds, the approved permissions and the branch geofence.
+
+Redeeming a ticket (a `ticket` field on check-in/check-out) verifies the
+signature and the geofence from the claims and finishes with a conditional
+UPDATE on the record; the status is computed by the status engine. The only
+lookups are in memory or in the cache (check-out reads the check-in time back
+from its UPDATE with RETURNING where the database supports it): the claims are compared with the
+schedule index (so schedule, session or branch edits invalidate outstanding
+tickets) and with a per-student marker set when a permission request changes.
+A stale ticket is rejected with `stale_day_ticket` and the app fetches a new one.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, Value, When
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from . import status_engine
+from .geofence import haversine_distance, nearest_branch
+from .models import AttendanceRecord, Student
+from .heatmap import invalidate_track_months
+from .response_cache import bump_tracks
+from .schedule_index import get_track_schedule
+from .stale_marks import mark_stale
+from .write_behind import flush_pending_rows
+
+logger = logging.getLogger(__name__)
+
+# Outlives any ticket (they expire at midnight)
+STALE_MARKER_TIMEOUT = 60 * 60 * 36
+
+
+class DayTicket(Token):
+    token_type = 'day_ticket'
+    lifetime = timedelta(days=1)
+
+
+class TicketPermission:
+    """The slice of an approved PermissionRequest the status engine needs."""
+    __slots__ = ('request_type', 'adjusted_time')
+
+    def __init__(self, request_type, adjusted_time):
+        self.request_type = request_type
+        self.adjusted_time = adjusted_time
+
+
+def _stale_key(student_id, schedule_id):
+    return f"day_ticket:stale:{student_id}:{schedule_id}"
+
+
+def mark_tickets_stale(student_id, schedule_id):
+    """Invalidate the tickets issued so far to this student for `schedule_id`."""
+    # Fractional, so a ticket issued earlier in the same second (iat is truncated) is still retired
+    cache.set(_stale_key(student_id, schedule_id), timezone.now().timestamp(), STALE_MARKER_TIMEOUT)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def issue_day_ticket(context, uuid):
+    """
+    Build a ticket from a loaded CheckInContext (which must have a schedule),
+    creating today's AttendanceRecord if needed.
+    """
+    record = context.attendance_record
+    if record is None:
+        record, _ = AttendanceRecord.objects.get_or_create(student=context.student, schedule_id=context.schedule_id)
+
+    ticket = DayTicket()
+    end_of_day = timezone.make_aware(datetime.combine(context.day + timedelta(days=1), time.min))
+    ticket.set_exp(from_time=ticket.current_time, lifetime=end_of_day - ticket.current_time)
+    ticket[api_settings.USER_ID_CLAIM] = str(context.user.pk)
+    ticket['student_id'] = context.student.id
+    ticket['track_id'] = context.student.track_id
+    ticket['uuid'] = uuid
+    ticket['day'] = context.day.isoformat()
+    ticket['record_id'] = record.id
+    ticket['schedule_id'] = context.schedule_id
+    ticket['schedule_name'] = context.schedule_name
+    ticket['first_session_start'] = _iso(context.first_session_start)
+    ticket['last_session_end'] = _iso(context.last_session_end)
+    ticket['permissions'] = [
+        [permission.request_type, _iso(permission.adjusted_time)] for permission in context.permissions
+    ]
+    ticket['branch'] = {
+        'id': context.branch_id,
+        'name': context.branch_name,
+        'latitude': context.branch_latitude,
+        'longitude': context.branch_longitude,
+        'radius': context.geofence_radius,
+    }
+    return ticket
+
+
+def _update_returning(queryset, field, **values):
+    """
+    queryset.update(**values) for a queryset of at most one row, returning
+    `field` of the updated row, or None when no row matched. PostgreSQL and
+    SQLite 3.35+ read it back in the same statement with UPDATE ... RETURNING.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' and not (
+        connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+    ):
+        # The update may stop the row matching the queryset, so pin its pk first
+        pks = list(queryset.values_list('pk', flat=True))
+        if not queryset.filter(pk__in=pks).update(**values):
+            return None
+        return queryset.model.objects.filter(pk__in=pks).values_list(field, flat=True).first()
+
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    compiler = query.get_compiler(queryset.db)
+    compiler.pre_sql_setup()
+    statement, params = compiler.as_sql()
+    column = queryset.model._meta.get_field(field).get_col(queryset.model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"{statement} RETURNING {connection.ops.quote_name(column.target.column)}", params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    value = row[0]
+    for converter in connection.ops.get_db_converters(column) + column.get_db_converters(connection):
+        value = converter(value, column, connection)
+    return value
+
+
+def _error(message, error_code, http_status=status.HTTP_400_BAD_REQUEST):
+    return {"status": "error", "message": message, "error_code": error_code}, http_status
+
+
+def _verify(raw_ticket, user, user_id, uuid):
+    """Return (ticket, None) or (None, (payload, status))."""
+    try:
+        ticket = DayTicket(raw_ticket)
+    except TokenError as e:
+        return None, _error(f"Invalid day ticket: {e}", "invalid_day_ticket")
+
+    if ticket[api_settings.USER_ID_CLAIM] != str(user.pk) or str(user_id) != str(user.pk):
+        return None, _error("This day ticket was issued to another user.", "invalid_day_ticket", status.HTTP_403_FORBIDDEN)
+    if ticket['uuid'] != uuid:
+        return None, _error(
+            "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
+            "uuid_mismatch"
+        )
+
+    day = timezone.localdate()
+    entry = get_track_schedule(ticket['track_id'], day)
+    stale_at = cache.get(_stale_key(ticket['student_id'], ticket['schedule_id']))
+    branch = ticket['branch']
+    if (
+        ticket['day'] != day.isoformat()
+        or entry is None
+        or entry.schedule_id != ticket['schedule_id']
+        or _iso(entry.first_session_start) != ticket['first_session_start']
+        or _iso(entry.last_session_end) != ticket['last_session_end']
+        or (entry.branch_id, entry.branch_latitude, entry.branch_longitude, entry.geofence_radius)
+        != (branch['id'], branch['latitude'], branch['longitude'], branch['radius'])
+        or (stale_at is not None and stale_at > ticket['iat'])
+    ):
+        return None, _error("Your day ticket is out of date. Please fetch a new one.", "stale_day_ticket",
+                            status.HTTP_409_CONFLICT)
+    return ticket, None
+
+
+def _permissions(ticket):
+    return [TicketPermission(request_type, parse_datetime(adjusted) if adjusted else None)
+            for request_type, adjusted in ticket['permissions']]
+
+
+def _geofence(ticket, latitude, longitude):
+    """Return (distance, None) or (distance, fail payload/status)."""
+    branch = ticket['branch']
+    distance = haversine_distance(latitude, longitude, branch['latitude'], branch['longitude'])
+    if distance <= branch['radius']:
+        return distance, None
+    return distance, ({
+        "status": "fail",
+        "message": "You are outside the allowed geofence area",
+        "distance": distance,
+        "geofence_radius": branch['radius'],
+        "branch": {"id": branch['id'], "name": branch['name']},
+        "nearest_branch": nearest_branch(latitude, longitude)
+    }, status.HTTP_400_BAD_REQUEST)
+
+
+def redeem_check_in(raw_ticket, user, user_id, uuid, latitude, longitude):
+    """Check in with a day ticket. Returns (response payload, HTTP status)."""
+    ticket, error = _verify(raw_ticket, user, user_id, uuid)
+    if error:
+        return error
+    distance, error = _geofence(ticket, latitude, longitude)
+    if error:
+        return error
+
+    # The conditional UPDATE must see a check-in still in the write-behind buffer
+    flush_pending_rows(ticket['record_id'], ticket['student_id'])
+    record = AttendanceRecord.objects.filter(pk=ticket['record_id'], check_in_time__isnull=True)
+    branch = {"id": ticket['branch']['id'], "name": ticket['branch']['name']}
+
+    if ticket['first_session_start'] is None:
+        record.update(status=status_engine.NO_SESSIONS)
+        return {
+            "status": "warning",
+            "message": "Check-in recorded, but this schedule has no sessions defined.",
+            "schedule_name": ticket['schedule_name']
+        }, status.HTTP_200_OK
+
+    current_time = timezone.localtime()
+    status_to_set = status_engine.check_in_status(
+        current_time, parse_datetime(ticket['first_session_start']), _permissions(ticket)
+    )
+    if not record.update(check_in_time=current_time, status=status_to_set):
+        return _error("You have already checked in for today's session.", "already_checked_in")
+    Student.objects.filter(pk=ticket['student_id']).update(is_checked_in=True)
+    mark_stale([ticket['schedule_id']], [ticket['student_id']])
+    invalidate_track_months([(ticket['track_id'], date.fromisoformat(ticket['day']))])
+    bump_tracks([ticket['track_id']])
+    logger.info(f"Day-ticket check-in for user {user.pk} with status: {status_to_set}")
+
+    return {
+        "status": "success",
+        "message": "Attendance validated successfully",
+        "distance": distance,
+        "geofence_radius": ticket['branch']['radius'],
+        "check_in_time": current_time,
+        "schedule_name": ticket['schedule_name'],
+        "branch": branch
+    }, status.HTTP_200_OK
+
+
+def redeem_check_out(raw_ticket, user, user_id, uuid, latitude, longitude):
+    """
+    Check out with a day ticket. Returns (response payload, HTTP status).
+
+    The final status depends on the status set at check-in, so it is computed
+    inside the UPDATE from the status engine's transition table instead of
+    being read first; the check-in time for the response comes back from the
+    same UPDATE.
+    """
+    ticket, error = _verify(raw_ticket, user, user_id, uuid)
+    if error:
+        return error
+    distance, error = _geofence(ticket, latitude, longitude)
+    if error:
+        return error
+
+    # A check-in still in the write-behind buffer must be written before the UPDATE looks for it
+    flush_pending_rows(ticket['record_id'], ticket['student_id'])
+    record = AttendanceRecord.objects.filter(
+        pk=ticket['record_id'], check_in_time__isnull=False, check_out_time__isnull=True
+    )
+    current_time = timezone.localtime()
+
+    if ticket['last_session_end'] is None:
+        new_status = Value(status_engine.NO_SESSIONS)
+    else:
+        last_session_end = parse_datetime(ticket['last_session_end'])
+        permissions = _permissions(ticket)
+        check_in_statuses = {check_in_status for check_in_status, _, _ in status_engine.CHECK_OUT_TRANSITIONS}
+        new_status = Case(
+            *[
+                When(status=check_in_status, then=Value(
+                    status_engine.check_out_status(current_time, last_session_end, check_in_status, permissions)
+                ))
+                for check_in_status in sorted(check_in_statuses)
+            ],
+            default=Value(status_engine.check_out_status(current_time, last_session_end, None, permissions)),
+        )
+
+    check_in_time = _update_returning(record, 'check_in_time', check_out_time=current_time, status=new_status)
+    if check_in_time is None:
+        return _error("You haven't checked in yet, or have already checked out.", "not_checked_in")
+    Student.objects.filter(pk=ticket['student_id']).update(is_checked_in=False)
+    mark_stale([ticket['schedule_id']], [ticket['student_id']])
+    invalidate_track_months([(ticket['track_id'], date.fromisoformat(ticket['day']))])
+    bump_tracks([ticket['track_id']])
+    logger.info(f"Day-ticket check-out for user {user.pk}")
+
+    if ticket['last_session_end'] is None:
+        return {
+            "status": "warning",
+            "message": "Check-out recorded, but this schedule has no sessions defined.",
+            "schedule_name": ticket['schedule_name']
+        }, status.HTTP_200_OK
+    return {
+        "status": "success",
+        "message": "Check-out successful",
+        "distance": distance,
+        "geofence_radius": ticket['branch']['radius'],
+        "check_in_time": check_in_time,
+        "check_out_time": current_time,
+        "attendance_duration_hours": round((current_time - check_in_time).total_seconds() / 3600, 2),
+        "is_checked_in": False,
+        "schedule_name": ticket['schedule_name'],
+        "branch": {"id": ticket['branch']['id'], "name": ticket['branch']['name']}
+    }, status.HTTP_200_OK
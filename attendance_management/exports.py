@@ -0,0 +1,157 @@
+"""
+Bulk export of attendance records as CSV or Parquet.
+
+Rows are one attendance record joined with its student, track, branch and
+schedule, read as plain tuples with `values_list(...).iterator(chunk_size)`
+so no model instances are built and, on PostgreSQL, rows come from a
+server-side cursor `chunk_size` at a time. The cursor is read inside a
+transaction: outside one Django declares it WITH HOLD, which pgbouncer in
+transaction pooling mode (the Neon `-pooler` host) does not support. CSV is
+produced line by line; Parquet is written one row group per chunk through a
+pyarrow ParquetWriter. Either way memory stays bounded by the chunk size, not
+the date range.
+
+The app is served over ASGI, where a StreamingHttpResponse reads a sync
+iterator to the end before sending anything, so the export view streams
+through `aiter_csv` and `aiter_file`, which pull one chunk at a time in the
+request's worker thread.
+
+Parquet needs the optional `pyarrow` package; CSV has no extra dependencies.
+"""
+import csv
+import itertools
+from contextlib import closing
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .models import AttendanceRecord
+
+CHUNK_SIZE = 5000
+FILE_BLOCK_SIZE = 64 * 1024
+
+# (header, lookup) in output order
+COLUMNS = (
+    ('record_id', 'id'),
+    ('date', 'schedule__created_at'),
+    ('schedule_id', 'schedule_id'),
+    ('schedule', 'schedule__name'),
+    ('day_modality', 'schedule__day_modality'),
+    ('branch_id', 'schedule__track__default_branch_id'),
+    ('branch', 'schedule__track__default_branch__name'),
+    ('track_id', 'schedule__track_id'),
+    ('track', 'schedule__track__name'),
+    ('student_id', 'student_id'),
+    ('email', 'student__user__email'),
+    ('first_name', 'student__user__first_name'),
+    ('last_name', 'student__user__last_name'),
+    ('status', 'status'),
+    ('check_in_time', 'check_in_time'),
+    ('check_out_time', 'check_out_time'),
+)
+HEADER = [name for name, _ in COLUMNS]
+
+
+def export_rows(start_date, end_date, track_ids=None, branch_id=None):
+    """
+    Queryset of row tuples (in COLUMNS order) for records of schedules from
+    `start_date` to `end_date`, optionally limited to some tracks and to the
+    tracks of a branch. Iterate it with `iter_rows` to keep memory flat.
+    """
+    records = AttendanceRecord.objects.filter(
+        schedule__created_at__gte=start_date, schedule__created_at__lte=end_date, schedule__track__isnull=False
+    )
+    if track_ids is not None:
+        records = records.filter(schedule__track_id__in=track_ids)
+    if branch_id is not None:
+        records = records.filter(schedule__track__default_branch_id=branch_id)
+    return records.order_by('schedule__created_at', 'schedule__track_id', 'id').values_list(
+        *[lookup for _, lookup in COLUMNS]
+    )
+
+
+def iter_rows(rows, chunk_size=CHUNK_SIZE):
+    """Iterate `rows` through a cursor that fetches `chunk_size` rows at a time."""
+    # A server-side cursor outside a transaction is declared WITH HOLD, which the pooler rejects
+    with transaction.atomic(using=rows.db):
+        yield from rows.iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object whose write() returns what it was given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, chunk_size=CHUNK_SIZE):
+    """Yield the CSV export of `rows` line by line, header first."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    with closing(iter_rows(rows, chunk_size)) as records:
+        for row in records:
+            yield writer.writerow(
+                value.isoformat() if hasattr(value, 'isoformat') else value for value in row
+            )
+
+
+async def _pull(next_chunk, close):
+    try:
+        while chunk := await sync_to_async(next_chunk)():
+            yield chunk
+    finally:
+        # Also on a client disconnect, so the cursor's transaction ends in the thread that opened it
+        await sync_to_async(close)()
+
+
+def aiter_csv(rows, chunk_size=CHUNK_SIZE):
+    """Async iter_csv() for ASGI, yielding `chunk_size` lines at a time."""
+    lines = iter_csv(rows, chunk_size)
+    return _pull(lambda: ''.join(itertools.islice(lines, chunk_size)), lines.close)
+
+
+def aiter_file(file, block_size=FILE_BLOCK_SIZE):
+    """Yield the rest of the binary `file` block by block for ASGI, closing it at the end."""
+    return _pull(lambda: file.read(block_size), file.close)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImproperlyConfigured("Parquet export requires the pyarrow package.")
+    return pyarrow
+
+
+def _parquet_schema(pa):
+    types = {
+        'date': pa.date32(),
+        'check_in_time': pa.timestamp('us', tz='UTC'),
+        'check_out_time': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([
+        (name, types.get(name, pa.int64() if name.endswith('id') else pa.string())) for name in HEADER
+    ])
+
+
+def write_parquet(rows, destination, chunk_size=CHUNK_SIZE):
+    """
+    Write `rows` as Parquet to `destination` (a path or binary file object),
+    one row group per chunk. Returns the number of rows written.
+    """
+    pa = _pyarrow()
+    schema = _parquet_schema(pa)
+    written = 0
+    with closing(iter_rows(rows, chunk_size)) as rows, pa.parquet.ParquetWriter(destination, schema) as writer:
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            columns = zip(*chunk)
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            written += len(chunk)
+    return written
@@ -0,0 +1,182 @@
+"""
+Geofence engine.
+
+Keeps every Branch's coordinates and radius in NumPy arrays so distances for
+many points can be computed in one vectorized pass, and answers "which branch
+is this point in / nearest to" with a haversine BallTree.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from .models import Branch
+
+logger = logging.getLogger(__name__)
+
+# Earth's radius in meters
+EARTH_RADIUS_METERS = 6371000
+# Branches rarely change; other workers pick up edits after this many seconds
+ENGINE_TTL_SECONDS = 60
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Distance in meters between coordinates given in degrees, using the Haversine formula.
+
+    Accepts scalars or array-likes (broadcast against each other). Returns a
+    float for scalar input and an ndarray otherwise.
+    """
+    lat1_rad = np.radians(np.asarray(lat1, dtype=float))
+    lon1_rad = np.radians(np.asarray(lon1, dtype=float))
+    lat2_rad = np.radians(np.asarray(lat2, dtype=float))
+    lon2_rad = np.radians(np.asarray(lon2, dtype=float))
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    distance = EARTH_RADIUS_METERS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    if distance.ndim == 0:
+        return float(distance)
+    return distance
+
+
+class BranchGeofence:
+    """
+    Immutable snapshot of all branch geofences.
+
+    Branches are addressed by their position in the arrays; `index_of` maps a
+    branch id to that position.
+    """
+
+    def __init__(self, branches):
+        branches = list(branches)
+        self.ids = np.array([branch['id'] for branch in branches], dtype=np.int64)
+        self.names = [branch['name'] for branch in branches]
+        self.latitudes = np.array([branch['latitude'] for branch in branches], dtype=float)
+        self.longitudes = np.array([branch['longitude'] for branch in branches], dtype=float)
+        self.radii = np.array([branch['radius'] for branch in branches], dtype=float)
+        self.index_of = {branch_id: position for position, branch_id in enumerate(self.ids.tolist())}
+        self._tree = None
+        if branches:
+            self._tree = BallTree(np.radians(np.column_stack([self.latitudes, self.longitudes])), metric='haversine')
+
+    @classmethod
+    def from_database(cls):
+        return cls(Branch.objects.values('id', 'name', 'latitude', 'longitude', 'radius').order_by('id'))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def describe(self, position, distance=None):
+        """Plain dict describing the branch at `position`, for API responses."""
+        info = {
+            "id": int(self.ids[position]),
+            "name": self.names[position],
+            "geofence_radius": float(self.radii[position]),
+        }
+        if distance is not None:
+            info["distance"] = float(distance)
+        return info
+
+    def _positions(self, branch_ids):
+        return np.array([self.index_of.get(branch_id, -1) for branch_id in branch_ids], dtype=np.int64)
+
+    def distances_to(self, branch_ids, latitudes, longitudes):
+        """
+        Distance from each point to the branch paired with it. Unknown branch ids yield NaN.
+        """
+        positions = self._positions(branch_ids)
+        known = positions >= 0
+        distances = np.full(len(positions), np.nan)
+        if known.any():
+            distances[known] = haversine_distance(
+                np.asarray(latitudes, dtype=float)[known],
+                np.asarray(longitudes, dtype=float)[known],
+                self.latitudes[positions[known]],
+                self.longitudes[positions[known]],
+            )
+        return distances
+
+    def within(self, branch_ids, latitudes, longitudes):
+        """
+        Check each point against the geofence of the branch paired with it.
+
+        Returns (distances, inside) arrays; points paired with unknown branches are never inside.
+        """
+        positions = self._positions(branch_ids)
+        known = positions >= 0
+        radii = np.full(len(positions), np.nan)
+        radii[known] = self.radii[positions[known]]
+        distances = self.distances_to(branch_ids, latitudes, longitudes)
+        with np.errstate(invalid='ignore'):
+            inside = distances <= radii
+        return distances, inside
+
+    def nearest(self, latitudes, longitudes):
+        """
+        Nearest branch for each point. Returns (positions, distances) arrays;
+        positions are -1 when there are no branches at all.
+        """
+        points = np.radians(np.column_stack([np.atleast_1d(latitudes), np.atleast_1d(longitudes)]).astype(float))
+        if self._tree is None:
+            return np.full(len(points), -1, dtype=np.int64), np.full(len(points), np.nan)
+        distances, positions = self._tree.query(points, k=1)
+        return positions[:, 0], distances[:, 0] * EARTH_RADIUS_METERS
+
+    def containing(self, latitudes, longitudes):
+        """
+        Branch whose geofence contains each point (the closest one if geofences overlap).
+        Returns (positions, distances) arrays; positions are -1 where no geofence contains the point.
+        """
+        points = np.radians(np.column_stack([np.atleast_1d(latitudes), np.atleast_1d(longitudes)]).astype(float))
+        positions = np.full(len(points), -1, dtype=np.int64)
+        distances = np.full(len(points), np.nan)
+        if self._tree is None:
+            return positions, distances
+
+        candidates, candidate_distances = self._tree.query_radius(
+            points, r=self.radii.max() / EARTH_RADIUS_METERS, return_distance=True, sort_results=True
+        )
+        for i, (branch_positions, branch_distances) in enumerate(zip(candidates, candidate_distances)):
+            meters = branch_distances * EARTH_RADIUS_METERS
+            matches = np.nonzero(meters <= self.radii[branch_positions])[0]
+            if len(matches):
+                positions[i] = branch_positions[matches[0]]
+                distances[i] = meters[matches[0]]
+        return positions, distances
+
+
+_lock = threading.Lock()
+_engine = None
+_engine_loaded_at = 0.0
+
+
+def get_branch_geofence():
+    """Return the process-wide BranchGeofence, rebuilding it when stale or invalidated."""
+    global _engine, _engine_loaded_at
+    with _lock:
+        if _engine is None or time.monotonic() - _engine_loaded_at > ENGINE_TTL_SECONDS:
+            _engine = BranchGeofence.from_database()
+            _engine_loaded_at = time.monotonic()
+            logger.debug(f"Loaded geofence engine with {len(_engine)} branches")
+        return _engine
+
+
+def invalidate_branch_geofence():
+    global _engine
+    with _lock:
+        _engine = None
+
+
+def nearest_branch(latitude, longitude):
+    """Describe the branch nearest to a single point, or None if there are no branches."""
+    engine = get_branch_geofence()
+    positions, distances = engine.nearest([latitude], [longitude])
+    if positions[0] < 0:
+        return None
+    return engine.describe(positions[0], distances[0])
@@ -0,0 +1,143 @@
+"""
+Month-bucketed cache for the attendance calendar heatmap.
+
+The calendar shows, per day, how many of a track's students checked in. The
+counts are cached per (track, month) so paging back through history reads
+cache buckets only; missing buckets for any number of tracks are filled from
+the analytics layer in one go.
+
+A bucket is dropped when an AttendanceRecord or Session of that track and
+month changes (signals, plus the bulk check-in paths that bypass them). A
+student joining, leaving or changing track changes the denominator of every
+month, so it bumps the track's generation, which retires all of its buckets
+at once.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .analytics import track_day_stats
+from .models import AttendanceRecord, Schedule
+from .schedule_index import as_date, indexed_track_days
+
+logger = logging.getLogger(__name__)
+
+CACHE_TIMEOUT = getattr(settings, 'ATTENDANCE_HEATMAP_CACHE_TIMEOUT', 60 * 60 * 24 * 31)
+
+
+def _generation_key(track_id):
+    return f"attendance_heatmap:generation:{track_id}"
+
+
+def _bucket_key(track_id, generation, month):
+    return f"attendance_heatmap:{track_id}:{generation}:{month:%Y-%m}"
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _months(start_date, end_date):
+    month, last = _month(start_date), _month(end_date)
+    while month <= last:
+        yield month
+        month = _month(month + timedelta(days=31))
+
+
+def _generations(track_ids):
+    stored = cache.get_many([_generation_key(track_id) for track_id in track_ids])
+    return {track_id: stored.get(_generation_key(track_id), 0) for track_id in track_ids}
+
+
+def _fill(missing):
+    """Compute the buckets for [(track_id, month), ...] with one analytics call."""
+    buckets = {track_month: {} for track_month in missing}
+    months = [month for _, month in missing]
+    last_month = max(months)
+    end_date = _month(last_month + timedelta(days=31)) - timedelta(days=1)
+    for stats in track_day_stats(sorted({track_id for track_id, _ in missing}), min(months), end_date):
+        bucket = buckets.get((stats.track_id, _month(stats.date)))
+        if bucket is not None:
+            bucket[stats.date.isoformat()] = (stats.checked_in, stats.enrolled)
+    return buckets
+
+
+def track_heatmaps(track_ids, start_date, end_date):
+    """
+    {track_id: {ISO date: (checked_in, enrolled)}} for the scheduled days of
+    `track_ids` between `start_date` and `end_date` inclusive.
+    """
+    track_ids = list(track_ids)
+    if not track_ids:
+        return {}
+    generations = _generations(track_ids)
+    keys = {
+        (track_id, month): _bucket_key(track_id, generations[track_id], month)
+        for track_id in track_ids
+        for month in _months(start_date, end_date)
+    }
+    cached = cache.get_many(keys.values())
+    buckets = {track_month: cached[key] for track_month, key in keys.items() if key in cached}
+
+    missing = [track_month for track_month in keys if track_month not in buckets]
+    if missing:
+        computed = _fill(missing)
+        cache.set_many({keys[track_month]: bucket for track_month, bucket in computed.items()}, CACHE_TIMEOUT)
+        buckets.update(computed)
+
+    first, last = start_date.isoformat(), end_date.isoformat()
+    heatmaps = {track_id: {} for track_id in track_ids}
+    for (track_id, _), bucket in sorted(buckets.items()):
+        heatmaps[track_id].update((day, counts) for day, counts in bucket.items() if first <= day <= last)
+    return heatmaps
+
+
+# -- invalidation --------------------------------------------------------------
+
+def invalidate_track_months(track_days):
+    """Drop the buckets holding [(track_id, day), ...]."""
+    track_months = {(track_id, _month(as_date(day))) for track_id, day in track_days if track_id is not None and day}
+    if not track_months:
+        return
+    generations = _generations({track_id for track_id, _ in track_months})
+    cache.delete_many([_bucket_key(track_id, generations[track_id], month) for track_id, month in track_months])
+
+
+def invalidate_schedules(schedule_ids):
+    """Drop the buckets of the given schedules, resolving today's from the schedule index without a query."""
+    track_days, unresolved = [], []
+    for schedule_id in set(schedule_ids):
+        if schedule_id is None:
+            continue
+        indexed = indexed_track_days(schedule_id)
+        track_days.extend(indexed)
+        if not indexed:
+            unresolved.append(schedule_id)
+    if unresolved:
+        track_days.extend(Schedule.objects.filter(pk__in=unresolved).values_list('track_id', 'created_at'))
+    invalidate_track_months(track_days)
+
+
+def invalidate_records(record_ids):
+    """Drop the buckets of the given AttendanceRecords."""
+    record_ids = list(set(record_ids))
+    if record_ids:
+        invalidate_track_months(
+            AttendanceRecord.objects.filter(pk__in=record_ids)
+            .values_list('schedule__track_id', 'schedule__created_at').distinct()
+        )
+
+
+def invalidate_track(track_id):
+    """Retire every bucket of a track."""
+    if track_id is None:
+        return
+    key = _generation_key(track_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, 1, None)
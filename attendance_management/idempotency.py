@@ -0,0 +1,178 @@
+"""
+Idempotency keys for retry-prone attendance endpoints.
+
+Clients may send an `Idempotency-Key` header; the first request with a given
+key does the work and its response is stored in the configured cache
+(settings.ATTENDANCE_IDEMPOTENCY_CACHE) so repeats get the stored response
+without touching the database. Without a header, a key is derived from the
+target user, today's date and the action, and only successful responses are
+replayed (a failed check-in must stay retryable).
+
+Concurrent duplicates are collapsed with a `cache.add` lock: one request does
+the work. A sync duplicate is answered at once with 409 `request_in_progress`
+and a Retry-After header rather than holding a worker thread; an async one
+waits briefly on the event loop for the stored response.
+
+The decorator works on DRF ViewSet actions and on the async check-in views
+(coroutine functions returning JsonResponse).
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# How long a request may hold the lock before others stop waiting for it
+LOCK_TIMEOUT = 30
+# How long async duplicates wait for the first response
+WAIT_TIMEOUT = 5
+POLL_INTERVAL = 0.05
+# Seconds a client told `request_in_progress` should wait before retrying
+RETRY_AFTER = 1
+
+
+def _cache():
+    return caches[getattr(settings, 'ATTENDANCE_IDEMPOTENCY_CACHE', 'default')]
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _request_key(request, action_name):
+    """Return (cache key, explicit) for this request, or (None, False) when it cannot be keyed."""
+    explicit_key = request.META.get(IDEMPOTENCY_HEADER)
+    if explicit_key:
+        return f"idempotency:{action_name}:{request.user.pk}:{explicit_key[:255]}", True
+    user_id = request.data.get('user_id')
+    if not user_id:
+        return None, False
+    return f"idempotency:{action_name}:derived:{request.user.pk}:{user_id}:{timezone.localdate().isoformat()}", False
+
+
+def json_response(data, status=200, headers=None):
+    """
+    JsonResponse rendered like a DRF Response (same encoder), keeping `.data`
+    around so the async views' responses can be stored and replayed.
+    """
+    response = JsonResponse(data, status=status, encoder=JSONEncoder, headers=headers)
+    response.data = data
+    return response
+
+
+def _replay(stored, fingerprint, explicit, respond=Response):
+    if explicit and stored['fingerprint'] != fingerprint:
+        return respond({
+            "status": "error",
+            "message": "This Idempotency-Key was already used with a different request body.",
+            "error_code": "idempotency_key_reused"
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return respond(stored['data'], status=stored['status'], headers={REPLAYED_HEADER: 'true'})
+
+
+def _in_progress(respond=Response):
+    return respond({
+        "status": "error",
+        "message": "An identical request is still being processed. Please retry shortly.",
+        "error_code": "request_in_progress"
+    }, status=status.HTTP_409_CONFLICT, headers={'Retry-After': str(RETRY_AFTER)})
+
+
+def _should_store(response, explicit):
+    if explicit:
+        # Anything but a server error is the final answer for this key
+        return response.status_code < 500
+    return 200 <= response.status_code < 300
+
+
+def _ttl(explicit):
+    if explicit:
+        return getattr(settings, 'ATTENDANCE_IDEMPOTENCY_TTL', 60 * 60 * 24)
+    return getattr(settings, 'ATTENDANCE_IDEMPOTENCY_DERIVED_TTL', 120)
+
+
+def _stored(response, fingerprint):
+    return {'status': response.status_code, 'data': response.data, 'fingerprint': fingerprint}
+
+
+def idempotent(action_name):
+    """Decorator for ViewSet actions (or async views) that de-duplicates retried requests."""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key, explicit = _request_key(request, action_name)
+            if key is None:
+                return view_method(self, request, *args, **kwargs)
+
+            cache = _cache()
+            result_key, lock_key = f"{key}:result", f"{key}:lock"
+            fingerprint = _fingerprint(request)
+
+            stored = cache.get(result_key)
+            if stored is not None:
+                return _replay(stored, fingerprint, explicit)
+
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                # A duplicate is being processed right now; the client retries for its stored answer
+                return _in_progress()
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                if _should_store(response, explicit):
+                    cache.set(result_key, _stored(response, fingerprint), _ttl(explicit))
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        @functools.wraps(view_method)
+        async def async_wrapper(request, *args, **kwargs):
+            key, explicit = _request_key(request, action_name)
+            if key is None:
+                return await view_method(request, *args, **kwargs)
+
+            cache = _cache()
+            result_key, lock_key = f"{key}:result", f"{key}:lock"
+            fingerprint = _fingerprint(request)
+
+            stored = await cache.aget(result_key)
+            if stored is not None:
+                return _replay(stored, fingerprint, explicit, json_response)
+
+            if not await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+                # A duplicate is being processed right now; wait for its answer without blocking a thread
+                deadline = time.monotonic() + WAIT_TIMEOUT
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(POLL_INTERVAL)
+                    stored = await cache.aget(result_key)
+                    if stored is not None:
+                        return _replay(stored, fingerprint, explicit, json_response)
+                    if await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+                        # The other request finished without a replayable response; do the work ourselves
+                        break
+                else:
+                    return _in_progress(json_response)
+
+            try:
+                response = await view_method(request, *args, **kwargs)
+                if _should_store(response, explicit):
+                    await cache.aset(result_key, _stored(response, fingerprint), _ttl(explicit))
+                return response
+            finally:
+                await cache.adelete(lock_key)
+
+        return async_wrapper if asyncio.iscoroutinefunction(view_method) else wrapper
+    return decorator
@@ -0,0 +1,144 @@
+"""
+Per-student attendance ledger.
+
+StudentAttendanceLedger holds one row per student with the totals the
+absence-warning checks and the student stats endpoint need, so they read a row
+instead of scanning the student's history.
+
+Rows are maintained like the daily rollup. Every write path that touches a
+student's attendance records or day excuses - record and permission request
+saves and deletes, session changes (which decide whether a day counts),
+schedule moves, batch ingestion, the write-behind flusher, day-ticket check-ins
+and status recomputes - marks the affected rows stale with a single UPDATE,
+deferred through `stale_marks` on the per-check-in paths. Readers go through `student_ledgers`, which creates missing rows and recounts
+the stale ones, and the ones counted for an earlier day (absences only count
+once a day has passed), with one aggregate query. `manage.py
+rebuild_attendance_ledger` recounts any set of students from scratch.
+"""
+from django.db.models import Case, Count, Exists, F, OuterRef, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import AttendanceRecord, PermissionRequest, Session, Student, StudentAttendanceLedger
+from .rollups import LATE, WRITE_CHUNK_SIZE
+from .stale_marks import flush_stale_marks
+
+COUNT_FIELDS = ('total_days', 'attended_days', 'late_days', 'excused_absences', 'unexcused_absences')
+
+
+# -- marking -----------------------------------------------------------------
+
+def mark_ledgers_stale(student_ids):
+    """Mark the ledgers of the given students stale."""
+    student_ids = [student_id for student_id in set(student_ids) if student_id is not None]
+    if not student_ids:
+        return 0
+    return StudentAttendanceLedger.objects.filter(student_id__in=student_ids, is_stale=False).update(is_stale=True)
+
+
+def mark_record_ledgers_stale(record_ids):
+    """Mark the ledgers of the given AttendanceRecords' students stale."""
+    record_ids = list(set(record_ids))
+    if not record_ids:
+        return 0
+    return StudentAttendanceLedger.objects.filter(
+        Exists(AttendanceRecord.objects.filter(pk__in=record_ids, student_id=OuterRef('student_id'))),
+        is_stale=False,
+    ).update(is_stale=True)
+
+
+def mark_schedule_ledgers_stale(schedule_ids):
+    """Mark the ledgers of every student with a record in the given schedules stale."""
+    schedule_ids = [schedule_id for schedule_id in set(schedule_ids) if schedule_id is not None]
+    if not schedule_ids:
+        return 0
+    return StudentAttendanceLedger.objects.filter(
+        Exists(AttendanceRecord.objects.filter(schedule_id__in=schedule_ids, student_id=OuterRef('student_id'))),
+        is_stale=False,
+    ).update(is_stale=True)
+
+
+# -- counting ----------------------------------------------------------------
+
+def _count(ledgers, today):
+    """Recount `ledgers` in place as of `today` and save them."""
+    if not ledgers:
+        return
+    # Clear the flag before counting so changes made while we count mark the row stale again
+    StudentAttendanceLedger.objects.filter(pk__in=[ledger.pk for ledger in ledgers]).update(is_stale=False)
+    day_counts = Q(schedule__created_at__lte=today, has_sessions=True)
+    absent = Q(schedule__created_at__lt=today, check_in_time__isnull=True)
+    counts = {
+        item['student_id']: item
+        for item in AttendanceRecord.objects
+        .filter(student_id__in=[ledger.pk for ledger in ledgers])
+        .annotate(
+            has_sessions=Exists(Session.objects.filter(schedule_id=OuterRef('schedule_id'))),
+            is_excused=Exists(PermissionRequest.objects.filter(
+                student_id=OuterRef('student_id'), schedule_id=OuterRef('schedule_id'),
+                request_type='day_excuse', status='approved',
+            )),
+        )
+        .values('student_id')
+        .annotate(
+            total_days=Count('id', filter=day_counts),
+            attended_days=Count('id', filter=day_counts & (Q(check_in_time__isnull=False) | Q(status='attended'))),
+            late_days=Count('id', filter=day_counts & LATE),
+            excused_absences=Count('id', filter=absent & Q(is_excused=True)),
+            unexcused_absences=Count('id', filter=absent & Q(is_excused=False)),
+        )
+        .order_by()
+    }
+    updated_at = timezone.now()
+    for ledger in ledgers:
+        item = counts.get(ledger.pk, {})
+        for field in COUNT_FIELDS:
+            setattr(ledger, field, item.get(field, 0))
+        ledger.as_of = today
+        ledger.is_stale = False
+        ledger.updated_at = updated_at
+    # One UPDATE per chunk; bulk_update would split it further on SQLite's parameter limit
+    for i in range(0, len(ledgers), WRITE_CHUNK_SIZE):
+        chunk = ledgers[i:i + WRITE_CHUNK_SIZE]
+        StudentAttendanceLedger.objects.filter(pk__in=[ledger.pk for ledger in chunk]).update(
+            as_of=today, updated_at=updated_at, **{
+                field: Case(*[When(pk=ledger.pk, then=Value(getattr(ledger, field))) for ledger in chunk],
+                            default=F(field), output_field=PositiveIntegerField())
+                for field in COUNT_FIELDS
+            }
+        )
+
+
+def student_ledgers(student_ids):
+    """Return {student_id: fresh StudentAttendanceLedger} for `student_ids`, creating missing rows."""
+    student_ids = {student_id for student_id in student_ids if student_id is not None}
+    if not student_ids:
+        return {}
+    today = timezone.localdate()
+    flush_stale_marks()
+    ledgers = {ledger.pk: ledger for ledger in StudentAttendanceLedger.objects.filter(student_id__in=student_ids)}
+    missing = [StudentAttendanceLedger(student_id=student_id) for student_id in student_ids - ledgers.keys()]
+    if missing:
+        StudentAttendanceLedger.objects.bulk_create(missing, ignore_conflicts=True)
+        ledgers.update((ledger.pk, ledger) for ledger in missing)
+    _count([ledger for ledger in ledgers.values() if ledger.is_stale or ledger.as_of != today], today)
+    return ledgers
+
+
+def student_ledger(student_id):
+    """The fresh StudentAttendanceLedger of one student."""
+    return student_ledgers([student_id])[student_id]
+
+
+def rebuild_ledgers(student_ids=None):
+    """Recount the ledgers of `student_ids` (default: every student) from scratch. Returns how many."""
+    if student_ids is None:
+        student_ids = Student.objects.values_list('id', flat=True)
+    student_ids = sorted(set(student_ids))
+    today = timezone.localdate()
+    for i in range(0, len(student_ids), WRITE_CHUNK_SIZE):
+        chunk = student_ids[i:i + WRITE_CHUNK_SIZE]
+        StudentAttendanceLedger.objects.bulk_create(
+            [StudentAttendanceLedger(student_id=student_id) for student_id in chunk], ignore_conflicts=True
+        )
+        _count(list(StudentAttendanceLedger.objects.filter(student_id__in=chunk)), today)
+    return len(student_ids)
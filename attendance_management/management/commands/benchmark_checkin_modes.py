@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+
+from attendance_management.benchmarking import BenchmarkFixture, asgi_request, percentile
+
+MODES = {
+    'sync': '/api/v1/attendance/',
+    'async': '/api/v1/attendance/async/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the DRF (sync) and native async check-in/check-out endpoints under N concurrent "
+        "clients, in-process through Django's ASGI handler. Seeds a throwaway track with one student "
+        "per client in the configured database and deletes it afterwards; run it against a local or "
+        "staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500, help="Concurrent clients (one student each).")
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['sync', 'async'])
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data.")
+
+    def handle(self, *args, **options):
+        fixture = BenchmarkFixture(options['clients']).create()
+        self.stdout.write(f"Seeded {len(fixture.students)} students (run {fixture.run_id})")
+        try:
+            for mode in options['modes']:
+                fixture.reset()
+                self.report(mode, asyncio.run(self.run_mode(fixture, mode)))
+        finally:
+            if not options['keep']:
+                fixture.destroy()
+
+    async def run_mode(self, fixture, mode):
+        application = ASGIHandler()
+        prefix = MODES[mode]
+        results = {'check-in': [], 'status': [], 'check-out': []}
+        errors = []
+
+        async def client(student):
+            token = fixture.tokens[student.user_id]
+            for step, method in (('check-in', 'POST'), ('status', 'GET'), ('check-out', 'POST')):
+                status_code, data, elapsed, _ = await asgi_request(
+                    application, method, f"{prefix}{step}/",
+                    body=fixture.payload(student) if method == 'POST' else None,
+                    token=token,
+                    # Explicit keys so runs never replay each other's stored responses
+                    headers={'Idempotency-Key': f"bench-{fixture.run_id}-{mode}-{step}"},
+                )
+                results[step].append(elapsed)
+                if status_code != 200:
+                    errors.append((step, status_code, (data or {}).get('error_code')))
+                    return
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(student) for student in fixture.students))
+        return results, errors, time.perf_counter() - started
+
+    def report(self, mode, outcome):
+        results, errors, wall_time = outcome
+        total = sum(len(latencies) for latencies in results.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"[{mode}] {total} requests in {wall_time:.2f}s ({total / wall_time:.0f} req/s), {len(errors)} errors"
+        ))
+        for step, latencies in results.items():
+            latencies = sorted(latencies)
+            self.stdout.write(
+                f"  {step:<10} n={len(latencies):<5} "
+                f"p50={percentile(latencies, 0.50) * 1000:.0f}ms "
+                f"p95={percentile(latencies, 0.95) * 1000:.0f}ms "
+                f"p99={percentile(latencies, 0.99) * 1000:.0f}ms"
+            )
+        for step, status_code, error_code in errors[:5]:
+            self.stdout.write(self.style.WARNING(f"  {step} failed with {status_code} ({error_code})"))
@@ -0,0 +1,131 @@
+import time
+from datetime import datetime, time as day_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from attendance_management.benchmarking import BenchmarkFixture
+from attendance_management.models import AttendanceRecord, Event, PermissionRequest, Schedule, Session
+from attendance_management.row_serializers import attendance_record_rows, event_rows, student_record_rows
+from attendance_management.signals import notify_students_on_session_deletion, notify_users_on_event_deletion
+from attendance_management.serializers import (
+    AttendanceRecordSerializer, AttendanceRecordSerializerForStudents, EventSerializer,
+    prefetch_attendance_records, prefetch_student_records
+)
+from lost_and_found_system.models import Notification
+from lost_and_found_system.serializers import NotificationSerializer, notification_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the ModelSerializers of the high-volume list endpoints with the row builders that "
+        "replaced them (attendance_management.row_serializers), rendering N rows of each to JSON. "
+        "Checks both render the same bytes. Seeds a throwaway track with one student, attendance "
+        "record, event and notification per row in the configured database and deletes it "
+        "afterwards; run it against a local or staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help="Row counts to measure.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the fastest is reported.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data.")
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            fixture = BenchmarkFixture(rows).create()
+            events = Event.objects.filter(description__startswith=f"Bench Event {fixture.run_id} ").order_by('id')
+            try:
+                self.seed(fixture)
+                self.stdout.write(f"Seeded {rows} rows (run {fixture.run_id})")
+                records = AttendanceRecord.objects.filter(schedule__in=fixture.schedules).order_by('id')
+                notifications = Notification.objects.filter(user=fixture.supervisor).order_by('id')
+                cases = (
+                    ('supervisor-attendance',
+                     lambda: AttendanceRecordSerializer(prefetch_attendance_records(records), many=True).data,
+                     lambda: attendance_record_rows(records)),
+                    ('student-attendance',
+                     lambda: AttendanceRecordSerializerForStudents(prefetch_student_records(records), many=True).data,
+                     lambda: student_record_rows(records)),
+                    ('events',
+                     lambda: EventSerializer(events.prefetch_related('schedule__custom_branch', 'schedule__sessions',
+                                                                     'target_tracks'), many=True).data,
+                     lambda: event_rows(events)),
+                    ('notifications',
+                     lambda: NotificationSerializer(notifications, many=True).data,
+                     lambda: notification_rows(notifications)),
+                )
+                for name, serialize, build_rows in cases:
+                    self.report(name, rows, self.measure(serialize, options['repeat']),
+                                self.measure(build_rows, options['repeat']))
+            finally:
+                if not options['keep']:
+                    self.delete_events(events)
+                    fixture.destroy()
+
+    def seed(self, fixture):
+        """One attendance record, event (with a schedule and two sessions) and notification per student."""
+        today = timezone.localdate()
+        schedule = fixture.schedules[0]
+        start = timezone.make_aware(datetime.combine(today, day_time(9)))
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(
+                student=student, schedule=schedule, status='attended' if i % 2 else 'absent',
+                check_in_time=start + timedelta(minutes=i % 60) if i % 2 else None,
+            )
+            for i, student in enumerate(fixture.students)
+        ])
+        PermissionRequest.objects.bulk_create([
+            PermissionRequest(student=student, schedule=schedule, request_type='late_check_in',
+                              adjusted_time=start + timedelta(minutes=30), status='approved')
+            for student in fixture.students[::3]
+        ])
+        events = Event.objects.bulk_create([
+            Event(description=f"Bench Event {fixture.run_id} {i}", audience_type='both') for i in range(fixture.size)
+        ])
+        schedules = Schedule.objects.bulk_create([
+            Schedule(name=f"Bench Event {fixture.run_id} {i}", custom_branch=fixture.branches[0],
+                     created_at=today + timedelta(days=1), event=event, is_shared=True)
+            for i, event in enumerate(events)
+        ])
+        Session.objects.bulk_create([
+            Session(schedule=event_schedule, title=title, instructor="Bench Speaker",
+                    start_time=start + timedelta(days=1, hours=hours), end_time=start + timedelta(days=1, hours=hours + 1))
+            for event_schedule in schedules for hours, title in ((0, "Keynote"), (2, "Panel"))
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=fixture.supervisor, message=f"Bench notification {i}") for i in range(fixture.size)
+        ])
+
+    def delete_events(self, events):
+        """Delete the seeded events without announcing their cancellation to every student."""
+        receivers = ((notify_users_on_event_deletion, Event), (notify_students_on_session_deletion, Session))
+        for receiver, sender in receivers:
+            post_delete.disconnect(receiver, sender=sender)
+        try:
+            events.delete()
+        finally:
+            for receiver, sender in receivers:
+                post_delete.connect(receiver, sender=sender)
+
+    def measure(self, build, repeat):
+        """(fastest seconds to build and render, rendered bytes)."""
+        best, rendered = None, None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            rendered = JSONRenderer().render(build())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, rendered
+
+    def report(self, name, rows, serializer, row_builder):
+        (serializer_time, expected), (rows_time, rendered) = serializer, row_builder
+        line = (
+            f"[{name}] {rows} rows: serializer {serializer_time * 1000:.0f}ms, "
+            f"rows {rows_time * 1000:.0f}ms ({serializer_time / rows_time:.1f}x)"
+        )
+        if rendered == expected:
+            self.stdout.write(self.style.SUCCESS(line))
+        else:
+            self.stdout.write(self.style.ERROR(f"{line}, output differs"))
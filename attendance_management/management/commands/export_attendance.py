@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_management.exports import CHUNK_SIZE, export_rows, iter_csv, write_parquet
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date: {value}. Use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Export attendance records for a date range as CSV or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', required=True, help="First day (YYYY-MM-DD).")
+        parser.add_argument('--end-date', required=True, help="Last day (YYYY-MM-DD).")
+        parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', dest='file_format')
+        parser.add_argument('--output', help="File to write. CSV defaults to stdout; Parquet requires a file.")
+        parser.add_argument('--branch', type=int, help="Branch ID. Defaults to all branches.")
+        parser.add_argument('--track', type=int, action='append', help="Track ID (repeatable). Defaults to all tracks.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        start_date = _parse_date(options['start_date'])
+        end_date = _parse_date(options['end_date'])
+        if start_date > end_date:
+            raise CommandError("--start-date must not be after --end-date.")
+        rows = export_rows(start_date, end_date, track_ids=options['track'], branch_id=options['branch'])
+
+        if options['file_format'] == 'parquet':
+            if not options['output']:
+                raise CommandError("--output is required for Parquet exports.")
+            try:
+                written = write_parquet(rows, options['output'], chunk_size=options['chunk_size'])
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            self.stderr.write(self.style.SUCCESS(f"Exported {written} attendance records to {options['output']}"))
+            return
+
+        written = -1  # Header line
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                for line in iter_csv(rows, chunk_size=options['chunk_size']):
+                    output.write(line)
+                    written += 1
+        else:
+            for line in iter_csv(rows, chunk_size=options['chunk_size']):
+                self.stdout.write(line, ending='')
+                written += 1
+        self.stderr.write(self.style.SUCCESS(f"Exported {written} attendance records to {options['output'] or 'stdout'}"))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from attendance_management.write_behind import WriteBehindBuffer
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the check-in write-behind journals of stopped server processes into the database. "
+        "Journals still locked by a running process are skipped; the server also replays on startup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--journal',
+            default=settings.ATTENDANCE_WRITE_BEHIND_JOURNAL,
+            help="Journal path the per-process journals are named after (defaults to ATTENDANCE_WRITE_BEHIND_JOURNAL).",
+        )
+
+    def handle(self, *args, **options):
+        buffer = WriteBehindBuffer(
+            options['journal'],
+            settings.ATTENDANCE_WRITE_BEHIND_FLUSH_MS,
+            settings.ATTENDANCE_WRITE_BEHIND_BATCH_SIZE,
+        )
+        written = buffer.replay()
+        self.stdout.write(self.style.SUCCESS(f"Replayed {written} rows from {options['journal']}.*"))
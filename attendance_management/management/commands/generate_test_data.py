@@ -2,9 +2,69 @@ from django.core.management.base import BaseCommand
 from datetime import datetime, timedelta
 import random
 from attendance_management.models import Track, Schedule, Session, Student, AttendanceRecord
+from attendance_management.modality import refresh_schedule_modality
 from django.db import transaction, connection
 from django.utils import timezone  # Add this import
 
+INSTRUCTORS = ["Sarah Malik", "Usman Khan", "Bilal Shah", "Mahmoud Helmy", "Hossam El-Din", 
+              "Mohamed El-Sayed", "Omar Abdelrahman", "Yasser Mohamed", "Ali Ahmed", "Mina Nagy", 
+              "Raphael", "Marina"]
+TOPICS_POOL = [
+    "HTML/CSS Basics", "JavaScript Fundamentals", "React Hooks", "Redux Intro", "React Routing",
+    "Python Basics", "Flask Routing", "REST APIs", "Postman Practice", "SQL & DB Models",
+    "User Auth", "Docker Basics", "CI/CD Pipelines", "Testing Flask", "Testing React",
+    "Debugging & Logging", "Network Protocols", "HTTP/HTTPS", "OS File System", "Threads & Processes",
+    "Capstone Planning", "Capstone Development", "Capstone Presentations", "Git Workflow", "Cloud Deployment",
+    "Responsive Design with Flexbox/Grid", "JavaScript ES6+ Features", "Async JS & Fetch API",
+    "React Context API", "React Performance Optimization", "Tailwind CSS Basics",
+    "Animations with Framer Motion",
+    "Python OOP", "Flask Blueprints", "Error Handling in Flask", "FastAPI Basics",
+    "Database Migrations with Alembic", "Background Tasks with Celery",
+    "PostgreSQL Joins & Indexes", "MongoDB Basics", "Query Optimization", "ORM vs Raw SQL",
+    "TCP vs UDP", "Ping, Traceroute, and Netstat", "Process Management in Linux",
+    "System Monitoring Tools (htop, top)", "File Permissions & Users", "Sockets Programming Intro",
+    "Firewalls & Port Scanning",
+    "Unit Testing with pytest", "Testing React with Jest", "API Testing with Postman/Newman",
+    "Integration Testing Overview",
+    "Git Rebase vs Merge", "Branching Strategy in Teams", "Docker Compose", "Intro to Kubernetes",
+    "GitHub Actions for CI/CD", "VS Code Power User Tips", "Using Postman for Mock Servers",
+    "Code Splitting in React", "Environment Variables & Secrets", "Deploying to Heroku",
+    "NGINX Basics for Devs", "Writing Clean Code & Linters", "Logging Strategies in Prod",
+    "Writing Good Technical Docs", "Time Estimation for Tasks", "Agile & Scrum Basics",
+    "How to Read Technical Specs"
+]
+SESSION_TIMES = [("09:00–12:00",), ("12:00–15:00",), ("16:00–18:00",)]
+
+
+def build_day_sessions(schedule, day, is_online, num_sessions=None, rng=random):
+    """
+    Unsaved Sessions for `schedule` on `day`: 1-3 (or `num_sessions`) of the
+    SESSION_TIMES slots, in time order. Also used by the load-test seeding.
+    """
+    num_sessions = num_sessions or rng.choice([1, 2, 3])
+    # To avoid time overlaps, sample from session times and sort them
+    available_slots = rng.sample(SESSION_TIMES, num_sessions)
+    available_slots.sort(key=lambda x: datetime.strptime(x[0].split("–")[0], "%H:%M"))
+
+    sessions = []
+    for time_slot in available_slots:
+        start_time_str, end_time_str = time_slot[0].split("–")
+        # Create timezone-aware start and end datetime objects
+        start_time = timezone.make_aware(datetime.combine(day, datetime.strptime(start_time_str, "%H:%M").time()))
+        end_time = timezone.make_aware(datetime.combine(day, datetime.strptime(end_time_str, "%H:%M").time()))
+        sessions.append(
+            Session(
+                schedule=schedule,
+                title=rng.choice(TOPICS_POOL),
+                instructor=rng.choice(INSTRUCTORS),
+                start_time=start_time,
+                end_time=end_time,
+                session_type="online" if is_online else "offline"
+            )
+        )
+    return sessions
+
+
 class Command(BaseCommand):
     help = 'Generate test data for schedules, sessions, and attendance records'
 
@@ -12,34 +72,6 @@ class Command(BaseCommand):
         # Configuration
         start_date = datetime(2025, 1, 1)
         end_date = datetime(2025, 4, 30)
-        instructors = ["Sarah Malik", "Usman Khan", "Bilal Shah", "Mahmoud Helmy", "Hossam El-Din", 
-                      "Mohamed El-Sayed", "Omar Abdelrahman", "Yasser Mohamed", "Ali Ahmed", "Mina Nagy", 
-                      "Raphael", "Marina"]
-        topics_pool = [
-            "HTML/CSS Basics", "JavaScript Fundamentals", "React Hooks", "Redux Intro", "React Routing",
-            "Python Basics", "Flask Routing", "REST APIs", "Postman Practice", "SQL & DB Models",
-            "User Auth", "Docker Basics", "CI/CD Pipelines", "Testing Flask", "Testing React",
-            "Debugging & Logging", "Network Protocols", "HTTP/HTTPS", "OS File System", "Threads & Processes",
-            "Capstone Planning", "Capstone Development", "Capstone Presentations", "Git Workflow", "Cloud Deployment",
-            "Responsive Design with Flexbox/Grid", "JavaScript ES6+ Features", "Async JS & Fetch API",
-            "React Context API", "React Performance Optimization", "Tailwind CSS Basics",
-            "Animations with Framer Motion",
-            "Python OOP", "Flask Blueprints", "Error Handling in Flask", "FastAPI Basics",
-            "Database Migrations with Alembic", "Background Tasks with Celery",
-            "PostgreSQL Joins & Indexes", "MongoDB Basics", "Query Optimization", "ORM vs Raw SQL",
-            "TCP vs UDP", "Ping, Traceroute, and Netstat", "Process Management in Linux",
-            "System Monitoring Tools (htop, top)", "File Permissions & Users", "Sockets Programming Intro",
-            "Firewalls & Port Scanning",
-            "Unit Testing with pytest", "Testing React with Jest", "API Testing with Postman/Newman",
-            "Integration Testing Overview",
-            "Git Rebase vs Merge", "Branching Strategy in Teams", "Docker Compose", "Intro to Kubernetes",
-            "GitHub Actions for CI/CD", "VS Code Power User Tips", "Using Postman for Mock Servers",
-            "Code Splitting in React", "Environment Variables & Secrets", "Deploying to Heroku",
-            "NGINX Basics for Devs", "Writing Clean Code & Linters", "Logging Strategies in Prod",
-            "Writing Good Technical Docs", "Time Estimation for Tasks", "Agile & Scrum Basics",
-            "How to Read Technical Specs"
-        ]
-        session_times = [("09:00–12:00",), ("12:00–15:00",), ("16:00–18:00",)]
 
         # Get all available tracks
         tracks = Track.objects.all()
@@ -114,56 +146,14 @@ class Command(BaseCommand):
                             self.style.SUCCESS(f'Track {track.name}: {"ONLINE" if is_online else "OFFLINE"} DAY: {current_date.strftime("%A, %b %d")}')
                         )
                         
-                        # Determine how many sessions to create (1-3)
-                        num_sessions = random.choice([1, 2, 3])
-                        
-                        # To avoid time overlaps, sample from session times and sort them
-                        available_slots = random.sample(session_times, num_sessions)
-                        available_slots.sort(key=lambda x: datetime.strptime(x[0].split("–")[0], "%H:%M"))
-                        
+                        sessions_to_create = build_day_sessions(schedule, current_date.date(), is_online)
                         # Track the first session start time and last session end time
-                        first_session_start_time = None
-                        last_session_end_time = None
-                        
-                        for time_slot in available_slots:
-                            start_time_str = time_slot[0].split("–")[0]
-                            end_time_str = time_slot[0].split("–")[1]
-                            
-                            # Create timezone-aware start and end datetime objects
-                            naive_start_time = datetime.combine(
-                                current_date.date(), 
-                                datetime.strptime(start_time_str, "%H:%M").time()
-                            )
-                            naive_end_time = datetime.combine(
-                                current_date.date(), 
-                                datetime.strptime(end_time_str, "%H:%M").time()
-                            )
-                            
-                            # Make datetime objects timezone-aware
-                            start_time = timezone.make_aware(naive_start_time)
-                            end_time = timezone.make_aware(naive_end_time)
-                            
-                            # Update first and last session times
-                            if first_session_start_time is None or start_time < first_session_start_time:
-                                first_session_start_time = start_time
-                            if last_session_end_time is None or end_time > last_session_end_time:
-                                last_session_end_time = end_time
-                            
-                            # Append session to bulk create list
-                            sessions_to_create.append(
-                                Session(
-                                    track=track,
-                                    schedule=schedule,
-                                    title=random.choice(topics_pool),
-                                    instructor=random.choice(instructors),
-                                    start_time=start_time,
-                                    end_time=end_time,
-                                    session_type="online" if is_online else "offline"
-                                )
-                            )
+                        first_session_start_time = min(session.start_time for session in sessions_to_create)
+                        last_session_end_time = max(session.end_time for session in sessions_to_create)
                         
                         # Bulk create all sessions for this day
                         Session.objects.bulk_create(sessions_to_create)
+                        refresh_schedule_modality([schedule.id])
                         
                         # Now create attendance records for all students
                         for student in students:
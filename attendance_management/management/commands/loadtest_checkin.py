@@ -0,0 +1,138 @@
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+
+from attendance_management.benchmarking import (
+    BenchmarkFixture, arrival_offsets, asgi_request, http_request, install_query_counter, percentile,
+)
+
+ENDPOINT_PREFIXES = {
+    'sync': '/api/v1/attendance/',
+    'async': '/api/v1/attendance/async/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a morning check-in surge: seed N students across tracks and branches, then send their "
+        "check-ins (and optionally check-outs) on a realistic arrival curve, either in-process through "
+        "Django's ASGI handler or against a running server (--url). Reports throughput, p50/p95/p99 "
+        "latency, DB queries per request (in-process only) and errors by error_code. The seeded data "
+        "lives in the configured database and is deleted afterwards; use a local or staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--tracks', type=int, default=50)
+        parser.add_argument('--branches', type=int, default=4)
+        parser.add_argument('--window-minutes', type=float, default=20,
+                            help="Real-world span of the arrivals (default 20).")
+        parser.add_argument('--speedup', type=float, default=1,
+                            help="Replay the window this many times faster than real time.")
+        parser.add_argument('--check-out', action='store_true',
+                            help="Replay check-outs on a second arrival curve after the check-ins.")
+        parser.add_argument('--endpoints', choices=sorted(ENDPOINT_PREFIXES), default='sync',
+                            help="DRF actions (sync) or the native async views.")
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000. "
+                                          "It must use the same database and SECRET_KEY.")
+        parser.add_argument('--max-concurrency', type=int, default=1000,
+                            help="Cap on requests in flight (and client threads with --url).")
+        parser.add_argument('--seed', type=int, help="Random seed for sessions and arrivals.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data.")
+
+    def handle(self, *args, **options):
+        fixture = BenchmarkFixture(options['students'], options['tracks'], options['branches'], seed=options['seed'])
+        fixture.create()
+        self.stdout.write(f"Seeded {len(fixture.students)} students over {len(fixture.tracks)} tracks "
+                          f"and {len(fixture.branches)} branches (run {fixture.run_id})")
+        try:
+            outcome = asyncio.run(self.replay(fixture, options))
+            self.report(outcome, options)
+        finally:
+            if not options['keep']:
+                fixture.destroy()
+
+    async def replay(self, fixture, options):
+        if options['url']:
+            executor = ThreadPoolExecutor(max_workers=options['max_concurrency'])
+
+            async def send(*args, **kwargs):
+                return await http_request(options['url'], *args, executor=executor, **kwargs)
+        else:
+            install_query_counter()
+            application = ASGIHandler()
+
+            async def send(*args, **kwargs):
+                return await asgi_request(application, *args, **kwargs)
+
+        prefix = ENDPOINT_PREFIXES[options['endpoints']]
+        rng = random.Random(options['seed'])
+        window = options['window_minutes'] * 60 / options['speedup']
+        students = list(fixture.students)
+        rng.shuffle(students)
+        arrivals = arrival_offsets(len(students), window, rng)
+        departures = arrival_offsets(len(students), window, rng) if options['check_out'] else [None] * len(students)
+        rng.shuffle(departures)
+
+        limit = asyncio.Semaphore(options['max_concurrency'])
+        samples = defaultdict(list)  # step -> [(latency, queries)]
+        errors = Counter()
+        started = time.perf_counter()
+
+        async def request(step, method, student):
+            async with limit:
+                status_code, data, elapsed, queries = await send(
+                    method, f"{prefix}{step}/",
+                    body=fixture.payload(student) if method == 'POST' else None,
+                    token=fixture.tokens[student.user_id],
+                )
+            samples[step].append((elapsed, queries))
+            if status_code != 200:
+                errors[(step, status_code, (data or {}).get('error_code') or (data or {}).get('error') or '-')] += 1
+            return status_code == 200
+
+        async def student_day(student, arrival, departure):
+            await asyncio.sleep(max(0, arrival - (time.perf_counter() - started)))
+            if not await request('check-in', 'POST', student):
+                return
+            await request('status', 'GET', student)
+            if departure is not None:
+                await asyncio.sleep(max(0, window + departure - (time.perf_counter() - started)))
+                await request('check-out', 'POST', student)
+
+        await asyncio.gather(*(
+            student_day(student, arrival, departure)
+            for student, arrival, departure in zip(students, arrivals, departures)
+        ))
+        if options['url']:
+            executor.shutdown()
+        return samples, errors, time.perf_counter() - started, window
+
+    def report(self, outcome, options):
+        samples, errors, wall_time, window = outcome
+        total = sum(len(step_samples) for step_samples in samples.values())
+        target = 'server ' + options['url'] if options['url'] else 'in-process ASGI'
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} requests ({options['endpoints']} endpoints, {target}) in {wall_time:.1f}s "
+            f"[arrival window {window:.1f}s]: {total / wall_time:.1f} req/s, {sum(errors.values())} errors"
+        ))
+        for step, step_samples in samples.items():
+            latencies = sorted(latency for latency, _ in step_samples)
+            line = (f"  {step:<10} n={len(latencies):<6} "
+                    f"p50={percentile(latencies, 0.50) * 1000:.0f}ms "
+                    f"p95={percentile(latencies, 0.95) * 1000:.0f}ms "
+                    f"p99={percentile(latencies, 0.99) * 1000:.0f}ms")
+            queries = sorted(count for _, count in step_samples if count is not None)
+            if queries:
+                line += (f"  queries/request avg={sum(queries) / len(queries):.1f} "
+                         f"p95={percentile(queries, 0.95)} max={queries[-1]}")
+            self.stdout.write(line)
+        if errors:
+            self.stdout.write(self.style.WARNING("Errors by step / HTTP status / error_code:"))
+            for (step, status_code, error_code), count in errors.most_common():
+                self.stdout.write(f"  {step:<10} {status_code} {error_code}: {count}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from attendance_management.ledger import rebuild_ledgers
+from attendance_management.models import Student
+
+
+class Command(BaseCommand):
+    help = "Recount the per-student attendance ledger from attendance records and day excuses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, action='append', help="Student ID (repeatable). Defaults to all students.")
+        parser.add_argument('--track', type=int, action='append', help="Track ID (repeatable); recounts its students.")
+
+    def handle(self, *args, **options):
+        student_ids = None
+        if options['student'] or options['track']:
+            student_ids = set(options['student'] or [])
+            if options['track']:
+                student_ids.update(Student.objects.filter(track_id__in=options['track']).values_list('id', flat=True))
+
+        counted = rebuild_ledgers(student_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {counted} student attendance ledgers"))
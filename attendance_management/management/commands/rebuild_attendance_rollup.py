@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from attendance_management.models import Schedule
+from attendance_management.rollups import rebuild_rollup
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date: {value}. Use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Recount the daily track attendance rollup from attendance records for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help="First day (YYYY-MM-DD). Defaults to the earliest schedule.")
+        parser.add_argument('--end-date', help="Last day (YYYY-MM-DD). Defaults to the latest schedule.")
+        parser.add_argument('--track', type=int, action='append', help="Track ID (repeatable). Defaults to all tracks.")
+
+    def handle(self, *args, **options):
+        bounds = Schedule.objects.filter(track__isnull=False).aggregate(first=Min('created_at'), last=Max('created_at'))
+        start_date = _parse_date(options['start_date']) if options['start_date'] else bounds['first']
+        end_date = _parse_date(options['end_date']) if options['end_date'] else bounds['last']
+        if start_date is None or end_date is None:
+            self.stdout.write("No schedules to roll up.")
+            return
+        if start_date > end_date:
+            raise CommandError("--start-date must not be after --end-date.")
+
+        counted, removed = rebuild_rollup(start_date, end_date, track_ids=options['track'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counted} daily track rows from {start_date} to {end_date} ({removed} orphaned rows removed)"
+        ))
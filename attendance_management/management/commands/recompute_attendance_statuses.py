@@ -0,0 +1,40 @@
+from collections import Counter
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_management.status_engine import recompute_statuses
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date: {value}. Use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Re-derive attendance record statuses from check-in/out times, sessions and approved permissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', type=int, action='append', help="Schedule ID (repeatable).")
+        parser.add_argument('--track', type=int, help="Track ID.")
+        parser.add_argument('--start-date', help="First schedule day (YYYY-MM-DD).")
+        parser.add_argument('--end-date', help="Last schedule day (YYYY-MM-DD).")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing.")
+
+    def handle(self, *args, **options):
+        if not any([options['schedule'], options['track'], options['start_date'], options['end_date']]):
+            raise CommandError("Give at least one of --schedule, --track, --start-date or --end-date.")
+
+        changed = recompute_statuses(
+            schedule_ids=options['schedule'],
+            track_id=options['track'],
+            start_date=_parse_date(options['start_date']) if options['start_date'] else None,
+            end_date=_parse_date(options['end_date']) if options['end_date'] else None,
+            dry_run=options['dry_run'],
+        )
+        for status, count in sorted(Counter(record.status for record in changed).items()):
+            self.stdout.write(f"  -> {status}: {count}")
+        verb = "Would update" if options['dry_run'] else "Updated"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(changed)} attendance records"))
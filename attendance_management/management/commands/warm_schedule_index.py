@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from attendance_management.schedule_index import build_schedule_index
+
+
+class Command(BaseCommand):
+    help = "Build the day-scoped schedule index (run from cron shortly after midnight)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to build the index for (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument('--days', type=int, default=1, help="Number of consecutive days to build, starting at --date.")
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                start = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}. Use YYYY-MM-DD.")
+        else:
+            start = timezone.localdate()
+
+        for offset in range(max(options['days'], 1)):
+            day = start + timedelta(days=offset)
+            entries = build_schedule_index(day)
+            self.stdout.write(self.style.SUCCESS(f"Indexed {len(entries)} track schedules for {day}"))
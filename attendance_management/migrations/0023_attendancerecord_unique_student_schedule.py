@@ -0,0 +1,117 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:13
+
+import logging
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+logger = logging.getLogger(__name__)
+
+# The status rules of attendance_management.status_engine as of this migration, copied so the
+# migration keeps working however the engine changes later
+LATE_CHECK_IN_GRACE = timedelta(minutes=15)
+CHECKED_IN_STATUSES = ('check-in', 'late-check-in', 'late-excused')
+NO_CHECK_OUT_STATUSES = {'no-check-out', 'late-check-in_no-check-out'}
+ABSENCE_STATUSES = {'absent', 'excused'}
+
+
+def _first_approved(permissions, request_type=None):
+    return next((p for p in permissions if request_type is None or p.request_type == request_type), None)
+
+
+def _check_in_status(at, first_session_start, permissions):
+    is_late = at > first_session_start + LATE_CHECK_IN_GRACE
+    permission = _first_approved(permissions)
+    request_type = permission.request_type if permission is not None else None
+    if request_type == 'late_check_in':
+        within = permission.adjusted_time is not None and at <= permission.adjusted_time
+        return 'late-excused' if within else 'late-check-in'
+    if request_type == 'day_excuse':
+        return 'excused'
+    return 'late-check-in' if is_late else 'check-in'
+
+
+def _check_out_status(at, last_session_end, current_status, permissions):
+    is_early = at < last_session_end
+    early_leave = _first_approved(permissions, 'early_leave') is not None
+    if current_status not in CHECKED_IN_STATUSES:
+        return 'check-in_early-check-out' if is_early and not early_leave else 'attended'
+    if not is_early:
+        return 'attended' if current_status == 'check-in' else current_status
+    return f"{current_status}_early-excused" if early_leave else f"{current_status}_early-check-out"
+
+
+def _derive_status(record, first_session_start, last_session_end, permissions):
+    if record.check_in_time is None:
+        if record.status not in ABSENCE_STATUSES:
+            return record.status
+        return 'excused' if _first_approved(permissions, 'day_excuse') else 'absent'
+    if first_session_start is None:
+        return 'no_sessions'
+    status = _check_in_status(record.check_in_time, first_session_start, permissions)
+    if record.check_out_time is not None:
+        return _check_out_status(record.check_out_time, last_session_end, status, permissions)
+    if record.status in NO_CHECK_OUT_STATUSES:
+        return 'late-check-in_no-check-out' if status == 'late-check-in' else 'no-check-out'
+    return status
+
+
+def remove_duplicate_attendance_records(apps, schema_editor):
+    """
+    Concurrent first check-ins could create two records for the same student and
+    schedule. Merge them into the one that recorded a check-in (earliest id on
+    ties): earliest check-in, latest check-out, and the status re-derived from
+    the merged times. The other rows are deleted.
+    """
+    AttendanceRecord = apps.get_model('attendance_management', 'AttendanceRecord')
+    PermissionRequest = apps.get_model('attendance_management', 'PermissionRequest')
+    Schedule = apps.get_model('attendance_management', 'Schedule')
+    duplicates = (
+        AttendanceRecord.objects
+        .values('student_id', 'schedule_id')
+        .annotate(record_count=Count('id'))
+        .filter(record_count__gt=1)
+    )
+    for duplicate in duplicates:
+        records = list(
+            AttendanceRecord.objects
+            .filter(student_id=duplicate['student_id'], schedule_id=duplicate['schedule_id'])
+            .order_by('id')
+        )
+        keep = next((record for record in records if record.check_in_time), records[0])
+        check_in_times = [record.check_in_time for record in records if record.check_in_time]
+        check_out_times = [record.check_out_time for record in records if record.check_out_time]
+        keep.check_in_time = min(check_in_times, default=None)
+        keep.check_out_time = max(check_out_times, default=None)
+
+        bounds = Schedule.objects.filter(id=duplicate['schedule_id']).aggregate(
+            first_session_start=Min('sessions__start_time'), last_session_end=Max('sessions__end_time')
+        )
+        permissions = PermissionRequest.objects.filter(
+            student_id=duplicate['student_id'], schedule_id=duplicate['schedule_id'], status='approved'
+        ).order_by('id')
+        keep.status = _derive_status(keep, bounds['first_session_start'], bounds['last_session_end'], list(permissions))
+        keep.save(update_fields=['check_in_time', 'check_out_time', 'status'])
+
+        removed = [record.id for record in records if record.id != keep.id]
+        AttendanceRecord.objects.filter(id__in=removed).delete()
+        logger.warning(
+            f"Merged duplicate attendance records {removed} into {keep.id} "
+            f"(student {duplicate['student_id']}, schedule {duplicate['schedule_id']})"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_management', '0022_event_attended_guests_event_attended_students_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance_records, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendancerecord',
+            constraint=models.UniqueConstraint(fields=('student', 'schedule'), name='unique_attendance_record_per_schedule'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_stale_rollup_rows(apps, schema_editor):
+    """
+    One stale row per existing track schedule; they are counted on first read
+    (or up front with `manage.py rebuild_attendance_rollup`).
+    """
+    Schedule = apps.get_model('attendance_management', 'Schedule')
+    DailyTrackAttendance = apps.get_model('attendance_management', 'DailyTrackAttendance')
+    track_days = Schedule.objects.filter(track__isnull=False).values_list('track_id', 'created_at').distinct()
+    DailyTrackAttendance.objects.bulk_create(
+        (DailyTrackAttendance(track_id=track_id, date=day, is_stale=True) for track_id, day in track_days.iterator()),
+        batch_size=1000, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_management', '0023_attendancerecord_unique_student_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTrackAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('expected_count', models.PositiveIntegerField(default=0)),
+                ('checked_in_count', models.PositiveIntegerField(default=0)),
+                ('late_count', models.PositiveIntegerField(default=0)),
+                ('excused_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('is_stale', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attendance', to='attendance_management.track')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='attendance__date_7ffaee_idx')],
+                'constraints': [models.UniqueConstraint(fields=('track', 'date'), name='unique_daily_track_attendance')],
+            },
+        ),
+        migrations.RunPython(create_stale_rollup_rows, migrations.RunPython.noop),
+    ]
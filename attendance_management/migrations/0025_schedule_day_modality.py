@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:44
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_day_modality(apps, schema_editor):
+    """
+    Count the sessions of every existing schedule with one grouped query and
+    store the counts and resulting modality.
+    """
+    Schedule = apps.get_model('attendance_management', 'Schedule')
+    Session = apps.get_model('attendance_management', 'Session')
+    counts = defaultdict(lambda: {'online': 0, 'offline': 0})
+    grouped = Session.objects.values_list('schedule_id', 'session_type').annotate(count=models.Count('id')).order_by()
+    for schedule_id, session_type, count in grouped.iterator():
+        if session_type in ('online', 'offline'):
+            counts[schedule_id][session_type] = count
+
+    schedules = []
+    for schedule_id, day in counts.items():
+        if day['online'] and day['offline']:
+            modality = 'mixed'
+        elif day['offline']:
+            modality = 'offline'
+        else:
+            modality = 'online'
+        schedules.append(Schedule(
+            id=schedule_id, online_session_count=day['online'],
+            offline_session_count=day['offline'], day_modality=modality,
+        ))
+    Schedule.objects.bulk_update(
+        schedules, ['online_session_count', 'offline_session_count', 'day_modality'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_management', '0024_dailytrackattendance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='day_modality',
+            field=models.CharField(choices=[('online', 'Online'), ('offline', 'Offline'), ('mixed', 'Mixed')], default='online', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='offline_session_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='online_session_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_day_modality, migrations.RunPython.noop),
+    ]
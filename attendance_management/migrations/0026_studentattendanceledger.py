@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_management', '0025_schedule_day_modality'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAttendanceLedger',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='attendance_ledger', serialize=False, to='attendance_management.student')),
+                ('as_of', models.DateField(blank=True, null=True)),
+                ('total_days', models.PositiveIntegerField(default=0)),
+                ('attended_days', models.PositiveIntegerField(default=0)),
+                ('late_days', models.PositiveIntegerField(default=0)),
+                ('excused_absences', models.PositiveIntegerField(default=0)),
+                ('unexcused_absences', models.PositiveIntegerField(default=0)),
+                ('is_stale', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+"""
+Stored online/offline classification of schedule days.
+
+Each Schedule keeps how many of its sessions are online and offline, and the
+resulting day modality, so reports can group and count days in the database
+instead of asking every schedule about its sessions. The columns are
+recomputed from the sessions table with a single UPDATE whenever sessions are
+saved or deleted (signals, plus the bulk_create paths that bypass them).
+"""
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Schedule, Session
+
+
+def _sessions(session_type):
+    return Session.objects.filter(schedule=OuterRef('pk'), session_type=session_type)
+
+
+def _session_count(session_type):
+    return Coalesce(
+        Subquery(
+            _sessions(session_type).order_by().values('schedule').annotate(count=Count('id')).values('count'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def refresh_schedule_modality(schedule_ids):
+    """Recompute the session counts and day modality of the given schedules in one query."""
+    schedule_ids = {schedule_id for schedule_id in schedule_ids if schedule_id is not None}
+    if not schedule_ids:
+        return 0
+    online, offline = Exists(_sessions('online')), Exists(_sessions('offline'))
+    return Schedule.objects.filter(pk__in=schedule_ids).update(
+        online_session_count=_session_count('online'),
+        offline_session_count=_session_count('offline'),
+        day_modality=Case(
+            When(online & offline, then=Value(Schedule.MODALITY_MIXED)),
+            When(offline, then=Value(Schedule.MODALITY_OFFLINE)),
+            default=Value(Schedule.MODALITY_ONLINE),
+        ),
+    )
+
@@ -99,6 +99,14 @@ class Event(models.Model):
         return self.schedule.custom_branch if hasattr(self, 'schedule') else None
 
 class Schedule(models.Model):
+    MODALITY_ONLINE = 'online'
+    MODALITY_OFFLINE = 'offline'
+    MODALITY_MIXED = 'mixed'
+    MODALITY_CHOICES = [
+        (MODALITY_ONLINE, 'Online'),
+        (MODALITY_OFFLINE, 'Offline'),
+        (MODALITY_MIXED, 'Mixed'),
+    ]
     # ForeignKey from Session - related_name: sessions
     # ForeignKey from AttendanceRecord - related_name: attendance_records
     # ForeignKey from PermissionRequest - related_name: permission_requests
@@ -121,6 +129,10 @@ class Schedule(models.Model):
         null=True,
         blank=True
     )
+    # Derived from the schedule's sessions and kept current by attendance_management.modality
+    online_session_count = models.PositiveIntegerField(default=0, editable=False)
+    offline_session_count = models.PositiveIntegerField(default=0, editable=False)
+    day_modality = models.CharField(max_length=10, choices=MODALITY_CHOICES, default=MODALITY_ONLINE, editable=False)
 
     class Meta:
         unique_together = ('track', 'created_at')  # Define composite primary key
@@ -176,59 +188,34 @@ class Student(models.Model):  # Renamed from StudentInfo
         Count the number of unexcused absences for this student.
         An unexcused absence is defined as an attendance record with no check-in time
         and no approved permission request.
+        Read from the student's attendance ledger.
         """
-        from .models import PermissionRequest  # Import here to avoid circular import
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        # Only include records for schedules before today
-        no_checkin_records = self.attendance_records.filter(
-            check_in_time__isnull=True,
-            schedule__created_at__lt=today
-        )
-        # Get all approved day excuse permission requests
-        approved_excuses = PermissionRequest.objects.filter(
-            student=self,
-            request_type='day_excuse',
-            status='approved'
-        ).values_list('schedule_id', flat=True)
-        
-        return no_checkin_records.exclude(schedule_id__in=approved_excuses).count()
+        from .ledger import student_ledger  # Import here to avoid circular import
+        return student_ledger(self.pk).unexcused_absences
     
     def get_excused_absence_count(self):
         """
         Count the number of excused absences for this student.
         An excused absence is defined as an attendance record with no check-in time
         and an approved day_excuse permission request.
+        Read from the student's attendance ledger.
         """
-        from .models import PermissionRequest  # Import here to avoid circular import
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        # Only include records for schedules before today
-        no_checkin_records = self.attendance_records.filter(
-            check_in_time__isnull=True,
-            schedule__created_at__lt=today
-        )
-        approved_excuses = PermissionRequest.objects.filter(
-            student=self,
-            request_type='day_excuse',
-            status='approved'
-        ).values_list('schedule_id', flat=True)
-        
-        return no_checkin_records.filter(schedule_id__in=approved_excuses).count()
+        from .ledger import student_ledger  # Import here to avoid circular import
+        return student_ledger(self.pk).excused_absences
     
     def has_exceeded_warning_threshold(self):
         """
         Check if the student has exceeded either the excused or unexcused absence threshold.
         Returns a tuple of (has_warning, warning_type) where warning_type is either 'excused' or 'unexcused'.
         """
+        from .ledger import student_ledger  # Import here to avoid circular import
         program_type = self.track.program_type
         unexcused_threshold = ApplicationSetting.get_unexcused_absence_threshold(program_type)
         excused_threshold = ApplicationSetting.get_excused_absence_threshold(program_type)
         
-        unexcused_count = self.get_unexcused_absence_count()
-        excused_count = self.get_excused_absence_count()
+        ledger = student_ledger(self.pk)
+        unexcused_count = ledger.unexcused_absences
+        excused_count = ledger.excused_absences
         
         if unexcused_count >= unexcused_threshold:
             return True, 'unexcused'
@@ -275,10 +262,58 @@ class AttendanceRecord(models.Model):
             models.Index(fields=['schedule']),
             models.Index(fields=['status']),  # Add index for the new status field
         ]
+        constraints = [
+            # One record per student per schedule; lets check-in use get_or_create safely
+            models.UniqueConstraint(fields=['student', 'schedule'], name='unique_attendance_record_per_schedule'),
+        ]
 
     def _str_(self):
         return f"AttendanceRecord(Student: {self.student}, Schedule: {self.schedule})"
 
+class DailyTrackAttendance(models.Model):
+    # Rollup of a track's AttendanceRecords for one day, maintained by attendance_management.rollups
+    track = models.ForeignKey(
+        Track,  # <-- ForeignKey to Track (attendance_management.models)
+        on_delete=models.CASCADE, related_name='daily_attendance'
+    )  # Each row summarises one track
+    date = models.DateField()
+    expected_count = models.PositiveIntegerField(default=0)  # Attendance records for the day's schedule
+    checked_in_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)  # Late check-ins without an approved excuse
+    excused_count = models.PositiveIntegerField(default=0)  # Day excuses
+    absent_count = models.PositiveIntegerField(default=0)  # No check-in and not excused
+    is_stale = models.BooleanField(default=True)  # Set when the day's records change; recounted on read
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['track', 'date'], name='unique_daily_track_attendance'),
+        ]
+
+    def __str__(self):
+        return f"{self.track} - {self.date}: {self.checked_in_count}/{self.expected_count}"
+
+class StudentAttendanceLedger(models.Model):
+    # Running totals of a student's AttendanceRecords, maintained by attendance_management.ledger
+    student = models.OneToOneField(
+        Student,  # <-- OneToOne to Student (attendance_management.models)
+        on_delete=models.CASCADE, primary_key=True, related_name='attendance_ledger'
+    )  # Each student has one ledger
+    as_of = models.DateField(blank=True, null=True)  # The day the counts were taken for
+    total_days = models.PositiveIntegerField(default=0)  # Days up to as_of that had sessions
+    attended_days = models.PositiveIntegerField(default=0)  # Of total_days, checked in or marked attended
+    late_days = models.PositiveIntegerField(default=0)  # Of total_days, late check-ins
+    excused_absences = models.PositiveIntegerField(default=0)  # Days before as_of without check-in, excused
+    unexcused_absences = models.PositiveIntegerField(default=0)  # Days before as_of without check-in or excuse
+    is_stale = models.BooleanField(default=True)  # Set when the student's records change; recounted on read
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student_id} ({self.as_of}): {self.attended_days}/{self.total_days}"
+
 class PermissionRequest(models.Model):
     # ForeignKey from nothing (leaf model)
     REQUEST_TYPES = [
@@ -0,0 +1,154 @@
+"""
+Role-scoped response cache with ETags for polled dashboard endpoints.
+
+A cached response is keyed by the endpoint, the caller's role scope (their
+groups and every track they can see) and the query parameters, plus today's
+date for endpoints that report on "today". Each track has a version token in
+the cache, and a global token covers the settings used by the reports. The
+ETag is a hash of the key and the current versions of the scope's tracks, so
+any attendance, permission, session, schedule or enrollment write to one of
+those tracks gives the dashboard a new ETag and leaves the old entry unused.
+
+Responses carry the ETag. When a browser revalidates with a matching
+If-None-Match, the view is skipped and a bodiless 304 is returned. Otherwise a
+stored response for the ETag is replayed, or the view runs and its 200
+response is stored for ATTENDANCE_RESPONSE_CACHE_TTL seconds.
+
+Version tokens are bumped by signals and by the bulk write paths that bypass
+them (batch check-in, the write-behind flusher, day tickets and status
+recomputes).
+"""
+import functools
+import hashlib
+import json
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import AttendanceRecord, Schedule
+from .schedule_index import indexed_track_days
+from .scope import get_user_scope
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_VERSION = 'global'
+
+
+def _cache():
+    return caches[getattr(settings, 'ATTENDANCE_RESPONSE_CACHE', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'ATTENDANCE_RESPONSE_CACHE_TTL', 300)
+
+
+def _version_key(scope):
+    return f"response_cache:version:{scope}"
+
+
+def _versions(scopes):
+    cache = _cache()
+    keys = [_version_key(scope) for scope in scopes]
+    stored = cache.get_many(keys)
+    missing = [key for key in keys if key not in stored]
+    if missing:
+        # Random tokens, so a cleared cache can never bring back an old ETag
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        stored.update(cache.get_many(missing))
+    return [stored.get(key, '') for key in keys]
+
+
+def _etag(endpoint, request):
+    scope = get_user_scope(request)
+    track_ids = sorted(scope.track_ids)
+    key = json.dumps([
+        endpoint, sorted(scope.groups), track_ids,
+        sorted(request.query_params.lists()), timezone.localdate().isoformat(),
+    ])
+    versions = _versions([GLOBAL_VERSION] + [f"track:{track_id}" for track_id in track_ids])
+    digest = hashlib.sha256(key.encode())
+    digest.update(':'.join(versions).encode())
+    return f'"{digest.hexdigest()[:40]}"'
+
+
+def _matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+
+def _tagged(response, etag):
+    response['ETag'] = etag
+    # Browsers keep the body but must revalidate before using it
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_response(endpoint):
+    """Decorator for read-only ViewSet actions whose output only depends on the caller's tracks."""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            try:
+                etag = _etag(endpoint, request)
+            except Exception as e:
+                logger.error(f"Response cache unavailable for {endpoint}: {str(e)}")
+                return view_method(self, request, *args, **kwargs)
+
+            if _matches(request, etag):
+                return _tagged(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+            cache = _cache()
+            entry_key = f"response_cache:entry:{etag}"
+            stored = cache.get(entry_key)
+            if stored is not None:
+                return _tagged(Response(stored), etag)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(entry_key, response.data, _ttl())
+                _tagged(response, etag)
+            return response
+        return wrapper
+    return decorator
+
+
+# -- invalidation --------------------------------------------------------------
+
+def bump_tracks(track_ids):
+    """Give every cached response covering these tracks a new ETag."""
+    track_ids = {track_id for track_id in track_ids if track_id is not None}
+    if track_ids:
+        _cache().set_many({_version_key(f"track:{track_id}"): uuid.uuid4().hex for track_id in track_ids}, None)
+
+
+def bump_all():
+    """Retire every cached response, e.g. when report settings change."""
+    _cache().set(_version_key(GLOBAL_VERSION), uuid.uuid4().hex, None)
+
+
+def bump_schedules(schedule_ids):
+    """bump_tracks for the given schedules' tracks, resolving today's from the schedule index without a query."""
+    track_ids, unresolved = set(), []
+    for schedule_id in set(schedule_ids):
+        if schedule_id is None:
+            continue
+        indexed = indexed_track_days(schedule_id)
+        track_ids.update(track_id for track_id, _ in indexed)
+        if not indexed:
+            unresolved.append(schedule_id)
+    if unresolved:
+        track_ids.update(Schedule.objects.filter(pk__in=unresolved).values_list('track_id', flat=True))
+    bump_tracks(track_ids)
+
+
+def bump_records(record_ids):
+    """bump_tracks for the tracks of the given AttendanceRecords."""
+    record_ids = list(set(record_ids))
+    if record_ids:
+        bump_tracks(AttendanceRecord.objects.filter(pk__in=record_ids).values_list('schedule__track_id', flat=True))
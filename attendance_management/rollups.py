@@ -0,0 +1,184 @@
+"""
+Daily attendance rollup.
+
+DailyTrackAttendance holds one row per (track, date) with the day's expected,
+checked-in, late, excused and absent counts, so dashboards read a row per day
+shown instead of recounting AttendanceRecords.
+
+Rows are maintained incrementally. Every write path that touches attendance
+records - record saves and deletes (signals), batch ingestion, the
+write-behind flusher, day-ticket check-ins and status recomputes - marks the
+affected rows stale with a single UPDATE; the per-check-in paths hand their
+marks to `stale_marks`, which writes them off the request. Readers go through `daily_rollup`,
+which recounts only the stale rows among those requested (one aggregate query
+over those days' records) before returning them; a recount stamps the row's
+updated_at so in-process copies can pick up what changed. Schedule saves and
+deletes create and remove rows; `manage.py rebuild_attendance_rollup` recounts
+any date range from scratch.
+"""
+import logging
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, Count, Exists, F, OuterRef, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import AttendanceRecord, DailyTrackAttendance, Schedule
+from .stale_marks import flush_stale_marks
+
+logger = logging.getLogger(__name__)
+
+COUNT_FIELDS = ('expected_count', 'checked_in_count', 'late_count', 'excused_count', 'absent_count')
+WRITE_CHUNK_SIZE = 500
+
+EXCUSED_STATUSES = ('excused', 'excused_late')
+LATE = Q(check_in_time__isnull=False) & (Q(status__startswith='late-check-in') | Q(status='late'))
+EXCUSED = Q(status__in=EXCUSED_STATUSES)
+ABSENT = Q(check_in_time__isnull=True) & ~Q(status__in=EXCUSED_STATUSES)
+
+
+def _track_days_filter(track_days, track_field='track_id', date_field='date'):
+    return reduce(or_, (Q(**{track_field: track_id, date_field: day}) for track_id, day in track_days))
+
+
+# -- marking -----------------------------------------------------------------
+
+def mark_schedules_stale(schedule_ids):
+    """Mark the rows of the given schedules' track-days stale."""
+    schedule_ids = [schedule_id for schedule_id in set(schedule_ids) if schedule_id is not None]
+    if not schedule_ids:
+        return 0
+    return DailyTrackAttendance.objects.filter(
+        Exists(Schedule.objects.filter(pk__in=schedule_ids, track_id=OuterRef('track_id'), created_at=OuterRef('date'))),
+        is_stale=False,
+    ).update(is_stale=True)
+
+
+def mark_records_stale(record_ids):
+    """Mark the rows of the given AttendanceRecords' track-days stale."""
+    record_ids = list(set(record_ids))
+    if not record_ids:
+        return 0
+    return DailyTrackAttendance.objects.filter(
+        Exists(AttendanceRecord.objects.filter(
+            pk__in=record_ids, schedule__track_id=OuterRef('track_id'), schedule__created_at=OuterRef('date')
+        )),
+        is_stale=False,
+    ).update(is_stale=True)
+
+
+def mark_track_days_stale(track_days):
+    """Create (or mark stale) the rows for [(track_id, date), ...], e.g. when a schedule is saved."""
+    track_days = {(track_id, day) for track_id, day in track_days if track_id is not None}
+    if not track_days:
+        return
+    DailyTrackAttendance.objects.bulk_create(
+        [DailyTrackAttendance(track_id=track_id, date=day, is_stale=True) for track_id, day in track_days],
+        ignore_conflicts=True,
+    )
+    DailyTrackAttendance.objects.filter(_track_days_filter(track_days), is_stale=False).update(is_stale=True)
+
+
+def drop_track_days(track_days):
+    """Remove the rows for [(track_id, date), ...] that no longer have a schedule."""
+    track_days = {(track_id, day) for track_id, day in track_days if track_id is not None}
+    if not track_days:
+        return 0
+    deleted, _ = DailyTrackAttendance.objects.filter(_track_days_filter(track_days)).exclude(
+        Exists(Schedule.objects.filter(track_id=OuterRef('track_id'), created_at=OuterRef('date')))
+    ).delete()
+    return deleted
+
+
+# -- counting ----------------------------------------------------------------
+
+def _count(rows):
+    """Recount `rows` in place from their AttendanceRecords and save them."""
+    if not rows:
+        return
+    # Clear the flag before counting so changes made while we count mark the row stale again
+    DailyTrackAttendance.objects.filter(pk__in=[row.pk for row in rows]).update(is_stale=False)
+    counts = {
+        (item['schedule__track_id'], item['schedule__created_at']): item
+        for item in AttendanceRecord.objects
+        .filter(_track_days_filter([(row.track_id, row.date) for row in rows], 'schedule__track_id', 'schedule__created_at'))
+        .values('schedule__track_id', 'schedule__created_at')
+        .annotate(
+            expected_count=Count('id'),
+            checked_in_count=Count('id', filter=Q(check_in_time__isnull=False)),
+            late_count=Count('id', filter=LATE),
+            excused_count=Count('id', filter=EXCUSED),
+            absent_count=Count('id', filter=ABSENT),
+        )
+        .order_by()
+    }
+    updated_at = timezone.now()
+    for row in rows:
+        item = counts.get((row.track_id, row.date), {})
+        for field in COUNT_FIELDS:
+            setattr(row, field, item.get(field, 0))
+        row.is_stale = False
+        row.updated_at = updated_at
+    # One UPDATE per chunk; bulk_update would split it further on SQLite's parameter limit
+    for i in range(0, len(rows), WRITE_CHUNK_SIZE):
+        chunk = rows[i:i + WRITE_CHUNK_SIZE]
+        DailyTrackAttendance.objects.filter(pk__in=[row.pk for row in chunk]).update(updated_at=updated_at, **{
+            field: Case(*[When(pk=row.pk, then=Value(getattr(row, field))) for row in chunk],
+                        default=F(field), output_field=PositiveIntegerField())
+            for field in COUNT_FIELDS
+        })
+
+
+def count_stale(rows):
+    """Recount the stale rows among the DailyTrackAttendance `rows` in place and return `rows`."""
+    stale = [row for row in rows if row.is_stale]
+    if stale:
+        _count(stale)
+    return rows
+
+
+def daily_rollup(track_ids, start_date, end_date=None):
+    """
+    Return the fresh DailyTrackAttendance rows (with their track) for `track_ids`
+    between `start_date` and `end_date` inclusive, ordered by date.
+    """
+    end_date = end_date or start_date
+    flush_stale_marks()
+    rows = list(
+        DailyTrackAttendance.objects
+        .filter(track_id__in=track_ids, date__gte=start_date, date__lte=end_date)
+        .select_related('track')
+        .order_by('date', 'track_id')
+    )
+    return count_stale(rows)
+
+
+def rebuild_rollup(start_date, end_date, track_ids=None, batch_size=WRITE_CHUNK_SIZE):
+    """
+    Recreate and recount every row between `start_date` and `end_date` from the
+    schedules and records. Returns (rows counted, rows removed).
+    """
+    schedules = Schedule.objects.filter(track__isnull=False, created_at__gte=start_date, created_at__lte=end_date)
+    rows = DailyTrackAttendance.objects.filter(date__gte=start_date, date__lte=end_date)
+    if track_ids is not None:
+        schedules = schedules.filter(track_id__in=track_ids)
+        rows = rows.filter(track_id__in=track_ids)
+
+    track_days = set(schedules.values_list('track_id', 'created_at'))
+    DailyTrackAttendance.objects.bulk_create(
+        [DailyTrackAttendance(track_id=track_id, date=day) for track_id, day in track_days],
+        batch_size=batch_size, ignore_conflicts=True,
+    )
+    removed, _ = rows.exclude(
+        Exists(Schedule.objects.filter(track_id=OuterRef('track_id'), created_at=OuterRef('date')))
+    ).delete()
+
+    counted = 0
+    pks = list(rows.order_by('date', 'track_id').values_list('pk', flat=True))
+    for i in range(0, len(pks), batch_size):
+        batch = list(DailyTrackAttendance.objects.filter(pk__in=pks[i:i + batch_size]))
+        _count(batch)
+        counted += len(batch)
+    logger.info(f"Rebuilt attendance rollup from {start_date} to {end_date}: {counted} rows counted, {removed} removed")
+    return counted, removed
+
@@ -0,0 +1,175 @@
+"""
+Read-only row builders for high-volume list endpoints.
+
+The ModelSerializers in attendance_management.serializers build every row from
+a model instance, running DRF's field machinery once per field per row. The
+functions here build the same rows as plain dicts from `.values()` querysets,
+with a fixed number of queries per list, and format dates and times with the
+same DRF fields, so the rendered JSON is byte for byte what the serializer
+they stand in for renders. Each function names that serializer; a change to
+one has to be made to the other (tests/test_row_serializers.py compares
+them, and `manage.py benchmark_row_serializers` times them).
+"""
+from rest_framework import serializers
+
+from .absence_warnings import warning_statuses
+from .models import PermissionRequest, Schedule, Session, Track
+from .serializers import schedule_annotations
+
+_DATETIME = serializers.DateTimeField()
+_DATE = serializers.DateField()
+
+
+def _datetime(value):
+    return None if value is None else _DATETIME.to_representation(value)
+
+
+def _date(value):
+    return None if value is None else _DATE.to_representation(value)
+
+
+def _permission_requests(records):
+    """
+    {(student_id, schedule_id): (first request, first approved request)} for
+    the students and schedules of `records`, in id order, like
+    AttendanceRecordSerializer.get_leave_request_status and get_adjusted_time.
+    """
+    found = {}
+    for request in PermissionRequest.objects.filter(
+        schedule_id__in=records.values('schedule_id'), student_id__in=records.values('student_id')
+    ).order_by('id').values('student_id', 'schedule_id', 'status', 'adjusted_time'):
+        key = (request['student_id'], request['schedule_id'])
+        first, approved = found.get(key, (None, None))
+        if approved is None and request['status'] == 'approved':
+            approved = request
+        found[key] = (first or request, approved)
+    return found
+
+
+def _adjusted_time(row, requests):
+    """get_adjusted_time: the approved request's adjusted time, else the check-in time."""
+    _, approved = requests.get((row['student_id'], row['schedule_id']), (None, None))
+    return approved['adjusted_time'] if approved is not None else row['check_in_time']
+
+
+def _schedules(schedule_ids):
+    """{schedule_id: ScheduleSerializer(schedule).data} for a list view of the schedules."""
+    sessions = {}
+    for schedule_id, title in Session.objects.filter(schedule_id__in=schedule_ids).values_list('schedule_id', 'title'):
+        sessions.setdefault(schedule_id, []).append(str(title))
+    return {
+        schedule['id']: {
+            'id': schedule['id'],
+            'name': schedule['name'],
+            'track': {'id': schedule['track_id'], 'name': schedule['track__name']} if schedule['track_id'] else None,
+            'created_at': _date(schedule['created_at']),
+            'sessions': sessions.get(schedule['id'], []),
+            'custom_branch': schedule['custom_branch_id'],
+            'is_shared': schedule['is_shared'],
+            'start_time': schedule['first_session_start'],
+            'end_time': schedule['last_session_end'],
+            'attended_out_of_total': {
+                'attended': schedule['attended_count'],
+                'total': schedule['record_count'],
+            },
+        }
+        for schedule in Schedule.objects.filter(id__in=schedule_ids).annotate(**schedule_annotations()).values(
+            'id', 'name', 'track_id', 'track__name', 'created_at', 'custom_branch_id', 'is_shared',
+            'first_session_start', 'last_session_end', 'record_count', 'attended_count',
+        )
+    }
+
+
+def attendance_record_rows(records):
+    """AttendanceRecordSerializer(records, many=True).data for an AttendanceRecord queryset."""
+    rows = list(records.values(
+        'id', 'student_id', 'schedule_id', 'check_in_time', 'check_out_time', 'status',
+        'student__user__first_name', 'student__user__last_name', 'student__track__name',
+    ))
+    requests = _permission_requests(records)
+    statuses = warning_statuses(row['student_id'] for row in rows)
+    result = []
+    for row in rows:
+        first, _ = requests.get((row['student_id'], row['schedule_id']), (None, None))
+        result.append({
+            'id': row['id'],
+            'student': {
+                'first_name': row['student__user__first_name'],
+                'last_name': row['student__user__last_name'],
+            },
+            'schedule': row['schedule_id'],
+            'check_in_time': _datetime(row['check_in_time']),
+            'check_out_time': _datetime(row['check_out_time']),
+            'leave_request_status': first['status'] if first is not None else None,
+            'status': row['status'],
+            'adjusted_time': _adjusted_time(row, requests),
+            'track_name': row['student__track__name'],
+            'warning_status': statuses.get(row['student_id']),
+        })
+    return result
+
+
+def student_record_rows(records):
+    """
+    AttendanceRecordSerializerForStudents(records, many=True).data for an
+    AttendanceRecord queryset, or EventAttendanceRecordSerializerForStudents
+    for an EventAttendanceRecord one.
+    """
+    rows = list(records.values('id', 'student_id', 'schedule_id', 'check_in_time', 'check_out_time', 'status'))
+    requests = _permission_requests(records)
+    schedules = _schedules(records.values('schedule_id'))
+    return [
+        {
+            'id': row['id'],
+            'schedule': schedules[row['schedule_id']],
+            'check_in_time': _datetime(row['check_in_time']),
+            'check_out_time': _datetime(row['check_out_time']),
+            'status': row['status'],
+            'adjusted_time': _adjusted_time(row, requests),
+        }
+        for row in rows
+    ]
+
+
+def event_rows(events):
+    """EventSerializer(events, many=True).data for an Event queryset."""
+    rows = list(events.values(
+        'id', 'description', 'audience_type', 'is_mandatory', 'created_at', 'updated_at',
+        'schedule__id', 'schedule__name', 'schedule__custom_branch_id', 'schedule__custom_branch__name',
+        'schedule__created_at',
+    ))
+    event_ids = [row['id'] for row in rows]
+    target_tracks = {}
+    for event_id, track_id, name in Track.objects.filter(events__in=event_ids).values_list('events', 'id', 'name'):
+        target_tracks.setdefault(event_id, []).append({'id': track_id, 'name': name})
+    sessions = {}
+    for session in Session.objects.filter(schedule__event__in=event_ids).values(
+        'id', 'title', 'instructor', 'start_time', 'end_time', 'session_type', 'room', 'schedule_id'
+    ):
+        sessions.setdefault(session['schedule_id'], []).append({
+            'id': session['id'],
+            'title': session['title'],
+            'speaker': session['instructor'],
+            'start_time': _datetime(session['start_time']),
+            'end_time': _datetime(session['end_time']),
+            'session_type': session['session_type'],
+            'room': session['room'],
+            'schedule': session['schedule_id'],
+        })
+    return [
+        {
+            'id': row['id'],
+            'title': row['schedule__name'],
+            'description': row['description'],
+            'branch': row['schedule__custom_branch_id'],
+            'branch_name': row['schedule__custom_branch__name'],
+            'audience_type': row['audience_type'],
+            'is_mandatory': row['is_mandatory'],
+            'created_at': _datetime(row['created_at']),
+            'updated_at': _datetime(row['updated_at']),
+            'target_tracks': target_tracks.get(row['id'], []),
+            'sessions': sessions.get(row['schedule__id'], []),
+            'event_date': _date(row['schedule__created_at']),
+        }
+        for row in rows
+    ]
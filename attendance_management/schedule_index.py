@@ -0,0 +1,218 @@
+"""
+Day-scoped schedule index.
+
+Maps track_id -> ScheduleIndexEntry (schedule id/name, first session start,
+last session end and the custom_branch geofence) for a given day, so the
+morning check-in path does not have to look the schedule up in the database.
+
+The index is built with a single query per day, kept in process memory and
+mirrored in the shared cache together with a version counter. Workers that
+did not make a change notice the version bump (checked at most every
+SCHEDULE_INDEX_RECHECK_SECONDS) and reload the index from the shared cache.
+Session/Schedule/Branch signal handlers update it incrementally, and the
+`warm_schedule_index` management command prebuilds it at midnight.
+"""
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import Schedule
+
+logger = logging.getLogger(__name__)
+
+# How long a worker trusts its in-memory copy before comparing versions with the shared cache
+RECHECK_SECONDS = getattr(settings, 'SCHEDULE_INDEX_RECHECK_SECONDS', 5)
+# Shared cache entries only need to outlive the day they describe
+CACHE_TIMEOUT = 60 * 60 * 36
+
+
+class ScheduleIndexEntry(NamedTuple):
+    schedule_id: int
+    schedule_name: str
+    track_id: int
+    first_session_start: Optional[datetime]
+    last_session_end: Optional[datetime]
+    branch_id: int
+    branch_name: str
+    branch_latitude: float
+    branch_longitude: float
+    geofence_radius: float
+
+
+class _LoadedDay:
+    __slots__ = ('version', 'entries', 'checked_at')
+
+    def __init__(self, version, entries):
+        self.version = version
+        self.entries = entries
+        self.checked_at = time.monotonic()
+
+
+_lock = threading.RLock()
+_loaded = {}  # day -> _LoadedDay
+
+
+def _cache_key(day):
+    return f"schedule_index:{day.isoformat()}"
+
+
+def _version_key(day):
+    return f"schedule_index:{day.isoformat()}:version"
+
+
+def _entries_query(day, track_ids=None):
+    queryset = (
+        Schedule.objects
+        .filter(created_at=day, track__isnull=False)
+        .select_related('custom_branch')
+        .annotate(first_session_start=Min('sessions__start_time'), last_session_end=Max('sessions__end_time'))
+    )
+    if track_ids is not None:
+        queryset = queryset.filter(track_id__in=track_ids)
+
+    entries = {}
+    for schedule in queryset:
+        branch = schedule.custom_branch
+        entries[schedule.track_id] = ScheduleIndexEntry(
+            schedule_id=schedule.id,
+            schedule_name=schedule.name,
+            track_id=schedule.track_id,
+            first_session_start=schedule.first_session_start,
+            last_session_end=schedule.last_session_end,
+            branch_id=branch.id,
+            branch_name=branch.name,
+            branch_latitude=branch.latitude,
+            branch_longitude=branch.longitude,
+            geofence_radius=branch.radius,
+        )
+    return entries
+
+
+def _next_version(day):
+    version_key = _version_key(day)
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        # Counter missing or expired; start a new one
+        version = int(time.time() * 1000)
+        cache.set(version_key, version, CACHE_TIMEOUT)
+        return version
+
+
+def _publish(day, entries):
+    """Store `entries` for `day` locally and in the shared cache under a new version."""
+    version = _next_version(day)
+    cache.set(_cache_key(day), {'version': version, 'entries': entries}, CACHE_TIMEOUT)
+    _loaded[day] = _LoadedDay(version, entries)
+    # Only the current day (and tomorrow, once warmed) are useful; drop the rest
+    for stale_day in [d for d in _loaded if d < day and d < timezone.localdate()]:
+        del _loaded[stale_day]
+    return entries
+
+
+def build_schedule_index(day=None):
+    """Rebuild the index for `day` (defaults to today) from the database and publish it."""
+    day = day or timezone.localdate()
+    entries = _entries_query(day)
+    with _lock:
+        _publish(day, entries)
+    logger.info(f"Built schedule index for {day} with {len(entries)} tracks")
+    return entries
+
+
+def get_schedule_index(day=None):
+    """Return the {track_id: ScheduleIndexEntry} mapping for `day` (defaults to today)."""
+    day = day or timezone.localdate()
+    with _lock:
+        loaded = _loaded.get(day)
+        if loaded and time.monotonic() - loaded.checked_at < RECHECK_SECONDS:
+            return loaded.entries
+
+        shared_version = cache.get(_version_key(day))
+        if loaded and shared_version == loaded.version:
+            loaded.checked_at = time.monotonic()
+            return loaded.entries
+
+        if shared_version is not None:
+            payload = cache.get(_cache_key(day))
+            if payload and payload['version'] == shared_version:
+                _loaded[day] = _LoadedDay(payload['version'], payload['entries'])
+                return payload['entries']
+
+    return build_schedule_index(day)
+
+
+def get_track_schedule(track_id, day=None):
+    """Return the ScheduleIndexEntry for `track_id` on `day`, or None if the track has no schedule."""
+    return get_schedule_index(day).get(track_id)
+
+
+async def aget_track_schedule(track_id, day=None):
+    """
+    Async get_track_schedule(). A fresh in-memory index is read on the event
+    loop; only a version check, reload or rebuild goes through a worker thread.
+    """
+    day = day or timezone.localdate()
+    with _lock:
+        loaded = _loaded.get(day)
+        if loaded and time.monotonic() - loaded.checked_at < RECHECK_SECONDS:
+            return loaded.entries.get(track_id)
+    return await sync_to_async(get_track_schedule)(track_id, day)
+
+
+def indexed_track_days(schedule_id):
+    """Return the (track_id, day) pairs under which this process currently indexes `schedule_id`."""
+    with _lock:
+        return [
+            (entry.track_id, day)
+            for day, loaded in _loaded.items()
+            for entry in loaded.entries.values()
+            if entry.schedule_id == schedule_id
+        ]
+
+
+def refresh_tracks(track_ids, days):
+    """
+    Recompute the entries for `track_ids` on each of `days`. Days nobody has
+    built an index for yet are skipped; they are built from scratch on first use.
+    """
+    track_ids = {track_id for track_id in track_ids if track_id is not None}
+    days = {as_date(day) for day in days} - {None}
+    if not track_ids or not days:
+        return
+    with _lock:
+        for day in days:
+            if day not in _loaded and cache.get(_version_key(day)) is None:
+                continue
+            entries = dict(get_schedule_index(day))
+            for track_id in track_ids:
+                entries.pop(track_id, None)
+            entries.update(_entries_query(day, track_ids))
+            _publish(day, entries)
+
+
+def invalidate_schedule_index(day=None):
+    """Drop the index for `day` (or every day held in memory) so it is rebuilt on next use."""
+    with _lock:
+        days = [day] if day is not None else list(_loaded)
+        for loaded_day in days:
+            _loaded.pop(loaded_day, None)
+            cache.delete(_cache_key(loaded_day))
+            cache.delete(_version_key(loaded_day))
+
+
+def as_date(value):
+    """Schedule.created_at is a DateField but callers sometimes pass datetimes."""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if isinstance(value, date):
+        return value
+    return None
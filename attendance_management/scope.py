@@ -0,0 +1,146 @@
+"""
+Per-user access scope shared by the permission classes and role-aware views.
+
+A UserScope holds what the role checks keep re-querying: the user's groups,
+their role, the branch they run or coordinate, and the tracks and branches
+they can see. It is built once per user and cached, and memoized on the
+request so permissions and the view share one lookup.
+
+Cached scopes are retired by signals: Track, Branch and Coordinator changes
+(supervisors, branch managers, coordinator assignments, active flags, new or
+removed tracks) bump a global generation, while a change to one user's groups,
+account or student profile drops just that user's entry.
+"""
+import uuid
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Branch, Coordinator, Track
+
+CACHE_TIMEOUT = getattr(settings, 'ATTENDANCE_USER_SCOPE_CACHE_TIMEOUT', 60 * 60)
+GENERATION_KEY = 'user_scope:generation'
+REQUEST_ATTRIBUTE = '_user_scope'
+
+# Highest first; a user's role is the first of these they belong to
+ROLES = ('admin', 'branch-manager', 'coordinator', 'supervisor', 'instructor', 'student', 'guest')
+
+
+class UserScope(NamedTuple):
+    user_id: Optional[int]
+    joined: Optional[float]  # Tells apart users that reuse a deleted user's id
+    groups: frozenset
+    role: Optional[str]
+    branch_id: Optional[int]  # Branch a branch manager runs or a coordinator belongs to
+    track_ids: frozenset
+    active_track_ids: frozenset
+    branch_ids: frozenset
+
+    def has_group(self, *names):
+        return not self.groups.isdisjoint(names)
+
+    def has_track(self, track_id, active_only=False):
+        """Whether `track_id` (possibly a query string value) is one of the visible tracks."""
+        try:
+            track_id = int(track_id)
+        except (TypeError, ValueError):
+            return False
+        return track_id in (self.active_track_ids if active_only else self.track_ids)
+
+    def tracks(self, active_only=False):
+        """The visible tracks as a queryset."""
+        return Track.objects.filter(pk__in=self.active_track_ids if active_only else self.track_ids)
+
+
+EMPTY_SCOPE = UserScope(None, None, frozenset(), None, None, frozenset(), frozenset(), frozenset())
+
+
+def _joined(user):
+    return user.date_joined.timestamp() if user.date_joined else None
+
+
+def _build(user):
+    groups = frozenset(user.groups.values_list('name', flat=True))
+    role = next((name for name in ROLES if name in groups), None)
+    branch_id = None
+    tracks = Track.objects.none()
+    if role == 'admin':
+        tracks = Track.objects.all()
+    elif role == 'branch-manager':
+        branch_id = Branch.objects.filter(branch_manager=user).values_list('id', flat=True).first()
+    elif role == 'coordinator':
+        branch_id = Coordinator.objects.filter(user=user).values_list('branch_id', flat=True).first()
+    elif role == 'supervisor':
+        tracks = Track.objects.filter(supervisor=user)
+    elif role == 'student':
+        tracks = Track.objects.filter(students__user=user)
+    if branch_id is not None:
+        tracks = Track.objects.filter(default_branch_id=branch_id)
+
+    rows = list(tracks.values_list('id', 'is_active', 'default_branch_id'))
+    if role == 'admin':
+        branch_ids = frozenset(Branch.objects.values_list('id', flat=True))
+    elif branch_id is not None:
+        branch_ids = frozenset([branch_id])
+    else:
+        branch_ids = frozenset(track_branch for _, _, track_branch in rows if track_branch is not None)
+    return UserScope(
+        user_id=user.pk,
+        joined=_joined(user),
+        groups=groups,
+        role=role,
+        branch_id=branch_id,
+        track_ids=frozenset(track_id for track_id, _, _ in rows),
+        active_track_ids=frozenset(track_id for track_id, is_active, _ in rows if is_active),
+        branch_ids=branch_ids,
+    )
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _key(user_id, generation):
+    return f"user_scope:{generation}:{user_id}"
+
+
+def scope_for_user(user):
+    """The cached UserScope of `user`, building it on a miss."""
+    if user is None or not user.is_authenticated:
+        return EMPTY_SCOPE
+    key = _key(user.pk, _generation())
+    scope = cache.get(key)
+    if scope is None or scope.joined != _joined(user):
+        scope = _build(user)
+        cache.set(key, scope, CACHE_TIMEOUT)
+    return scope
+
+
+def get_user_scope(request):
+    """The UserScope of the request's user, looked up at most once per request."""
+    user = request.user
+    # Keep it on the Django request, which the DRF request wrapping it shares
+    holder = getattr(request, '_request', request)
+    scope = getattr(holder, REQUEST_ATTRIBUTE, None)
+    if scope is None or scope.user_id != getattr(user, 'pk', None):
+        scope = scope_for_user(user)
+        setattr(holder, REQUEST_ATTRIBUTE, scope)
+    return scope
+
+
+# -- invalidation --------------------------------------------------------------
+
+def invalidate_user(user_id):
+    """Drop one user's cached scope."""
+    if user_id is not None:
+        cache.delete(_key(user_id, _generation()))
+
+
+def invalidate_all():
+    """Retire every cached scope."""
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
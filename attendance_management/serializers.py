@@ -3,7 +3,8 @@ from .models import Schedule, Session, Student, Track, Branch, AttendanceRecord,
 from users.models import CustomUser
 from datetime import datetime, timedelta
 from django.core.exceptions import ValidationError
-from django.db.models import Count, Q
+from django.db.models import Count, Manager, Max, Min, Prefetch, Q
+from .absence_warnings import CONTEXT_KEY, warning_statuses
 
 class SessionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,6 +16,32 @@ class MiniTrackSerializer(serializers.ModelSerializer):
         model = Track
         fields = ['id', 'name']
 
+def schedule_annotations():
+    """
+    The annotations ScheduleSerializer reads: the first session start and last
+    session end, and the number of attendance records and of students who
+    checked in.
+    """
+    return {
+        'first_session_start': Min('sessions__start_time'),
+        'last_session_end': Max('sessions__end_time'),
+        # distinct: the sessions join repeats every record once per session
+        'record_count': Count('attendance_records', distinct=True),
+        'attended_count': Count(
+            'attendance_records__student', filter=Q(attendance_records__check_in_time__isnull=False), distinct=True
+        ),
+    }
+
+
+def annotate_schedules(schedules):
+    """
+    Add what ScheduleSerializer reads to a Schedule queryset, so a list of
+    schedules serializes with a fixed number of queries: the track, the
+    sessions and schedule_annotations().
+    """
+    return schedules.select_related('track').prefetch_related('sessions').annotate(**schedule_annotations())
+
+
 class ScheduleSerializer(serializers.ModelSerializer):
     track = MiniTrackSerializer(read_only=True)  # Read-only field for track
     sessions = serializers.StringRelatedField(many=True, read_only=True)  # Read-only field for sessions
@@ -28,11 +55,15 @@ class ScheduleSerializer(serializers.ModelSerializer):
 
     def get_start_time(self, obj):
         """Get the start time from the first session of the day"""
+        if hasattr(obj, 'first_session_start'):
+            return obj.first_session_start
         first_session = Session.objects.filter(schedule=obj).order_by('start_time').first()
         return first_session.start_time if first_session else None
         
     def get_end_time(self, obj):
         """Get the end time from the last session of the day"""
+        if hasattr(obj, 'last_session_end'):
+            return obj.last_session_end
         last_session = Session.objects.filter(schedule=obj).order_by('-end_time').first()
         return last_session.end_time if last_session else None
 
@@ -47,6 +78,11 @@ class ScheduleSerializer(serializers.ModelSerializer):
         """
         Calculate the number of students attended the schedule out of total students in the track using the available attendance records.
         """
+        if hasattr(obj, 'record_count'):
+            return {
+                "attended": obj.attended_count,
+                "total": obj.record_count
+            }
         total_students = obj.attendance_records.count()
         attended_students = AttendanceRecord.objects.filter(schedule=obj, check_in_time__isnull=False).values_list('student', flat=True).distinct().count()
         
@@ -153,6 +189,70 @@ class BranchSerializer(serializers.ModelSerializer):
         model = Branch
         fields = ['id', 'name', 'branch_manager', 'branch_manager_id', 'latitude', 'longitude', 'location_url', 'radius']
 
+def prefetch_attendance_records(records, student=None):
+    """
+    Add the joins and prefetches the AttendanceRecord serializers read from, so
+    a list of records serializes with a fixed number of queries: the student
+    with their user and track, the schedule with its track and sessions, and
+    the permission requests of the records' schedules (only `student`'s, when
+    all records belong to one student).
+    """
+    permission_requests = PermissionRequest.objects.order_by('id')
+    if student is not None:
+        permission_requests = permission_requests.filter(student=student)
+    return records.select_related('student__user', 'student__track', 'schedule__track').prefetch_related(
+        'schedule__sessions',
+        Prefetch('schedule__permission_requests', queryset=permission_requests, to_attr='prefetched_permission_requests'),
+    )
+
+
+def prefetch_student_records(records, student=None):
+    """
+    The counterpart of prefetch_attendance_records for
+    AttendanceRecordSerializerForStudents and
+    EventAttendanceRecordSerializerForStudents, which nest ScheduleSerializer:
+    the records' schedules come annotated (see annotate_schedules), with their
+    permission requests (only `student`'s, when all records belong to one
+    student).
+    """
+    permission_requests = PermissionRequest.objects.order_by('id')
+    if student is not None:
+        permission_requests = permission_requests.filter(student=student)
+    schedules = annotate_schedules(Schedule.objects.all()).prefetch_related(
+        Prefetch('permission_requests', queryset=permission_requests, to_attr='prefetched_permission_requests')
+    )
+    return records.prefetch_related(Prefetch('schedule', queryset=schedules))
+
+
+def _permission_requests(obj):
+    """
+    The permission requests of the record's student for its schedule, in id
+    order, from prefetch_attendance_records; None when they were not prefetched.
+    """
+    if not type(obj).schedule.is_cached(obj):
+        return None
+    prefetched = getattr(obj.schedule, 'prefetched_permission_requests', None)
+    if prefetched is None:
+        return None
+    return [request for request in prefetched if request.student_id == obj.student_id]
+
+
+class AttendanceRecordListSerializer(serializers.ListSerializer):
+    """
+    Evaluates the absence warnings of every record's student in one batch
+    (see attendance_management.absence_warnings) and hands them to the child
+    serializer through the context, unless the caller passed them already.
+    """
+    def __init__(self, *args, **kwargs):
+        instance = args[0] if args else kwargs.get('instance')
+        context = kwargs.get('context') or {}
+        if instance is not None and CONTEXT_KEY not in context and 'warning_status' in kwargs['child'].fields:
+            # Evaluates a queryset in place, so serializing it afterwards runs no second query
+            records = list(instance.all() if isinstance(instance, Manager) else instance)
+            kwargs['context'] = {**context, CONTEXT_KEY: warning_statuses(record.student_id for record in records)}
+        super().__init__(*args, **kwargs)
+
+
 class AttendanceRecordSerializer(serializers.ModelSerializer):
     student = serializers.SerializerMethodField()  # updated student field
     adjusted_time = serializers.SerializerMethodField()
@@ -174,6 +274,7 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
             'track_name',
             'warning_status',  # Added warning_status field
         ]
+        list_serializer_class = AttendanceRecordListSerializer
 
     def get_student(self, obj):
         """
@@ -188,11 +289,15 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
         """
         Calculate the adjusted time based on the permission request.
         """
-        permission_request = PermissionRequest.objects.filter(
-            student=obj.student, 
-            schedule=obj.schedule, 
-            status='approved'
-        ).first()
+        prefetched = _permission_requests(obj)
+        if prefetched is not None:
+            permission_request = next((request for request in prefetched if request.status == 'approved'), None)
+        else:
+            permission_request = PermissionRequest.objects.filter(
+                student_id=obj.student_id, 
+                schedule_id=obj.schedule_id, 
+                status='approved'
+            ).first()
 
         if permission_request:
             return permission_request.adjusted_time
@@ -202,10 +307,14 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
         """
         Check if there is a pending leave request for the student and schedule.
         """
-        pending_request = PermissionRequest.objects.filter(
-            student=obj.student, 
-            schedule=obj.schedule, 
-        ).first()
+        prefetched = _permission_requests(obj)
+        if prefetched is not None:
+            pending_request = prefetched[0] if prefetched else None
+        else:
+            pending_request = PermissionRequest.objects.filter(
+                student_id=obj.student_id, 
+                schedule_id=obj.schedule_id, 
+            ).first()
         return pending_request.status if pending_request else None
     def get_track_name(self, obj):
         """
@@ -216,8 +325,12 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
     def get_warning_status(self, obj):
         """
         Get the warning status ('excused' or 'unexcused') if a threshold is exceeded.
-        Relies on the optimized Student.has_exceeded_warning_threshold() method.
+        Lists evaluate every student in one batch and pass it through the context;
+        a single record falls back to Student.has_exceeded_warning_threshold().
         """
+        statuses = self.context.get(CONTEXT_KEY)
+        if statuses is not None and obj.student_id in statuses:
+            return statuses[obj.student_id]
         has_warning, warning_type = obj.student.has_exceeded_warning_threshold()
         return warning_type if has_warning else None
     
@@ -259,6 +372,8 @@ class AttendanceRecordSerializerForSupervisors(AttendanceRecordSerializer):
         """
         Return the sessions related to the schedule of the attendance record.
         """
+        if 'sessions' in getattr(obj.schedule, '_prefetched_objects_cache', {}):
+            return [session.title for session in obj.schedule.sessions.all()]
         sessions = Session.objects.filter(schedule=obj.schedule).values_list('title', flat=True)
         return sessions
     def get_schedule(self, obj):
@@ -322,8 +437,13 @@ class StudentWithWarningSerializer(serializers.ModelSerializer):
     def get_warning_type(self, obj):
         from .models import ApplicationSetting
         program_type = obj.track.program_type
-        unexcused_threshold = ApplicationSetting.get_unexcused_absence_threshold(program_type)
-        excused_threshold = ApplicationSetting.get_excused_absence_threshold(program_type)
+        # Lists pass ApplicationSetting.get_absence_thresholds() in the context
+        thresholds = self.context.get('absence_thresholds', {}).get(program_type)
+        if thresholds:
+            unexcused_threshold, excused_threshold = thresholds['unexcused'], thresholds['excused']
+        else:
+            unexcused_threshold = ApplicationSetting.get_unexcused_absence_threshold(program_type)
+            excused_threshold = ApplicationSetting.get_excused_absence_threshold(program_type)
 
         if obj.unexcused_count >= unexcused_threshold:
             return "Unexcused"
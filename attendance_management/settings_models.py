@@ -36,4 +36,24 @@ class ApplicationSetting(models.Model):
         """
         key = 'excused_absence_threshold_intensive' if program_type == 'intensive' else 'excused_absence_threshold'
         setting = cls.objects.filter(key=key).first()
-        return int(setting.value) if setting else 5  # Changed default from 3 to 5
\ No newline at end of file
+        return int(setting.value) if setting else 5  # Changed default from 3 to 5
+
+    @classmethod
+    def get_absence_thresholds(cls):
+        """
+        Get the unexcused and excused absence thresholds of every program type with one query.
+        Returns {program_type: {'unexcused': n, 'excused': n}} using the same keys and defaults
+        as get_unexcused_absence_threshold and get_excused_absence_threshold.
+        """
+        keys = {
+            ('nine_months', 'unexcused'): 'unexcused_absence_threshold',
+            ('nine_months', 'excused'): 'excused_absence_threshold',
+            ('intensive', 'unexcused'): 'unexcused_absence_threshold_intensive',
+            ('intensive', 'excused'): 'excused_absence_threshold_intensive',
+        }
+        defaults = {'unexcused': 2, 'excused': 5}
+        values = dict(cls.objects.filter(key__in=keys.values()).values_list('key', 'value'))
+        thresholds = {}
+        for (program_type, kind), key in keys.items():
+            thresholds.setdefault(program_type, {})[kind] = int(values[key]) if key in values else defaults[kind]
+        return thresholds
@@ -1,12 +1,354 @@
 import logging
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
 from django.dispatch import receiver
-from .models import Schedule, Student, Session, Event, Guest
+from .models import Schedule, Student, Session, Event, Guest, Branch, PermissionRequest, AttendanceRecord, Track, Coordinator
+from .settings_models import ApplicationSetting
+from . import heatmap, ledger, modality, response_cache, rollups, schedule_index, scope, timeseries
+from users.models import CustomUser
+from .geofence import invalidate_branch_geofence
+from .day_ticket import mark_tickets_stale
+from .stale_marks import mark_stale
 from lost_and_found_system.utils import send_and_save_notification
 
 logger = logging.getLogger(__name__)
 
 
+def _refresh_schedule_index(track_days):
+    """
+    Refresh the schedule index entries for the given (track_id, day) pairs once
+    the surrounding transaction commits.
+    """
+    track_days = [(track_id, day) for track_id, day in track_days if track_id is not None]
+    if not track_days:
+        return
+
+    def refresh():
+        try:
+            for track_id, day in track_days:
+                schedule_index.refresh_tracks([track_id], [day])
+        except Exception as e:
+            logger.error(f"Error refreshing schedule index: {str(e)}", exc_info=True)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(pre_save, sender=Session)
+def remember_previous_session_schedule(sender, instance, **kwargs):
+    """
+    Remember which schedule and track/day a session belonged to before an update,
+    so moving a session between schedules refreshes the derived data of both.
+    """
+    instance._previous_track_day = None
+    instance._previous_schedule_id = None
+    if instance.pk:
+        previous = Session.objects.filter(pk=instance.pk).values_list(
+            'schedule_id', 'schedule__track_id', 'schedule__created_at'
+        ).first()
+        if previous:
+            instance._previous_schedule_id = previous[0]
+            instance._previous_track_day = previous[1:]
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def refresh_schedule_index_on_schedule_change(sender, instance, **kwargs):
+    """
+    Keep the schedule index in sync when a schedule is created, moved, re-branched or deleted
+    """
+    # Dates or tracks may have changed; also refresh whatever the index held for this schedule
+    _refresh_schedule_index(
+        [(instance.track_id, instance.created_at)] + schedule_index.indexed_track_days(instance.id)
+    )
+
+
+@receiver(pre_save, sender=Schedule)
+def remember_previous_schedule_day(sender, instance, **kwargs):
+    """
+    Remember a schedule's track/day before an update, so moving it drops its old rollup row.
+    """
+    instance._previous_track_day = None
+    if instance.pk:
+        instance._previous_track_day = Schedule.objects.filter(pk=instance.pk).values_list(
+            'track_id', 'created_at'
+        ).first()
+
+
+@receiver(post_save, sender=Schedule)
+def update_rollup_on_schedule_save(sender, instance, **kwargs):
+    """
+    Every track schedule gets a DailyTrackAttendance row, counted on first read
+    """
+    track_day = (instance.track_id, instance.created_at)
+    previous = getattr(instance, '_previous_track_day', None)
+
+    def update():
+        rollups.mark_track_days_stale([track_day])
+        if previous and previous != track_day:
+            rollups.drop_track_days([previous])
+            # In-process trend vectors only notice recounted rows, not removed ones
+            timeseries.invalidate_track(previous[0])
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Schedule)
+def update_rollup_on_schedule_delete(sender, instance, **kwargs):
+    track_day = (instance.track_id, instance.created_at)
+
+    def update():
+        rollups.drop_track_days([track_day])
+        timeseries.invalidate_track(instance.track_id)
+
+    transaction.on_commit(update)
+
+
+class _StaleBatch:
+    """The rollup and ledger stale marks of one transaction, written by a single on_commit callback."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.schedule_ids = set()
+        self.student_ids = set()
+
+    def __call__(self):
+        self.connection._attendance_stale_batch = None
+        mark_stale(self.schedule_ids, self.student_ids)
+
+
+def _mark_stale_on_commit(schedule_id, student_id):
+    """
+    Mark the rollup row of `schedule_id` and the ledger of `student_id` stale
+    once the surrounding transaction commits. All attendance writes in one
+    transaction share one callback; the marks themselves are written off the
+    request by `stale_marks`.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        # Autocommit: the write is already committed and there is nothing to batch it with
+        mark_stale([schedule_id], [student_id])
+        return
+    batch = getattr(connection, '_attendance_stale_batch', None)
+    # A rolled-back (savepoint of the) transaction drops its callbacks; don't add to a batch that will never run
+    if batch is None or not any(callback is batch for _, callback, _ in connection.run_on_commit):
+        batch = connection._attendance_stale_batch = _StaleBatch(connection)
+        transaction.on_commit(batch)
+    batch.schedule_ids.add(schedule_id)
+    batch.student_ids.add(student_id)
+
+
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+@receiver(post_save, sender=PermissionRequest)
+@receiver(post_delete, sender=PermissionRequest)
+def mark_derived_data_stale_on_attendance_change(sender, instance, **kwargs):
+    """
+    Recount the schedule's day in the attendance rollup and the student's
+    attendance ledger the next time they are read
+    """
+    _mark_stale_on_commit(instance.schedule_id, instance.student_id)
+
+
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+@receiver(post_save, sender=Schedule)
+def mark_ledgers_stale_on_schedule_change(sender, instance, **kwargs):
+    """
+    Sessions decide whether a day counts and a schedule's date whether it is past,
+    so recount the ledgers of the students with records in the schedule (and the one a session moved from)
+    """
+    if sender is Schedule:
+        previous = getattr(instance, '_previous_track_day', None)
+        if not previous or previous[1] == instance.created_at:
+            return
+        schedule_ids = [instance.id]
+    else:
+        schedule_ids = [instance.schedule_id, getattr(instance, '_previous_schedule_id', None)]
+    transaction.on_commit(lambda: ledger.mark_schedule_ledgers_stale(schedule_ids))
+
+
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+def invalidate_heatmap_on_attendance_change(sender, instance, **kwargs):
+    """
+    Drop the calendar heatmap month of the record's or session's schedule (and the one a session moved from)
+    """
+    schedule_id = instance.schedule_id
+    previous = getattr(instance, '_previous_track_day', None)
+
+    def invalidate():
+        heatmap.invalidate_schedules([schedule_id])
+        if previous:
+            heatmap.invalidate_track_months([previous])
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+def refresh_day_modality_on_session_change(sender, instance, **kwargs):
+    """
+    Recount the online/offline sessions of the session's schedule (and the one it moved from)
+    """
+    schedule_ids = [instance.schedule_id, getattr(instance, '_previous_schedule_id', None)]
+
+    def refresh():
+        try:
+            modality.refresh_schedule_modality(schedule_ids)
+        except Exception as e:
+            logger.error(f"Error refreshing day modality: {str(e)}", exc_info=True)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(pre_save, sender=Student)
+def remember_previous_student_track(sender, instance, update_fields=None, **kwargs):
+    """
+    Remember a student's track before a save that may move them, so both tracks' heatmaps are retired
+    """
+    instance._previous_track_id = None
+    if instance.pk and (update_fields is None or 'track' in update_fields):
+        instance._previous_track_id = Student.objects.filter(pk=instance.pk).values_list('track_id', flat=True).first()
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_heatmap_on_enrollment_change(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Heatmap percentages are relative to the track's student count
+    """
+    previous = getattr(instance, '_previous_track_id', None)
+    moved = previous is not None and previous != instance.track_id
+    if kwargs['signal'] is post_save and not (created or moved):
+        return
+    track_ids = {instance.track_id, previous} - {None}
+
+    def invalidate():
+        for track_id in track_ids:
+            heatmap.invalidate_track(track_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+@receiver(post_save, sender=PermissionRequest)
+@receiver(post_delete, sender=PermissionRequest)
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+def bump_response_cache_on_attendance_change(sender, instance, **kwargs):
+    """
+    New ETags for the dashboards of the schedule's track (and the one a session moved from)
+    """
+    schedule_id = instance.schedule_id
+    previous = getattr(instance, '_previous_track_day', None)
+
+    def bump():
+        response_cache.bump_schedules([schedule_id])
+        if previous:
+            response_cache.bump_tracks([previous[0]])
+
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def bump_response_cache_on_track_content_change(sender, instance, **kwargs):
+    """
+    New ETags for the dashboards of the schedule's or student's track, and the one it moved from
+    """
+    if sender is Schedule:
+        previous = getattr(instance, '_previous_track_day', None)
+        previous_track_id = previous[0] if previous else None
+    else:
+        previous_track_id = getattr(instance, '_previous_track_id', None)
+    track_ids = [instance.track_id, previous_track_id]
+    transaction.on_commit(lambda: response_cache.bump_tracks(track_ids))
+
+
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Track)
+def bump_response_cache_on_track_change(sender, instance, **kwargs):
+    track_id = instance.id
+    transaction.on_commit(lambda: response_cache.bump_tracks([track_id]))
+
+
+@receiver(post_save, sender=ApplicationSetting)
+@receiver(post_delete, sender=ApplicationSetting)
+def bump_response_cache_on_setting_change(sender, instance, **kwargs):
+    """
+    Absence thresholds feed the warning reports of every track
+    """
+    transaction.on_commit(response_cache.bump_all)
+
+
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Track)
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+@receiver(post_save, sender=Coordinator)
+@receiver(post_delete, sender=Coordinator)
+def invalidate_user_scopes_on_assignment_change(sender, instance, **kwargs):
+    """
+    Supervisors, branch managers, coordinator branches and the track list shape every user's scope
+    """
+    transaction.on_commit(scope.invalidate_all)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_user_scope_on_user_change(sender, instance, **kwargs):
+    user_id = instance.pk if sender is CustomUser else instance.user_id
+    transaction.on_commit(lambda: scope.invalidate_user(user_id))
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_user_scope_on_group_change(sender, instance, action, reverse, **kwargs):
+    """
+    A user's groups decide their role; changes made from the group side retire every scope
+    """
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        transaction.on_commit(scope.invalidate_all)
+    else:
+        user_id = instance.pk
+        transaction.on_commit(lambda: scope.invalidate_user(user_id))
+
+
+@receiver(post_save, sender=Branch)
+def invalidate_schedule_index_on_branch_change(sender, instance, **kwargs):
+    """
+    Branch geofences are copied into the schedule index, so rebuild it when a branch changes
+    """
+    transaction.on_commit(schedule_index.invalidate_schedule_index)
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def invalidate_geofence_on_branch_change(sender, instance, **kwargs):
+    """
+    Reload the geofence engine's branch arrays when a branch is added, moved or removed
+    """
+    transaction.on_commit(invalidate_branch_geofence)
+
+
+@receiver(post_save, sender=PermissionRequest)
+@receiver(post_delete, sender=PermissionRequest)
+def invalidate_day_tickets_on_permission_change(sender, instance, **kwargs):
+    """
+    Day tickets embed the student's approved permissions, so retire them when a request changes
+    """
+    if instance.schedule_id:
+        transaction.on_commit(lambda: mark_tickets_stale(instance.student_id, instance.schedule_id))
+
+
 @receiver(post_save, sender=Session)
 def notify_students_on_session_create_or_update(sender, instance, created, **kwargs):
     """
@@ -16,6 +358,12 @@ def notify_students_on_session_create_or_update(sender, instance, created, **kwa
     try:
         # Get the schedule for this session
         schedule = instance.schedule
+
+        # Keep today's first/last session bounds in the schedule index current
+        _refresh_schedule_index([
+            (schedule.track_id, schedule.created_at),
+            getattr(instance, '_previous_track_day', None) or (None, None),
+        ])
         
         # Determine if this is a regular session (track-based) or event sub-session
         if schedule.track:
@@ -118,6 +466,9 @@ def notify_students_on_session_deletion(sender, instance, **kwargs):
     try:
         # Get the schedule for this session
         schedule = instance.schedule
+
+        # Keep today's first/last session bounds in the schedule index current
+        _refresh_schedule_index([(schedule.track_id, schedule.created_at)])
         
         # Determine if this is a regular session (track-based) or event sub-session
         if schedule.track:
@@ -0,0 +1,118 @@
+"""
+Deferred stale marks for the attendance rollup and ledgers.
+
+Marking a DailyTrackAttendance row stale is an UPDATE on the row every
+check-in of the track that day contends on, and dashboards keep flipping it
+back to fresh. Hot write paths (record and permission request saves, day-ticket
+redemptions) call `mark_stale` instead, which only adds the schedule and
+student ids to an in-process set. A background thread writes the set every
+ATTENDANCE_STALE_MARK_INTERVAL_MS milliseconds with one UPDATE per table, so a
+surge of check-ins costs a couple of UPDATEs per interval instead of two per
+check-in, and none on the request.
+
+Readers in the same process (`rollups.daily_rollup`, `ledger.student_ledgers`,
+the trend vectors) call `flush_stale_marks` before loading rows, so they never
+miss a write they could have seen; readers in other processes see the marks
+within one interval. With the interval set to 0 marks are written at once.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def _write(schedule_ids, student_ids):
+    from . import ledger, rollups  # Import here to avoid circular import
+    rollups.mark_schedules_stale(schedule_ids)
+    ledger.mark_ledgers_stale(student_ids)
+
+
+class StaleMarks:
+    def __init__(self, interval_ms):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._schedule_ids = set()
+        self._student_ids = set()
+        self._thread = None
+
+    def note(self, schedule_ids=(), student_ids=()):
+        """Remember that these schedules' rollup rows and these students' ledgers are stale."""
+        with self._lock:
+            self._schedule_ids.update(schedule_id for schedule_id in schedule_ids if schedule_id is not None)
+            self._student_ids.update(student_id for student_id in student_ids if student_id is not None)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='attendance-stale-marks', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def flush(self):
+        """Write the pending marks. Returns the number of ids written."""
+        # A reader waits for a flush in progress, so the rows it loads next carry those marks
+        with self._flush_lock:
+            with self._lock:
+                schedule_ids, self._schedule_ids = self._schedule_ids, set()
+                student_ids, self._student_ids = self._student_ids, set()
+            if not schedule_ids and not student_ids:
+                return 0
+            try:
+                _write(schedule_ids, student_ids)
+            except Exception:
+                with self._lock:
+                    self._schedule_ids |= schedule_ids
+                    self._student_ids |= student_ids
+                raise
+            return len(schedule_ids) + len(student_ids)
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # The ids are kept; the next tick retries
+                logger.error(f"Writing stale marks failed: {str(e)}", exc_info=True)
+            finally:
+                close_old_connections()
+
+
+_marks = None
+_marks_lock = threading.Lock()
+
+
+def mark_stale(schedule_ids=(), student_ids=()):
+    """
+    Mark the rollup rows of `schedule_ids` and the ledgers of `student_ids`
+    stale, deferred to the background writer unless the interval is 0. Call
+    it once the write is committed.
+    """
+    global _marks
+    interval = getattr(settings, 'ATTENDANCE_STALE_MARK_INTERVAL_MS', 250)
+    if not interval:
+        _write(schedule_ids, student_ids)
+        return
+    if _marks is None:
+        with _marks_lock:
+            if _marks is None:
+                _marks = StaleMarks(interval)
+    _marks.note(schedule_ids, student_ids)
+
+
+def flush_stale_marks():
+    """Write this process's pending marks, e.g. before reading rollup rows or ledgers."""
+    if _marks is not None:
+        _marks.flush()
@@ -0,0 +1,193 @@
+"""
+Attendance status engine.
+
+Every AttendanceRecord status is a function of the check-in/check-out times,
+the schedule's first session start / last session end and the student's
+approved permission requests for that schedule. The transitions live in the
+tables below; check-in, check-out and batch ingestion all go through
+`check_in_status` / `check_out_status`, and `recompute_statuses` re-derives
+statuses in bulk (e.g. after a permission request is approved late).
+"""
+import logging
+from datetime import timedelta
+
+from django.db.models import Max, Min
+
+from .models import AttendanceRecord, PermissionRequest, Schedule
+from .heatmap import invalidate_track_months
+from .response_cache import bump_tracks
+from .ledger import mark_ledgers_stale
+from .rollups import mark_schedules_stale
+from .write_behind import flush_pending
+
+logger = logging.getLogger(__name__)
+
+# A student is considered late this long after the first session starts
+LATE_CHECK_IN_GRACE = timedelta(minutes=15)
+
+NO_SESSIONS = 'no_sessions'
+
+# (approved permission outcome, checked in after the grace period) -> status at check-in.
+# The outcome is the type of the student's first approved permission; a late_check_in
+# permission is split on whether the student arrived before its adjusted time.
+CHECK_IN_TRANSITIONS = {
+    (None, False): 'check-in',
+    (None, True): 'late-check-in',
+    ('late_check_in_within', False): 'late-excused',
+    ('late_check_in_within', True): 'late-excused',
+    ('late_check_in_beyond', False): 'late-check-in',
+    ('late_check_in_beyond', True): 'late-check-in',
+    ('day_excuse', False): 'excused',
+    ('day_excuse', True): 'excused',
+    ('early_leave', False): 'check-in',
+    ('early_leave', True): 'late-check-in',
+}
+
+# (status at check-in, left before the last session ended, early leave approved) -> final status
+CHECK_OUT_TRANSITIONS = {
+    ('check-in', False, False): 'attended',
+    ('check-in', False, True): 'attended',
+    ('check-in', True, False): 'check-in_early-check-out',
+    ('check-in', True, True): 'check-in_early-excused',
+    ('late-check-in', False, False): 'late-check-in',
+    ('late-check-in', False, True): 'late-check-in',
+    ('late-check-in', True, False): 'late-check-in_early-check-out',
+    ('late-check-in', True, True): 'late-check-in_early-excused',
+    ('late-excused', False, False): 'late-excused',
+    ('late-excused', False, True): 'late-excused',
+    ('late-excused', True, False): 'late-excused_early-check-out',
+    ('late-excused', True, True): 'late-excused_early-excused',
+}
+
+# Any other status at check-out (shouldn't normally happen)
+FALLBACK_CHECK_OUT = {
+    (True, False): 'check-in_early-check-out',
+}
+FALLBACK_CHECK_OUT_DEFAULT = 'attended'
+
+# Checked in, never checked out, once the day has been closed
+NO_CHECK_OUT_TRANSITIONS = {
+    'late-check-in': 'late-check-in_no-check-out',
+}
+NO_CHECK_OUT_DEFAULT = 'no-check-out'
+NO_CHECK_OUT_STATUSES = {'no-check-out', 'late-check-in_no-check-out'}
+
+# Statuses of records without a check-in that the engine owns
+ABSENCE_STATUSES = {'absent', 'excused'}
+
+
+def _first_approved(permissions, request_type=None):
+    for permission in permissions:
+        if request_type is None or permission.request_type == request_type:
+            return permission
+    return None
+
+
+def check_in_status(at, first_session_start, permissions=()):
+    """Status a record gets when the student checks in at `at`."""
+    is_late = at > first_session_start + LATE_CHECK_IN_GRACE
+    permission = _first_approved(permissions)
+    outcome = None
+    if permission is not None:
+        outcome = permission.request_type
+        if outcome == 'late_check_in':
+            within = permission.adjusted_time is not None and at <= permission.adjusted_time
+            outcome = 'late_check_in_within' if within else 'late_check_in_beyond'
+    return CHECK_IN_TRANSITIONS.get((outcome, is_late), CHECK_IN_TRANSITIONS[(None, is_late)])
+
+
+def check_out_status(at, last_session_end, current_status, permissions=()):
+    """Status a record with `current_status` gets when the student checks out at `at`."""
+    is_early = at < last_session_end
+    early_leave = _first_approved(permissions, 'early_leave') is not None
+    status = CHECK_OUT_TRANSITIONS.get((current_status, is_early, early_leave))
+    if status is None:
+        status = FALLBACK_CHECK_OUT.get((is_early, early_leave), FALLBACK_CHECK_OUT_DEFAULT)
+    return status
+
+
+def derive_status(record, first_session_start, last_session_end, permissions=()):
+    """
+    Re-derive a record's status from its times, the session bounds and the
+    approved permissions. Returns the record's current status for records the
+    engine does not own (e.g. 'pending').
+    """
+    if record.check_in_time is None:
+        if record.status not in ABSENCE_STATUSES:
+            return record.status
+        return 'excused' if _first_approved(permissions, 'day_excuse') else 'absent'
+
+    if first_session_start is None:
+        return NO_SESSIONS
+
+    status = check_in_status(record.check_in_time, first_session_start, permissions)
+    if record.check_out_time is not None:
+        return check_out_status(record.check_out_time, last_session_end, status, permissions)
+    if record.status in NO_CHECK_OUT_STATUSES:
+        return NO_CHECK_OUT_TRANSITIONS.get(status, NO_CHECK_OUT_DEFAULT)
+    return status
+
+
+def recompute_statuses(schedule_ids=None, track_id=None, start_date=None, end_date=None,
+                       student_ids=None, dry_run=False):
+    """
+    Re-derive the status of every attendance record in scope and write the
+    changed ones with a single bulk_update.
+
+    Scope is the intersection of the given filters: schedules, a track, a
+    schedule date range (inclusive) and students. Returns the list of changed
+    records (with their new status set).
+    """
+    schedules = Schedule.objects.all()
+    if schedule_ids is not None:
+        schedules = schedules.filter(id__in=schedule_ids)
+    if track_id is not None:
+        schedules = schedules.filter(track_id=track_id)
+    if start_date is not None:
+        schedules = schedules.filter(created_at__gte=start_date)
+    if end_date is not None:
+        schedules = schedules.filter(created_at__lte=end_date)
+
+    # Buffered check-ins must land first or bulk_update and the flusher would overwrite each other
+    flush_pending()
+
+    bounds, track_days = {}, {}
+    for schedule_id, track_id, day, first_start, last_end in (
+        schedules
+        .annotate(first_session_start=Min('sessions__start_time'), last_session_end=Max('sessions__end_time'))
+        .values_list('id', 'track_id', 'created_at', 'first_session_start', 'last_session_end')
+    ):
+        bounds[schedule_id] = (first_start, last_end)
+        track_days[schedule_id] = (track_id, day)
+    if not bounds:
+        return []
+
+    records = AttendanceRecord.objects.filter(schedule_id__in=bounds.keys())
+    permission_requests = PermissionRequest.objects.filter(schedule_id__in=bounds.keys(), status='approved')
+    if student_ids is not None:
+        records = records.filter(student_id__in=student_ids)
+        permission_requests = permission_requests.filter(student_id__in=student_ids)
+
+    permissions = {}
+    for permission in (permission_requests
+                       .only('id', 'student_id', 'schedule_id', 'request_type', 'adjusted_time')
+                       .order_by('id')):
+        permissions.setdefault((permission.student_id, permission.schedule_id), []).append(permission)
+
+    changed = []
+    for record in records.only('id', 'student_id', 'schedule_id', 'check_in_time', 'check_out_time', 'status'):
+        first_start, last_end = bounds[record.schedule_id]
+        status = derive_status(record, first_start, last_end, permissions.get((record.student_id, record.schedule_id), ()))
+        if status != record.status:
+            record.status = status
+            changed.append(record)
+
+    if changed and not dry_run:
+        AttendanceRecord.objects.bulk_update(changed, ['status'], batch_size=1000)
+        mark_schedules_stale(record.schedule_id for record in changed)
+        mark_ledgers_stale(record.student_id for record in changed)
+        invalidate_track_months({track_days[record.schedule_id] for record in changed})
+        bump_tracks(track_days[record.schedule_id][0] for record in changed)
+    logger.info(f"Recomputed attendance statuses for {len(bounds)} schedules: {len(changed)} changed"
+                f"{' (dry run)' if dry_run else ''}")
+    return changed
@@ -0,0 +1,71 @@
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.db.models import F, Min
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..analytics import track_day_stats
+from ..benchmarking import BenchmarkFixture
+from ..models import AttendanceRecord, DailyTrackAttendance, Session
+from ..rollups import rebuild_rollup
+from ..schedule_index import get_schedule_index, invalidate_schedule_index
+
+DASHBOARDS = [
+    'attendance-percentage/today/',
+    'attendance-percentage/weekly/',
+    'attendance-trends/',
+    'weekly-breakdown/',
+    'calendar/',
+]
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AnalyticsQueryCountTestCase(TestCase):
+    def _supervisor_with_tracks(self, track_count):
+        fixture = BenchmarkFixture(track_count * 2, tracks=track_count, seed=1).create()
+        fixture.supervisor.groups.add(Group.objects.get_or_create(name='supervisor')[0])
+        # Move the day's sessions to start at midnight, so the dashboards count today whatever the time of day
+        sessions = Session.objects.filter(schedule__in=fixture.schedules)
+        midnight = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        shift = sessions.aggregate(first_start=Min('start_time'))['first_start'] - midnight
+        sessions.update(start_time=F('start_time') - shift, end_time=F('end_time') - shift)
+        schedules = {schedule.track_id: schedule for schedule in fixture.schedules}
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(
+                student=student, schedule=schedules[student.track_id],
+                check_in_time=timezone.now() if i % 2 else None, status='check-in' if i % 2 else 'absent',
+            )
+            for i, student in enumerate(fixture.students)
+        ])
+        return fixture
+
+    def _query_counts(self, fixture):
+        client = APIClient()
+        client.force_authenticate(user=fixture.supervisor)
+        counts = {}
+        for url in DASHBOARDS:
+            # Count with every day stale so the recount path is included too
+            DailyTrackAttendance.objects.update(is_stale=True)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(f'/api/v1/attendance/{url}')
+            self.assertEqual(response.status_code, 200, (url, response.data))
+            counts[url] = len(queries)
+        return counts
+
+    def test_dashboard_queries_do_not_grow_with_tracks(self):
+        small = self._supervisor_with_tracks(1)
+        large = self._supervisor_with_tracks(200)
+        today = timezone.localdate()
+        rebuild_rollup(today, today)
+        # Rebuilt from the moved sessions before counting, so neither supervisor pays for it
+        invalidate_schedule_index(today)
+        get_schedule_index(today)
+
+        stats = track_day_stats([track.id for track in large.tracks], today)
+        self.assertEqual(len(stats), 200)
+        self.assertEqual(sum(day.expected for day in stats), 400)
+        self.assertEqual(sum(day.checked_in for day in stats), 200)
+
+        self.assertEqual(self._query_counts(small), self._query_counts(large))
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ..models import AttendanceRecord, Branch, Schedule, Session, Student, Track
+from ..schedule_index import invalidate_schedule_index
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AsyncCheckInTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_schedule_index(timezone.localdate())
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.student_user = CustomUser.objects.create_user(
+            email='student@example.com', password='pass123',
+            first_name='John', last_name='Doe', groups=['student']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=supervisor,
+            start_date=timezone.localdate(), default_branch=branch
+        )
+        self.student = Student.objects.create(user=self.student_user, track=track, phone_uuid='device-1')
+        self.schedule = Schedule.objects.create(
+            name="Today", track=track, custom_branch=branch, created_at=timezone.localdate()
+        )
+        now = timezone.localtime()
+        Session.objects.create(
+            schedule=self.schedule, title="Morning", instructor="Instructor",
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=2)
+        )
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.student_user)}"}
+        self.payload = {'user_id': self.student_user.id, 'uuid': 'device-1', 'latitude': 30.0722, 'longitude': 31.0177}
+
+    async def _post(self, path, payload=None, **headers):
+        return await self.async_client.post(
+            f'/api/v1/attendance/async/{path}/', payload or self.payload,
+            content_type='application/json', headers={**self.headers, **headers}
+        )
+
+    async def test_check_in_then_check_out(self):
+        response = await self._post('check-in')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(body['branch']['name'], "Smart Village Branch")
+
+        record = await AttendanceRecord.objects.aget(student=self.student, schedule=self.schedule)
+        self.assertEqual(record.status, 'late-check-in')
+        status_response = await self.async_client.get('/api/v1/attendance/async/status/', headers=self.headers)
+        self.assertTrue(status_response.json()['is_checked_in'])
+
+        # Derived idempotency key: the retry replays the stored response
+        retry = await self._post('check-in')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), body)
+
+        response = await self._post('check-out')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['is_checked_in'], False)
+        record = await AttendanceRecord.objects.aget(pk=record.pk)
+        self.assertEqual(record.status, 'late-check-in_early-check-out')
+
+    async def test_errors_match_sync_views(self):
+        self.assertEqual((await self.async_client.post('/api/v1/attendance/async/check-in/')).status_code, 401)
+
+        outside = await self._post('check-in', dict(self.payload, latitude=31.0))
+        self.assertEqual(outside.status_code, 400)
+        self.assertEqual(outside.json()['status'], 'fail')
+        self.assertEqual(outside.json()['nearest_branch']['name'], "Smart Village Branch")
+
+        mismatch = await self._post('check-in', dict(self.payload, uuid='other-device'))
+        self.assertEqual(mismatch.json()['error_code'], 'uuid_mismatch')
+
+        not_checked_in = await self._post('check-out')
+        self.assertEqual(not_checked_in.json()['error_code'], 'not_checked_in')
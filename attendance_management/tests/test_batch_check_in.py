@@ -0,0 +1,182 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from ..models import Track, Student, Schedule, AttendanceRecord, Branch, Session
+from unittest import mock
+
+from .. import batch_checkin
+from ..batch_checkin import sign_event
+from ..schedule_index import build_schedule_index, invalidate_schedule_index
+from rest_framework.test import APIClient
+from datetime import timedelta
+from django.utils import timezone
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BatchCheckInTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        invalidate_schedule_index(timezone.localdate())
+
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com',
+            password='pass123',
+            first_name='Sara',
+            last_name='Supervisor',
+            groups=['supervisor']
+        )
+        self.branch = Branch.objects.create(
+            name="Smart Village Branch",
+            latitude=30.0722,
+            longitude=31.0177,
+            radius=100
+        )
+        self.track = Track.objects.create(
+            name="Computer Science",
+            intake=1,
+            supervisor=self.supervisor,
+            start_date=timezone.localdate(),
+            default_branch=self.branch
+        )
+        self.students = []
+        for i in range(3):
+            user = CustomUser.objects.create_user(
+                email=f'student{i}@example.com',
+                password='pass123',
+                first_name='Student',
+                last_name=f'Number{i}',
+                groups=['student']
+            )
+            self.students.append(Student.objects.create(user=user, track=self.track, phone_uuid=f'device-{i}'))
+
+        self.schedule = Schedule.objects.create(
+            name="Today",
+            track=self.track,
+            custom_branch=self.branch,
+            created_at=timezone.localdate()
+        )
+        self.now = timezone.localtime()
+        Session.objects.create(
+            schedule=self.schedule,
+            title="Morning",
+            instructor="Instructor",
+            start_time=self.now - timedelta(hours=2),
+            end_time=self.now + timedelta(hours=2)
+        )
+        self.client.force_authenticate(user=self.students[0].user)
+
+    def _sync_key(self, student):
+        self.client.force_authenticate(user=student.user)
+        response = self.client.get('/api/v1/attendance/sync-key/', {'uuid': student.phone_uuid})
+        self.assertEqual(response.status_code, 200)
+        return response.data['sync_key']
+
+    def _event(self, student, event_type, at, event_id, latitude=30.0722, longitude=31.0177, key=None):
+        event = {
+            'event_id': event_id,
+            'user_id': student.user_id,
+            'uuid': student.phone_uuid,
+            'type': event_type,
+            'timestamp': at.isoformat(),
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+        event['signature'] = sign_event(event, key or self._sync_key(student))
+        return event
+
+    def test_batch_applies_events_in_bulk(self):
+        check_in_at = self.now - timedelta(hours=2) + timedelta(minutes=5)
+        keys = [self._sync_key(student) for student in self.students]
+        events = [
+            self._event(self.students[0], 'check_out', self.now - timedelta(minutes=30), 'a2', key=keys[0]),
+            self._event(self.students[0], 'check_in', check_in_at, 'a1', key=keys[0]),
+            self._event(self.students[1], 'check_in', check_in_at + timedelta(minutes=30), 'b1', key=keys[1]),
+            self._event(self.students[2], 'check_in', check_in_at, 'c1', latitude=31.0, key=keys[2]),
+        ]
+        events.append(dict(events[2], event_id='b2', signature='0' * 64))
+
+        build_schedule_index()
+        # students, records, permissions, insert, locked re-read, student update (+ savepoint pair),
+        # rollup and ledger stale marks
+        with self.assertNumQueries(10):
+            response = self.client.post('/api/v1/attendance/batch-check-in/', {'events': events}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = {result['event_id']: result for result in response.data['results']}
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual(results['a1']['attendance_status'], 'check-in')
+        self.assertEqual(results['a2']['attendance_status'], 'check-in_early-check-out')
+        self.assertEqual(results['b1']['attendance_status'], 'late-check-in')
+        self.assertEqual(results['c1']['status'], 'fail')
+        self.assertEqual(results['b2']['error_code'], 'invalid_signature')
+
+        record = AttendanceRecord.objects.get(student=self.students[0], schedule=self.schedule)
+        self.assertEqual(record.check_in_time, check_in_at)
+        self.assertEqual(record.status, 'check-in_early-check-out')
+        self.assertTrue(Student.objects.get(pk=self.students[1].pk).is_checked_in)
+        self.assertFalse(Student.objects.get(pk=self.students[0].pk).is_checked_in)
+
+        # Retrying the same events is harmless
+        response = self.client.post('/api/v1/attendance/batch-check-in/', {'events': events[:3]}, format='json')
+        self.assertEqual(response.data['applied'], 0)
+        self.assertTrue(all(result.get('duplicate') for result in response.data['results']))
+
+    def test_batch_rejects_bad_events(self):
+        future = self._event(self.students[0], 'check_in', self.now + timedelta(hours=1), 'f1')
+        stale = self._event(self.students[0], 'check_in', self.now - batch_checkin.MAX_EVENT_AGE - timedelta(minutes=1), 's1')
+        wrong_device = self._event(self.students[1], 'check_in', self.now, 'w1')
+        wrong_device['uuid'] = 'other-device'
+        response = self.client.post('/api/v1/attendance/batch-check-in/', {
+            'events': [future, stale, wrong_device, {'event_id': 'x1'}]
+        }, format='json')
+        self.assertEqual(
+            [result['error_code'] for result in response.data['results']],
+            ['invalid_timestamp', 'invalid_timestamp', 'uuid_mismatch', 'invalid_event']
+        )
+
+        response = self.client.post('/api/v1/attendance/batch-check-in/', {'events': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_past_day_events_only_complete_existing_records(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        schedule = Schedule.objects.create(name="Yesterday", track=self.track, custom_branch=self.branch, created_at=yesterday)
+        evening = timezone.make_aware(timezone.datetime.combine(yesterday, timezone.datetime.min.time())) + timedelta(hours=23)
+        Session.objects.create(schedule=schedule, title="Evening", start_time=evening - timedelta(minutes=30),
+                               end_time=evening + timedelta(minutes=50))
+        AttendanceRecord.objects.create(student=self.students[1], schedule=schedule, check_in_time=evening - timedelta(minutes=25),
+                                        status='check-in')
+        keys = [self._sync_key(student) for student in self.students[:2]]
+        events = [
+            self._event(self.students[0], 'check_in', evening, 'p1', key=keys[0]),
+            self._event(self.students[1], 'check_out', evening + timedelta(minutes=55), 'p2', key=keys[1]),
+        ]
+        with mock.patch.object(batch_checkin, 'MAX_EVENT_AGE', timedelta(days=2)):
+            response = self.client.post('/api/v1/attendance/batch-check-in/', {'events': events}, format='json')
+        results = {result['event_id']: result for result in response.data['results']}
+        self.assertEqual(results['p1']['error_code'], 'attendance_record_not_found')
+        self.assertFalse(AttendanceRecord.objects.filter(student=self.students[0], schedule=schedule).exists())
+        self.assertEqual(results['p2']['attendance_status'], 'attended')
+
+    def test_batch_merges_with_a_concurrent_check_in(self):
+        online_at = self.now - timedelta(hours=2) + timedelta(minutes=1)
+        key = self._sync_key(self.students[0])
+        events = [self._event(self.students[0], 'check_out', self.now - timedelta(minutes=10), 'm2', key=key)]
+        AttendanceRecord.objects.create(student=self.students[0], schedule=self.schedule,
+                                        check_in_time=self.now - timedelta(hours=1), status='late-check-in')
+        build_schedule_index()
+
+        def check_in_online(*args, **kwargs):
+            # An online check-in lands after the batch read the record
+            AttendanceRecord.objects.filter(student=self.students[0]).update(check_in_time=online_at, status='check-in')
+            return context_class(*args, **kwargs)
+        context_class = batch_checkin.CheckInContext
+        with mock.patch.object(batch_checkin, 'CheckInContext', side_effect=check_in_online):
+            response = self.client.post('/api/v1/attendance/batch-check-in/', {'events': events}, format='json')
+        self.assertEqual(response.data['applied'], 1)
+
+        record = AttendanceRecord.objects.get(student=self.students[0], schedule=self.schedule)
+        self.assertEqual(record.check_in_time, online_at)
+        self.assertEqual(record.check_out_time, self.now - timedelta(minutes=10))
+        self.assertEqual(record.status, 'check-in_early-check-out')
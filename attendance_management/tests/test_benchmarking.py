@@ -0,0 +1,26 @@
+import random
+
+from django.test import SimpleTestCase
+
+from ..benchmarking import arrival_offsets, percentile
+
+
+class BenchmarkingHelpersTestCase(SimpleTestCase):
+    def test_arrival_curve_peaks_inside_window(self):
+        offsets = arrival_offsets(5000, 1200, random.Random(1))
+        self.assertEqual(len(offsets), 5000)
+        self.assertEqual(offsets, sorted(offsets))
+        self.assertTrue(0 <= offsets[0] and offsets[-1] <= 1200)
+        # Busiest minute sits around the peak (60% into the window), not at the edges
+        per_minute = [0] * 20
+        for offset in offsets:
+            per_minute[min(int(offset // 60), 19)] += 1
+        self.assertIn(per_minute.index(max(per_minute)), range(10, 14))
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertEqual(percentile([], 0.5), 0.0)
@@ -0,0 +1,167 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..models import Track, Student, Schedule, AttendanceRecord, Branch, Session, PermissionRequest
+from ..checkin_context import load_check_in_context
+from ..schedule_index import build_schedule_index, get_track_schedule, invalidate_schedule_index
+from ..geofence import invalidate_branch_geofence
+from rest_framework.test import APIClient
+from datetime import timedelta
+from django.utils import timezone
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CheckInContextTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        invalidate_schedule_index(timezone.localdate())
+        invalidate_branch_geofence()
+
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com',
+            password='pass123',
+            first_name='Sara',
+            last_name='Supervisor',
+            groups=['supervisor']
+        )
+        self.student_user = CustomUser.objects.create_user(
+            email='student@example.com',
+            password='pass123',
+            first_name='John',
+            last_name='Doe',
+            groups=['student']
+        )
+        self.branch = Branch.objects.create(
+            name="Smart Village Branch",
+            latitude=30.0722,
+            longitude=31.0177,
+            radius=100
+        )
+        self.track = Track.objects.create(
+            name="Computer Science",
+            intake=1,
+            supervisor=self.supervisor,
+            start_date=timezone.localdate(),
+            default_branch=self.branch
+        )
+        self.student = Student.objects.create(user=self.student_user, track=self.track)
+        self.schedule = Schedule.objects.create(
+            name="Today",
+            track=self.track,
+            custom_branch=self.branch,
+            created_at=timezone.localdate()
+        )
+        now = timezone.localtime()
+        Session.objects.create(
+            schedule=self.schedule,
+            title="Morning",
+            instructor="Instructor",
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1)
+        )
+        Session.objects.create(
+            schedule=self.schedule,
+            title="Afternoon",
+            instructor="Instructor",
+            start_time=now + timedelta(hours=1),
+            end_time=now + timedelta(hours=3)
+        )
+        self.client.force_authenticate(user=self.student_user)
+
+    def _payload(self, **overrides):
+        payload = {
+            'user_id': self.student_user.id,
+            'uuid': 'device-1',
+            'latitude': 30.0722,
+            'longitude': 31.0177,
+        }
+        payload.update(overrides)
+        return payload
+
+    def test_context_is_loaded_in_two_queries(self):
+        AttendanceRecord.objects.create(student=self.student, schedule=self.schedule)
+        build_schedule_index()
+        with CaptureQueriesContext(connection) as ctx:
+            context = load_check_in_context(self.student_user.id)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(context.schedule_id, self.schedule.id)
+        self.assertEqual(context.geofence_radius, 100)
+        self.assertEqual(context.first_session_start, self.schedule.sessions.order_by('start_time').first().start_time)
+        self.assertEqual(context.last_session_end, self.schedule.sessions.order_by('-end_time').first().end_time)
+
+    def test_schedule_index_follows_session_changes(self):
+        entry = get_track_schedule(self.track.id)
+        self.assertEqual(entry.schedule_id, self.schedule.id)
+
+        late_end = timezone.localtime() + timedelta(hours=6)
+        with self.captureOnCommitCallbacks(execute=True):
+            session = Session.objects.create(
+                schedule=self.schedule,
+                title="Evening",
+                instructor="Instructor",
+                start_time=late_end - timedelta(hours=1),
+                end_time=late_end
+            )
+        self.assertEqual(get_track_schedule(self.track.id).last_session_end, late_end)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            session.delete()
+        self.assertLess(get_track_schedule(self.track.id).last_session_end, late_end)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule.delete()
+        self.assertIsNone(get_track_schedule(self.track.id))
+
+    def test_check_in_then_check_out(self):
+        AttendanceRecord.objects.create(student=self.student, schedule=self.schedule)
+
+        response = self.client.post('/api/v1/attendance/check-in/', self._payload(), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(response.data['branch'], {"id": self.branch.id, "name": self.branch.name})
+        # First session started an hour ago, past the 15 minute grace period
+        record = AttendanceRecord.objects.get(student=self.student, schedule=self.schedule)
+        self.assertEqual(record.status, 'late-check-in')
+
+        response = self.client.post('/api/v1/attendance/check-out/', self._payload(), format='json')
+        self.assertEqual(response.status_code, 200)
+        record.refresh_from_db()
+        self.assertEqual(record.status, 'late-check-in_early-check-out')
+        self.student.refresh_from_db()
+        self.assertFalse(self.student.is_checked_in)
+
+    def test_check_in_creates_missing_record_with_permission(self):
+        PermissionRequest.objects.create(
+            student=self.student,
+            schedule=self.schedule,
+            request_type='late_check_in',
+            reason='Traffic',
+            status='approved',
+            adjusted_time=timezone.localtime() + timedelta(minutes=30)
+        )
+        response = self.client.post('/api/v1/attendance/check-in/', self._payload(), format='json')
+        self.assertEqual(response.status_code, 200)
+        record = AttendanceRecord.objects.get(student=self.student, schedule=self.schedule)
+        self.assertEqual(record.status, 'late-excused')
+
+    def test_check_in_errors(self):
+        response = self.client.post('/api/v1/attendance/check-in/', self._payload(user_id=self.supervisor.id), format='json')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/api/v1/attendance/check-in/', self._payload(user_id=999999), format='json')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/api/v1/attendance/check-in/', self._payload(latitude=31.0), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['status'], 'fail')
+        self.assertEqual(response.data['nearest_branch']['id'], self.branch.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule.delete()
+        response = self.client.post('/api/v1/attendance/check-in/', self._payload(), format='json')
+        self.assertEqual(response.data['error_code'], 'no_schedule_today')
@@ -0,0 +1,118 @@
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..cohorts import _group_percentiles, cohort_report, load_snapshot
+from ..models import AttendanceRecord, Branch, Schedule, Session, Student, Track
+
+CustomUser = get_user_model()
+
+
+class GroupPercentilesTestCase(SimpleTestCase):
+    def test_matches_numpy_percentile_per_group(self):
+        rng = np.random.default_rng(7)
+        values = rng.random(200) * 100
+        groups = rng.integers(0, 4, 200)
+        result = _group_percentiles(values, groups, 5, (10, 50, 90))
+        for g in range(4):
+            np.testing.assert_allclose(result[g], np.percentile(values[groups == g], (10, 50, 90)))
+        self.assertTrue(np.isnan(result[4]).all())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CohortAnalyticsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = CustomUser.objects.create_user(
+            email='manager@example.com', password='pass123',
+            first_name='Mona', last_name='Manager', groups=['branch-manager']
+        )
+        self.admin = CustomUser.objects.create_user(
+            email='admin@example.com', password='pass123', first_name='Adam', last_name='Admin', groups=['admin']
+        )
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        branches = [
+            Branch.objects.create(
+                name=name, latitude=30.0722, longitude=31.0177, radius=100,
+                branch_manager=self.manager if name == "Smart Village" else None
+            )
+            for name in ("Smart Village", "Alexandria")
+        ]
+        self.today = timezone.localdate()
+        # Smart Village: 2 students at 2/2 and 1/2 days; Alexandria: 1 student at 0/2
+        plan = {0: [['late', 'attended'], ['attended', 'absent']], 1: [['excused', 'absent']]}
+        for b, branch in enumerate(branches):
+            track = Track.objects.create(
+                name=f"Track {b}", intake=45, supervisor=supervisor, start_date=self.today, default_branch=branch,
+                program_type='intensive' if b else 'nine_months'
+            )
+            schedules = []
+            for offset in (1, 2):
+                day = self.today - timedelta(days=offset)
+                schedule = Schedule.objects.create(name="Day", track=track, custom_branch=branch, created_at=day)
+                start = timezone.make_aware(datetime.combine(day, time(9)))
+                Session.objects.create(schedule=schedule, title="Lab", start_time=start, end_time=start + timedelta(hours=3))
+                schedules.append((schedule, start))
+            for s, statuses in enumerate(plan[b]):
+                user = CustomUser.objects.create_user(
+                    email=f'student{b}{s}@example.com', password='pass123',
+                    first_name='Student', last_name=f'Number {b}{s}', groups=['student']
+                )
+                student = Student.objects.create(user=user, track=track)
+                for (schedule, start), record_status in zip(schedules, statuses):
+                    checked_in = record_status in ('late', 'attended')
+                    AttendanceRecord.objects.create(
+                        student=student, schedule=schedule, status=record_status,
+                        check_in_time=start + timedelta(minutes=30 if record_status == 'late' else 10) if checked_in else None,
+                    )
+        # Another intake is left out
+        Track.objects.create(name="Old", intake=44, supervisor=supervisor, start_date=self.today, default_branch=branches[0])
+
+    def test_branch_report(self):
+        with self.assertNumQueries(3):
+            snapshot = load_snapshot(45)
+        self.assertEqual(len(snapshot.student), 6)
+        smart_village, alexandria = cohort_report([snapshot], group_by='branch')
+
+        self.assertEqual(smart_village['branch_name'], "Smart Village")
+        self.assertEqual((smart_village['students'], smart_village['records'], smart_village['attended']), (2, 4, 3))
+        self.assertEqual(smart_village['attendance_rate'], 75.0)
+        self.assertEqual(smart_village['late_rate'], 33.33)
+        self.assertEqual(smart_village['student_attendance_rate']['p50'], 75.0)
+        self.assertEqual(smart_village['student_attendance_rate']['histogram'][5], 1)
+        self.assertEqual(smart_village['check_in_delay_minutes']['mean'], 16.67)
+        self.assertEqual(smart_village['check_in_delay_minutes']['p50'], 10.0)
+
+        self.assertEqual(alexandria['attendance_rate'], 0.0)
+        self.assertEqual(alexandria['excused_ratio'], 50.0)
+        self.assertIsNone(alexandria['late_rate'])
+
+        by_program = {group['program_type']: group for group in cohort_report([snapshot], group_by='program_type')}
+        self.assertEqual(by_program['intensive']['records'], 2)
+        # Dates narrow the days counted
+        (intake,) = cohort_report([snapshot], group_by='intake', end_date=self.today - timedelta(days=2))
+        self.assertEqual((intake['intake'], intake['records'], intake['attended']), (45, 3, 1))
+
+    def test_endpoint_is_scoped_and_cached(self):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        url = '/api/v1/attendance/tracks/cohort-analytics/'
+        response = client.get(url, {'intake': '45,44', 'group_by': 'track'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([group['track_name'] for group in response.data['groups']], ["Track 0", "Track 1", "Old"])
+        self.assertEqual(response.data['groups'][2]['records'], 0)
+
+        client.force_authenticate(user=self.manager)
+        with self.assertNumQueries(3):  # Permission scope and the user's groups; the snapshots are cached
+            response = client.get(url, {'intake': '45,44', 'group_by': 'track'})
+        self.assertEqual([group['track_name'] for group in response.data['groups']], ["Track 0", "Old"])
+        self.assertEqual(client.get(url, {'group_by': 'track'}).status_code, 400)
+        self.assertEqual(client.get(url, {'intake': 45, 'group_by': 'month'}).status_code, 400)
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import Branch, Schedule, Session, Track
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class DayModalityTestCase(TestCase):
+    def setUp(self):
+        self.manager = CustomUser.objects.create_user(
+            email='manager@example.com', password='pass123',
+            first_name='Mona', last_name='Manager', groups=['branch-manager']
+        )
+        self.branch = Branch.objects.create(
+            name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100,
+            branch_manager=self.manager
+        )
+        self.today = timezone.localdate()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def _track(self, name):
+        return Track.objects.create(
+            name=name, intake=1, supervisor=self.manager, start_date=self.today, default_branch=self.branch
+        )
+
+    def _session(self, schedule, session_type):
+        start = timezone.now()
+        return Session.objects.create(
+            schedule=schedule, title=f"{session_type} session", start_time=start,
+            end_time=start + timedelta(hours=1), session_type=session_type
+        )
+
+    def _modality(self, schedule):
+        schedule.refresh_from_db()
+        return schedule.day_modality, schedule.online_session_count, schedule.offline_session_count
+
+    def test_sessions_keep_schedule_modality_current(self):
+        track = self._track("Computer Science")
+        yesterday = Schedule.objects.create(
+            name="Yesterday", track=track, custom_branch=self.branch, created_at=self.today - timedelta(days=1)
+        )
+        today = Schedule.objects.create(name="Today", track=track, custom_branch=self.branch, created_at=self.today)
+        self.assertEqual(self._modality(today), ('online', 0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            online = self._session(today, 'online')
+        self.assertEqual(self._modality(today), ('online', 1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            offline = self._session(today, 'offline')
+        self.assertEqual(self._modality(today), ('mixed', 1, 1))
+
+        # Moving a session recounts both schedules
+        with self.captureOnCommitCallbacks(execute=True):
+            online.schedule = yesterday
+            online.save()
+        self.assertEqual(self._modality(today), ('offline', 0, 1))
+        self.assertEqual(self._modality(yesterday), ('online', 1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            offline.delete()
+        self.assertEqual(self._modality(today), ('online', 0, 0))
+
+    def _branch_statistics(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/attendance/tracks/branch_statistics/')
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_branch_statistics_runs_fixed_queries(self):
+        first = self._track("Track 0")
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset, session_type in enumerate(['offline', 'online', 'online']):
+                schedule = Schedule.objects.create(
+                    name=f"Day {offset}", track=first, custom_branch=self.branch,
+                    created_at=self.today - timedelta(days=offset)
+                )
+                self._session(schedule, session_type)
+        data, single_track_queries = self._branch_statistics()
+        statistics = data[0]['statistics']
+        self.assertEqual(
+            (statistics['total_days'], statistics['online_days'], statistics['offline_days']), (3, 2, 1)
+        )
+        self.assertEqual(sum(month['total_days'] for month in statistics['monthly_summary']), 3)
+        self.assertEqual([day['type'] for day in data[0]['daily_data']], ['online', 'online', 'offline'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(1, 20):
+                schedule = Schedule.objects.create(
+                    name="Today", track=self._track(f"Track {i}"), custom_branch=self.branch, created_at=self.today
+                )
+                self._session(schedule, 'offline')
+                self._session(schedule, 'online')
+        data, many_track_queries = self._branch_statistics()
+        self.assertEqual(len(data), 20)
+        self.assertEqual(many_track_queries, single_track_queries)
+        mixed = next(track for track in data if track['track_name'] == "Track 1")
+        self.assertEqual(mixed['daily_data'][0]['type'], 'offline')
+        self.assertEqual(mixed['daily_data'][0]['modality'], 'mixed')
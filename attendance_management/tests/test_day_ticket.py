@@ -0,0 +1,139 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+
+from .. import write_behind
+from ..models import AttendanceRecord, Branch, PermissionRequest, Schedule, Session, Student, Track
+from ..schedule_index import invalidate_schedule_index
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class DayTicketTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_schedule_index(timezone.localdate())
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.student_user = CustomUser.objects.create_user(
+            email='student@example.com', password='pass123',
+            first_name='John', last_name='Doe', groups=['student']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=supervisor,
+            start_date=timezone.localdate(), default_branch=branch
+        )
+        self.student = Student.objects.create(user=self.student_user, track=track, phone_uuid='device-1')
+        self.schedule = Schedule.objects.create(
+            name="Today", track=track, custom_branch=branch, created_at=timezone.localdate()
+        )
+        now = timezone.localtime()
+        Session.objects.create(
+            schedule=self.schedule, title="Morning", instructor="Instructor",
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=2)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student_user)
+        self.payload = {'user_id': self.student_user.id, 'uuid': 'device-1', 'latitude': 30.0722, 'longitude': 31.0177}
+
+    def _ticket(self):
+        response = self.client.get('/api/v1/attendance/day-ticket/', {'uuid': 'device-1'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['ticket']
+
+    def _post(self, step, ticket):
+        return self.client.post(f'/api/v1/attendance/{step}/', {**self.payload, 'ticket': ticket}, format='json')
+
+    def test_ticket_check_in_and_out_without_reads(self):
+        ticket = self._ticket()
+        record = AttendanceRecord.objects.get(student=self.student, schedule=self.schedule)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post('check-in', ticket)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertFalse([q['sql'] for q in queries.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')])
+
+        record.refresh_from_db()
+        self.assertEqual(record.status, 'late-check-in')
+        self.assertTrue(Student.objects.get(pk=self.student.pk).is_checked_in)
+
+        # Past the retry de-duplication window, a second check-in is rejected by the conditional update
+        cache.clear()
+        response = self._post('check-in', ticket)
+        self.assertEqual(response.json()['error_code'], 'already_checked_in')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post('check-out', ticket)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')])
+        # Same payload as a check-out without a ticket
+        record.refresh_from_db()
+        self.assertEqual(parse_datetime(response.json()['check_in_time']), record.check_in_time)
+        self.assertEqual(
+            response.json()['attendance_duration_hours'],
+            round((record.check_out_time - record.check_in_time).total_seconds() / 3600, 2)
+        )
+        self.assertEqual(record.status, 'late-check-in_early-check-out')
+        self.assertFalse(Student.objects.get(pk=self.student.pk).is_checked_in)
+
+    def test_rejected_tickets(self):
+        ticket = self._ticket()
+
+        response = self._post('check-in', ticket[:-2] + 'xx')
+        self.assertEqual(response.json()['error_code'], 'invalid_day_ticket')
+
+        response = self.client.post('/api/v1/attendance/check-in/',
+                                    {**self.payload, 'latitude': 30.2, 'ticket': ticket}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'fail')
+
+        # A permission change retires tickets issued before it
+        with self.captureOnCommitCallbacks(execute=True):
+            PermissionRequest.objects.create(student=self.student, schedule=self.schedule,
+                                             request_type='late_check_in', status='approved')
+        response = self._post('check-in', ticket)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error_code'], 'stale_day_ticket')
+
+    def test_ticket_check_out_after_buffered_check_in(self):
+        ticket = self._ticket()
+        with tempfile.TemporaryDirectory() as tmpdir, override_settings(
+            ATTENDANCE_WRITE_BEHIND=True,
+            ATTENDANCE_WRITE_BEHIND_JOURNAL=os.path.join(tmpdir, 'checkin_journal.jsonl'),
+            ATTENDANCE_WRITE_BEHIND_FLUSH_MS=60000,
+            ATTENDANCE_WRITE_BEHIND_BATCH_SIZE=1000,
+        ):
+            write_behind._buffer = None
+            try:
+                # Checked in without the ticket: the check-in is only in the buffer
+                response = self.client.post('/api/v1/attendance/check-in/', self.payload, format='json')
+                self.assertEqual(response.status_code, 200)
+                record = AttendanceRecord.objects.get(student=self.student, schedule=self.schedule)
+                self.assertIsNone(record.check_in_time)
+
+                response = self._post('check-out', ticket)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['status'], 'success')
+
+                # Nothing is left for a later flush to write over the check-out
+                self.assertEqual(write_behind._buffer.flush(), 0)
+                record.refresh_from_db()
+                self.assertEqual(record.status, 'late-check-in_early-check-out')
+                self.assertFalse(Student.objects.get(pk=self.student.pk).is_checked_in)
+            finally:
+                write_behind._buffer.stop()
+                write_behind._buffer = None
@@ -0,0 +1,117 @@
+import csv
+import importlib.util
+import io
+from datetime import timedelta
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..exports import HEADER, export_rows, write_parquet
+from ..models import AttendanceRecord, Branch, Schedule, Student, Track
+
+CustomUser = get_user_model()
+
+URL = '/api/v1/attendance/export/'
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AttendanceExportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.today = timezone.localdate()
+        self.supervisors = []
+        for t in range(2):
+            supervisor = CustomUser.objects.create_user(
+                email=f'supervisor{t}@example.com', password='pass123',
+                first_name='Sara', last_name=f'Supervisor {t}', groups=['supervisor']
+            )
+            track = Track.objects.create(
+                name=f"Track {t}", intake=1, supervisor=supervisor, start_date=self.today, default_branch=branch
+            )
+            for offset in (0, 1):
+                schedule = Schedule.objects.create(
+                    name=f"Day {offset}", track=track, custom_branch=branch,
+                    created_at=self.today - timedelta(days=offset)
+                )
+                for i in range(2):
+                    user, _ = CustomUser.objects.get_or_create(
+                        email=f'student{t}{i}@example.com',
+                        defaults={'first_name': 'Student', 'last_name': f'Number {t}{i}'}
+                    )
+                    student, _ = Student.objects.get_or_create(user=user, track=track)
+                    AttendanceRecord.objects.create(
+                        student=student, schedule=schedule, status='attended' if i == 0 else 'absent',
+                        check_in_time=timezone.now() if i == 0 else None,
+                    )
+            self.supervisors.append(supervisor)
+
+    def _content(self, response):
+        """The body of a streaming response, read the way the ASGI handler reads it."""
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b''.join([part async for part in response.streaming_content])
+        return async_to_sync(read)()
+
+    def _csv(self, response):
+        return list(csv.DictReader(io.StringIO(self._content(response).decode())))
+
+    def test_csv_export_streams_the_callers_tracks(self):
+        client = APIClient()
+        client.force_authenticate(user=self.supervisors[0])
+        response = client.get(URL, {'start_date': self.today - timedelta(days=1), 'end_date': self.today})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = self._csv(response)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['track'] for row in rows}, {'Track 0'})
+        self.assertEqual(list(rows[0]), HEADER)
+        self.assertEqual(rows[0]['date'], (self.today - timedelta(days=1)).isoformat())
+
+        # Only today
+        response = client.get(URL, {'start_date': self.today, 'end_date': self.today})
+        self.assertEqual(len(self._csv(response)), 2)
+        # Someone else's track
+        other = Track.objects.get(name="Track 1")
+        response = client.get(URL, {'start_date': self.today, 'end_date': self.today, 'track_id': other.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(client.get(URL, {'start_date': 'yesterday'}).status_code, 400)
+
+    def test_rows_are_read_in_one_query(self):
+        rows = export_rows(self.today - timedelta(days=1), self.today)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(rows.iterator(chunk_size=3))), 8)
+
+    def test_management_command_writes_csv(self):
+        output = io.StringIO()
+        call_command(
+            'export_attendance', start_date=str(self.today), end_date=str(self.today), stdout=output, stderr=io.StringIO()
+        )
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(output.getvalue())))), 4)
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_parquet_export(self):
+        import pyarrow.parquet
+
+        output = io.BytesIO()
+        self.assertEqual(write_parquet(export_rows(self.today - timedelta(days=1), self.today), output, chunk_size=3), 8)
+        output.seek(0)
+        table = pyarrow.parquet.read_table(output)
+        self.assertEqual(table.column_names, HEADER)
+        self.assertEqual(table.num_rows, 8)
+
+        client = APIClient()
+        client.force_authenticate(user=self.supervisors[1])
+        response = client.get(URL, {'start_date': self.today, 'end_date': self.today, 'file_format': 'parquet'})
+        self.assertEqual(response.status_code, 200)
+        content = self._content(response)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        table = pyarrow.parquet.read_table(io.BytesIO(content))
+        self.assertEqual(table.column('track').to_pylist(), ['Track 1', 'Track 1'])
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ..geofence import BranchGeofence, haversine_distance
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    lat1_rad, lon1_rad, lat2_rad, lon2_rad = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2_rad - lat1_rad) / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin((lon2_rad - lon1_rad) / 2) ** 2
+    return 6371000 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class GeofenceTestCase(SimpleTestCase):
+    def setUp(self):
+        self.engine = BranchGeofence([
+            {'id': 1, 'name': 'Smart Village', 'latitude': 30.0722, 'longitude': 31.0177, 'radius': 100},
+            {'id': 2, 'name': 'New Capital', 'latitude': 30.0199, 'longitude': 31.7556, 'radius': 250},
+            {'id': 3, 'name': 'Alexandria', 'latitude': 31.2001, 'longitude': 29.9187, 'radius': 150},
+        ])
+
+    def test_matches_scalar_haversine(self):
+        self.assertAlmostEqual(
+            haversine_distance(30.0722, 31.0177, 30.0199, 31.7556),
+            scalar_haversine(30.0722, 31.0177, 30.0199, 31.7556),
+            places=6
+        )
+        latitudes = np.array([30.0, 30.5, 31.0])
+        longitudes = np.array([31.0, 30.5, 29.0])
+        distances = haversine_distance(latitudes, longitudes, 30.0722, 31.0177)
+        for lat, lon, distance in zip(latitudes, longitudes, distances):
+            self.assertAlmostEqual(distance, scalar_haversine(lat, lon, 30.0722, 31.0177), places=6)
+
+    def test_within_pairs_points_with_branches(self):
+        distances, inside = self.engine.within(
+            [1, 2, 3, 99],
+            [30.0722, 30.0722, 31.2005, 30.0],
+            [31.0178, 31.0177, 29.9187, 31.0],
+        )
+        self.assertEqual(inside.tolist(), [True, False, True, False])
+        self.assertTrue(np.isnan(distances[3]))
+
+    def test_nearest_and_containing(self):
+        positions, distances = self.engine.nearest([30.03, 31.21], [31.70, 29.90])
+        self.assertEqual(self.engine.ids[positions].tolist(), [2, 3])
+        self.assertAlmostEqual(distances[0], scalar_haversine(30.03, 31.70, 30.0199, 31.7556), delta=0.01)
+
+        positions, _ = self.engine.containing([30.0722, 30.03], [31.0177, 31.70])
+        self.assertEqual(positions.tolist(), [0, -1])
+        self.assertEqual(self.engine.describe(0)['name'], 'Smart Village')
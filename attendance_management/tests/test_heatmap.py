@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import AttendanceRecord, Branch, Schedule, Student, Track
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CalendarHeatmapTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.day = timezone.localdate() - timedelta(days=1)
+        self.tracks, self.records = [], []
+        with self.captureOnCommitCallbacks(execute=True):
+            for t in range(2):
+                track = Track.objects.create(
+                    name=f"Track {t}", intake=1, supervisor=self.supervisor,
+                    start_date=self.day, default_branch=branch
+                )
+                schedule = Schedule.objects.create(name="Yesterday", track=track, custom_branch=branch, created_at=self.day)
+                for i in range(2):
+                    user = CustomUser.objects.create_user(
+                        email=f'student{t}{i}@example.com', password='pass123',
+                        first_name='Student', last_name=f'Number {t}{i}', groups=['student']
+                    )
+                    student = Student.objects.create(user=user, track=track)
+                    self.records.append(AttendanceRecord.objects.create(
+                        student=student, schedule=schedule,
+                        check_in_time=timezone.now() - timedelta(days=1) if i == 0 else None,
+                        status='check-in' if i == 0 else 'absent',
+                    ))
+                self.tracks.append(track)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.supervisor)
+        self.url = '/api/v1/attendance/calendar/'
+
+    def _calendar(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_buckets_are_cached_and_invalidated(self):
+        params = {'track_id': self.tracks[0].id}
+        day = self.day.isoformat()
+        self.assertEqual(self._calendar(**params)['calendar'], {day: 50.0})
+        # Cached months only cost the track lookup
+        with self.assertNumQueries(1):
+            self.assertEqual(self._calendar(**params)['calendar'], {day: 50.0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            absent = self.records[1]
+            absent.check_in_time = timezone.now() - timedelta(days=1)
+            absent.save()
+        self.assertEqual(self._calendar(**params)['calendar'], {day: 100.0})
+
+        # A new student changes the denominator of every month
+        with self.captureOnCommitCallbacks(execute=True):
+            user = CustomUser.objects.create_user(
+                email='late-joiner@example.com', password='pass123',
+                first_name='Late', last_name='Joiner', groups=['student']
+            )
+            Student.objects.create(user=user, track=self.tracks[0])
+        self.assertEqual(self._calendar(**params)['calendar'], {day: 66.7})
+
+    def test_several_tracks_in_one_call(self):
+        data = self._calendar(track_ids=f"{self.tracks[0].id},{self.tracks[1].id}")
+        self.assertEqual(data['calendar'], {self.day.isoformat(): 50.0})
+        self.assertEqual(set(data['tracks']), {track.id for track in self.tracks})
+
+        response = self.client.get(self.url, {'track_ids': 'one,two'})
+        self.assertEqual(response.status_code, 400)
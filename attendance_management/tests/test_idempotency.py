@@ -0,0 +1,95 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import AttendanceRecord, Branch, Schedule, Session, Student, Track
+from ..schedule_index import invalidate_schedule_index
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class IdempotencyTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_schedule_index(timezone.localdate())
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.student_user = CustomUser.objects.create_user(
+            email='student@example.com', password='pass123',
+            first_name='John', last_name='Doe', groups=['student']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=supervisor,
+            start_date=timezone.localdate(), default_branch=branch
+        )
+        self.student = Student.objects.create(user=self.student_user, track=track, phone_uuid='device-1')
+        self.schedule = Schedule.objects.create(
+            name="Today", track=track, custom_branch=branch, created_at=timezone.localdate()
+        )
+        now = timezone.localtime()
+        Session.objects.create(
+            schedule=self.schedule, title="Morning", instructor="Instructor",
+            start_time=now, end_time=now + timedelta(hours=2)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student_user)
+        self.payload = {'user_id': self.student_user.id, 'uuid': 'device-1', 'latitude': 30.0722, 'longitude': 31.0177}
+
+    def _check_in(self, payload=None, **headers):
+        return self.client.post('/api/v1/attendance/check-in/', payload or self.payload, format='json', **headers)
+
+    def test_explicit_key_replays_stored_response(self):
+        first = self._check_in(HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(AttendanceRecord.objects.filter(student=self.student).count(), 1)
+
+        with self.assertNumQueries(0):
+            retry = self._check_in(HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+
+        reused = self._check_in(dict(self.payload, latitude=30.0723), HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(reused.data['error_code'], 'idempotency_key_reused')
+
+    def test_derived_key_only_replays_success(self):
+        outside = self._check_in(dict(self.payload, latitude=31.0))
+        self.assertEqual(outside.status_code, 400)
+
+        first = self._check_in()
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+
+        retry = self._check_in()
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_concurrent_duplicate_is_told_to_retry(self):
+        key = f"idempotency:check-in:{self.student_user.pk}:xyz"
+        fingerprint = hashlib.sha256(json.dumps(self.payload, sort_keys=True).encode()).hexdigest()
+        cache.add(f"{key}:lock", 1, 30)
+
+        with self.assertNumQueries(0):
+            response = self._check_in(HTTP_IDEMPOTENCY_KEY='xyz')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['error_code'], 'request_in_progress')
+        self.assertEqual(response['Retry-After'], '1')
+
+        # The first request finishes; the retry gets its response
+        cache.set(f"{key}:result", {'status': 200, 'data': {'status': 'success'}, 'fingerprint': fingerprint}, 60)
+        cache.delete(f"{key}:lock")
+        with self.assertNumQueries(0):
+            response = self._check_in(HTTP_IDEMPOTENCY_KEY='xyz')
+        self.assertEqual(response.data, {'status': 'success'})
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
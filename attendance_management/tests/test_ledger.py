@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..ledger import student_ledger
+from ..models import (
+    AttendanceRecord, Branch, PermissionRequest, Schedule, Session, Student, StudentAttendanceLedger, Track
+)
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StudentAttendanceLedgerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.today = timezone.localdate()
+        track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=supervisor, start_date=self.today, default_branch=branch
+        )
+        self.user = CustomUser.objects.create_user(
+            email='student@example.com', password='pass123',
+            first_name='Student', last_name='One', groups=['student']
+        )
+        self.student = Student.objects.create(user=self.user, track=track)
+        self.schedules, self.records = {}, {}
+        with self.captureOnCommitCallbacks(execute=True):
+            # Checked in 3 days ago; absent 2 days ago and yesterday; today still open
+            for offset, checked_in in ((3, True), (2, False), (1, False), (0, False)):
+                day = self.today - timedelta(days=offset)
+                schedule = Schedule.objects.create(name=f"Day {offset}", track=track, custom_branch=branch, created_at=day)
+                start = timezone.make_aware(datetime.combine(day, time(9)))
+                Session.objects.create(schedule=schedule, title="Lab", start_time=start, end_time=start + timedelta(hours=3))
+                self.schedules[offset] = schedule
+                self.records[offset] = AttendanceRecord.objects.create(
+                    student=self.student, schedule=schedule,
+                    check_in_time=start if checked_in else None, status='attended' if checked_in else 'absent',
+                )
+
+    def _counts(self):
+        ledger = student_ledger(self.student.pk)
+        return ledger.total_days, ledger.attended_days, ledger.excused_absences, ledger.unexcused_absences
+
+    def test_ledger_follows_attendance_changes(self):
+        self.assertEqual(self._counts(), (4, 1, 0, 2))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.student.get_unexcused_absence_count(), 2)
+
+        # An approved day excuse moves an absence from unexcused to excused
+        with self.captureOnCommitCallbacks(execute=True):
+            PermissionRequest.objects.create(
+                student=self.student, schedule=self.schedules[2], request_type='day_excuse', status='approved'
+            )
+        self.assertEqual(self._counts(), (4, 1, 1, 1))
+        self.assertEqual(self.student.get_excused_absence_count(), 1)
+
+        # A late check-in
+        with self.captureOnCommitCallbacks(execute=True):
+            record = self.records[1]
+            record.check_in_time = timezone.now()
+            record.status = 'late'
+            record.save()
+        self.assertEqual(self._counts(), (4, 2, 1, 0))
+        self.assertEqual(student_ledger(self.student.pk).late_days, 1)
+
+        # A day without sessions is not counted
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedules[3].sessions.all().delete()
+        self.assertEqual(self._counts(), (3, 1, 1, 0))
+
+    def test_ledger_recounts_on_a_new_day(self):
+        self.assertEqual(self._counts(), (4, 1, 0, 2))
+        # Counted yesterday: today's open day was not an absence yet
+        StudentAttendanceLedger.objects.filter(pk=self.student.pk).update(as_of=self.today - timedelta(days=1))
+        self.assertEqual(self._counts(), (4, 1, 0, 2))
+        self.assertEqual(StudentAttendanceLedger.objects.get(pk=self.student.pk).as_of, self.today)
+
+    def test_warning_threshold_and_stats_read_the_ledger(self):
+        self.assertEqual(self.student.has_exceeded_warning_threshold(), (True, 'unexcused'))
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get('/api/v1/attendance/attendance-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['total_days'], response.data['total_attended'], response.data['unexcused_absences']),
+            (4, 1, 2)
+        )
+
+    def test_rebuild_command(self):
+        StudentAttendanceLedger.objects.create(student=self.student, as_of=self.today, is_stale=False)
+        call_command('rebuild_attendance_ledger', stdout=StringIO())
+        ledger = StudentAttendanceLedger.objects.get(pk=self.student.pk)
+        self.assertEqual((ledger.total_days, ledger.unexcused_absences, ledger.is_stale), (4, 2, False))
@@ -0,0 +1,276 @@
+"""
+Query budgets for the API's read endpoints.
+
+Every GET endpoint the routers in core/urls.py expose is requested at three
+data sizes - 1, 10 and 100 students, schedules, events and lost-and-found
+items - and must run the same number of SQL queries at each size, within its
+budget in ENDPOINTS. A query count that grows with the data is an N+1 in a
+serializer or a per-row loop in a view.
+
+The suite prints a report of queries, time and rows per endpoint and size;
+run it on its own to read it:
+
+    python manage.py test attendance_management.tests.test_query_budgets
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from lost_and_found_system.models import FoundItem, LostItem, MatchedItem, Notification
+from ..schedule_index import invalidate_schedule_index
+from ..models import (
+    AttendanceRecord, Branch, Coordinator, Event, EventAttendanceRecord, Guest, PermissionRequest, Schedule, Session,
+    Student, Track
+)
+
+CustomUser = get_user_model()
+
+SIZES = (1, 10, 100)
+
+# (endpoint, role, path, query budget). Paths are relative to /api/v1/attendance/ unless absolute; see
+# QueryBudgetTestCase.seed for the placeholders.
+ENDPOINTS = [
+    # attendance_management: schedules, sessions, students, tracks, branches
+    ('schedules', 'supervisor', 'schedules/', 5),
+    ('sessions', 'supervisor', 'sessions/', 4),
+    ('sessions/today-by-track', 'student', 'sessions/today-by-track/?track_id={track}', 5),
+    ('sessions/calendar-data', 'supervisor', 'sessions/calendar-data/?track_id={track}', 5),
+    ('students', 'supervisor', 'students/', 4),
+    ('students/by-user-id', 'supervisor', 'students/by-user-id/?userId={student}', 3),
+    ('students/with-warnings', 'supervisor', 'students/with-warnings/', 4),
+    ('tracks', 'admin', 'tracks/', 4),
+    ('tracks/branch_statistics', 'branch-manager', 'tracks/branch_statistics/', 6),
+    ('tracks/cohort-analytics', 'admin', 'tracks/cohort-analytics/?intake=1', 6),
+    ('branches', 'admin', 'branches/', 5),
+    ('branches/own-branch', 'branch-manager', 'branches/own-branch/', 4),
+    ('permission-requests', 'supervisor', 'permission-requests/', 6),
+    # events
+    ('events', 'admin', 'events/', 6),
+    ('events/events-for-registration', 'guest', 'events/events-for-registration/', 3),
+    ('events/attendance_stats', 'guest', 'events/attendance_stats/', 4),
+    ('events/todays-schedule', 'guest', 'events/todays-schedule/', 7),
+    ('events/upcoming-records', 'guest', 'events/upcoming-records/', 7),
+    # attendance
+    ('status', 'student', 'status/', 1),
+    ('supervisor-attendance', 'supervisor', 'supervisor-attendance/', 10),
+    ('attendance-percentage/today', 'supervisor', 'attendance-percentage/today/', 4),
+    ('attendance-percentage/weekly', 'supervisor', 'attendance-percentage/weekly/', 5),
+    ('attendance-trends', 'supervisor', 'attendance-trends/', 5),
+    ('todays-schedule', 'student', 'todays-schedule/', 7),
+    ('upcoming-records', 'student', 'upcoming-records/', 4),
+    ('upcoming-records-gt', 'student', 'upcoming-records-gt/', 4),
+    ('weekly-breakdown', 'supervisor', 'weekly-breakdown/', 7),
+    ('recent-absences', 'supervisor', 'recent-absences/', 4),
+    ('calendar', 'supervisor', 'calendar/', 3),
+    ('student-attendance', 'student', 'student-attendance/', 5),
+    ('student-history', 'supervisor', '{student}/student-history/', 9),
+    ('student-attendance-summary', 'student', 'student-attendance-summary/', 2),
+    ('attendance-stats', 'student', 'attendance-stats/', 4),
+    # (+2: the savepoint the cursor is read in, a BEGIN/COMMIT outside the test's transaction)
+    ('export', 'supervisor', 'export/?start_date={start}&end_date={today}', 5),
+    ('settings/absence-thresholds', 'admin', 'settings/absence-thresholds/', 4),
+    # users
+    ('accounts/groups', 'admin', '/api/v1/accounts/groups/', 5),
+    ('accounts/users', 'admin', '/api/v1/accounts/users/', 7),
+    ('accounts/users/students', 'admin', '/api/v1/accounts/users/students/', 7),
+    ('accounts/users/branch-managers', 'admin', '/api/v1/accounts/users/branch-managers/', 7),
+    ('accounts/users/supervisors', 'admin', '/api/v1/accounts/users/supervisors/', 6),
+    ('accounts/users/admins', 'admin', '/api/v1/accounts/users/admins/', 7),
+    ('accounts/users/admins-and-supervisors', 'admin', '/api/v1/accounts/users/admins-and-supervisors/', 6),
+    ('accounts/users/photo', 'student', '/api/v1/accounts/users/photo/', 0),
+    ('accounts/users/profile', 'student', '/api/v1/accounts/users/profile/', 1),
+    ('accounts/students', 'supervisor', '/api/v1/accounts/students/', 9),
+    ('accounts/coordinators', 'admin', '/api/v1/accounts/coordinators/', 7),
+    ('accounts/guests', 'admin', '/api/v1/accounts/guests/', 6),
+    # lost_and_found_system
+    ('lost-and-found', 'admin', '/api/v1/lost-and-found/', 2),
+    ('lost-and-found/lost-items', 'admin', '/api/v1/lost-and-found/lost-items/', 2),
+    ('lost-and-found/found-items', 'admin', '/api/v1/lost-and-found/found-items/', 2),
+    ('lost-and-found/found-items/my_found_items', 'student', '/api/v1/lost-and-found/found-items/my_found_items/', 2),
+    ('lost-and-found/matched-items', 'admin', '/api/v1/lost-and-found/matched-items/', 2),
+    ('lost-and-found/notifications', 'student', '/api/v1/lost-and-found/notifications/', 1),
+    ('lost-and-found/notifications/unread', 'student', '/api/v1/lost-and-found/notifications/unread/', 1),
+]
+
+
+def _streamed(response):
+    """The body of a streaming response, read the way the ASGI handler reads it."""
+    if not response.is_async:
+        return b''.join(response.streaming_content)
+
+    async def read():
+        return b''.join([part async for part in response.streaming_content])
+    return async_to_sync(read)()
+
+
+def _rows(response):
+    """How many rows the endpoint returned: list items, page results or CSV lines."""
+    if getattr(response, 'streaming', False):
+        return max(_streamed(response).count(b'\n') - 1, 0)
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return len(data['results'])
+    if isinstance(data, list):
+        return len(data)
+    return 1
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class QueryBudgetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        cls.users = {
+            role: CustomUser.objects.create_user(
+                email=f'{role}@example.com', password='pass123',
+                first_name=role.title(), last_name='User', groups=[role], is_staff=role == 'admin',
+            )
+            for role in ('admin', 'branch-manager', 'coordinator', 'supervisor', 'guest')
+        }
+        cls.branch.branch_manager = cls.users['branch-manager']
+        cls.branch.save()
+        Coordinator.objects.create(user=cls.users['coordinator'], branch=cls.branch)
+        Guest.objects.create(user=cls.users['guest'])
+
+    def seed(self, size):
+        """`size` students, schedules, events and lost-and-found items; returns the path placeholders."""
+        today = timezone.localdate()
+        supervisor = self.users['supervisor']
+        tracks = [
+            Track.objects.create(
+                name=f"Track {t}", intake=1, supervisor=supervisor, start_date=today - timedelta(days=size),
+                default_branch=self.branch, description='',
+            )
+            for t in range(max(1, size // 10))
+        ]
+        students = [
+            Student.objects.create(
+                user=CustomUser.objects.create_user(
+                    email=f'student{n}@example.com', password='pass123',
+                    first_name='Student', last_name=f'Number {n}', groups=['student'],
+                ),
+                track=tracks[n % len(tracks)],
+            )
+            for n in range(size)
+        ]
+        # `size` schedules spread over the tracks, today and the days before
+        schedules = Schedule.objects.bulk_create(
+            Schedule(name=f"Day {n}", track=tracks[n % len(tracks)], custom_branch=self.branch,
+                     created_at=today - timedelta(days=n // len(tracks)))
+            for n in range(size)
+        )
+        sessions = []
+        for schedule in schedules:
+            # From midnight, so today's sessions have started whatever time the suite runs
+            start = timezone.make_aware(datetime.combine(schedule.created_at, datetime.min.time()))
+            sessions += [
+                Session(schedule=schedule, title="Lecture", start_time=start, end_time=start + timedelta(hours=2)),
+                Session(schedule=schedule, title="Lab", start_time=start + timedelta(hours=3),
+                        end_time=start + timedelta(hours=5), session_type='online'),
+            ]
+        Session.objects.bulk_create(sessions)
+        AttendanceRecord.objects.bulk_create(
+            AttendanceRecord(
+                student=student, schedule=schedule, status='attended' if n % 2 else 'absent',
+                check_in_time=timezone.now() if n % 2 else None,
+            )
+            for n, student in enumerate(students)
+            for schedule in schedules if schedule.track_id == student.track_id
+        )
+        PermissionRequest.objects.bulk_create(
+            PermissionRequest(student=student, schedule=schedule, request_type='day_excuse')
+            for student in students
+            for schedule in schedules[:len(tracks)] if schedule.track_id == student.track_id
+        )
+
+        # `size` events from today on, each with a registered student and guest
+        guest = self.users['guest'].guest_profile
+        events = []
+        for n in range(size):
+            event = Event.objects.create(audience_type='both', description='')
+            event.target_tracks.set(tracks)
+            schedule = Schedule.objects.create(
+                name=f"Event {n}", custom_branch=self.branch, created_at=today + timedelta(days=n), event=event
+            )
+            start = timezone.make_aware(datetime.combine(schedule.created_at, datetime.min.time())) + timedelta(hours=10)
+            Session.objects.create(schedule=schedule, title="Talk", start_time=start, end_time=start + timedelta(hours=1))
+            EventAttendanceRecord.objects.create(schedule=schedule, student=students[n], status='registered')
+            EventAttendanceRecord.objects.create(schedule=schedule, guest=guest, status='registered')
+            events.append(event)
+
+        # `size` lost, found and matched items and notifications for the measured student
+        owner = students[0].user
+        lost = LostItem.objects.bulk_create(
+            LostItem(name=f"Lost {n}", description="A black bag", place="Lab 1", user=owner) for n in range(size)
+        )
+        found = FoundItem.objects.bulk_create(
+            FoundItem(name=f"Found {n}", description="A black bag", place="Lab 2", user=owner) for n in range(size)
+        )
+        matches = MatchedItem.objects.bulk_create(
+            MatchedItem(lost_item=lost_item, found_item=found_item, similarity_score=50)
+            for lost_item, found_item in zip(lost, found)
+        )
+        Notification.objects.bulk_create(
+            Notification(user=owner, message=f"Match {n}", matched_item=match) for n, match in enumerate(matches)
+        )
+        self.users['student'] = owner
+        return {
+            'student': owner.pk, 'track': tracks[0].pk,
+            'start': (today - timedelta(days=size)).isoformat(), 'today': today.isoformat(),
+        }
+
+    def measure(self, size):
+        """{endpoint: (queries, seconds, rows, HTTP status)} at `size`."""
+        results = {}
+        with transaction.atomic():
+            placeholders = self.seed(size)
+            for name, role, path, _ in ENDPOINTS:
+                url = path.format(**placeholders)
+                if not url.startswith('/'):
+                    url = f'/api/v1/attendance/{url}'
+                client = APIClient()
+                # A fresh user each time: a shared one carries cached relations from earlier requests
+                client.force_authenticate(user=CustomUser.objects.get(pk=self.users[role].pk))
+                # Cold caches: every request pays for its cached lookups
+                cache.clear()
+                invalidate_schedule_index(timezone.localdate())
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    rows = _rows(response)
+                    elapsed = time.perf_counter() - started
+                results[name] = (len(queries), elapsed, rows, response.status_code)
+            transaction.set_rollback(True)
+        return results
+
+    def report(self, results):
+        lines = [
+            '',
+            f"{'endpoint':<44}{'budget':>7}" + ''.join(f"{f'q@{size}':>7}{f'ms@{size}':>9}{f'rows@{size}':>10}" for size in SIZES),
+        ]
+        for name, _, _, budget in ENDPOINTS:
+            lines.append(f'{name:<44}{budget:>7}' + ''.join(
+                f'{results[size][name][0]:>7}{results[size][name][1] * 1000:>9.1f}{results[size][name][2]:>10}'
+                for size in SIZES
+            ))
+        sys.stderr.write('\n'.join(lines) + '\n')
+
+    def test_queries_do_not_grow_with_data_size(self):
+        results = {size: self.measure(size) for size in SIZES}
+        self.report(results)
+        for name, _, _, budget in ENDPOINTS:
+            with self.subTest(endpoint=name):
+                statuses = [results[size][name][3] for size in SIZES]
+                self.assertEqual(statuses, [200] * len(SIZES), f"{name} did not answer 200: {statuses}")
+                counts = [results[size][name][0] for size in SIZES]
+                self.assertEqual(len(set(counts)), 1, f"{name} grows with data size: {counts}")
+                self.assertLessEqual(counts[0], budget, f"{name} is over its budget of {budget} queries")
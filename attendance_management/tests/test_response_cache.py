@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import AttendanceRecord, Branch, Schedule, Student, Track
+
+CustomUser = get_user_model()
+
+URL = '/api/v1/attendance/attendance-percentage/today/'
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        today = timezone.localdate()
+        self.clients, self.records = [], []
+        with self.captureOnCommitCallbacks(execute=True):
+            for t in range(2):
+                supervisor = CustomUser.objects.create_user(
+                    email=f'supervisor{t}@example.com', password='pass123',
+                    first_name='Sara', last_name=f'Supervisor {t}', groups=['supervisor']
+                )
+                track = Track.objects.create(
+                    name=f"Track {t}", intake=1, supervisor=supervisor, start_date=today, default_branch=branch
+                )
+                schedule = Schedule.objects.create(name="Today", track=track, custom_branch=branch, created_at=today)
+                user = CustomUser.objects.create_user(
+                    email=f'student{t}@example.com', password='pass123',
+                    first_name='Student', last_name=f'Number {t}', groups=['student']
+                )
+                student = Student.objects.create(user=user, track=track)
+                self.records.append(AttendanceRecord.objects.create(student=student, schedule=schedule, status='absent'))
+                client = APIClient()
+                client.force_authenticate(user=supervisor)
+                self.clients.append(client)
+
+    def test_unchanged_dashboard_revalidates_with_304(self):
+        client = self.clients[0]
+        response = client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # The caller's scope is cached, so revalidating does not touch the database
+        with self.assertNumQueries(0):
+            response = client.get(URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # Another role scope gets its own entry
+        self.assertNotEqual(self.clients[1].get(URL)['ETag'], etag)
+        # Query parameters are part of the key
+        self.assertNotEqual(client.get(URL, {'track_id': 1})['ETag'], etag)
+
+    def test_attendance_write_changes_etag(self):
+        client = self.clients[0]
+        etag = client.get(URL)['ETag']
+        other_etag = self.clients[1].get(URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record = self.records[0]
+            record.check_in_time = timezone.now()
+            record.status = 'check-in'
+            record.save()
+
+        response = client.get(URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['attended_students'], 1)
+        # The other track's dashboard is untouched
+        self.assertEqual(self.clients[1].get(URL, HTTP_IF_NONE_MATCH=other_etag).status_code, 304)
@@ -0,0 +1,170 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .. import stale_marks
+from ..models import (
+    AttendanceRecord, Branch, DailyTrackAttendance, Schedule, Session, Student, StudentAttendanceLedger, Track
+)
+from ..ledger import student_ledgers
+from ..rollups import daily_rollup, rebuild_rollup
+from ..schedule_index import get_schedule_index, invalidate_schedule_index
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class DailyTrackAttendanceTestCase(TestCase):
+    def setUp(self):
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=self.supervisor,
+            start_date=timezone.localdate(), default_branch=branch
+        )
+        self.today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule = Schedule.objects.create(name="Today", track=self.track, custom_branch=branch, created_at=self.today)
+            self.students = []
+            for i in range(4):
+                user = CustomUser.objects.create_user(
+                    email=f'student{i}@example.com', password='pass123',
+                    first_name='Student', last_name=f'Number {i}', groups=['student']
+                )
+                student = Student.objects.create(user=user, track=self.track)
+                self.students.append(student)
+            now = timezone.localtime()
+            statuses = [(now, 'check-in'), (now, 'late-check-in'), (None, 'excused'), (None, 'absent')]
+            self.records = [
+                AttendanceRecord.objects.create(student=student, schedule=self.schedule, check_in_time=at, status=status)
+                for student, (at, status) in zip(self.students, statuses)
+            ]
+
+    def _counts(self):
+        row, = daily_rollup([self.track.id], self.today)
+        return row.expected_count, row.checked_in_count, row.late_count, row.excused_count, row.absent_count
+
+    def test_rows_follow_record_changes(self):
+        self.assertEqual(self._counts(), (4, 2, 1, 1, 1))
+        # Fresh rows are read with a single query
+        with self.assertNumQueries(1):
+            self._counts()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            absent = self.records[3]
+            absent.check_in_time = timezone.localtime()
+            absent.status = 'late-check-in'
+            absent.save()
+        self.assertTrue(DailyTrackAttendance.objects.get(track=self.track, date=self.today).is_stale)
+        self.assertEqual(self._counts(), (4, 3, 2, 1, 0))
+
+        # Moving the schedule moves its row
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule.created_at = self.today - timedelta(days=1)
+            self.schedule.save()
+        self.assertEqual(daily_rollup([self.track.id], self.today), [])
+        self.assertEqual(len(daily_rollup([self.track.id], self.today - timedelta(days=1))), 1)
+
+    def test_writes_in_one_transaction_share_one_stale_mark(self):
+        self._counts()
+        with self.captureOnCommitCallbacks() as callbacks:
+            for record in self.records:
+                record.status = 'attended'
+                record.save(update_fields=['status'])
+        # One UPDATE for the rollup rows and one for the ledgers, however many records were saved
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(DailyTrackAttendance.objects.get(track=self.track, date=self.today).is_stale)
+
+    def test_rebuild_and_dashboard(self):
+        # Changes made without signals are picked up by a rebuild
+        AttendanceRecord.objects.filter(pk=self.records[2].pk).update(status='absent')
+        DailyTrackAttendance.objects.all().delete()
+        self.assertEqual(rebuild_rollup(self.today, self.today), (1, 0))
+        self.assertEqual(self._counts(), (4, 2, 1, 0, 2))
+
+        client = APIClient()
+        client.force_authenticate(user=self.supervisor)
+        response = client.get('/api/v1/attendance/attendance-percentage/today/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_students'], 4)
+        self.assertEqual(response.data['attended_students'], 2)
+        self.assertEqual(response.data['attendance_percentage'], 50.0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, ATTENDANCE_STALE_MARK_INTERVAL_MS=60000)
+class DeferredStaleMarksTestCase(TransactionTestCase):
+    """Check-in in autocommit, as in production: no stale-mark UPDATEs on the request."""
+
+    def setUp(self):
+        # The writer thread is parked (long interval) so the test drives flushes itself
+        stale_marks._marks = None
+        cache.clear()
+        invalidate_schedule_index(timezone.localdate())
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.student_user = CustomUser.objects.create_user(
+            email='student@example.com', password='pass123',
+            first_name='John', last_name='Doe', groups=['student']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=supervisor,
+            start_date=timezone.localdate(), default_branch=branch
+        )
+        self.student = Student.objects.create(user=self.student_user, track=self.track, phone_uuid='device-1')
+        schedule = Schedule.objects.create(name="Today", track=self.track, custom_branch=branch, created_at=timezone.localdate())
+        now = timezone.localtime()
+        Session.objects.create(
+            schedule=schedule, title="Morning", instructor="Instructor",
+            start_time=now, end_time=now + timedelta(hours=2)
+        )
+        AttendanceRecord.objects.create(student=self.student, schedule=schedule)
+        # Start from fresh rows, so the marks the check-in leaves are visible
+        daily_rollup([self.track.id], timezone.localdate())
+        student_ledgers([self.student.id])
+        DailyTrackAttendance.objects.update(is_stale=False)
+        StudentAttendanceLedger.objects.update(is_stale=False)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student_user)
+
+    def tearDown(self):
+        if stale_marks._marks is not None:
+            stale_marks._marks.stop()
+            stale_marks._marks = None
+
+    def test_check_in_defers_stale_marks(self):
+        get_schedule_index(timezone.localdate())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/v1/attendance/check-in/', {
+                'user_id': self.student_user.id,
+                'uuid': 'device-1',
+                'latitude': 30.0722,
+                'longitude': 31.0177,
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([query for query in sql if 'dailytrackattendance' in query or 'studentattendanceledger' in query])
+        # Context, permissions, record and student: the stale marks are left to the writer thread
+        self.assertEqual(len(sql), 4, sql)
+
+        self.assertFalse(DailyTrackAttendance.objects.get(track=self.track).is_stale)
+        # Readers in the process write the pending marks before loading rows
+        row, = daily_rollup([self.track.id], timezone.localdate())
+        self.assertEqual(row.checked_in_count, 1)
+        self.assertTrue(StudentAttendanceLedger.objects.get(student=self.student).is_stale)
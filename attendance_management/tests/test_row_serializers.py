@@ -0,0 +1,128 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from lost_and_found_system.models import FoundItem, LostItem, MatchedItem, Notification
+from lost_and_found_system.serializers import NotificationSerializer, notification_rows
+
+from ..models import (
+    AttendanceRecord, Branch, Event, EventAttendanceRecord, PermissionRequest, Schedule, Session, Student, Track
+)
+from ..row_serializers import attendance_record_rows, event_rows, student_record_rows
+from ..serializers import (
+    AttendanceRecordSerializer, AttendanceRecordSerializerForStudents, EventAttendanceRecordSerializerForStudents,
+    EventSerializer, prefetch_attendance_records, prefetch_student_records
+)
+from ..settings_models import ApplicationSetting
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RowSerializersTestCase(TestCase):
+    """Every row builder renders the same JSON as the serializer it stands in for."""
+
+    def setUp(self):
+        cache.clear()
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.today = timezone.localdate()
+        self.track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=supervisor, start_date=self.today, default_branch=self.branch
+        )
+        ApplicationSetting.objects.create(key='unexcused_absence_threshold', value='2')
+        self.students = []
+        for n in range(3):
+            user = CustomUser.objects.create_user(
+                email=f'student{n}@example.com', password='pass123',
+                first_name='Student', last_name=f'Number {n}', groups=['student']
+            )
+            self.students.append(Student.objects.create(user=user, track=self.track))
+        for offset in (2, 1, 0):
+            day = self.today - timedelta(days=offset)
+            schedule = Schedule.objects.create(name=f"Day {offset}", track=self.track, custom_branch=self.branch, created_at=day)
+            start = timezone.make_aware(datetime.combine(day, time(9)))
+            for hours, title in ((0, "Lecture"), (3, "Lab")):
+                Session.objects.create(
+                    schedule=schedule, title=title,
+                    start_time=start + timedelta(hours=hours), end_time=start + timedelta(hours=hours + 2)
+                )
+            # Checked in; absent with a pending then an approved late check-in; absent
+            for student, checked_in in zip(self.students, (True, False, False)):
+                AttendanceRecord.objects.create(
+                    student=student, schedule=schedule, status='attended' if checked_in else 'absent',
+                    check_in_time=start + timedelta(minutes=5) if checked_in else None,
+                )
+            for request_status in ('pending', 'approved'):
+                PermissionRequest.objects.create(
+                    student=self.students[1], schedule=schedule, request_type='late_check_in',
+                    adjusted_time=start + timedelta(minutes=30), status=request_status,
+                )
+        # Schedules with no sessions and no track
+        empty = Schedule.objects.create(name="Empty", track=None, custom_branch=self.branch, created_at=self.today - timedelta(days=3))
+        AttendanceRecord.objects.create(student=self.students[0], schedule=empty, status='absent')
+
+    def assertRendersSame(self, rows, data):
+        self.assertEqual(JSONRenderer().render(rows), JSONRenderer().render(data))
+
+    def test_attendance_record_rows(self):
+        records = AttendanceRecord.objects.order_by('id')
+        expected = AttendanceRecordSerializer(prefetch_attendance_records(records), many=True).data
+        self.assertRendersSame(attendance_record_rows(records), expected)
+        self.assertEqual({row['warning_status'] for row in expected}, {None, 'unexcused'})
+
+    def test_student_record_rows(self):
+        student = self.students[1]
+        records = AttendanceRecord.objects.filter(student=student).order_by('-schedule__created_at')
+        expected = AttendanceRecordSerializerForStudents(prefetch_student_records(records, student=student), many=True).data
+        self.assertRendersSame(student_record_rows(records), expected)
+
+        records = AttendanceRecord.objects.filter(student=self.students[0]).order_by('-schedule__created_at')
+        expected = AttendanceRecordSerializerForStudents(prefetch_student_records(records), many=True).data
+        self.assertRendersSame(student_record_rows(records), expected)
+        self.assertIsNone(expected[-1]['schedule']['track'])
+
+    def test_event_rows(self):
+        speaker_event = Event.objects.create(audience_type='both', description='Talks', is_mandatory=True)
+        speaker_event.target_tracks.set([self.track])
+        schedule = Schedule.objects.create(
+            name="Career Day", custom_branch=self.branch, created_at=self.today + timedelta(days=1), event=speaker_event,
+        )
+        start = timezone.make_aware(datetime.combine(self.today, time(13)))
+        for title in ("Keynote", "Panel"):
+            Session.objects.create(
+                schedule=schedule, title=title, instructor="Guest Speaker", start_time=start, end_time=start + timedelta(hours=1)
+            )
+        EventAttendanceRecord.objects.create(schedule=schedule, student=self.students[0], status='registered')
+        Event.objects.create(description=None)  # No schedule yet
+
+        events = Event.objects.order_by('id')
+        expected = EventSerializer(events, many=True).data
+        self.assertRendersSame(event_rows(events), expected)
+        self.assertIsNone(expected[1]['title'])
+
+        records = EventAttendanceRecord.objects.filter(student__user=self.students[0].user).order_by('schedule__created_at')
+        expected = EventAttendanceRecordSerializerForStudents(
+            prefetch_student_records(records, student=self.students[0]), many=True
+        ).data
+        self.assertRendersSame(student_record_rows(records), expected)
+
+    def test_notification_rows(self):
+        owner = self.students[0].user
+        match = MatchedItem.objects.create(
+            lost_item=LostItem.objects.create(name="Bag", description="A black bag", place="Lab 1", user=owner),
+            found_item=FoundItem.objects.create(name="Bag", description="A black bag", place="Lab 2", user=owner),
+            similarity_score=50,
+        )
+        Notification.objects.create(user=owner, message="Possible match", matched_item=match)
+        Notification.objects.create(user=owner, message="Welcome", is_read=True)
+
+        notifications = Notification.objects.order_by('id')
+        self.assertRendersSame(notification_rows(notifications), NotificationSerializer(notifications, many=True).data)
@@ -0,0 +1,91 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import AttendanceRecord, Branch, PermissionRequest, Schedule, Session, Student, Track
+from ..serializers import ScheduleSerializer
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ScheduleAnnotationsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.today = timezone.localdate()
+        self.track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=self.supervisor, start_date=self.today, default_branch=self.branch
+        )
+        self.students = []
+        for n in range(3):
+            user = CustomUser.objects.create_user(
+                email=f'student{n}@example.com', password='pass123',
+                first_name='Student', last_name=f'Number {n}', groups=['student']
+            )
+            self.students.append(Student.objects.create(user=user, track=self.track))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.supervisor)
+
+    def _add_schedules(self, count):
+        for _ in range(count):
+            day = self.today - timedelta(days=Schedule.objects.count())
+            schedule = Schedule.objects.create(name=f"Day {day}", track=self.track, custom_branch=self.branch, created_at=day)
+            start = timezone.make_aware(datetime.combine(day, time(9)))
+            for hours, title in ((0, "Lecture"), (3, "Lab")):
+                Session.objects.create(
+                    schedule=schedule, title=title,
+                    start_time=start + timedelta(hours=hours), end_time=start + timedelta(hours=hours + 2)
+                )
+            # Two of three students checked in
+            for student in self.students:
+                AttendanceRecord.objects.create(
+                    student=student, schedule=schedule,
+                    check_in_time=start if student is not self.students[-1] else None,
+                )
+            PermissionRequest.objects.create(student=self.students[-1], schedule=schedule, request_type='day_excuse')
+
+    def _query_count(self, url):
+        self.client.get(url)  # Caches the caller's scope
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_schedule_list_reads_annotations(self):
+        self._add_schedules(1)
+        few, _ = self._query_count('/api/v1/attendance/schedules/')
+        self._add_schedules(9)
+        many, data = self._query_count('/api/v1/attendance/schedules/')
+        self.assertEqual(few, many)
+        self.assertEqual(many, 3)  # Page count, schedules, sessions
+        self.assertEqual(len(data['results']), 10)
+
+        # Same output as serializing each schedule on its own
+        expected = [ScheduleSerializer(schedule).data for schedule in Schedule.objects.order_by('-created_at')]
+        self.assertEqual([dict(row) for row in data['results']], [dict(row) for row in expected])
+        self.assertEqual(data['results'][0]['attended_out_of_total'], {'attended': 2, 'total': 3})
+        self.assertEqual(data['results'][0]['sessions'], ["Lecture", "Lab"])
+
+    def test_permission_request_list_reads_annotations(self):
+        self._add_schedules(1)
+        few, _ = self._query_count('/api/v1/attendance/permission-requests/')
+        self._add_schedules(4)
+        many, data = self._query_count('/api/v1/attendance/permission-requests/')
+        self.assertEqual(few, many)
+
+        rows = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(len(rows), 5)
+        for row in rows:
+            schedule = Schedule.objects.get(pk=row['schedule']['id'])
+            self.assertEqual(dict(row['schedule']), dict(ScheduleSerializer(schedule).data))
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import Branch, Schedule, Track
+from ..scope import scope_for_user
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class UserScopeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.supervisor = CustomUser.objects.create_user(
+                email='supervisor@example.com', password='pass123',
+                first_name='Sara', last_name='Supervisor', groups=['supervisor']
+            )
+            self.other = CustomUser.objects.create_user(
+                email='other@example.com', password='pass123',
+                first_name='Omar', last_name='Other', groups=['supervisor']
+            )
+            self.tracks = [
+                Track.objects.create(
+                    name=f"Track {t}", intake=1, supervisor=supervisor, start_date=today, default_branch=self.branch
+                )
+                for t, supervisor in enumerate([self.supervisor, self.other])
+            ]
+            for track in self.tracks:
+                Schedule.objects.create(name="Today", track=track, custom_branch=self.branch, created_at=today)
+
+    def test_scope_is_cached_until_assignments_change(self):
+        scope = scope_for_user(self.supervisor)
+        self.assertEqual(scope.role, 'supervisor')
+        self.assertEqual(scope.track_ids, {self.tracks[0].id})
+        with self.assertNumQueries(0):
+            self.assertEqual(scope_for_user(self.supervisor), scope)
+
+        # Handing a track over retires the cached scope
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracks[1].supervisor = self.supervisor
+            self.tracks[1].save()
+        self.assertEqual(scope_for_user(self.supervisor).track_ids, {track.id for track in self.tracks})
+
+        # So does a group change
+        with self.captureOnCommitCallbacks(execute=True):
+            self.supervisor.groups.add(Group.objects.get_or_create(name='admin')[0])
+        self.assertEqual(scope_for_user(self.supervisor).role, 'admin')
+
+    def test_schedules_are_limited_to_supervised_tracks(self):
+        client = APIClient()
+        client.force_authenticate(user=self.supervisor)
+        response = client.get('/api/v1/attendance/schedules/')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([schedule['track']['id'] for schedule in results], [self.tracks[0].id])
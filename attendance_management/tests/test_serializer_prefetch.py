@@ -0,0 +1,97 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import AttendanceRecord, Branch, PermissionRequest, Schedule, Session, Student, Track
+from ..serializers import AttendanceRecordSerializer, AttendanceRecordSerializerForSupervisors
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AttendanceRecordPrefetchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.today = timezone.localdate()
+        self.track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=self.supervisor, start_date=self.today, default_branch=self.branch
+        )
+        self.schedules = []
+        for offset in (2, 1, 0):
+            day = self.today - timedelta(days=offset)
+            schedule = Schedule.objects.create(name=f"Day {offset}", track=self.track, custom_branch=self.branch, created_at=day)
+            start = timezone.make_aware(datetime.combine(day, time(9)))
+            for title in ("Lecture", "Lab"):
+                Session.objects.create(schedule=schedule, title=title, start_time=start, end_time=start + timedelta(hours=2))
+            self.schedules.append(schedule)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.supervisor)
+
+    def _add_students(self, count):
+        for _ in range(count):
+            n = Student.objects.count()
+            user = CustomUser.objects.create_user(
+                email=f'student{n}@example.com', password='pass123',
+                first_name='Student', last_name=f'Number {n}', groups=['student']
+            )
+            student = Student.objects.create(user=user, track=self.track)
+            for schedule in self.schedules:
+                AttendanceRecord.objects.create(student=student, schedule=schedule, status='absent')
+            PermissionRequest.objects.create(student=student, schedule=self.schedules[-1], request_type='late_check_in',
+                                             adjusted_time=timezone.now(), status='approved')
+            PermissionRequest.objects.create(student=student, schedule=self.schedules[0], request_type='day_excuse')
+
+    def _query_count(self, url):
+        self.client.get(url)  # Caches the caller's scope
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_supervisor_attendance_query_count_is_flat(self):
+        self._add_students(2)
+        few, _ = self._query_count('/api/v1/attendance/supervisor-attendance/')
+        self._add_students(4)
+        many, data = self._query_count('/api/v1/attendance/supervisor-attendance/')
+        self.assertEqual(few, many)
+
+        # Same output as serializing each record on its own
+        expected = [
+            AttendanceRecordSerializer(record).data
+            for record in AttendanceRecord.objects.filter(schedule=self.schedules[-1])
+        ]
+        self.assertEqual([dict(row) for row in data], [dict(row) for row in expected])
+        self.assertTrue(all(row['leave_request_status'] == 'approved' for row in data))
+
+    def test_student_history_query_count_is_flat(self):
+        self._add_students(1)
+        student = Student.objects.get()
+        url = f'/api/v1/attendance/{student.user_id}/student-history/'
+        few, _ = self._query_count(url)
+        for offset in (4, 3):
+            schedule = Schedule.objects.create(
+                name="Earlier", track=self.track, custom_branch=self.branch, created_at=self.today - timedelta(days=offset)
+            )
+            Session.objects.create(schedule=schedule, title="Lab", start_time=timezone.now(), end_time=timezone.now())
+            AttendanceRecord.objects.create(student=student, schedule=schedule, status='absent')
+        many, data = self._query_count(url)
+        self.assertEqual(few, many)
+
+        records = data['attendance_records']
+        self.assertEqual(len(records), 5)
+        self.assertEqual(list(records[0]['sessions']), ["Lecture", "Lab"])
+        standalone = AttendanceRecordSerializerForSupervisors(
+            AttendanceRecord.objects.get(student=student, schedule=self.schedules[-1])
+        ).data
+        self.assertEqual(records[0]['adjusted_time'], standalone['adjusted_time'])
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import AttendanceRecord, Branch, PermissionRequest, Schedule, Session, Student, Track
+from ..status_engine import check_in_status, check_out_status, recompute_statuses
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StatusEngineTestCase(TestCase):
+    def setUp(self):
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=self.supervisor,
+            start_date=timezone.localdate(), default_branch=branch
+        )
+        self.day = timezone.localdate() - timedelta(days=1)
+        self.schedule = Schedule.objects.create(name="Yesterday", track=self.track, custom_branch=branch, created_at=self.day)
+        self.start = timezone.localtime().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        self.end = self.start + timedelta(hours=6)
+        Session.objects.create(schedule=self.schedule, title="Morning", instructor="Instructor",
+                               start_time=self.start, end_time=self.end)
+
+        self.students = []
+        for i in range(3):
+            user = CustomUser.objects.create_user(
+                email=f'student{i}@example.com', password='pass123',
+                first_name='Student', last_name=f'Number {i}', groups=['student']
+            )
+            self.students.append(Student.objects.create(user=user, track=self.track))
+
+    def test_transition_tables(self):
+        late_permission = PermissionRequest(request_type='late_check_in', adjusted_time=self.start + timedelta(hours=1))
+        early_leave = PermissionRequest(request_type='early_leave')
+
+        self.assertEqual(check_in_status(self.start, self.start), 'check-in')
+        self.assertEqual(check_in_status(self.start + timedelta(minutes=30), self.start), 'late-check-in')
+        self.assertEqual(check_in_status(self.start + timedelta(minutes=30), self.start, [late_permission]), 'late-excused')
+        self.assertEqual(check_in_status(self.start + timedelta(hours=2), self.start, [late_permission]), 'late-check-in')
+
+        early = self.end - timedelta(hours=1)
+        self.assertEqual(check_out_status(self.end, self.end, 'check-in'), 'attended')
+        self.assertEqual(check_out_status(early, self.end, 'check-in'), 'check-in_early-check-out')
+        self.assertEqual(check_out_status(early, self.end, 'late-excused', [early_leave]), 'late-excused_early-excused')
+        self.assertEqual(check_out_status(early, self.end, 'excused'), 'check-in_early-check-out')
+
+    def test_recompute_after_late_approval(self):
+        late, excused, absent = self.students
+        late_record = AttendanceRecord.objects.create(
+            student=late, schedule=self.schedule, status='late-check-in_early-check-out',
+            check_in_time=self.start + timedelta(minutes=40), check_out_time=self.end - timedelta(hours=1),
+        )
+        excused_record = AttendanceRecord.objects.create(student=excused, schedule=self.schedule, status='absent')
+        absent_record = AttendanceRecord.objects.create(student=absent, schedule=self.schedule, status='absent')
+        PermissionRequest.objects.create(student=late, schedule=self.schedule, request_type='late_check_in',
+                                         adjusted_time=self.start + timedelta(hours=1), status='approved')
+        PermissionRequest.objects.create(student=excused, schedule=self.schedule, request_type='day_excuse',
+                                         status='approved')
+
+        # Session bounds, records, permissions, one bulk update and the rollup and ledger stale marks
+        with self.assertNumQueries(6):
+            changed = recompute_statuses(track_id=self.track.id, start_date=self.day, end_date=self.day)
+        self.assertEqual(len(changed), 2)
+
+        late_record.refresh_from_db()
+        excused_record.refresh_from_db()
+        absent_record.refresh_from_db()
+        self.assertEqual(late_record.status, 'late-excused_early-check-out')
+        self.assertEqual(excused_record.status, 'excused')
+        self.assertEqual(absent_record.status, 'absent')
+
+        # Idempotent: nothing left to change
+        self.assertEqual(recompute_statuses(schedule_ids=[self.schedule.id]), [])
+
+    def test_approving_permission_recomputes_status(self):
+        student = self.students[0]
+        record = AttendanceRecord.objects.create(
+            student=student, schedule=self.schedule, status='check-in_early-check-out',
+            check_in_time=self.start, check_out_time=self.end - timedelta(hours=2),
+        )
+        permission = PermissionRequest.objects.create(student=student, schedule=self.schedule, request_type='early_leave')
+
+        client = APIClient()
+        client.force_authenticate(user=self.supervisor)
+        response = client.post(f'/api/v1/attendance/permission-requests/{permission.id}/approve/')
+        self.assertEqual(response.status_code, 200)
+        record.refresh_from_db()
+        self.assertEqual(record.status, 'check-in_early-excused')
@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import AttendanceRecord, Branch, Schedule, Student, Track
+from ..timeseries import attendance_frame, iso_week_totals, iso_weeks, rolling_sum
+
+CustomUser = get_user_model()
+
+
+class VectorHelpersTestCase(SimpleTestCase):
+    def test_iso_weeks_match_isocalendar(self):
+        days = [date(2024, 12, 20) + timedelta(days=i) for i in range(400)]
+        dates = np.array(days, dtype='datetime64[D]')
+        self.assertEqual(iso_weeks(dates).tolist(), [day.isocalendar()[1] for day in days])
+
+    def test_rolling_and_weekly_totals(self):
+        self.assertEqual(rolling_sum(np.array([1, 2, 3, 4, 5]), 3).tolist(), [1, 3, 6, 9, 12])
+        weeks = np.array([1, 1, 2, 2, 3])
+        scheduled = np.array([True, False, False, False, True])
+        week_numbers, totals = iso_week_totals(weeks, scheduled, np.array([1, 2, 3, 4, 5]))
+        self.assertEqual(week_numbers.tolist(), [1, 3])
+        self.assertEqual(totals.tolist(), [3, 5])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AttendanceTimeSeriesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        self.today = timezone.localdate()
+        self.track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=self.supervisor,
+            start_date=self.today - timedelta(days=10), default_branch=branch
+        )
+        self.records = {}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedules = {
+                offset: Schedule.objects.create(
+                    name=f"Day {offset}", track=self.track, custom_branch=branch,
+                    created_at=self.today - timedelta(days=offset)
+                )
+                for offset in (0, 3)
+            }
+            for i in range(2):
+                user = CustomUser.objects.create_user(
+                    email=f'student{i}@example.com', password='pass123',
+                    first_name='Student', last_name=f'Number {i}', groups=['student']
+                )
+                student = Student.objects.create(user=user, track=self.track)
+                for offset, schedule in self.schedules.items():
+                    self.records[offset, i] = AttendanceRecord.objects.create(
+                        student=student, schedule=schedule,
+                        check_in_time=timezone.now() if i == 0 else None,
+                        status='check-in' if i == 0 else 'absent',
+                    )
+
+    def _attended(self):
+        frame = attendance_frame(Track.objects.filter(pk=self.track.pk), self.today - timedelta(days=6))
+        self.assertEqual(frame.attended.shape, (1, 7))
+        return frame.attended[0, [3, 6]].tolist()
+
+    def test_vectors_load_once_and_refresh_changes(self):
+        self.assertEqual(self._attended(), [1, 1])
+        # Warm: track list, enrollment and the changed-rows read
+        with self.assertNumQueries(3):
+            self.assertEqual(self._attended(), [1, 1])
+
+        # A past day edited since the last read is picked up with today's rows
+        with self.captureOnCommitCallbacks(execute=True):
+            record = self.records[3, 1]
+            record.check_in_time = timezone.now()
+            record.status = 'check-in'
+            record.save()
+        self.assertEqual(self._attended(), [2, 1])
+
+        # Removing a schedule retires the vectors
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedules[3].delete()
+        self.assertEqual(self._attended(), [0, 1])
+
+    def test_trends_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.supervisor)
+        response = client.get('/api/v1/attendance/attendance-trends/', {'track_id': self.track.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(day['date'], day['attended'], day['expected']) for day in response.data['daily_trends']],
+            [(self.today - timedelta(days=3), 1, 2), (self.today, 1, 2)]
+        )
+        self.assertEqual(sum(week['attended'] for week in response.data['weekly_trends']), 2)
+        self.assertEqual(
+            [(day['attended'], day['expected']) for day in response.data['rolling_trends']], [(1, 2), (2, 4)]
+        )
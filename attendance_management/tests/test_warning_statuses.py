@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..absence_warnings import CONTEXT_KEY, warning_statuses
+from ..models import AttendanceRecord, Branch, PermissionRequest, Schedule, Student, Track
+from ..serializers import AttendanceRecordSerializer
+from ..settings_models import ApplicationSetting
+
+CustomUser = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class WarningStatusesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        today = timezone.localdate()
+        ApplicationSetting.objects.create(key='excused_absence_threshold_intensive', value='1')
+        self.schedules = []
+        self.students = []
+        for program_type in ('nine_months', 'intensive'):
+            track = Track.objects.create(
+                name=program_type, intake=1, supervisor=supervisor, start_date=today,
+                default_branch=branch, program_type=program_type
+            )
+            schedules = [
+                Schedule.objects.create(name="Day", track=track, custom_branch=branch, created_at=today - timedelta(days=offset))
+                for offset in (2, 1)
+            ]
+            self.schedules.extend(schedules)
+            # Absent both days; absent both days with one excused; attended both days
+            for s, kind in enumerate(('absent', 'excused', 'attended')):
+                user = CustomUser.objects.create_user(
+                    email=f'{program_type}{s}@example.com', password='pass123',
+                    first_name='Student', last_name=f'{program_type} {s}', groups=['student']
+                )
+                student = Student.objects.create(user=user, track=track)
+                for schedule in schedules:
+                    AttendanceRecord.objects.create(
+                        student=student, schedule=schedule, status='attended' if kind == 'attended' else 'absent',
+                        check_in_time=timezone.now() if kind == 'attended' else None,
+                    )
+                if kind == 'excused':
+                    PermissionRequest.objects.create(
+                        student=student, schedule=schedules[0], request_type='day_excuse', status='approved'
+                    )
+                self.students.append(student)
+
+    def test_batch_matches_single_student_checks(self):
+        statuses = warning_statuses(student.pk for student in self.students)
+        self.assertEqual(statuses, {
+            student.pk: student.has_exceeded_warning_threshold()[1] for student in self.students
+        })
+        self.assertEqual(
+            [statuses[student.pk] for student in self.students],
+            ['unexcused', None, None, 'unexcused', 'excused', None]
+        )
+
+    def test_query_count_does_not_depend_on_student_count(self):
+        warning_statuses(student.pk for student in self.students)  # Ledgers exist and are fresh
+        with CaptureQueriesContext(connection) as few:
+            warning_statuses([self.students[0].pk])
+        with CaptureQueriesContext(connection) as many:
+            warning_statuses(student.pk for student in self.students)
+        self.assertEqual(len(few), len(many))
+
+    def test_list_serializer_evaluates_warnings_once(self):
+        records = AttendanceRecord.objects.filter(schedule=self.schedules[1]).order_by('id')
+        with CaptureQueriesContext(connection) as queries:
+            data = AttendanceRecordSerializer(records, many=True).data
+        self.assertEqual([row['warning_status'] for row in data], ['unexcused', None, None])
+        settings_reads = [query for query in queries if 'attendance_management_applicationsetting' in query['sql']]
+        ledger_reads = [
+            query for query in queries
+            if query['sql'].startswith('SELECT') and 'attendance_management_studentattendanceledger' in query['sql']
+        ]
+        self.assertEqual((len(settings_reads), len(ledger_reads)), (1, 1))
+
+        # Statuses passed in by the caller are used as they are
+        statuses = {student.pk: 'excused' for student in self.students}
+        with CaptureQueriesContext(connection) as queries:
+            data = AttendanceRecordSerializer(records, many=True, context={CONTEXT_KEY: statuses}).data
+        self.assertEqual([row['warning_status'] for row in data], ['excused'] * 3)
+        self.assertFalse([query for query in queries if 'attendance_management_studentattendanceledger' in query['sql']])
+
+        # A single record still works on its own
+        self.assertEqual(AttendanceRecordSerializer(records[0]).data['warning_status'], 'unexcused')
@@ -0,0 +1,190 @@
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .. import write_behind
+from ..checkin_context import load_check_in_context
+from ..models import AttendanceRecord, Branch, Schedule, Session, Student, Track
+from ..schedule_index import invalidate_schedule_index
+
+CustomUser = get_user_model()
+
+
+class WriteBehindTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.journal = os.path.join(self.tmpdir.name, 'checkin_journal.jsonl')
+        # The flusher thread is parked (long interval, big batch) so the test drives flushes itself
+        self.settings_override = override_settings(
+            SECURE_SSL_REDIRECT=False,
+            ATTENDANCE_WRITE_BEHIND=True,
+            ATTENDANCE_WRITE_BEHIND_JOURNAL=self.journal,
+            ATTENDANCE_WRITE_BEHIND_FLUSH_MS=60000,
+            ATTENDANCE_WRITE_BEHIND_BATCH_SIZE=1000,
+        )
+        self.settings_override.enable()
+        write_behind._buffer = None
+        cache.clear()
+        invalidate_schedule_index(timezone.localdate())
+
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com', password='pass123',
+            first_name='Sara', last_name='Supervisor', groups=['supervisor']
+        )
+        self.student_user = CustomUser.objects.create_user(
+            email='student@example.com', password='pass123',
+            first_name='John', last_name='Doe', groups=['student']
+        )
+        branch = Branch.objects.create(name="Smart Village Branch", latitude=30.0722, longitude=31.0177, radius=100)
+        track = Track.objects.create(
+            name="Computer Science", intake=1, supervisor=supervisor,
+            start_date=timezone.localdate(), default_branch=branch
+        )
+        self.student = Student.objects.create(user=self.student_user, track=track, phone_uuid='device-1')
+        self.schedule = Schedule.objects.create(
+            name="Today", track=track, custom_branch=branch, created_at=timezone.localdate()
+        )
+        now = timezone.localtime()
+        Session.objects.create(
+            schedule=self.schedule, title="Morning", instructor="Instructor",
+            start_time=now, end_time=now + timedelta(hours=2)
+        )
+        self.record = AttendanceRecord.objects.create(student=self.student, schedule=self.schedule)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student_user)
+
+    def tearDown(self):
+        if write_behind._buffer is not None:
+            write_behind._buffer.stop()
+            write_behind._buffer = None
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def _check_in(self):
+        return self.client.post('/api/v1/attendance/check-in/', {
+            'user_id': self.student_user.id,
+            'uuid': 'device-1',
+            'latitude': 30.0722,
+            'longitude': 31.0177,
+        }, format='json')
+
+    def test_check_in_is_journaled_then_flushed(self):
+        response = self._check_in()
+        self.assertEqual(response.status_code, 200)
+
+        # Acknowledged and journaled, but not written yet
+        self.record.refresh_from_db()
+        self.assertIsNone(self.record.check_in_time)
+        with open(f"{self.journal}.{os.getpid()}") as journal:
+            self.assertEqual(len(journal.readlines()), 1)
+
+        # Retries and the status endpoint see the buffered state
+        self.assertTrue(self.client.get('/api/v1/attendance/status/').data['is_checked_in'])
+        context = load_check_in_context(self.student_user.id)
+        self.assertIsNotNone(context.attendance_record.check_in_time)
+        self.assertTrue(context.student.is_checked_in)
+        # (clear the stored idempotent response so the retry is re-validated)
+        cache.clear()
+        self.assertEqual(self._check_in().data['error_code'], 'already_checked_in')
+
+        self.assertEqual(write_behind._buffer.flush(), 2)
+        self.record.refresh_from_db()
+        self.student.refresh_from_db()
+        self.assertEqual(self.record.status, 'check-in')
+        self.assertIsNotNone(self.record.check_in_time)
+        self.assertTrue(self.student.is_checked_in)
+        self.assertEqual(glob.glob(f"{self.journal}.*.flushing"), [])
+
+    def test_rows_being_flushed_stay_visible(self):
+        self.assertEqual(self._check_in().status_code, 200)
+        applying, release = threading.Event(), threading.Event()
+
+        def slow_apply(model, updates):
+            applying.set()
+            release.wait(5)
+
+        def flush():
+            try:
+                buffer.flush()
+            finally:
+                connection.close()
+
+        buffer = write_behind._buffer
+        # The flusher thread only takes the rows; what it does with the database is beside the point here
+        derived = ('mark_records_stale', 'mark_record_ledgers_stale', 'invalidate_records', 'bump_records')
+        with mock.patch.object(write_behind, '_apply', side_effect=slow_apply), \
+                mock.patch.multiple(write_behind, **{name: mock.DEFAULT for name in derived}):
+            flusher = threading.Thread(target=flush)
+            flusher.start()
+            try:
+                self.assertTrue(applying.wait(5))
+                # Not committed yet, but neither the status nor a retry may miss the check-in
+                self.assertTrue(self.client.get('/api/v1/attendance/status/').data['is_checked_in'])
+                cache.clear()
+                self.assertEqual(self._check_in().data['error_code'], 'already_checked_in')
+            finally:
+                release.set()
+                flusher.join(5)
+        self.assertEqual(buffer.pending_record_fields(self.record.pk), {})
+
+    def test_admin_reset_is_not_overwritten_by_a_later_flush(self):
+        self.assertEqual(self._check_in().status_code, 200)
+        supervisor = CustomUser.objects.get(email='supervisor@example.com')
+        self.client.force_authenticate(user=supervisor)
+        response = self.client.patch(f'/api/v1/attendance/{self.record.pk}/reset-attendance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_checked_in'])
+
+        write_behind._buffer.flush()
+        self.record.refresh_from_db()
+        self.student.refresh_from_db()
+        self.assertIsNone(self.record.check_in_time)
+        self.assertEqual(self.record.status, 'absent')
+        self.assertFalse(self.student.is_checked_in)
+
+    def test_replay_applies_leftover_journals(self):
+        # Left behind by a process (pid 4242) that is gone: nothing holds its lock
+        check_in_time = timezone.localtime().replace(microsecond=0)
+        with open(f"{self.journal}.4242.1.flushing", 'w') as journal:
+            journal.write(json.dumps({'records': {str(self.record.pk): {
+                'check_in_time': check_in_time.isoformat(), 'status': 'check-in'
+            }}}) + '\n')
+        with open(f"{self.journal}.4242", 'w') as journal:
+            journal.write(json.dumps({
+                'records': {str(self.record.pk): {'status': 'late-check-in'}},
+                'students': {str(self.student.pk): {'is_checked_in': True}},
+            }) + '\n')
+            journal.write('{"records": {"1"')  # torn write from a crash
+
+        buffer = write_behind.WriteBehindBuffer(self.journal, 60000, 1000)
+        self.assertEqual(buffer.replay(), 2)
+
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.check_in_time, check_in_time)
+        self.assertEqual(self.record.status, 'late-check-in')
+        self.assertTrue(Student.objects.get(pk=self.student.pk).is_checked_in)
+        self.assertEqual(glob.glob(f"{self.journal}.*"), [])
+
+    def test_replay_skips_journals_of_running_processes(self):
+        journal_path = f"{self.journal}.4242"
+        with open(journal_path, 'w') as journal:
+            journal.write(json.dumps({'records': {str(self.record.pk): {'status': 'check-in'}}}) + '\n')
+        with open(f"{journal_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            buffer = write_behind.WriteBehindBuffer(self.journal, 60000, 1000)
+            self.assertEqual(buffer.replay(), 0)
+        self.assertTrue(os.path.exists(journal_path))
+        self.assertEqual(AttendanceRecord.objects.get(pk=self.record.pk).status, 'absent')
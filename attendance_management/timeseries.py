@@ -0,0 +1,220 @@
+"""
+In-process columnar time series of daily track attendance for trend charts.
+
+For each track the store keeps NumPy vectors of the daily rollup's expected,
+attended, late and excused counts (plus which days had a schedule), indexed by
+days since the track's origin: its start date, or an earlier day if one was
+asked for. Windows, ISO-week totals, rolling sums and all-track totals are then
+slices and reductions over a (tracks x days) frame instead of loops over rows.
+
+Vectors are loaded from the daily rollup the first time a track is asked for.
+Later calls re-read only today's rows and rows recounted since the previous
+call, in one query for all requested tracks. Days whose rollup row is removed
+(a schedule deleted or moved) are not seen by that query, so those paths call
+`invalidate_track`, which retires the track's vectors in every process through
+a generation token in the shared cache; vectors older than
+ATTENDANCE_TIMESERIES_MAX_AGE are reloaded as a backstop.
+"""
+import threading
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import track_student_counts
+from .models import DailyTrackAttendance, Track
+from .rollups import count_stale
+from .stale_marks import flush_stale_marks
+
+MAX_AGE = getattr(settings, 'ATTENDANCE_TIMESERIES_MAX_AGE', timedelta(hours=1))
+# Rows recounted this close to the previous refresh are read again, to absorb clock drift between workers
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+FIELDS = ('expected', 'attended', 'late', 'excused')
+ROLLUP_COLUMNS = {
+    'expected': 'expected_count',
+    'attended': 'checked_in_count',
+    'late': 'late_count',
+    'excused': 'excused_count',
+}
+
+
+class AttendanceFrame(NamedTuple):
+    """Per-day attendance of several tracks; every matrix is (tracks x days)."""
+    dates: np.ndarray  # datetime64[D]
+    track_ids: list
+    track_names: list
+    enrolled: np.ndarray  # Students currently in each track
+    scheduled: np.ndarray  # bool: the track had a schedule that day
+    expected: np.ndarray  # Attendance records of the day's schedule
+    attended: np.ndarray
+    late: np.ndarray
+    excused: np.ndarray
+
+    def iso_weeks(self):
+        """ISO week number of every day in `dates`."""
+        return iso_weeks(self.dates)
+
+
+def iso_weeks(dates):
+    """ISO week numbers of a datetime64[D] array."""
+    days = dates.astype('datetime64[D]')
+    weekday = (days.astype(np.int64) + 3) % 7  # Monday is 0; 1970-01-01 was a Thursday
+    thursday = days - weekday + 3
+    year_start = thursday.astype('datetime64[Y]').astype('datetime64[D]')
+    return (thursday - year_start).astype(np.int64) // 7 + 1
+
+
+def rolling_sum(values, window):
+    """Trailing `window`-day sums along the last axis (shorter at the start)."""
+    totals = np.cumsum(values, axis=-1)
+    totals[..., window:] -= totals[..., :-window].copy()
+    return totals
+
+
+def iso_week_totals(weeks, scheduled, values):
+    """
+    (weeks, totals): `values` summed per ISO week for 1-D per-day arrays,
+    keeping only weeks with at least one scheduled day, in week order.
+    """
+    week_numbers, index = np.unique(weeks, return_inverse=True)
+    totals = np.bincount(index, weights=values, minlength=len(week_numbers))
+    has_schedule = np.bincount(index, weights=scheduled, minlength=len(week_numbers)) > 0
+    return week_numbers[has_schedule], totals[has_schedule].astype(np.int64)
+
+
+class _TrackVectors:
+    __slots__ = ('origin', 'generation', 'loaded_at', 'refreshed_at', 'scheduled') + FIELDS
+
+    def __init__(self, origin, days, generation, now):
+        self.origin = origin
+        self.generation = generation
+        self.loaded_at = self.refreshed_at = now
+        self.scheduled = np.zeros(days, dtype=bool)
+        for field in FIELDS:
+            setattr(self, field, np.zeros(days, dtype=np.int32))
+
+    def extend_to(self, day):
+        missing = (day - self.origin).days + 1 - len(self.scheduled)
+        if missing > 0:
+            for field in ('scheduled',) + FIELDS:
+                setattr(self, field, np.pad(getattr(self, field), (0, missing)))
+
+    def put(self, rows):
+        index = np.array([(row.date - self.origin).days for row in rows])
+        keep = (index >= 0) & (index < len(self.scheduled))
+        self.scheduled[index[keep]] = True
+        for field, column in ROLLUP_COLUMNS.items():
+            getattr(self, field)[index[keep]] = np.array([getattr(row, column) for row in rows])[keep]
+
+
+def _generation_key(track_id):
+    return f"attendance_timeseries:generation:{track_id}"
+
+
+def _generations(track_ids):
+    keys = {track_id: _generation_key(track_id) for track_id in track_ids}
+    stored = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in stored]
+    if missing:
+        # Random tokens, so a cleared cache never matches what a process still holds
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        stored.update(cache.get_many(missing))
+    return {track_id: stored.get(key) for track_id, key in keys.items()}
+
+
+def invalidate_track(track_id):
+    """Retire a track's vectors in every process."""
+    if track_id is not None:
+        cache.set(_generation_key(track_id), uuid.uuid4().hex, None)
+
+
+class AttendanceTimeSeries:
+    """Per-process store of _TrackVectors keyed by track id."""
+
+    def __init__(self):
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def frame(self, tracks, start_date, end_date=None):
+        """AttendanceFrame for `tracks` (a Track queryset) from `start_date` to `end_date` (default today)."""
+        today = timezone.localdate()
+        end_date = min(end_date or today, today)
+        tracks = list(tracks.order_by('id').values_list('id', 'name', 'start_date'))
+        track_ids = [track_id for track_id, _, _ in tracks]
+        enrolled = track_student_counts(track_ids)
+        with self._lock:
+            self._sync(tracks, start_date, today)
+            vectors = [self._tracks[track_id] for track_id in track_ids]
+
+            def window(field):
+                if not vectors:
+                    return np.zeros((0, max((end_date - start_date).days + 1, 0)), dtype=np.int32)
+                return np.stack([
+                    getattr(v, field)[(start_date - v.origin).days:(end_date - v.origin).days + 1] for v in vectors
+                ])
+
+            return AttendanceFrame(
+                dates=np.arange(np.datetime64(start_date), np.datetime64(end_date + timedelta(days=1))),
+                track_ids=track_ids,
+                track_names=[name for _, name, _ in tracks],
+                enrolled=np.array([enrolled.get(track_id, 0) for track_id in track_ids], dtype=np.int64),
+                scheduled=window('scheduled'),
+                **{field: window(field) for field in FIELDS},
+            )
+
+    def _sync(self, tracks, start_date, today):
+        now = timezone.now()
+        generations = _generations([track_id for track_id, _, _ in tracks])
+        flush_stale_marks()
+        cold, warm = {}, []
+        for track_id, _, track_start in tracks:
+            vectors = self._tracks.get(track_id)
+            if (
+                vectors is None or vectors.generation != generations[track_id]
+                or vectors.origin > start_date or now - vectors.loaded_at > MAX_AGE
+            ):
+                origin = min(track_start or start_date, start_date)
+                cold[track_id] = _TrackVectors(origin, (today - origin).days + 1, generations[track_id], now)
+            else:
+                vectors.extend_to(today)
+                warm.append(track_id)
+
+        if cold:
+            rows = DailyTrackAttendance.objects.filter(
+                track_id__in=list(cold), date__gte=min(v.origin for v in cold.values()), date__lte=today
+            )
+            self._tracks.update(cold)
+            self._apply(count_stale(list(rows)))
+        if warm:
+            since = min(self._tracks[track_id].refreshed_at for track_id in warm) - REFRESH_OVERLAP
+            rows = DailyTrackAttendance.objects.filter(track_id__in=warm, date__lte=today).filter(
+                Q(date=today) | Q(is_stale=True) | Q(updated_at__gte=since)
+            )
+            self._apply(count_stale(list(rows)))
+            for track_id in warm:
+                self._tracks[track_id].refreshed_at = now
+
+    def _apply(self, rows):
+        by_track = defaultdict(list)
+        for row in rows:
+            by_track[row.track_id].append(row)
+        for track_id, track_rows in by_track.items():
+            self._tracks[track_id].put(track_rows)
+
+
+_store = AttendanceTimeSeries()
+
+
+def attendance_frame(tracks, start_date, end_date=None):
+    """AttendanceFrame for `tracks` from the process-wide store."""
+    if not hasattr(tracks, 'values_list'):
+        tracks = Track.objects.filter(pk__in=tracks)
+    return _store.frame(tracks, start_date, end_date)
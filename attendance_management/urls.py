@@ -9,6 +9,7 @@ from attendance_management.views.permission_request_views import PermissionReque
 from attendance_management.views.attendance_views import AttendanceViewSet
 from attendance_management.views.settings_views import get_absence_thresholds, update_absence_thresholds
 from attendance_management.views.event_views import EventViewSet  
+from attendance_management.views import async_attendance_views
 
 router = DefaultRouter()
 router.register(r'schedules', ScheduleViewSet, basename='schedule')
@@ -21,6 +22,10 @@ router.register(r'events', EventViewSet, basename='event')
 router.register(r'', AttendanceViewSet, basename='attendance')  # Register with empty prefixrouter.register(r'attendance', AttendanceViewSet, basename='attendance')
 
 urlpatterns = [
+    # Native async check-in/check-out for the ASGI server
+    path('async/check-in/', async_attendance_views.check_in, name='async-check-in'),
+    path('async/check-out/', async_attendance_views.check_out, name='async-check-out'),
+    path('async/status/', async_attendance_views.is_checked_in, name='async-status'),
     path('', include(router.urls)),
     path('settings/absence-thresholds/', get_absence_thresholds, name='get-absence-thresholds'),
     path('settings/absence-thresholds/update/', update_absence_thresholds, name='update-absence-thresholds'),
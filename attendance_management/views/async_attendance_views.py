@@ -0,0 +1,381 @@
+"""
+Native async check-in, check-out and status endpoints.
+
+These mirror AttendanceViewSet.check_in/check_out/is_checked_in but run on the
+event loop under the ASGI server. A sync view holds a worker thread for the
+whole request; here only the individual queries do (Django's async ORM -
+afirst/aget_or_create/asave - still runs them through sync_to_async). The
+schedule index is read from memory and the geofence math (a single haversine)
+runs inline. Authentication is the same SimpleJWT bearer token the DRF views
+accept; the user is loaded with aget.
+
+Mounted under `attendance/async/` alongside the DRF actions, with identical
+request bodies, response shapes and error codes.
+"""
+import functools
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from ..checkin_context import aload_check_in_context
+from ..day_ticket import redeem_check_in, redeem_check_out
+from ..geofence import haversine_distance, nearest_branch
+from ..idempotency import idempotent, json_response
+from ..models import AttendanceRecord, Student
+from ..write_behind import aget_write_behind, apersist_attendance, overlay_student
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication whose user lookup uses the async ORM."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        # Token validation is pure CPU work (signature + claims)
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed("User not found", code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+_authentication = AsyncJWTAuthentication()
+
+
+def _parse_body(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST.dict()
+
+
+def async_api_view(methods):
+    """
+    Minimal async counterpart of DRF's @api_view + IsAuthenticated: checks the
+    method, authenticates the bearer token and exposes the parsed body as
+    `request.data`.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({"detail": f'Method "{request.method}" not allowed.'},
+                                     status=status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                authenticated = await _authentication.aauthenticate(request)
+            except AuthenticationFailed as e:
+                return json_response(e.detail if isinstance(e.detail, dict) else {"detail": e.detail},
+                                     status=status.HTTP_401_UNAUTHORIZED,
+                                     headers={"WWW-Authenticate": _authentication.authenticate_header(request)})
+            if authenticated is None:
+                return json_response({"detail": "Authentication credentials were not provided."},
+                                     status=status.HTTP_401_UNAUTHORIZED,
+                                     headers={"WWW-Authenticate": _authentication.authenticate_header(request)})
+            request.user, request.auth = authenticated
+
+            request.data = _parse_body(request) if request.method == 'POST' else {}
+            if request.data is None:
+                return json_response({"detail": "JSON parse error."}, status=status.HTTP_400_BAD_REQUEST)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _parse_location(request):
+    """Return (user_id, uuid, latitude, longitude, None) or (..., error response)."""
+    user_id = request.data.get('user_id')
+    uuid = request.data.get('uuid')
+    latitude = request.data.get('latitude')
+    longitude = request.data.get('longitude')
+
+    if not all([user_id, uuid, latitude, longitude]):
+        return None, None, None, None, json_response(
+            {"error": "Missing required fields. Please provide user_id, uuid, latitude, and longitude."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None, None, None, None, json_response(
+            {"error": "Invalid latitude or longitude format. Please provide valid decimal numbers."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return user_id, uuid, latitude, longitude, None
+
+
+async def _load_context(user_id):
+    """Return (context, None) or (None, error response)."""
+    try:
+        return await aload_check_in_context(user_id), None
+    except Student.DoesNotExist:
+        return None, json_response({"error": "No student record found for this user."}, status=status.HTTP_404_NOT_FOUND)
+    except Http404 as e:
+        return None, json_response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+
+async def _outside_geofence(context, latitude, longitude, distance):
+    logger.warning(f"Student {context.student.user.email} failed location validation: distance {distance}m exceeds radius {context.geofence_radius}m")
+    return json_response({
+        "status": "fail",
+        "message": "You are outside the allowed geofence area",
+        "distance": distance,
+        "geofence_radius": context.geofence_radius,
+        "branch": {"id": context.branch_id, "name": context.branch_name},
+        # The branch engine may need (re)loading from the database
+        "nearest_branch": await sync_to_async(nearest_branch)(latitude, longitude)
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view(['POST'])
+@idempotent('check-in')
+async def check_in(request):
+    """Async AttendanceViewSet.check_in: same body, responses and error codes."""
+    user_id, uuid, latitude, longitude, error = _parse_location(request)
+    if error:
+        return error
+
+    if request.data.get('ticket'):
+        payload, status_code = await sync_to_async(redeem_check_in)(
+            request.data['ticket'], request.user, user_id, uuid, latitude, longitude
+        )
+        return json_response(payload, status=status_code)
+
+    context, error = await _load_context(user_id)
+    if error:
+        return error
+    student = context.student
+
+    if not student.user.is_active:
+        logger.warning(f"Student {student.user.email} is not active")
+        return json_response({
+            "status": "error",
+            "message": "Your account is not active. Please contact an administrator.",
+            "error_code": "account_not_active"
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    if student.phone_uuid and student.phone_uuid != uuid:
+        logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
+        return json_response({
+            "status": "error",
+            "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
+            "error_code": "uuid_mismatch"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    elif not student.phone_uuid:
+        student.phone_uuid = uuid
+        await student.asave(update_fields=['phone_uuid'])
+        logger.info(f"Set phone UUID for student {student.user.email} to {uuid}")
+
+    if not context.has_schedule:
+        return json_response({
+            "status": "error",
+            "message": "No schedule found for today.",
+            "error_code": "no_schedule_today"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    attendance_record = context.attendance_record
+    if not attendance_record:
+        try:
+            attendance_record, created = await AttendanceRecord.objects.aget_or_create(
+                student=student,
+                schedule_id=context.schedule_id
+            )
+            if created:
+                logger.info(f"Created new attendance record for {student.user.email} for today's schedule")
+        except Exception as e:
+            logger.error(f"Error finding attendance record: {str(e)}")
+            return json_response({
+                "status": "error",
+                "message": f"Error finding attendance record: {str(e)}",
+                "error_code": "attendance_record_error"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if attendance_record.check_in_time:
+        logger.warning(f"Student {student.user.email} have already checked in for today's session")
+        return json_response({
+            "status": "error",
+            "message": "You have already checked in for today's session.",
+            "error_code": "already_checked_in"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    distance = haversine_distance(latitude, longitude, context.branch_latitude, context.branch_longitude)
+    if distance > context.geofence_radius:
+        return await _outside_geofence(context, latitude, longitude, distance)
+
+    current_time = timezone.localtime()
+    if not context.has_sessions:
+        attendance_record.status = 'no_sessions'
+        await apersist_attendance(attendance_record, ['status'])
+        return json_response({
+            "status": "warning",
+            "message": "Check-in recorded, but this schedule has no sessions defined.",
+            "schedule_name": context.schedule_name
+        })
+
+    status_to_set = context.check_in_status(current_time)
+    attendance_record.check_in_time = current_time
+    attendance_record.status = status_to_set
+    student.is_checked_in = True
+    await apersist_attendance(attendance_record, ['check_in_time', 'status'], student, ['is_checked_in'])
+    logger.info(f"Check-in time set for student {student.user.email} with status: {status_to_set}")
+    logger.info(f"Student {student.user.email} successfully validated attendance at {context.branch_name}")
+
+    return json_response({
+        "status": "success",
+        "message": "Attendance validated successfully",
+        "distance": distance,
+        "geofence_radius": context.geofence_radius,
+        "check_in_time": attendance_record.check_in_time,
+        "schedule_name": context.schedule_name,
+        "branch": {"id": context.branch_id, "name": context.branch_name}
+    })
+
+
+@async_api_view(['POST'])
+@idempotent('check-out')
+async def check_out(request):
+    """Async AttendanceViewSet.check_out: same body, responses and error codes."""
+    user_id, uuid, latitude, longitude, error = _parse_location(request)
+    if error:
+        return error
+
+    if request.data.get('ticket'):
+        payload, status_code = await sync_to_async(redeem_check_out)(
+            request.data['ticket'], request.user, user_id, uuid, latitude, longitude
+        )
+        return json_response(payload, status=status_code)
+
+    context, error = await _load_context(user_id)
+    if error:
+        return error
+    student = context.student
+
+    if not student.user.is_active:
+        logger.warning(f"Student {student.user.email} is not active")
+        return json_response({
+            "status": "error",
+            "message": "Your account is not active. Please contact an administrator.",
+            "error_code": "account_not_active"
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    if not student.is_checked_in:
+        logger.warning(f"Student {student.user.email} attempted to check out but hasn't checked in")
+        return json_response({
+            "status": "error",
+            "message": "You haven't checked in yet. Please check in first.",
+            "error_code": "not_checked_in"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if student.phone_uuid and student.phone_uuid != uuid:
+        logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
+        return json_response({
+            "status": "error",
+            "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
+            "error_code": "uuid_mismatch"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if not context.has_schedule:
+        return json_response({
+            "status": "error",
+            "message": "No schedule found for today.",
+            "error_code": "no_schedule_today"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    attendance_record = context.attendance_record
+    if not attendance_record:
+        return json_response({
+            "status": "error",
+            "message": "No checked-in attendance record found for today.",
+            "error_code": "no_checkin_record"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    if attendance_record.check_out_time:
+        return json_response({
+            "status": "error",
+            "message": "You have already checked out for this session.",
+            "error_code": "already_checked_out"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    distance = haversine_distance(latitude, longitude, context.branch_latitude, context.branch_longitude)
+    if distance > context.geofence_radius:
+        return await _outside_geofence(context, latitude, longitude, distance)
+
+    current_time = timezone.localtime()
+    attendance_record.check_out_time = current_time
+    student.is_checked_in = False
+    if not context.has_sessions:
+        attendance_record.status = 'no_sessions'
+        await apersist_attendance(attendance_record, ['check_out_time', 'status'], student, ['is_checked_in'])
+        return json_response({
+            "status": "warning",
+            "message": "Check-out recorded, but this schedule has no sessions defined.",
+            "schedule_name": context.schedule_name
+        })
+
+    status_to_set = context.check_out_status(current_time)
+    attendance_record.status = status_to_set
+    await apersist_attendance(attendance_record, ['check_out_time', 'status'], student, ['is_checked_in'])
+    logger.info(f"Check-out time set for student {student.user.email} with status: {status_to_set}")
+
+    hours = (attendance_record.check_out_time - attendance_record.check_in_time).total_seconds() / 3600
+    return json_response({
+        "status": "success",
+        "message": "Check-out successful",
+        "distance": distance,
+        "geofence_radius": context.geofence_radius,
+        "check_in_time": attendance_record.check_in_time,
+        "check_out_time": attendance_record.check_out_time,
+        "attendance_duration_hours": round(hours, 2),
+        "is_checked_in": False,
+        "schedule_name": context.schedule_name,
+        "branch": {"id": context.branch_id, "name": context.branch_name}
+    })
+
+
+@async_api_view(['GET'])
+async def is_checked_in(request):
+    """Async AttendanceViewSet.is_checked_in."""
+    student = await Student.objects.filter(user=request.user).only('id', 'is_checked_in').afirst()
+    if student is None:
+        return json_response({
+            "status": "error",
+            "message": "No student record found for the logged-in user."
+        }, status=status.HTTP_404_NOT_FOUND)
+    # Starts the buffer if needed so a check-in it still holds is reported
+    await aget_write_behind()
+    overlay_student(student)
+    return json_response({
+        "status": "success",
+        "is_checked_in": student.is_checked_in
+    })
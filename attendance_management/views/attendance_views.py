@@ -2,7 +2,6 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-import math
 import logging
 from attendance_management.models import AttendanceRecord, Schedule, Student
 from django.shortcuts import get_object_or_404
@@ -10,10 +9,29 @@ from users.models import CustomUser
 from django.utils import timezone
 from core.permissions import IsSupervisorOrAboveUser  # Changed from relative to absolute import
 from ..models import PermissionRequest, Track, Session, Branch
-from ..serializers import AttendanceRecordSerializer, AttendanceRecordSerializerForStudents, AttendanceRecordSerializerForSupervisors
+from ..checkin_context import load_check_in_context
+from ..schedule_index import get_schedule_index, get_track_schedule
+from ..geofence import haversine_distance, nearest_branch
+from ..batch_checkin import MAX_EVENTS_PER_BATCH, ingest_events, sync_key_for
+from ..write_behind import flush_pending, overlay_student, persist_attendance
+from ..idempotency import idempotent
+from ..response_cache import cached_response
+from ..scope import get_user_scope
+from ..analytics import track_day_map, track_day_stats, track_student_counts
+from ..heatmap import track_heatmaps
+from ..timeseries import attendance_frame, iso_week_totals, rolling_sum
+from ..day_ticket import issue_day_ticket, redeem_check_in, redeem_check_out
+from ..exports import aiter_csv, aiter_file, export_rows, write_parquet
+from ..ledger import student_ledger
+from ..serializers import AttendanceRecordSerializerForStudents, AttendanceRecordSerializerForSupervisors, prefetch_attendance_records, prefetch_student_records
+from ..row_serializers import attendance_record_rows, student_record_rows
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models import Count, Q, Prefetch
+from django.http import FileResponse, StreamingHttpResponse
 from datetime import timedelta, date, datetime
 from collections import OrderedDict
+import numpy as np
+import tempfile
 
 import calendar
 from rest_framework import status
@@ -22,6 +40,8 @@ from dateutil.relativedelta import relativedelta
 
 logger = logging.getLogger(__name__)
 
+ROLLING_DAYS = 7  # Window of the attendance-trends rolling totals
+
 class AttendanceViewSet(viewsets.ViewSet):
     """
     API endpoints for attendance validation and management.
@@ -29,6 +49,7 @@ class AttendanceViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     @action(detail=False, methods=['POST'], url_path='check-in')
+    @idempotent('check-in')
     def check_in(self, request):
         """
         Check in a student by validating their location against the geofencing area.
@@ -38,6 +59,9 @@ class AttendanceViewSet(viewsets.ViewSet):
         - uuid: UUID for the student's phone
         - latitude: User's current latitude
         - longitude: User's current longitude
+        
+        An optional Idempotency-Key header makes retries return the original response.
+        An optional `ticket` (from the day-ticket endpoint) skips the database lookups.
         """
         # Extract data from request
         user_id = request.data.get('user_id')
@@ -62,81 +86,71 @@ class AttendanceViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get user
-        user = get_object_or_404(CustomUser, id=user_id)
-        
-        # Get student record for this user
-        try:
-            student = Student.objects.get(user=user)
+        # A day ticket carries everything below, so it is checked without reading the database
+        if request.data.get('ticket'):
+            payload, status_code = redeem_check_in(request.data['ticket'], request.user, user_id, uuid, latitude, longitude)
+            return Response(payload, status=status_code)
 
-            # check if student is active
-            if not student.user.is_active:
-                logger.warning(f"Student {student.user.email} is not active")
-                return Response({
-                    "status": "error",
-                    "message": "Your account is not active. Please contact an administrator.",
-                    "error_code": "account_not_active"
-                }, status=status.HTTP_403_FORBIDDEN)
-            
-            # Check if the student has a UUID
-            if student.phone_uuid and student.phone_uuid != uuid:
-                # Student has a different UUID - return error message
-                logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
-                return Response({
-                    "status": "error",
-                    "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
-                    "error_code": "uuid_mismatch"
-                }, status=status.HTTP_400_BAD_REQUEST)
-            elif not student.phone_uuid:
-                # Student exists but has no UUID, so update it
-                student.phone_uuid = uuid
-                student.save(update_fields=['phone_uuid'])
-                logger.info(f"Set phone UUID for student {student.user.email} to {uuid}")
+        # Load student, today's schedule, branch, session bounds, attendance record
+        # and approved permissions in one go
+        try:
+            context = load_check_in_context(user_id)
         except Student.DoesNotExist:
             return Response(
                 {"error": "No student record found for this user."},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        # Get today's date
-        today = timezone.localdate()
+        student = context.student
 
+        # check if student is active
+        if not student.user.is_active:
+            logger.warning(f"Student {student.user.email} is not active")
+            return Response({
+                "status": "error",
+                "message": "Your account is not active. Please contact an administrator.",
+                "error_code": "account_not_active"
+            }, status=status.HTTP_403_FORBIDDEN)
         
-        # Find a schedule for today and get corresponding attendance record
-        try:
-            # Find schedules for the student's track that are for today
-            schedule = Schedule.objects.filter(
-                track=student.track,
-                created_at=today
-            ).first()
-            
-            if not schedule:
-                return Response({
-                    "status": "error",
-                    "message": "No schedule found for today.",
-                    "error_code": "no_schedule_today"
-                }, status=status.HTTP_404_NOT_FOUND)
-            
-            # Find attendance record for this student and schedule
-            attendance_record = AttendanceRecord.objects.filter(
-                student=student,
-                schedule=schedule
-            ).first()
-            
-            if not attendance_record:
-                # Create a new attendance record if one doesn't exist
-                attendance_record = AttendanceRecord.objects.create(
-                    student=student,
-                    schedule=schedule
-                )
-                logger.info(f"Created new attendance record for {student.user.email} for today's schedule")
-        except Exception as e:
-            logger.error(f"Error finding attendance record: {str(e)}")
+        # Check if the student has a UUID
+        if student.phone_uuid and student.phone_uuid != uuid:
+            # Student has a different UUID - return error message
+            logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
             return Response({
                 "status": "error",
-                "message": f"Error finding attendance record: {str(e)}",
-                "error_code": "attendance_record_error"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
+                "error_code": "uuid_mismatch"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        elif not student.phone_uuid:
+            # Student exists but has no UUID, so update it
+            student.phone_uuid = uuid
+            student.save(update_fields=['phone_uuid'])
+            logger.info(f"Set phone UUID for student {student.user.email} to {uuid}")
+        
+        if not context.has_schedule:
+            return Response({
+                "status": "error",
+                "message": "No schedule found for today.",
+                "error_code": "no_schedule_today"
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        attendance_record = context.attendance_record
+        if not attendance_record:
+            # Create a new attendance record if one doesn't exist
+            try:
+                # get_or_create + the (student, schedule) unique constraint settle concurrent first check-ins
+                attendance_record, created = AttendanceRecord.objects.get_or_create(
+                    student=student,
+                    schedule_id=context.schedule_id
+                )
+                if created:
+                    logger.info(f"Created new attendance record for {student.user.email} for today's schedule")
+            except Exception as e:
+                logger.error(f"Error finding attendance record: {str(e)}")
+                return Response({
+                    "status": "error",
+                    "message": f"Error finding attendance record: {str(e)}",
+                    "error_code": "attendance_record_error"
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # Check if the student has already checked in
         if attendance_record.check_in_time:
@@ -147,76 +161,37 @@ class AttendanceViewSet(viewsets.ViewSet):
                 "error_code": "already_checked_in"
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        
-        # Get branch for geofence validation
-        branch = schedule.custom_branch
-        
         # Calculate distance between user and branch coordinates
-        branch_latitude = branch.latitude
-        branch_longitude = branch.longitude
-        geofence_radius = branch.radius  # in meters
-        
-        distance = self._calculate_distance(latitude, longitude, branch_latitude, branch_longitude)
+        geofence_radius = context.geofence_radius  # in meters
+        distance = haversine_distance(latitude, longitude, context.branch_latitude, context.branch_longitude)
         
         # Check if user is within the geofence
         if distance <= geofence_radius:
             # User is within the geofence - update check-in time and mark student as checked in
             current_time = timezone.localtime()
             
-            # Get first session start time for lateness calculation
-            sessions = schedule.sessions.all().order_by('start_time')
-            if not sessions.exists():
+            if not context.has_sessions:
                 attendance_record.status = 'no_sessions'
-                attendance_record.save(update_fields=['status'])
+                persist_attendance(attendance_record, ['status'])
                 return Response({
                     "status": "warning",
                     "message": "Check-in recorded, but this schedule has no sessions defined.",
-                    "schedule_name": schedule.name
+                    "schedule_name": context.schedule_name
                 })
             
-            first_session = sessions.first()
-            
-            # Check for permission requests
-            permission_request = PermissionRequest.objects.filter(
-                student=student,
-                schedule=schedule,
-                status='approved'
-            ).first()
-            
             # Determine status based on timing and permissions
-            is_late = current_time > (first_session.start_time + timedelta(minutes=15))
-            
-            if permission_request:
-                # Handle approved permissions
-                if permission_request.request_type == 'late_check_in':
-                    if permission_request.adjusted_time and current_time <= permission_request.adjusted_time:
-                        # Within approved late window
-                        status_to_set = 'late-excused'
-                    else:
-                        # Late even beyond approved time
-                        status_to_set = 'late-check-in'
-                elif permission_request.request_type == 'day_excuse':
-                    # Should not reach here if properly excused for the day
-                    status_to_set = 'excused'
-                else:
-                    # Other permission types (like early_leave) - regular check-in
-                    status_to_set = 'late-check-in' if is_late else 'check-in'
-            else:
-                # No permissions
-                status_to_set = 'late-check-in' if is_late else 'check-in'
+            status_to_set = context.check_in_status(current_time)
             
             # Update check_in_time and status
             attendance_record.check_in_time = current_time
             attendance_record.status = status_to_set
-            attendance_record.save(update_fields=['check_in_time', 'status'])
-            logger.info(f"Check-in time set for student {student.user.email} with status: {status_to_set}")
-            
             # Mark student as checked in
             student.is_checked_in = True
-            student.save(update_fields=['is_checked_in'])
+            persist_attendance(attendance_record, ['check_in_time', 'status'], student, ['is_checked_in'])
+            logger.info(f"Check-in time set for student {student.user.email} with status: {status_to_set}")
             logger.info(f"Student {student.user.email} marked as checked in")
             
-            logger.info(f"Student {student.user.email} successfully validated attendance at {branch.name}")
+            logger.info(f"Student {student.user.email} successfully validated attendance at {context.branch_name}")
             
             return Response({
                 "status": "success",
@@ -224,7 +199,8 @@ class AttendanceViewSet(viewsets.ViewSet):
                 "distance": distance,
                 "geofence_radius": geofence_radius,
                 "check_in_time": attendance_record.check_in_time,
-                "schedule_name": schedule.name
+                "schedule_name": context.schedule_name,
+                "branch": {"id": context.branch_id, "name": context.branch_name}
             })
         else:
             # User is outside the geofence
@@ -234,10 +210,13 @@ class AttendanceViewSet(viewsets.ViewSet):
                 "status": "fail",
                 "message": "You are outside the allowed geofence area",
                 "distance": distance,
-                "geofence_radius": geofence_radius
+                "geofence_radius": geofence_radius,
+                "branch": {"id": context.branch_id, "name": context.branch_name},
+                "nearest_branch": nearest_branch(latitude, longitude)
             }, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['POST'], url_path='check-out')
+    @idempotent('check-out')
     def check_out(self, request):
         """
         Check out a student by validating their location against the geofencing area.
@@ -247,6 +226,9 @@ class AttendanceViewSet(viewsets.ViewSet):
         - uuid: UUID for the student's phone
         - latitude: User's current latitude
         - longitude: User's current longitude
+        
+        An optional Idempotency-Key header makes retries return the original response.
+        An optional `ticket` (from the day-ticket endpoint) skips the database lookups.
         """
         # Extract data from request
         user_id = request.data.get('user_id')
@@ -270,194 +252,105 @@ class AttendanceViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get user
-        user = get_object_or_404(CustomUser, id=user_id)
-        
-        # Get student record for this user
-        try:
-            student = Student.objects.get(user=user)
+        # A day ticket carries everything below, so it is checked without reading the database
+        if request.data.get('ticket'):
+            payload, status_code = redeem_check_out(request.data['ticket'], request.user, user_id, uuid, latitude, longitude)
+            return Response(payload, status=status_code)
 
-            # check if student is active
-            if not student.user.is_active:
-                logger.warning(f"Student {student.user.email} is not active")
-                return Response({
-                    "status": "error",
-                    "message": "Your account is not active. Please contact an administrator.",
-                    "error_code": "account_not_active"
-                }, status=status.HTTP_403_FORBIDDEN)
-            
-            # Check if the student is checked in (can't check out if not checked in)
-            if not student.is_checked_in:
-                logger.warning(f"Student {student.user.email} attempted to check out but hasn't checked in")
-                return Response({
-                    "status": "error",
-                    "message": "You haven't checked in yet. Please check in first.",
-                    "error_code": "not_checked_in"
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Check if the student has a UUID
-            if student.phone_uuid and student.phone_uuid != uuid:
-                # Student has a different UUID - return error message
-                logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
-                return Response({
-                    "status": "error",
-                    "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
-                    "error_code": "uuid_mismatch"
-                }, status=status.HTTP_400_BAD_REQUEST)
+        # Load student, today's schedule, branch, session bounds, attendance record
+        # and approved permissions in one go
+        try:
+            context = load_check_in_context(user_id)
         except Student.DoesNotExist:
             return Response(
                 {"error": "No student record found for this user."},
                 status=status.HTTP_404_NOT_FOUND
             )
+        student = context.student
+
+        # check if student is active
+        if not student.user.is_active:
+            logger.warning(f"Student {student.user.email} is not active")
+            return Response({
+                "status": "error",
+                "message": "Your account is not active. Please contact an administrator.",
+                "error_code": "account_not_active"
+            }, status=status.HTTP_403_FORBIDDEN)
         
-        # Get today's date
-        today = timezone.localdate()
+        # Check if the student is checked in (can't check out if not checked in)
+        if not student.is_checked_in:
+            logger.warning(f"Student {student.user.email} attempted to check out but hasn't checked in")
+            return Response({
+                "status": "error",
+                "message": "You haven't checked in yet. Please check in first.",
+                "error_code": "not_checked_in"
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Find a schedule for today and get corresponding attendance record
-        try:
-            # Find schedules for the student's track that are for today
-            schedule = Schedule.objects.filter(
-                track=student.track,
-                created_at=today
-            ).first()
-            
-            if not schedule:
-                return Response({
-                    "status": "error",
-                    "message": "No schedule found for today.",
-                    "error_code": "no_schedule_today"
-                }, status=status.HTTP_404_NOT_FOUND)
-            
-            # Find attendance record for this student and schedule with check-in
-            attendance_record = AttendanceRecord.objects.filter(
-                student=student,
-                schedule=schedule,
-                # check_in_time__isnull=False  # Must have checked in first
-            ).first()
-            
-            if not attendance_record:
-                return Response({
-                    "status": "error",
-                    "message": "No checked-in attendance record found for today.",
-                    "error_code": "no_checkin_record"
-                }, status=status.HTTP_404_NOT_FOUND)
-                
-            # Check if already checked out
-            if attendance_record.check_out_time:
-                return Response({
-                    "status": "error",
-                    "message": "You have already checked out for this session.",
-                    "error_code": "already_checked_out"
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-        except Exception as e:
-            logger.error(f"Error finding attendance record: {str(e)}")
+        # Check if the student has a UUID
+        if student.phone_uuid and student.phone_uuid != uuid:
+            # Student has a different UUID - return error message
+            logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
             return Response({
                 "status": "error",
-                "message": f"Error finding attendance record: {str(e)}",
-                "error_code": "attendance_record_error"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
+                "error_code": "uuid_mismatch"
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get branch for geofence validation
-        branch = schedule.custom_branch
+        if not context.has_schedule:
+            return Response({
+                "status": "error",
+                "message": "No schedule found for today.",
+                "error_code": "no_schedule_today"
+            }, status=status.HTTP_404_NOT_FOUND)
         
-        # Calculate distance between user and branch coordinates
-        branch_latitude = branch.latitude
-        branch_longitude = branch.longitude
-        geofence_radius = branch.radius  # in meters
+        attendance_record = context.attendance_record
+        if not attendance_record:
+            return Response({
+                "status": "error",
+                "message": "No checked-in attendance record found for today.",
+                "error_code": "no_checkin_record"
+            }, status=status.HTTP_404_NOT_FOUND)
+            
+        # Check if already checked out
+        if attendance_record.check_out_time:
+            return Response({
+                "status": "error",
+                "message": "You have already checked out for this session.",
+                "error_code": "already_checked_out"
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        distance = self._calculate_distance(latitude, longitude, branch_latitude, branch_longitude)
+        # Calculate distance between user and branch coordinates
+        geofence_radius = context.geofence_radius  # in meters
+        distance = haversine_distance(latitude, longitude, context.branch_latitude, context.branch_longitude)
         
         # Check if user is within the geofence
         if distance <= geofence_radius:
             # User is within the geofence - set check-out time and update student status
             current_time = timezone.localtime()
             
-            # Get sessions for timing calculations
-            sessions = schedule.sessions.all().order_by('-end_time')
-            if not sessions.exists():
+            if not context.has_sessions:
                 attendance_record.check_out_time = current_time
                 attendance_record.status = 'no_sessions'
-                attendance_record.save(update_fields=['check_out_time', 'status'])
-                
                 # Update student check-in status
                 student.is_checked_in = False
-                student.save(update_fields=['is_checked_in'])
+                persist_attendance(attendance_record, ['check_out_time', 'status'], student, ['is_checked_in'])
                 
                 return Response({
                     "status": "warning",
                     "message": "Check-out recorded, but this schedule has no sessions defined.",
-                    "schedule_name": schedule.name
+                    "schedule_name": context.schedule_name
                 })
             
-            last_session = sessions.first()  # Get the session that ends last
-            
-            # Check for permission requests
-            permission_requests = PermissionRequest.objects.filter(
-                student=student,
-                schedule=schedule,
-                status='approved'
-            )
-            
-            # Check if there's an early leave permission
-            early_leave_permission = permission_requests.filter(request_type='early_leave').first()
-            
-            # Check if there was a late check-in permission
-            late_checkin_permission = permission_requests.filter(request_type='late_check_in').first()
-            
-            # Determine if check-out is early (before session end)
-            is_early_checkout = current_time < last_session.end_time
-            
-            # Determine base status from check-in status
-            current_status = attendance_record.status
-            
             # Determine final status based on check-in status, timing, and permissions
-            if current_status in ['check-in']:
-                # Normal check-in
-                if is_early_checkout:
-                    if early_leave_permission:
-                        status_to_set = 'check-in_early-excused'
-                    else:
-                        status_to_set = 'check-in_early-check-out'
-                else:
-                    status_to_set = 'attended'
-                    
-            elif current_status in ['late-check-in']:
-                # Late check-in without excuse
-                if is_early_checkout:
-                    if early_leave_permission:
-                        status_to_set = 'late-check-in_early-excused'
-                    else:
-                        status_to_set = 'late-check-in_early-check-out'
-                else:
-                    status_to_set = 'late-check-in'
-                    
-            elif current_status in ['late-excused']:
-                # Late check-in with excuse
-                if is_early_checkout:
-                    if early_leave_permission:
-                        status_to_set = 'late-excused_early-excused'
-                    else:
-                        status_to_set = 'late-excused_early-check-out'
-                else:
-                    status_to_set = 'late-excused'
-                    
-            else:
-                # Any other status (shouldn't normally happen)
-                if is_early_checkout and not early_leave_permission:
-                    status_to_set = 'check-in_early-check-out'
-                else:
-                    status_to_set = 'attended'
+            status_to_set = context.check_out_status(current_time)
             
             # Update check_out_time and status
             attendance_record.check_out_time = current_time
             attendance_record.status = status_to_set
-            attendance_record.save(update_fields=['check_out_time', 'status'])
-            logger.info(f"Check-out time set for student {student.user.email} with status: {status_to_set}")
-            
             # Set student as checked out
             student.is_checked_in = False
-            student.save(update_fields=['is_checked_in'])
+            persist_attendance(attendance_record, ['check_out_time', 'status'], student, ['is_checked_in'])
+            logger.info(f"Check-out time set for student {student.user.email} with status: {status_to_set}")
             logger.info(f"Student {student.user.email} marked as checked out")
             
             # Calculate duration of attendance 
@@ -473,7 +366,8 @@ class AttendanceViewSet(viewsets.ViewSet):
                 "check_out_time": attendance_record.check_out_time,
                 "attendance_duration_hours": round(hours, 2),
                 "is_checked_in": False,
-                "schedule_name": schedule.name
+                "schedule_name": context.schedule_name,
+                "branch": {"id": context.branch_id, "name": context.branch_name}
             })
         else:
             # User is outside the geofence
@@ -483,15 +377,150 @@ class AttendanceViewSet(viewsets.ViewSet):
                 "status": "fail",
                 "message": "You are outside the allowed geofence area",
                 "distance": distance,
-                "geofence_radius": geofence_radius
+                "geofence_radius": geofence_radius,
+                "branch": {"id": context.branch_id, "name": context.branch_name},
+                "nearest_branch": nearest_branch(latitude, longitude)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['POST'], url_path='batch-check-in')
+    def batch_check_in(self, request):
+        """
+        Apply a batch of check-in/check-out events queued by the mobile app.
+        
+        Request body should contain:
+        - events: list of events, each with
+            - event_id: client-generated ID, echoed back in the results
+            - user_id: ID of the user
+            - uuid: UUID for the student's phone
+            - type: "check_in" or "check_out"
+            - timestamp: ISO 8601 time the event happened on the device
+            - latitude / longitude: coordinates at that time
+            - signature: hex HMAC-SHA256 of "event_id|user_id|uuid|type|timestamp|latitude|longitude"
+              keyed with the device's sync key (see sync-key)
+        
+        Returns one result per event, in request order.
+        """
+        events = request.data.get('events')
+        if not isinstance(events, list) or not events:
+            return Response(
+                {"error": "Missing required field. Please provide a non-empty list of events."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(events) > MAX_EVENTS_PER_BATCH:
+            return Response({
+                "status": "error",
+                "message": f"Too many events. A batch can contain at most {MAX_EVENTS_PER_BATCH} events.",
+                "error_code": "batch_too_large"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results, applied = ingest_events(events)
+        return Response({
+            "status": "success",
+            "applied": applied,
+            "results": results
+        })
+
+    @action(detail=False, methods=['GET'], url_path='sync-key')
+    def sync_key(self, request):
+        """
+        Return the key the logged-in student's device uses to sign batched check-in events.
+        
+        Query parameters:
+        - uuid: UUID for the student's phone (registered if the student has none yet)
+        """
+        uuid = request.query_params.get('uuid')
+        if not uuid:
+            return Response(
+                {"error": "Missing required fields. Please provide uuid."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            student = Student.objects.select_related('user').get(user=request.user)
+        except Student.DoesNotExist:
+            return Response({
+                "status": "error",
+                "message": "No student record found for the logged-in user."
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        if student.phone_uuid and student.phone_uuid != uuid:
+            logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
+            return Response({
+                "status": "error",
+                "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
+                "error_code": "uuid_mismatch"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        elif not student.phone_uuid:
+            student.phone_uuid = uuid
+            student.save(update_fields=['phone_uuid'])
+            logger.info(f"Set phone UUID for student {student.user.email} to {uuid}")
+
+        return Response({
+            "status": "success",
+            "sync_key": sync_key_for(student)
+        })
+
+    @action(detail=False, methods=['GET'], url_path='day-ticket')
+    def day_ticket(self, request):
+        """
+        Return a signed ticket for today's check-in/check-out, valid until midnight.
+        
+        The ticket embeds the student's attendance record, today's schedule and session
+        bounds, approved permissions and the branch geofence; sending it as `ticket`
+        with check-in/check-out lets the server skip its lookups. Fetch a new one
+        when check-in/check-out answers with `stale_day_ticket`.
+        
+        Query parameters:
+        - uuid: UUID for the student's phone (registered if the student has none yet)
+        """
+        uuid = request.query_params.get('uuid')
+        if not uuid:
+            return Response(
+                {"error": "Missing required fields. Please provide uuid."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            context = load_check_in_context(request.user.id)
+        except Student.DoesNotExist:
+            return Response({
+                "status": "error",
+                "message": "No student record found for the logged-in user."
+            }, status=status.HTTP_404_NOT_FOUND)
+        student = context.student
+
+        if student.phone_uuid and student.phone_uuid != uuid:
+            logger.warning(f"UUID mismatch for student {student.user.email}: received {uuid}, stored {student.phone_uuid}")
+            return Response({
+                "status": "error",
+                "message": "Incorrect device UUID. Please use the same device you used during registration or contact an administrator.",
+                "error_code": "uuid_mismatch"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        elif not student.phone_uuid:
+            student.phone_uuid = uuid
+            student.save(update_fields=['phone_uuid'])
+            logger.info(f"Set phone UUID for student {student.user.email} to {uuid}")
+
+        if not context.has_schedule:
+            return Response({
+                "status": "error",
+                "message": "No schedule found for today.",
+                "error_code": "no_schedule_today"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        ticket = issue_day_ticket(context, uuid)
+        return Response({
+            "status": "success",
+            "ticket": str(ticket),
+            "expires_at": datetime.fromtimestamp(ticket['exp'], tz=timezone.get_current_timezone())
+        })
+
     @action(detail=False, methods=['POST'], url_path='reset-check-ins', permission_classes=[IsSupervisorOrAboveUser])
     def reset_check_ins(self, request):
         """
         Reset the check-in status for all students.
         Only accessible by admin users.
         """
+        # Buffered check-ins would otherwise be flushed over the reset afterwards
+        flush_pending()
         # Reset all students' is_checked_in to False
         count = Student.objects.filter(is_checked_in=True).update(is_checked_in=False)
         logger.info(f"Reset check-in status for {count} students")
@@ -508,7 +537,7 @@ class AttendanceViewSet(viewsets.ViewSet):
         """
         try:
             # Get the logged-in user's student profile
-            student = Student.objects.get(user=request.user)
+            student = overlay_student(Student.objects.get(user=request.user))
             return Response({
                 "status": "success",
                 "is_checked_in": student.is_checked_in
@@ -559,9 +588,8 @@ class AttendanceViewSet(viewsets.ViewSet):
                 student__track__in=tracks,
                 schedule__created_at=date 
             )
-            serializer = AttendanceRecordSerializer(attendance_records, many=True)
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(attendance_record_rows(attendance_records), status=status.HTTP_200_OK)
 
 
         except Exception as e:
@@ -571,6 +599,7 @@ class AttendanceViewSet(viewsets.ViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @action(detail=False, methods=['GET'], url_path='attendance-percentage/today')
+    @cached_response('attendance-percentage-today')
     def get_todays_attendance_percentage(self, request):
         """
          Get today's attendance percentage.
@@ -580,42 +609,37 @@ class AttendanceViewSet(viewsets.ViewSet):
         - Coordinators: See percentage for all tracks in their branch
         """
         try:
-            user = request.user
-            user_groups = user.groups.values_list('name', flat=True)
-            track_id = request.query_params.get('track_id')
-            if 'admin' in user_groups:
-           
-                tracks = Track.objects.all()
-                if not tracks.exists():
+            scope = get_user_scope(request)
+            if scope.role == 'admin':
+                tracks = scope.tracks()
+                if not scope.track_ids:
                     return Response({"status": "info", "message": "No tracks found in the system."}, 
                                 status=status.HTTP_200_OK)
                 
-            elif 'branch-manager' in user_groups:
-                branch = Branch.objects.filter(branch_manager=user).first()
-                if not branch:
+            elif scope.role == 'branch-manager':
+                if scope.branch_id is None:
                     return Response({
                         "status": "error",
                         "message": "No branch found for this branch manager."
                     }, status=status.HTTP_404_NOT_FOUND)
                     
-                tracks = Track.objects.filter(default_branch=branch, is_active=True)
-                if not tracks.exists():
+                tracks = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "error",
                         "message": "No tracks found in your branch."
                     }, status=status.HTTP_404_NOT_FOUND)
 
-            elif 'supervisor' in user_groups:
-                    tracks = Track.objects.filter(supervisor=user, is_active=True)
-                    if not tracks.exists():
-                        return Response({
-                            "status": "error",
-                            "message": "You are not assigned as a supervisor to any track."
-                        }, status=status.HTTP_403_FORBIDDEN)
-            elif 'coordinator' in user_groups:
-                coordinator_profile = user.coordinator
-                tracks = Track.objects.filter(default_branch__coordinators=coordinator_profile, is_active=True)
-                if not tracks.exists():
+            elif scope.role == 'supervisor':
+                tracks = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
+                    return Response({
+                        "status": "error",
+                        "message": "You are not assigned as a supervisor to any track."
+                    }, status=status.HTTP_403_FORBIDDEN)
+            elif scope.role == 'coordinator':
+                tracks = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "error",
                         "message": "No tracks found in your branch."
@@ -625,25 +649,13 @@ class AttendanceViewSet(viewsets.ViewSet):
                     "status": "error",
                     "message": "You must be an admin, branch manager, supervisor, or coordinator to access this endpoint."
                 }, status=status.HTTP_403_FORBIDDEN)
-                    
-            date = timezone.localdate()
-
-            total_students = 0
-            attended_students = 0
 
-            for track in tracks:
-                schedules = Schedule.objects.filter(track=track, created_at=date)
-                scheduled_students = Student.objects.filter(
-                attendance_records__schedule__in=schedules
-            ).distinct().count()
-                total_students += scheduled_students
+            date = timezone.localdate()
 
-                # Count how many of the scheduled students actually attended today
-                attended_students += AttendanceRecord.objects.filter(
-                    student__track=track,
-                    schedule__in=schedules,
-                    check_in_time__isnull=False
-                ).count()
+            # Students scheduled today and how many of them checked in, for all tracks at once
+            stats = track_day_stats(tracks, date)
+            total_students = sum(day.expected for day in stats)
+            attended_students = sum(day.checked_in for day in stats)
 
             attendance_percentage = (attended_students / total_students) * 100 if total_students > 0 else 0
 
@@ -671,36 +683,33 @@ class AttendanceViewSet(viewsets.ViewSet):
         - Coordinators: See percentage for all tracks in their branch
         """
         try:
-            user = request.user
-            user_groups = user.groups.values_list('name', flat=True)
-            if 'admin' in user_groups:
-                tracks = Track.objects.filter(is_active=True)
-                if not tracks.exists():
+            scope = get_user_scope(request)
+            if scope.role == 'admin':
+                tracks = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "info", 
                         "message": "No tracks found in the system."
                     }, status=status.HTTP_200_OK)
 
-            elif 'branch-manager' in user_groups:
-                branch = Branch.objects.filter(branch_manager=user).first()
-                if not branch:
+            elif scope.role == 'branch-manager':
+                if scope.branch_id is None:
                     return Response({
                         "status": "error",
                         "message": "No branch found for this branch manager."
                     }, status=status.HTTP_404_NOT_FOUND)
-                tracks = Track.objects.filter(default_branch=branch, is_active=True)
+                tracks = scope.tracks(active_only=True)
 
-            elif 'supervisor' in user_groups:
-                tracks = Track.objects.filter(supervisor=user, is_active=True)
-                if not tracks.exists():
+            elif scope.role == 'supervisor':
+                tracks = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "error",
                         "message": "You are not assigned as a supervisor to any track."
                     }, status=status.HTTP_403_FORBIDDEN)
-            elif 'coordinator' in user_groups:
-                coordinator_profile = user.coordinator
-                tracks = Track.objects.filter(default_branch__coordinators=coordinator_profile, is_active=True)
-                if not tracks.exists():
+            elif scope.role == 'coordinator':
+                tracks = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "error",
                         "message": "No tracks found in your branch."
@@ -713,26 +722,16 @@ class AttendanceViewSet(viewsets.ViewSet):
 
             end_date = timezone.localdate()
             start_date = end_date - timedelta(days=7)
-            total_students = Student.objects.filter(track__in=tracks).count()
-            # Get schedules in the past week
-            schedules = Schedule.objects.filter(
-                track__in=tracks,
-                created_at__range=(start_date, end_date)
-            )
-            num_schedules = schedules.count()
+            total_students = sum(track_student_counts(tracks).values())
+            # One entry per schedule (track and day) in the past week
+            stats = track_day_stats(tracks, start_date, end_date)
+            num_schedules = len(stats)
 
-            # Calculate expected attendance count by aggregating per track
-            expected_attendance_count = sum(
-                Student.objects.filter(track=track).count() * Schedule.objects.filter(track=track, created_at__range=(start_date, end_date)).count()
-                for track in tracks
-            )
+            # Every student of a track is expected at each of its schedules
+            expected_attendance_count = sum(day.enrolled for day in stats)
 
             # Count actual attendance records with check-ins
-            actual_attendance_count = AttendanceRecord.objects.filter(
-                student__track__in=tracks,
-                schedule__in=schedules,
-                check_in_time__isnull=False
-            ).count()
+            actual_attendance_count = sum(day.checked_in for day in stats)
 
             attendance_percentage = (
                 (actual_attendance_count / expected_attendance_count) * 100
@@ -767,14 +766,11 @@ class AttendanceViewSet(viewsets.ViewSet):
         - Coordinators: See trends for all tracks in their branch
         """
         try:
-            user = request.user
-            user_groups = list(user.groups.values_list('name', flat=True))
-            track_id = request.query_params.get('track_id')
-            branch_id = request.query_params.get('branch_id')
+            scope = get_user_scope(request)
             track_id = request.query_params.get('track_id')
             branch_id = request.query_params.get('branch_id') 
-            if 'admin' in user_groups:
-                tracks_query = Track.objects.filter(is_active=True)
+            if scope.role == 'admin':
+                tracks_query = scope.tracks(active_only=True)
                 if branch_id:
                     tracks_query = tracks_query.filter(default_branch_id=branch_id)
                 if not tracks_query.exists():
@@ -783,33 +779,31 @@ class AttendanceViewSet(viewsets.ViewSet):
                         "message": "No tracks found in the system."
                     }, status=status.HTTP_200_OK)
 
-            elif 'branch-manager' in user_groups:
-                branch = Branch.objects.filter(branch_manager=user).first()
-                if not branch:
+            elif scope.role == 'branch-manager':
+                if scope.branch_id is None:
                     return Response({
                         "status": "error",
                         "message": "No branch found for this branch manager."
                     }, status=status.HTTP_404_NOT_FOUND)
                 
-                tracks_query = Track.objects.filter(default_branch=branch, is_active=True)
-                if not tracks_query.exists():
+                tracks_query = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "error",
                         "message": "No tracks found in your branch."
                     }, status=status.HTTP_404_NOT_FOUND)
 
-            elif 'supervisor' in user_groups:
-                tracks_query = Track.objects.filter(supervisor=user, is_active=True)
-                if not tracks_query.exists():
+            elif scope.role == 'supervisor':
+                tracks_query = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "error",
                         "message": "You are not assigned as a supervisor to any track."
                     }, status=status.HTTP_403_FORBIDDEN)
 
-            elif 'coordinator' in user_groups:
-                coordinator_profile = user.coordinator
-                tracks_query = Track.objects.filter(default_branch__coordinators=coordinator_profile, is_active=True)
-                if not tracks_query.exists():
+            elif scope.role == 'coordinator':
+                tracks_query = scope.tracks(active_only=True)
+                if not scope.active_track_ids:
                     return Response({
                         "status": "error",
                         "message": "No tracks found in your branch."
@@ -829,89 +823,66 @@ class AttendanceViewSet(viewsets.ViewSet):
                     }, status=status.HTTP_404_NOT_FOUND)
 
             # Calculate date ranges
-            today = timezone.now().date()
+            today = timezone.localdate()
             thirty_days_ago = today - timedelta(days=30)
             four_weeks_ago = today - timedelta(weeks=4)
 
-            # Get track students count
-            track_students = {
-                track.id: Student.objects.filter(track=track).count()
-                for track in tracks_query
-            }
-
-            # Get attendance data in a single query
-            schedule_data = (
-                Schedule.objects.filter(
-                    track__in=tracks_query,
-                    created_at__gte=four_weeks_ago,
-                    created_at__lte=today
-                )
-                .values('track__id', 'track__name', 'created_at')
-                .annotate(
-                    attended=Count('attendance_records', filter=Q(attendance_records__check_in_time__isnull=False)),
-                    total_students=Count('track__students')
-                )
-                .order_by('created_at')
-            )
+            # Columnar per-track/per-day counts; the extra days feed the first rolling windows
+            frame = attendance_frame(tracks_query, thirty_days_ago - timedelta(days=ROLLING_DAYS - 1), today)
+            # Every student of a track is expected at each of its schedules
+            expected = frame.scheduled * frame.enrolled[:, None]
+            shown = frame.dates >= np.datetime64(thirty_days_ago)
 
-            # Process daily trends and weekly aggregation
-            daily_trends = []
-            weekly_data = {}
-
-            for record in schedule_data:
-                date = record['created_at']
-                track_name = record['track__name']
-                attended = record['attended']
-                expected = record['total_students']
-
-                # Daily trends - only include data from the last 30 days
-                if date >= thirty_days_ago and date <= today:
-                    daily_trends.append({
-                        "date": date,
-                        "track": track_name,
-                        "attended": attended,
-                        "expected": expected
-                    })
+            # Daily trends - one entry per track and scheduled day in the last 30 days, by date
+            days, track_indexes = np.nonzero((frame.scheduled & shown).T)
+            daily_trends = [
+                {
+                    "date": frame.dates[day].item(),
+                    "track": frame.track_names[track],
+                    "attended": int(frame.attended[track, day]),
+                    "expected": int(expected[track, day])
+                }
+                for day, track in zip(days.tolist(), track_indexes.tolist())
+            ]
 
-                # Weekly trends - aggregate all tracks per week
-                if date >= four_weeks_ago and date <= today:
-                    week_num = date.isocalendar()[1]
-                    if track_id:
-                        # If filtering by track, keep track name in the key
-                        week_key = (week_num, track_name)
-                    else:
-                        # If showing all tracks, aggregate by week only
-                        week_key = week_num
-                        
-                    if week_key not in weekly_data:
-                        weekly_data[week_key] = {'attended': 0, 'expected': 0}
-                    weekly_data[week_key]['attended'] += attended
-                    weekly_data[week_key]['expected'] += expected
-
-            # Convert weekly data to list format
+            # Weekly trends - per track when filtering by track, otherwise all tracks together
+            in_weeks = frame.dates >= np.datetime64(four_weeks_ago)
+            weeks = frame.iso_weeks()[in_weeks]
+            if track_id:
+                series = [
+                    (name, frame.scheduled[i], frame.attended[i], expected[i])
+                    for i, name in enumerate(frame.track_names)
+                ]
+            else:
+                series = [("All Tracks", frame.scheduled.any(axis=0), frame.attended.sum(axis=0), expected.sum(axis=0))]
             weekly_trends = []
-            for week_key, data in sorted(weekly_data.items()):
-                if isinstance(week_key, tuple):
-                    # Data for specific track
-                    week_num, track_name = week_key
-                    weekly_trends.append({
-                        "week": week_num,
-                        "track": track_name,
-                        "attended": data['attended'],
-                        "expected": data['expected']
-                    })
-                else:
-                    # Aggregated data for all tracks
-                    weekly_trends.append({
-                        "week": week_key,
-                        "track": "All Tracks",
-                        "attended": data['attended'],
-                        "expected": data['expected']
-                    })
+            for name, scheduled, attended, expected_total in series:
+                week_numbers, attended_weekly = iso_week_totals(weeks, scheduled[in_weeks], attended[in_weeks])
+                _, expected_weekly = iso_week_totals(weeks, scheduled[in_weeks], expected_total[in_weeks])
+                weekly_trends += [
+                    {"week": week, "track": name, "attended": attended_count, "expected": expected_count}
+                    for week, attended_count, expected_count in zip(
+                        week_numbers.tolist(), attended_weekly.tolist(), expected_weekly.tolist()
+                    )
+                ]
+            weekly_trends.sort(key=lambda x: (x['week'], x['track']))
+
+            # Rolling trends - all tracks over the trailing ROLLING_DAYS days, for each scheduled day
+            rolling_attended = rolling_sum(frame.attended.sum(axis=0), ROLLING_DAYS)
+            rolling_expected = rolling_sum(expected.sum(axis=0), ROLLING_DAYS)
+            rolling_trends = [
+                {
+                    "date": frame.dates[day].item(),
+                    "attended": int(rolling_attended[day]),
+                    "expected": int(rolling_expected[day])
+                }
+                for day in np.nonzero(frame.scheduled.any(axis=0) & shown)[0].tolist()
+            ]
 
             response_data = {
-                "daily_trends": sorted(daily_trends, key=lambda x: x['date']),
-                "weekly_trends": weekly_trends
+                "daily_trends": daily_trends,
+                "weekly_trends": weekly_trends,
+                "rolling_trends": rolling_trends
             }
 
             return Response(response_data, status=status.HTTP_200_OK)
@@ -931,6 +902,8 @@ class AttendanceViewSet(viewsets.ViewSet):
         """
         
         try:
+            # Buffered check-ins would otherwise be flushed over the reset afterwards
+            flush_pending()
             attendance_record = get_object_or_404(AttendanceRecord, id=pk)
             # Store previous values for logging
             previous_check_in = attendance_record.check_in_time
@@ -981,6 +954,8 @@ class AttendanceViewSet(viewsets.ViewSet):
         
         try:
             payload = {}
+            # Buffered check-ins would otherwise be flushed over the manual record afterwards
+            flush_pending()
             # Get the attendance record
             attendance_record = get_object_or_404(AttendanceRecord, id=pk)
             schedule = attendance_record.schedule
@@ -1058,10 +1033,13 @@ class AttendanceViewSet(viewsets.ViewSet):
                 }, status=status.HTTP_403_FORBIDDEN)
 
             today = timezone.localdate()
-            schedule = AttendanceRecord.objects.filter(
-                student=student,
-                schedule__created_at=today,
-            ).prefetch_related('schedule__sessions').first()
+            entry = get_track_schedule(student.track_id, today)
+            schedule = None
+            if entry:
+                schedule = prefetch_student_records(AttendanceRecord.objects.filter(
+                    student=student,
+                    schedule_id=entry.schedule_id,
+                ), student=student).first()
 
             if not schedule:
                 return Response({
@@ -1124,6 +1102,7 @@ class AttendanceViewSet(viewsets.ViewSet):
             if student_permission_request.exists():
                 upcoming_records = upcoming_records.exclude(schedule__id__in=student_permission_request.values_list('schedule__id', flat=True))
             
+            upcoming_records = prefetch_student_records(upcoming_records, student=student)
             serializer = AttendanceRecordSerializerForStudents(upcoming_records, many=True)
             
             return Response({
@@ -1177,6 +1156,7 @@ class AttendanceViewSet(viewsets.ViewSet):
             if student_permission_request.exists():
                 upcoming_records = upcoming_records.exclude(schedule__id__in=student_permission_request.values_list('schedule__id', flat=True))
             
+            upcoming_records = prefetch_student_records(upcoming_records, student=student)
             serializer = AttendanceRecordSerializerForStudents(upcoming_records, many=True)
             
             return Response({
@@ -1195,6 +1175,7 @@ class AttendanceViewSet(viewsets.ViewSet):
                 "message": f"An error occurred: {str(e)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)            
     @action(detail=False, methods=['GET'], url_path='weekly-breakdown')
+    @cached_response('weekly-breakdown')
     def get_weekly_attendance_by_track(self, request):
         """
         Get attendance percentage breakdown for each track from Saturday to Friday.
@@ -1202,38 +1183,36 @@ class AttendanceViewSet(viewsets.ViewSet):
         For coordinators: Shows data for all tracks in their branch
         """
         try:
-            user = request.user
-            user_groups = user.groups.values_list('name', flat=True)
+            scope = get_user_scope(request)
             track_id = request.query_params.get('track_id')
 
             # Initialize tracks queryset based on user role
-            if 'supervisor' in user_groups:
+            if scope.role == 'supervisor':
                 if track_id:
-                    tracks = Track.objects.filter(id=track_id, supervisor=user, is_active=True)
-                    if not tracks.exists():
+                    tracks = Track.objects.filter(id=track_id)
+                    if not scope.has_track(track_id, active_only=True):
                         return Response({
                             "status": "error",
                             "message": "Invalid track ID or you are not the supervisor of this track."
                         }, status=status.HTTP_403_FORBIDDEN)
                 else:
-                    tracks = Track.objects.filter(supervisor=user, is_active=True)
-                    if not tracks.exists():
+                    tracks = scope.tracks(active_only=True)
+                    if not scope.active_track_ids:
                         return Response({
                             "status": "error",
                             "message": "You are not assigned as a supervisor to any track."
                         }, status=status.HTTP_403_FORBIDDEN)
-            elif 'coordinator' in user_groups:
-                coordinator_profile = user.coordinator
+            elif scope.role == 'coordinator':
                 if track_id:
-                    tracks = Track.objects.filter(id=track_id, default_branch__coordinators=coordinator_profile, is_active=True)
-                    if not tracks.exists():
+                    tracks = Track.objects.filter(id=track_id)
+                    if not scope.has_track(track_id, active_only=True):
                         return Response({
                             "status": "error",
                             "message": "Invalid track ID or this track is not in your branch."
                         }, status=status.HTTP_403_FORBIDDEN)
                 else:
-                    tracks = Track.objects.filter(default_branch__coordinators=coordinator_profile, is_active=True)
-                    if not tracks.exists():
+                    tracks = scope.tracks(active_only=True)
+                    if not scope.active_track_ids:
                         return Response({
                             "status": "error",
                             "message": "No tracks found in your branch."
@@ -1253,13 +1232,16 @@ class AttendanceViewSet(viewsets.ViewSet):
             week_dates = [d for d in week_dates if d <= today]
             # Exclude today if the first session hasn't started yet
             if today in week_dates:
-                first_session = Session.objects.filter(
-                    schedule__track__in=tracks,
-                    schedule__created_at=today
-                ).order_by('start_time').first()
-                if first_session and first_session.start_time > timezone.localtime():
+                todays_schedules = get_schedule_index(today)
+                first_session_starts = [
+                    todays_schedules[track_id].first_session_start
+                    for track_id in tracks.values_list('id', flat=True)
+                    if track_id in todays_schedules and todays_schedules[track_id].first_session_start
+                ]
+                if first_session_starts and min(first_session_starts) > timezone.localtime():
                     week_dates.remove(today)
             response_data = OrderedDict()
+            stats = track_day_map(tracks, week_dates[0], week_dates[-1]) if week_dates else {}
 
             for date in week_dates:
                 day_name = calendar.day_name[date.weekday()]
@@ -1268,26 +1250,17 @@ class AttendanceViewSet(viewsets.ViewSet):
                 total_actual_records = 0
 
                 for track in tracks:
-                    schedules = Schedule.objects.filter(track=track, created_at=date)
+                    day = stats.get((track.id, date))
 
-                    if not schedules.exists():
+                    if day is None:
                         daily_data[track.name] = {
                             "status": "Free Day"
                         }
                         continue
 
-                    # Count only students scheduled today
-                    scheduled_students = Student.objects.filter(
-                        attendance_records__schedule__in=schedules
-                    ).distinct().count()
-                    
-                    total_students = scheduled_students
-                    expected_records = total_students * schedules.count()
-                    actual_records = AttendanceRecord.objects.filter(
-                        student__track=track,
-                        schedule__in=schedules,
-                        check_in_time__isnull=False
-                    ).count()
+                    # Count only students scheduled that day
+                    expected_records = day.expected
+                    actual_records = day.checked_in
 
                     present_percent = (actual_records / expected_records) * 100 if expected_records else 0
                     absent_percent = 100 - present_percent
@@ -1330,6 +1303,7 @@ class AttendanceViewSet(viewsets.ViewSet):
 
 
     @action(detail=False, methods=['get'], url_path='recent-absences')
+    @cached_response('recent-absences')
     def recent_absences(self, request, *args, **kwargs):
         """
         Get recent absences with optional track filtering.
@@ -1337,40 +1311,36 @@ class AttendanceViewSet(viewsets.ViewSet):
             track_id (optional): Filter results for a specific track
         """
         try:
-            user = request.user
-            user_groups = user.groups.values_list('name', flat=True)
+            scope = get_user_scope(request)
             today = date.today()
             track_id = request.query_params.get('track_id')
-            if track_id:
-                tracks = tracks.filter(id=track_id, is_active=True)
-                
-            if 'supervisor' in user_groups:
+
+            if scope.role == 'supervisor':
                 if track_id:
-                    tracks = Track.objects.filter(id=track_id, supervisor=user, is_active=True)
-                    if not tracks.exists():
+                    tracks = Track.objects.filter(id=track_id)
+                    if not scope.has_track(track_id, active_only=True):
                         return Response({
                             "status": "error",
                             "message": "Invalid track ID or you are not the supervisor of this track."
                         }, status=status.HTTP_403_FORBIDDEN)
                 else:
-                    tracks = Track.objects.filter(supervisor=user, is_active=True)
-                    if not tracks.exists():
+                    tracks = scope.tracks(active_only=True)
+                    if not scope.active_track_ids:
                         return Response({
                             "status": "error",
                             "message": "You are not assigned as a supervisor to any track."
                         }, status=status.HTTP_403_FORBIDDEN)
-            elif 'coordinator' in user_groups:
-                coordinator_profile = user.coordinator
+            elif scope.role == 'coordinator':
                 if track_id:
-                    tracks = Track.objects.filter(id=track_id, default_branch__coordinators=coordinator_profile, is_active=True)
-                    if not tracks.exists():
+                    tracks = Track.objects.filter(id=track_id)
+                    if not scope.has_track(track_id, active_only=True):
                         return Response({
                             "status": "error",
                             "message": "Invalid track ID or this track is not in your branch."
                         }, status=status.HTTP_403_FORBIDDEN)
                 else:
-                    tracks = Track.objects.filter(default_branch__coordinators=coordinator_profile, is_active=True)
-                    if not tracks.exists():
+                    tracks = scope.tracks(active_only=True)
+                    if not scope.active_track_ids:
                         return Response({
                             "status": "error",
                             "message": "No tracks found in your branch."
@@ -1426,8 +1396,19 @@ class AttendanceViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=["get"], url_path="calendar")
     def calendar(self, request):
+        """
+        Daily attendance percentages of the supervisor's tracks, two months per page.
+        
+        Query parameters:
+        - track_id: a single track, or
+        - track_ids: comma-separated tracks; the response then also has a per-track `tracks` map
+        - page: 0 for the current and previous month, 1 for the two before, etc.
+        
+        `calendar` combines the selected tracks per day (checked in / enrolled).
+        """
         supervisor= request.user
         track_id = request.query_params.get('track_id')
+        track_ids = request.query_params.get('track_ids')
         page = int(request.query_params.get('page', 0))
         now = datetime.now()
         
@@ -1445,34 +1426,43 @@ class AttendanceViewSet(viewsets.ViewSet):
         tracks = Track.objects.filter(supervisor=supervisor)
         if track_id:
             tracks = tracks.filter(id=track_id)
+        elif track_ids:
+            try:
+                tracks = tracks.filter(id__in=[int(value) for value in track_ids.split(',') if value.strip()])
+            except ValueError:
+                return Response({
+                    "status": "error",
+                    "message": "track_ids must be a comma-separated list of track IDs."
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-        schedules = Schedule.objects.filter(
-            track__in=tracks,
-            created_at__gte=start_date,
-            created_at__lt=end_date
-        ).select_related('track')
-
-        attendance_counts = AttendanceRecord.objects.filter(
-            schedule__in=schedules,
-            check_in_time__isnull=False
-        ).values('schedule').annotate(count=Count('id'))
-        attendance_map = {item['schedule']: item['count'] for item in attendance_counts}
+        # Month buckets come from the heatmap cache; end_date is exclusive
+        heatmaps = track_heatmaps(
+            tracks.order_by('id').values_list('id', flat=True), start_date.date(), end_date.date() - timedelta(days=1)
+        )
 
-        result = {}
+        def percentage(attended_count, total_students):
+            return round((attended_count / total_students * 100) if total_students > 0 else 0.0, 1)
 
-        for schedule in schedules:
-            date_str = schedule.created_at.strftime('%Y-%m-%d')
-            total_students = schedule.track.students.count()
-            attended_count = attendance_map.get(schedule.id, 0)
-            percentage = (attended_count / total_students * 100) if total_students > 0 else 0.0
-            result[date_str] = round(percentage, 1)
+        totals = {}
+        for days in heatmaps.values():
+            for date_str, (attended_count, total_students) in days.items():
+                day_totals = totals.setdefault(date_str, [0, 0])
+                day_totals[0] += attended_count
+                day_totals[1] += total_students
+        result = {date_str: percentage(*totals[date_str]) for date_str in sorted(totals)}
 
-        return Response({
+        response_data = {
             "start_month": start_date.strftime("%B"),
             "end_month": (end_date - relativedelta(days=1)).strftime("%B"),
             "year": start_date.year,
             "calendar": result
-        }, status=status.HTTP_200_OK)
+        }
+        if track_ids and not track_id:
+            response_data["tracks"] = {
+                track: {date_str: percentage(*counts) for date_str, counts in sorted(days.items())}
+                for track, days in heatmaps.items()
+            }
+        return Response(response_data, status=status.HTTP_200_OK)
 
 
     @action(detail=False, methods=['GET'], url_path='student-attendance')
@@ -1501,11 +1491,9 @@ class AttendanceViewSet(viewsets.ViewSet):
                 student=student,
                 schedule__created_at__lte=today
             ).order_by('-schedule__created_at')  # Most recent first
-                
-            serializer = AttendanceRecordSerializerForStudents(attendance_records, many=True)
             
             # Return simpler response structure
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(student_record_rows(attendance_records), status=status.HTTP_200_OK)
 
         except Student.DoesNotExist:
             return Response({
@@ -1530,7 +1518,7 @@ class AttendanceViewSet(viewsets.ViewSet):
             request_user = request.user
             
             # Get the student by ID (from URL parameter)
-            student = get_object_or_404(Student, user_id=pk)
+            student = get_object_or_404(Student.objects.select_related('user', 'track'), user_id=pk)
             
             # Check if student belongs to a track supervised by this supervisor
             if student.track.supervisor != request_user and not student.track.default_branch.coordinators.filter(user=request_user).exists():
@@ -1572,7 +1560,9 @@ class AttendanceViewSet(viewsets.ViewSet):
                     }, status=status.HTTP_400_BAD_REQUEST)
             
             # Get attendance records with optimized queries
-            attendance_records = AttendanceRecord.objects.filter(**query_filters).order_by('-schedule__created_at')  # Most recent first
+            attendance_records = prefetch_attendance_records(
+                AttendanceRecord.objects.filter(**query_filters).order_by('-schedule__created_at'), student=student
+            )  # Most recent first
             
             # Get attendance aggregate for this student
             user_attendance_records = AttendanceRecord.objects.filter(
@@ -1673,7 +1663,7 @@ class AttendanceViewSet(viewsets.ViewSet):
         """
         try:
             # Get the logged-in user's student profile
-            student = Student.objects.get(user=request.user)
+            student = Student.objects.select_related('track').get(user=request.user)
             
             # Get student's program type from track
             program_type = student.track.program_type
@@ -1683,22 +1673,14 @@ class AttendanceViewSet(viewsets.ViewSet):
             unexcused_threshold = ApplicationSetting.get_unexcused_absence_threshold(program_type)
             excused_threshold = ApplicationSetting.get_excused_absence_threshold(program_type)
             
-            # Fetch past attendance records
-            today = timezone.localdate()
-            past_records = AttendanceRecord.objects.filter(
-                student=student,
-                schedule__created_at__lte=today,
-                schedule__sessions__isnull=False,  # Ensure there were sessions
-            ).distinct()
-            
-            # Count attendance data
-            total_days = past_records.count()
-            total_attended = past_records.filter(Q(check_in_time__isnull=False) | Q(status='attended')).count()
-            
+            # Days with sessions up to today and absences, from the student's ledger
+            ledger = student_ledger(student.pk)
+            total_days = ledger.total_days
+            total_attended = ledger.attended_days
             
             # Get excused and unexcused absences
-            unexcused_absences = student.get_unexcused_absence_count()
-            excused_absences = student.get_excused_absence_count()
+            unexcused_absences = ledger.unexcused_absences
+            excused_absences = ledger.excused_absences
             total_absent = unexcused_absences + excused_absences
             # Calculate percentage
             attendance_percentage = (total_attended / total_days) * 100 if total_days > 0 else 0
@@ -1737,27 +1719,67 @@ class AttendanceViewSet(viewsets.ViewSet):
                 "error": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def _calculate_distance(self, lat1, lon1, lat2, lon2):
+    @action(detail=False, methods=['GET'], url_path='export', permission_classes=[IsSupervisorOrAboveUser])
+    def export(self, request):
         """
-        Calculate the distance between two coordinates using the Haversine formula.
-        Returns distance in meters.
+        Download the attendance records of the caller's tracks for a date range.
+
+        Query parameters:
+        - start_date, end_date: YYYY-MM-DD, both required
+        - file_format: csv (default) or parquet
+        - branch_id: only tracks of this branch
+        - track_id: only this track
+
+        CSV is streamed as rows are read; Parquet is written to a temporary
+        file one row group at a time and then streamed from it.
         """
-        # Earth's radius in meters
-        R = 6371000
-        
-        # Convert degrees to radians
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        # Differences
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        # Haversine formula
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        
-        return distance
\ No newline at end of file
+        try:
+            start_date = date.fromisoformat(request.query_params.get('start_date', ''))
+            end_date = date.fromisoformat(request.query_params.get('end_date', ''))
+        except ValueError:
+            return Response(
+                {"error": "start_date and end_date are required. Use YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start_date > end_date:
+            return Response({"error": "start_date must not be after end_date."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in ('csv', 'parquet'):
+            return Response({"error": "file_format must be csv or parquet."}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = get_user_scope(request)
+        track_id = request.query_params.get('track_id')
+        if track_id and not scope.has_track(track_id):
+            return Response({"error": "Track not found or not accessible."}, status=status.HTTP_404_NOT_FOUND)
+        branch_id = request.query_params.get('branch_id')
+        if branch_id and not branch_id.isdigit():
+            return Response({"error": "branch_id must be a branch ID."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if track_id:
+            track_ids = [int(track_id)]
+        else:
+            # Admins see every track; skip the IN list
+            track_ids = None if scope.role == 'admin' else scope.track_ids
+        rows = export_rows(
+            start_date, end_date, track_ids=track_ids,
+            branch_id=int(branch_id) if branch_id else None,
+        )
+        filename = f"attendance_{start_date}_{end_date}.{file_format}"
+        if file_format == 'csv':
+            response = StreamingHttpResponse(aiter_csv(rows), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+        output = tempfile.TemporaryFile()
+        try:
+            write_parquet(rows, output)
+        except ImproperlyConfigured as e:
+            output.close()
+            return Response({"error": str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        size = output.tell()
+        output.seek(0)
+        response = FileResponse(
+            aiter_file(output), as_attachment=True, filename=filename, content_type='application/vnd.apache.parquet'
+        )
+        response['Content-Length'] = size
+        return response
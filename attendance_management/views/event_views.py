@@ -3,13 +3,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
 from django.utils import timezone
-import math
 import logging
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.utils.dateparse import parse_datetime  # Import parse_datetime
 from ..models import Event, EventAttendanceRecord, Student, Guest, Schedule, Track, Session, Branch  # Import Branch
-from ..serializers import EventSerializer, EventAttendanceRecordSerializer, EventAttendanceRecordSerializerForStudents
+from ..geofence import haversine_distance
+from ..modality import refresh_schedule_modality
+from ..scope import get_user_scope
+from ..serializers import (
+    EventSerializer, EventAttendanceRecordSerializer, EventAttendanceRecordSerializerForStudents,
+    prefetch_student_records
+)
+from ..row_serializers import event_rows, student_record_rows
 from core.permissions import IsCoordinatorOrAboveUser, IsStudentOrAboveUser, IsGuestOrAboveUser
 from django.db.models import Q, Count, Min
 
@@ -88,6 +94,7 @@ class EventViewSet(viewsets.ModelViewSet):
                         raise  # Re-raise to rollback
 
                 Session.objects.bulk_create(sessions_to_create)
+                refresh_schedule_modality([schedule.id])
 
                 # 5. Add target tracks if provided
                 target_track_ids = request.data.get('target_track_ids', [])
@@ -120,6 +127,7 @@ class EventViewSet(viewsets.ModelViewSet):
         base_queryset = Event.objects.all()
 
         return base_queryset.prefetch_related(
+            'schedule__custom_branch',
             'schedule__sessions',
             'target_tracks',
             'schedule__event_attendance_records',
@@ -130,18 +138,18 @@ class EventViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         user = request.user
+        scope = get_user_scope(request)
         queryset = self.get_queryset()
 
-        if user.groups.filter(name='coordinator').exists():
-            queryset = queryset.filter(schedule__custom_branch=user.coordinator.branch)
-        elif user.groups.filter(name='admin').exists():
+        if scope.role == 'coordinator':
+            queryset = queryset.filter(schedule__custom_branch_id=scope.branch_id)
+        elif scope.role == 'admin':
             queryset = queryset.all()
-        elif user.groups.filter(name='supervisor').exists():
-            supervisor_tracks = Track.objects.filter(supervisor=user)
-            queryset = queryset.filter(target_tracks__in=supervisor_tracks).distinct()
-        elif user.groups.filter(name='branch-manager').exists():
-            queryset = queryset.filter(schedule__custom_branch=user.branch_manager.branch)
-        elif user.groups.filter(name='student').exists():
+        elif scope.role == 'supervisor':
+            queryset = queryset.filter(target_tracks__in=scope.track_ids).distinct()
+        elif scope.role == 'branch-manager':
+            queryset = queryset.filter(schedule__custom_branch_id=scope.branch_id)
+        elif scope.role == 'student':
             student = user.student_profile
             queryset = queryset.filter(
                 Q(audience_type__in=['students_only', 'both']),
@@ -155,8 +163,7 @@ class EventViewSet(viewsets.ModelViewSet):
                 schedule__event_attendance_records__guest__user=user
             ).distinct()
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(event_rows(queryset))
     
     def update(self, request, *args, **kwargs):
         try:
@@ -195,6 +202,7 @@ class EventViewSet(viewsets.ModelViewSet):
                             )
                         )
                     Session.objects.bulk_create(new_sessions)
+                    refresh_schedule_modality([schedule.id])
 
                 # 4. Update target tracks and handle auto-registration
                 old_target_tracks = set(event.target_tracks.all())
@@ -409,7 +417,7 @@ class EventViewSet(viewsets.ModelViewSet):
         Retrieve attendance statistics for all events.
         """
         try:
-            events = Event.objects.all().order_by('-schedule__created_at')  
+            events = Event.objects.select_related('schedule').order_by('-schedule__created_at')  
             paginator = EventAttendancePagination()
             page = paginator.paginate_queryset(events, request) 
             data = []
@@ -446,15 +454,15 @@ class EventViewSet(viewsets.ModelViewSet):
 
             # Get today's schedules based on user type
             if hasattr(user, 'student_profile'):
-                event_attendance_record = EventAttendanceRecord.objects.filter(
+                event_attendance_record = prefetch_student_records(EventAttendanceRecord.objects.filter(
                     schedule__created_at=today,
                     student__user=user,
-                ).distinct().first()
+                ), student=user.student_profile).distinct().first()
             elif hasattr(user, 'guest_profile'):
-                event_attendance_record = EventAttendanceRecord.objects.filter(
+                event_attendance_record = prefetch_student_records(EventAttendanceRecord.objects.filter(
                     schedule__created_at=today,
                     guest__user=user,
-                ).distinct().first()
+                )).distinct().first()
             else:
                 return Response({"error": "User type not recognized"}, status=status.HTTP_403_FORBIDDEN)
             if not event_attendance_record:
@@ -504,11 +512,9 @@ class EventViewSet(viewsets.ModelViewSet):
             else:
                 return Response({"error": "User type not recognized"}, status=status.HTTP_403_FORBIDDEN)
             
-            serializer = EventAttendanceRecordSerializerForStudents(upcoming_records, many=True)
-            
             return Response({
                 "status": "success",
-                "data": serializer.data
+                "data": student_record_rows(upcoming_records)
             })
         except Student.DoesNotExist:
             return Response({
@@ -676,7 +682,7 @@ class EventViewSet(viewsets.ModelViewSet):
         branch_longitude = branch.longitude
         geofence_radius = branch.radius  # in meters
         
-        distance = self._calculate_distance(latitude, longitude, branch_latitude, branch_longitude)
+        distance = haversine_distance(latitude, longitude, branch_latitude, branch_longitude)
         
         # Check if user is within the geofence
         if distance <= geofence_radius:
@@ -716,28 +722,3 @@ class EventViewSet(viewsets.ModelViewSet):
                 "distance": distance,
                 "geofence_radius": geofence_radius
             }, status=status.HTTP_400_BAD_REQUEST)
-    
-    def _calculate_distance(self, lat1, lon1, lat2, lon2):
-        """
-        Calculate the distance between two coordinates using the Haversine formula.
-        Returns distance in meters.
-        """
-        # Earth's radius in meters
-        R = 6371000
-        
-        # Convert degrees to radians
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        # Differences
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        # Haversine formula
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        
-        return distance
\ No newline at end of file
@@ -1,8 +1,11 @@
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Prefetch
 from ..models import PermissionRequest, Schedule
-from ..serializers import PermissionRequestSerializer
+from ..serializers import PermissionRequestSerializer, annotate_schedules
+from ..scope import get_user_scope
+from ..status_engine import recompute_statuses
 from core.permissions import IsSupervisorOrAboveUser, IsStudentOrAboveUser
 from lost_and_found_system.utils import send_and_save_notification  # Import the notification function
 from rest_framework import status
@@ -13,7 +16,9 @@ class PermissionRequestViewSet(viewsets.ModelViewSet):
     ViewSet for managing permission requests.
     Students can create requests, while supervisors or admins can view, approve, or reject them.
     """
-    queryset = PermissionRequest.objects.select_related('student__user').all()  # Updated to use Student
+    queryset = PermissionRequest.objects.select_related('student__user').prefetch_related(
+        Prefetch('schedule', queryset=annotate_schedules(Schedule.objects.all()))  # Nested ScheduleSerializer
+    )
     serializer_class = PermissionRequestSerializer
 
     def create(self, request, *args, **kwargs):
@@ -90,7 +95,7 @@ class PermissionRequestViewSet(viewsets.ModelViewSet):
         Students see only their own requests.
         """
         user = self.request.user
-        user_groups = user.groups.values_list('name', flat=True)
+        user_groups = get_user_scope(self.request).groups
         if 'supervisor' in user_groups:
             return self.queryset.filter(student__track__supervisor=user, status='pending')
         elif 'coordinator' in user_groups:
@@ -111,10 +116,13 @@ class PermissionRequestViewSet(viewsets.ModelViewSet):
         permission_request = self.get_object()
         user = request.user
         approver_role = "supervisor"
-        if user.groups.filter(name='coordinator').exists():
+        if get_user_scope(request).has_group('coordinator'):
             approver_role = "coordinator"
         permission_request.status = 'approved'
         permission_request.save()
+        # The student may already have checked in/out; re-derive their status with the permission applied
+        if permission_request.schedule_id:
+            recompute_statuses(schedule_ids=[permission_request.schedule_id], student_ids=[permission_request.student_id])
         
         # Send notification to the student that their request was approved
         student = permission_request.student
@@ -148,7 +156,7 @@ class PermissionRequestViewSet(viewsets.ModelViewSet):
         permission_request = self.get_object()
         user = request.user
         rejector_role = "supervisor"
-        if user.groups.filter(name='coordinator').exists():
+        if get_user_scope(request).has_group('coordinator'):
             rejector_role = "coordinator"
         permission_request.status = 'rejected'
         permission_request.save()
@@ -1,6 +1,7 @@
 from rest_framework import viewsets
-from ..models import Schedule, Track
-from ..serializers import ScheduleSerializer
+from ..models import Schedule
+from ..serializers import ScheduleSerializer, annotate_schedules
+from ..scope import get_user_scope
 from core import permissions
 
 
@@ -10,26 +11,16 @@ class ScheduleViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsStudentOrAboveUser]
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_user_scope(self.request)
         queryset = Schedule.objects.all().filter(event=None)
-        groups = user.groups.values_list('name', flat=True)
         from_date = self.request.query_params.get('from_date')
         to_date = self.request.query_params.get('to_date')
         track_id = self.request.query_params.get('track')
 
-        if 'coordinator' in groups:
-            # Get the branch where the user is the coordinator
-            branch = user.coordinator.branch
-            tracks = Track.objects.filter(default_branch=branch)
-            queryset.filter(track__in=tracks)
-        elif 'supervisor' in groups:
-            tracks = Track.objects.filter(supervisor=user)
-            queryset.filter(track__in=tracks)
-        elif 'admin' in groups:
-            queryset.all()
-        elif 'student' in groups:
-            queryset.filter(track__students__user=user)
-        else:
+        if scope.role in ('coordinator', 'supervisor', 'student'):
+            # The coordinator's branch tracks, the supervisor's tracks or the student's own track
+            queryset = queryset.filter(track_id__in=scope.track_ids)
+        elif scope.role != 'admin':
             return Schedule.objects.none()  # No access for other users
         # query for track_id
         if track_id:
@@ -41,11 +32,9 @@ class ScheduleViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(created_at=from_date)
         # order by created_at descending
         queryset = queryset.order_by('-created_at')
-        return queryset
+        return annotate_schedules(queryset)
 
     def list(self, request, *args, **kwargs):
-        user = request.user
-        groups = user.groups.values_list('name', flat=True)
-        if 'student' in groups:
+        if get_user_scope(request).role == 'student':
             self.pagination_class = None  # Disable pagination for students
         return super().list(request, *args, **kwargs)
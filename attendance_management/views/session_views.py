@@ -1,11 +1,11 @@
 from rest_framework import viewsets  # Importing the base class for creating viewsets
 from rest_framework.decorators import action  # For defining custom actions in viewsets
 from rest_framework.response import Response  # For returning HTTP responses
-from django.utils.timezone import now  # Utility for working with timezones
 from django.db import transaction  # For managing database transactions
 from django.utils.dateparse import parse_datetime  # For parsing datetime strings
 from ..models import Session, Schedule , Student , AttendanceRecord , Branch 
 from ..serializers import SessionSerializer  # Serializer for the Session model
+from ..schedule_index import get_track_schedule
 from core import permissions  # Custom permissions module
 from datetime import timedelta
 from django.db.models import Count  # Import Count for aggregation
@@ -30,12 +30,11 @@ class SessionViewSet(viewsets.ModelViewSet):
             return Response({'error': 'User is not a student'}, status=403)  # Return error if not a student
 
         student = user.student_profile  # Get the student's profile
-        today = now().date()  # Get today's date
-        # Filter sessions based on the student's track and today's date
-        sessions = self.queryset.filter(
-            schedule__track=student.track,
-            start_time__date=today
-        )
+        # Look up today's schedule for the student's track in the schedule index
+        entry = get_track_schedule(student.track_id)
+        if not entry:
+            return Response([])
+        sessions = self.queryset.filter(schedule_id=entry.schedule_id)
 
         serializer = self.get_serializer(sessions, many=True)  # Serialize the filtered sessions
         return Response(serializer.data)  # Return the serialized data as a response
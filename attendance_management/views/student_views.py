@@ -8,6 +8,8 @@ from rest_framework.exceptions import NotFound
 from django.db.models import Count, Subquery, OuterRef, Q
 from django.utils import timezone
 from ..models import PermissionRequest, ApplicationSetting, Track
+from ..response_cache import cached_response
+from ..scope import get_user_scope
 
 
 class StudentViewSet(viewsets.ModelViewSet):
@@ -54,6 +56,7 @@ class StudentViewSet(viewsets.ModelViewSet):
         return Response(data, status=200)
 
     @action(detail=False, methods=['get'], url_path='with-warnings', permission_classes=[permissions.IsSupervisorOrAboveUser])
+    @cached_response('students-with-warnings')
     def students_with_warnings(self, request):
         """
         Get students who have exceeded absence thresholds.
@@ -61,21 +64,11 @@ class StudentViewSet(viewsets.ModelViewSet):
         For coordinators: Shows students in all tracks in their branch
         """
         try:
-            user = request.user
-            user_groups = user.groups.values_list('name', flat=True)
+            scope = get_user_scope(request)
             track_id = request.query_params.get('track_id')
 
             # Get thresholds based on program type
-            thresholds = {
-                'nine_months': {
-                    'excused': ApplicationSetting.get_excused_absence_threshold('nine_months'),
-                    'unexcused': ApplicationSetting.get_unexcused_absence_threshold('nine_months')
-                },
-                'intensive': {
-                    'excused': ApplicationSetting.get_excused_absence_threshold('intensive'),
-                    'unexcused': ApplicationSetting.get_unexcused_absence_threshold('intensive')
-                }
-            }
+            thresholds = ApplicationSetting.get_absence_thresholds()
 
             # Get only past schedules
             today = timezone.now().date()
@@ -90,44 +83,36 @@ class StudentViewSet(viewsets.ModelViewSet):
             ).values('schedule_id')
 
             # Get tracks based on user role
-            if 'supervisor' in user_groups:
+            if scope.role == 'supervisor':
                 if track_id:
-                    tracks = Track.objects.filter(id=track_id, supervisor=user, is_active=True)
-                    if not tracks.exists():
+                    if not scope.has_track(track_id, active_only=True):
                         return Response({
                             "status": "error",
                             "message": "Invalid track ID or you are not the supervisor of this track."
                         }, status=status.HTTP_403_FORBIDDEN)
+                    tracks = Track.objects.filter(id=track_id)
                 else:
-                    tracks = Track.objects.filter(supervisor=user, is_active=True)
-            elif 'coordinator' in user_groups:
+                    tracks = scope.tracks(active_only=True)
+            elif scope.role == 'coordinator':
                 if track_id:
-                    tracks = Track.objects.filter(
-                        id=track_id,
-                        default_branch__coordinators=user.coordinator,
-                        is_active=True
-                    )
-                    if not tracks.exists():
+                    if not scope.has_track(track_id, active_only=True):
                         return Response({
                             "status": "error",
                             "message": "Invalid track ID or this track is not in your branch."
                         }, status=status.HTTP_403_FORBIDDEN)
+                    tracks = Track.objects.filter(id=track_id)
                 else:
-                    tracks = Track.objects.filter(
-                        default_branch__coordinators=user.coordinator,
-                        is_active=True
-                    )
+                    tracks = scope.tracks(active_only=True)
             else:
                 return Response({
                     "status": "error",
                     "message": "You must be either a supervisor or coordinator to access this endpoint."
                 }, status=status.HTTP_403_FORBIDDEN)
 
-            if not tracks.exists():
-                role = "supervisor" if 'supervisor' in user_groups else "coordinator"
+            if not track_id and not scope.active_track_ids:
                 return Response({
                     "status": "info",
-                    "message": f"No active tracks found for this {role}."
+                    "message": f"No active tracks found for this {scope.role}."
                 }, status=status.HTTP_404_NOT_FOUND)
 
             # Get students with absences
@@ -156,7 +141,9 @@ class StudentViewSet(viewsets.ModelViewSet):
                     student.excused_count >= thresholds[student.track.program_type]['excused'])
             ]
 
-            serializer = StudentWithWarningSerializer(students_with_warnings, many=True)
+            serializer = StudentWithWarningSerializer(
+                students_with_warnings, many=True, context={'absence_thresholds': thresholds}
+            )
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.db.models import Count, Q, F
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from datetime import datetime, timedelta
 from calendar import monthrange
@@ -9,6 +10,8 @@ from collections import defaultdict
 import calendar
 from ..models import Track, Schedule, Session, Branch
 from ..serializers import TrackSerializer
+from ..scope import get_user_scope
+from ..cohorts import GROUP_BY, cohort_report, intake_snapshot
 from core import permissions
 
 
@@ -18,8 +21,7 @@ class TrackViewSet(viewsets.ModelViewSet):
     pagination_class = None 
 
     def get_queryset(self):
-        user = self.request.user
-        user_groups = user.groups.values_list('name', flat=True)
+        scope = get_user_scope(self.request)
         queryset = Track.objects.select_related('default_branch', 'supervisor')
         program_type = self.request.query_params.get('program_type')
         is_active = self.request.query_params.get('is_active')
@@ -28,19 +30,11 @@ class TrackViewSet(viewsets.ModelViewSet):
         if is_active:
             is_active = is_active.lower() == 'true' if is_active else False
             queryset = queryset.filter(is_active=is_active)
-        if 'admin' in user_groups:
+        if scope.role == 'admin':
             return queryset
-        if 'branch-manager' in user_groups:
-            # Get the branch where the user is the branch manager
-            branch = Branch.objects.filter(branch_manager=user).first()
-            if branch:
-                return queryset.filter(default_branch=branch)
-            return Track.objects.none()
-        if 'coordinator' in user_groups:
-            coordinator_profile = user.coordinator
-            return queryset.filter(default_branch__coordinators=coordinator_profile)
-        if 'supervisor' in user_groups:
-            return queryset.filter(supervisor=user)
+        if scope.role in ('branch-manager', 'coordinator', 'supervisor'):
+            # The branch manager's or coordinator's branch tracks, or the supervisor's tracks
+            return queryset.filter(pk__in=scope.track_ids)
         return Track.objects.none()  # No access for other users
     
     @action(detail=True, methods=['patch'], permission_classes=[permissions.IsSupervisorOrAboveUser])
@@ -66,22 +60,21 @@ class TrackViewSet(viewsets.ModelViewSet):
         - Each track includes daily data and monthly summaries
         - Track details including start_date, intake, supervisor, and description
         """
-        request_user = self.request.user
-        user_groups = request_user.groups.values_list('name', flat=True)
+        scope = get_user_scope(request)
         
         # Get the branch based on user role
         branch = None
-        if 'admin' in user_groups:
+        if scope.role == 'admin':
             branch_id = request.query_params.get('branch_id')
             if not branch_id:
                 return Response({"error": "branch_id is required for admin users"}, status=status.HTTP_400_BAD_REQUEST)
             branch = Branch.objects.filter(id=branch_id).first()
             if not branch:
                 return Response({"error": f"Branch with id {branch_id} not found"}, status=status.HTTP_404_NOT_FOUND)
-        elif 'branch-manager' in user_groups:
-            # Get the branch where the user is the branch manager
-            branch = Branch.objects.filter(branch_manager=request_user).first()
-            if not branch:
+        elif scope.role == 'branch-manager':
+            # The branch the user manages
+            branch = scope.branch_id
+            if branch is None:
                 return Response({"error": "No branch found for this branch manager"}, status=status.HTTP_404_NOT_FOUND)
         
         is_active_str = request.query_params.get('is_active')
@@ -97,77 +90,57 @@ class TrackViewSet(viewsets.ModelViewSet):
             tracks_query = tracks_query.filter(is_active=is_active)
         
         tracks = tracks_query
-        
+
+        # Day types are stored on Schedule (kept current by the session signals), so
+        # the whole branch is summarised with one grouped query plus one for the days.
+        # A day with any offline session is reported as offline.
+        is_offline = Q(offline_session_count__gt=0)
+        schedules = Schedule.objects.filter(track__in=tracks_query.values('id'))
+        monthly_rows = (
+            schedules.annotate(month=TruncMonth('created_at'))
+            .values('track_id', 'month')
+            .annotate(total_days=Count('id'), offline_days=Count('id', filter=is_offline))
+            .order_by('track_id', 'month')
+        )
+        daily_rows = schedules.values(
+            'track_id', 'id', 'name', 'created_at', 'day_modality', 'offline_session_count'
+        ).order_by('track_id', 'created_at')
+
+        monthly_by_track = defaultdict(list)
+        for row in monthly_rows:
+            month = row['month']
+            online_days = row['total_days'] - row['offline_days']
+            monthly_by_track[row['track_id']].append({
+                'year': month.year,
+                'month': month.month,
+                'month_name': calendar.month_name[month.month],
+                'online_days': online_days,
+                'offline_days': row['offline_days'],
+                'total_days': row['total_days'],
+                'online_percentage': round((online_days / row['total_days']) * 100, 2),
+                'offline_percentage': round((row['offline_days'] / row['total_days']) * 100, 2)
+            })
+
+        daily_by_track = defaultdict(list)
+        for row in daily_rows:
+            daily_by_track[row['track_id']].append({
+                'date': row['created_at'].strftime('%Y-%m-%d'),
+                'type': 'offline' if row['offline_session_count'] else 'online',
+                'modality': row['day_modality'],
+                'schedule_id': row['id'],
+                'schedule_name': row['name']
+            })
+
         result = []
-        
+
         for track in tracks:
-            # Get all schedules for this track within date range
-            schedules = Schedule.objects.filter(
-                track=track,
-            ).prefetch_related('sessions')
-            
-            # Initialize data structures
-            daily_data = {}
-            monthly_stats = defaultdict(lambda: {'online_days': 0, 'offline_days': 0, 'total_days': 0})
-            
-            # Process each schedule
-            for schedule in schedules:
-                date_str = schedule.created_at.strftime('%Y-%m-%d')
-                month_key = schedule.created_at.strftime('%Y-%m')
-                
-                # Check if any session for this schedule is offline
-                has_offline_session = schedule.sessions.filter(session_type='offline').exists()
-                session_type = 'offline' if has_offline_session else 'online'
-                
-                # Store daily data
-                daily_data[date_str] = {
-                    'date': date_str,
-                    'type': session_type,
-                    'schedule_id': schedule.id,
-                    'schedule_name': schedule.name if hasattr(schedule, 'name') else f"Schedule {schedule.id}"
-                }
-                
-                # Update monthly statistics
-                if session_type == 'online':
-                    monthly_stats[month_key]['online_days'] += 1
-                else:
-                    monthly_stats[month_key]['offline_days'] += 1
-                monthly_stats[month_key]['total_days'] += 1
-            
-            # Calculate percentages for monthly stats
-            monthly_summary = []
-            for month_key, stats in monthly_stats.items():
-                year, month = map(int, month_key.split('-'))
-                month_name = calendar.month_name[month]
-                
-                online_percentage = 0
-                offline_percentage = 0
-                
-                if stats['total_days'] > 0:
-                    online_percentage = round((stats['online_days'] / stats['total_days']) * 100, 2)
-                    offline_percentage = round((stats['offline_days'] / stats['total_days']) * 100, 2)
-                
-                monthly_summary.append({
-                    'year': year,
-                    'month': month,
-                    'month_name': month_name,
-                    'online_days': stats['online_days'],
-                    'offline_days': stats['offline_days'],
-                    'total_days': stats['total_days'],
-                    'online_percentage': online_percentage,
-                    'offline_percentage': offline_percentage
-                })
-            
-            # Sort monthly summary by year and month
-            monthly_summary.sort(key=lambda x: (x['year'], x['month']))
-            
-            # Sort daily data by date
-            daily_data_sorted = [daily_data[date_key] for date_key in sorted(daily_data.keys())]
-            
+            monthly_summary = monthly_by_track.get(track.id, [])
+            daily_data_sorted = daily_by_track.get(track.id, [])
+
             # Calculate overall statistics
-            total_days = len(daily_data)
-            online_days = sum(1 for day in daily_data.values() if day['type'] == 'online')
-            offline_days = sum(1 for day in daily_data.values() if day['type'] == 'offline')
+            total_days = sum(month['total_days'] for month in monthly_summary)
+            online_days = sum(month['online_days'] for month in monthly_summary)
+            offline_days = sum(month['offline_days'] for month in monthly_summary)
             
             online_percentage = 0
             offline_percentage = 0
@@ -210,3 +183,48 @@ class TrackViewSet(viewsets.ModelViewSet):
             })
         
         return Response(result)
+
+    @action(detail=False, methods=['get'], url_path='cohort-analytics', permission_classes=[permissions.IsBranchManagerOrAboveUser])
+    def cohort_analytics(self, request):
+        """
+        Compare the attendance of intakes, program types, branches or tracks.
+
+        Query Parameters:
+        - intake: intake number, or a comma-separated list of them (required)
+        - group_by: intake, program_type, branch (default) or track
+        - start_date, end_date: optional YYYY-MM-DD bounds on the days counted
+
+        Returns one entry per group with attendance, late and excused rates,
+        percentiles and a 10-bucket histogram of per-student attendance rates,
+        and check-in delays after the day's first session. Branch managers
+        only see their branch's tracks. Figures may trail live attendance by
+        a few minutes.
+        """
+        try:
+            intakes = sorted({int(value) for value in request.query_params.get('intake', '').split(',') if value.strip()})
+            start_date = request.query_params.get('start_date')
+            end_date = request.query_params.get('end_date')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return Response(
+                {"error": "intake must be a comma-separated list of numbers and dates must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not intakes:
+            return Response({"error": "intake is required"}, status=status.HTTP_400_BAD_REQUEST)
+        group_by = request.query_params.get('group_by', 'branch')
+        if group_by not in GROUP_BY:
+            return Response(
+                {"error": f"group_by must be one of: {', '.join(GROUP_BY)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = get_user_scope(request)
+        report = cohort_report(
+            [intake_snapshot(intake) for intake in intakes],
+            group_by=group_by,
+            track_ids=None if scope.role == 'admin' else scope.track_ids,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        return Response({'intakes': intakes, 'group_by': group_by, 'groups': report})
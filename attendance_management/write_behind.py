@@ -0,0 +1,442 @@
+"""
+Write-behind buffer for check-in/check-out updates.
+
+When settings.ATTENDANCE_WRITE_BEHIND is on, the check-in/check-out views
+hand their AttendanceRecord and Student field updates to this buffer instead
+of saving them one row at a time. Each update is appended to a local
+append-only journal (fsync'd before the request is acknowledged), merged into
+an in-memory pending set keyed by row, and applied by a background flusher
+thread with bulk_update every ATTENDANCE_WRITE_BEHIND_FLUSH_MS milliseconds or
+as soon as ATTENDANCE_WRITE_BEHIND_BATCH_SIZE rows are pending.
+
+Journal lifecycle: each process journals to its own `<journal>.<pid>` and
+holds an exclusive flock on `<journal>.<pid>.lock` while it runs. When a flush
+starts, the live journal is renamed to `<journal>.<pid>.<n>.flushing` and a
+fresh one is opened; the renamed file is deleted once its rows are committed.
+On startup (or via the `flush_checkin_journal` command) the journals of
+processes that are gone, i.e. whose lock is free, are replayed in order;
+journals of running processes are left to them.
+
+Only updates to existing rows go through the buffer; creating a missing
+AttendanceRecord stays synchronous. Readers that must see the latest state
+(the check-in context, the status endpoints) overlay pending updates with
+`overlay_record` and `overlay_student`. Admin writers that overwrite these rows
+call `flush_pending` first so a later flush cannot undo them; day-ticket
+redemptions, which write one row pair, call `flush_pending_rows`.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import AttendanceRecord, Student
+from .heatmap import invalidate_records
+from .response_cache import bump_records
+from .ledger import mark_record_ledgers_stale
+from .rollups import mark_records_stale
+
+logger = logging.getLogger(__name__)
+
+RECORD_FIELDS = ('check_in_time', 'check_out_time', 'status')
+STUDENT_FIELDS = ('is_checked_in',)
+DATETIME_FIELDS = ('check_in_time', 'check_out_time')
+
+
+def _encode(fields):
+    return {name: value.isoformat() if name in DATETIME_FIELDS and value is not None else value
+            for name, value in fields.items()}
+
+
+def _decode(fields):
+    return {name: parse_datetime(value) if name in DATETIME_FIELDS and value is not None else value
+            for name, value in fields.items()}
+
+
+def _merge(into, updates):
+    for pk, fields in updates.items():
+        into.setdefault(pk, {}).update(fields)
+
+
+def _apply(model, updates):
+    """bulk_update `updates` ({pk: {field: value}}), grouping rows that touch the same fields."""
+    groups = {}
+    for pk, fields in updates.items():
+        groups.setdefault(tuple(sorted(fields)), []).append(model(pk=pk, **fields))
+    for field_names, objects in groups.items():
+        model.objects.bulk_update(objects, list(field_names), batch_size=500)
+
+
+def _refresh_derived(records):
+    """Mark what is derived from the written `records` stale."""
+    mark_records_stale(records)
+    mark_record_ledgers_stale(records)
+    invalidate_records(records)
+    bump_records(records)
+
+
+def _sequence(path):
+    return int(path.rsplit('.', 2)[-2])
+
+
+def _try_lock(path):
+    """Open and exclusively flock `path`; None when another process holds the lock."""
+    lock_file = open(path, 'a')
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _unlock(lock_file, remove=True):
+    if remove:
+        os.remove(lock_file.name)
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    lock_file.close()
+
+
+class WriteBehindBuffer:
+    def __init__(self, journal_path, flush_interval_ms, batch_size):
+        self.base_path = journal_path
+        self.journal_path = f"{journal_path}.{os.getpid()}"
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._records = {}   # record pk -> {field: value}
+        self._students = {}  # student pk -> {field: value}
+        # Rows taken by the flush in progress, still visible to readers until they are committed
+        self._in_flight_records = {}
+        self._in_flight_students = {}
+        self._journal = None
+        self._lock_file = None
+        self._thread = None
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+        # Held for the life of the process so other processes never replay this journal
+        self._lock_file = _try_lock(f"{self.journal_path}.lock")
+        if self._lock_file is None:
+            raise RuntimeError(f"Write-behind journal {self.journal_path} is locked by another process")
+        self.replay()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='attendance-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(f"Write-behind buffer started (journal {self.journal_path}, "
+                    f"every {int(self.flush_interval * 1000)}ms or {self.batch_size} rows)")
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            os.remove(self.journal_path)
+            self._journal = None
+        if self._lock_file is not None:
+            _unlock(self._lock_file)
+            self._lock_file = None
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Pending rows and the journal are kept; the next tick retries
+                logger.error(f"Write-behind flush failed: {str(e)}", exc_info=True)
+            finally:
+                close_old_connections()
+
+    # -- writes --------------------------------------------------------------
+
+    def submit(self, record=None, record_fields=(), student=None, student_fields=()):
+        """Journal and buffer updates to an existing AttendanceRecord and/or Student."""
+        entry = {}
+        if record is not None and record_fields:
+            entry['records'] = {record.pk: {name: getattr(record, name) for name in record_fields}}
+        if student is not None and student_fields:
+            entry['students'] = {student.pk: {name: getattr(student, name) for name in student_fields}}
+        if not entry:
+            return
+
+        line = json.dumps({
+            kind: {str(pk): _encode(fields) for pk, fields in rows.items()}
+            for kind, rows in entry.items()
+        })
+        with self._lock:
+            self._journal.write(line + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            _merge(self._records, entry.get('records', {}))
+            _merge(self._students, entry.get('students', {}))
+            pending = len(self._records) + len(self._students)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Apply everything pending to the database. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._records and not self._students:
+                    return 0
+                records, self._records = self._records, {}
+                students, self._students = self._students, {}
+                self._in_flight_records, self._in_flight_students = records, students
+                flushing_paths = self._rotate_journal()
+            try:
+                with transaction.atomic():
+                    _apply(AttendanceRecord, records)
+                    _apply(Student, students)
+            except Exception:
+                with self._lock:
+                    # Put rows back underneath anything submitted in the meantime
+                    _merge(records, self._records)
+                    _merge(students, self._students)
+                    self._records, self._students = records, students
+                    self._in_flight_records, self._in_flight_students = {}, {}
+                raise
+            with self._lock:
+                self._in_flight_records, self._in_flight_students = {}, {}
+            # Rows from earlier failed flushes were merged back into this one, so their journals go too
+            for path in flushing_paths:
+                os.remove(path)
+            _refresh_derived(records)
+            written = len(records) + len(students)
+            logger.info(f"Write-behind flushed {len(records)} attendance records and {len(students)} students")
+            return written
+
+    def _rotate_journal(self):
+        """
+        Move the live journal aside for the flush in progress and open a fresh one
+        (caller holds _lock). Returns every journal the flush covers.
+        """
+        self._journal.close()
+        existing = glob.glob(f"{self.journal_path}.*.flushing")
+        sequence = max((_sequence(path) for path in existing), default=0) + 1
+        flushing_path = f"{self.journal_path}.{sequence}.flushing"
+        os.replace(self.journal_path, flushing_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        return existing + [flushing_path]
+
+    def _journal_owners(self):
+        """Paths of the per-process journals next to this one, with or without files left behind."""
+        pattern = re.compile(rf"{re.escape(self.base_path)}\.(\d+)(\.\d+\.flushing|\.lock)?")
+        owners = set()
+        for path in glob.glob(f"{glob.escape(self.base_path)}.*"):
+            match = pattern.fullmatch(path)
+            if match:
+                owners.add(f"{self.base_path}.{match.group(1)}")
+        return owners
+
+    def replay(self):
+        """
+        Apply the journals of processes that are gone. Journals whose lock is
+        held belong to a running process and are skipped. Returns the number
+        of rows written.
+        """
+        groups, locks = [], []
+        for owner in self._journal_owners():
+            # Our own pid may have been reused from a crashed process; we already hold that lock
+            if owner != self.journal_path or self._lock_file is None:
+                lock_file = _try_lock(f"{owner}.lock")
+                if lock_file is None:
+                    logger.info(f"Skipping write-behind journal {owner}: its process is still running")
+                    continue
+                locks.append(lock_file)
+            paths = sorted(glob.glob(f"{glob.escape(owner)}.*.flushing"), key=_sequence)
+            if os.path.exists(owner):
+                paths.append(owner)
+            if paths:
+                groups.append(paths)
+        # Processes are replayed oldest journal first, so the latest write of a row wins
+        groups.sort(key=lambda paths: max(os.path.getmtime(path) for path in paths))
+        paths = [path for group in groups for path in group]
+        try:
+            return self._replay(paths)
+        finally:
+            for lock_file in locks:
+                _unlock(lock_file)
+
+    def _replay(self, paths):
+        records, students = {}, {}
+        for path in paths:
+            with open(path, encoding='utf-8') as journal:
+                for line in journal:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write was never acknowledged
+                        logger.warning(f"Skipping unreadable write-behind journal line in {path}")
+                        continue
+                    _merge(records, {int(pk): _decode(fields) for pk, fields in entry.get('records', {}).items()})
+                    _merge(students, {int(pk): _decode(fields) for pk, fields in entry.get('students', {}).items()})
+        if records or students:
+            # Rows deleted since they were journaled are silently skipped by bulk_update
+            with transaction.atomic():
+                _apply(AttendanceRecord, records)
+                _apply(Student, students)
+            mark_records_stale(records)
+            mark_record_ledgers_stale(records)
+            invalidate_records(records)
+            bump_records(records)
+            logger.info(f"Replayed write-behind journal: {len(records)} attendance records, {len(students)} students")
+        for path in paths:
+            os.remove(path)
+        return len(records) + len(students)
+
+    def flush_rows(self, record_pk=None, student_pk=None):
+        """
+        Write the pending updates of one record and/or student now, e.g. before
+        a conditional UPDATE on them, so the UPDATE sees them and a later flush
+        cannot undo it. Waits for the flush in progress when it holds them.
+        Returns whether anything was pending.
+        """
+        with self._lock:
+            pending = (
+                record_pk in self._records or student_pk in self._students
+                or record_pk in self._in_flight_records or student_pk in self._in_flight_students
+            )
+        if not pending:
+            return False
+        with self._flush_lock:
+            with self._lock:
+                records = {record_pk: self._records.pop(record_pk)} if record_pk in self._records else {}
+                students = {student_pk: self._students.pop(student_pk)} if student_pk in self._students else {}
+            if not records and not students:
+                # The flush we waited for wrote them
+                return True
+            try:
+                with transaction.atomic():
+                    _apply(AttendanceRecord, records)
+                    _apply(Student, students)
+            except Exception:
+                with self._lock:
+                    _merge(records, self._records)
+                    _merge(students, self._students)
+                    self._records.update(records)
+                    self._students.update(students)
+                raise
+        _refresh_derived(records)
+        return True
+
+    # -- reads ---------------------------------------------------------------
+
+    def pending_record_fields(self, pk):
+        """Buffered fields of a record, including those of the flush in progress."""
+        with self._lock:
+            return {**self._in_flight_records.get(pk, {}), **self._records.get(pk, {})}
+
+    def pending_student_fields(self, pk):
+        """Buffered fields of a student, including those of the flush in progress."""
+        with self._lock:
+            return {**self._in_flight_students.get(pk, {}), **self._students.get(pk, {})}
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind():
+    """Return the process-wide buffer (starting it on first use), or None when write-behind is disabled."""
+    global _buffer
+    if not getattr(settings, 'ATTENDANCE_WRITE_BEHIND', False):
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                buffer = WriteBehindBuffer(
+                    settings.ATTENDANCE_WRITE_BEHIND_JOURNAL,
+                    settings.ATTENDANCE_WRITE_BEHIND_FLUSH_MS,
+                    settings.ATTENDANCE_WRITE_BEHIND_BATCH_SIZE,
+                )
+                buffer.start()
+                _buffer = buffer
+    return _buffer
+
+
+def persist_attendance(record, record_fields, student=None, student_fields=()):
+    """
+    Persist check-in/check-out field changes, through the write-behind buffer
+    when it is enabled and with two plain saves otherwise.
+    """
+    buffer = get_write_behind()
+    if buffer is None or record.pk is None:
+        record.save(update_fields=list(record_fields))
+        if student is not None and student_fields:
+            student.save(update_fields=list(student_fields))
+        return
+    buffer.submit(record, record_fields, student, student_fields)
+
+
+async def aget_write_behind():
+    """Async get_write_behind(); starting the buffer replays the journal, so that part runs in a worker thread."""
+    if not getattr(settings, 'ATTENDANCE_WRITE_BEHIND', False):
+        return None
+    if _buffer is None:
+        return await sync_to_async(get_write_behind)()
+    return _buffer
+
+
+async def apersist_attendance(record, record_fields, student=None, student_fields=()):
+    """Async persist_attendance()."""
+    buffer = await aget_write_behind()
+    if buffer is None or record.pk is None:
+        await record.asave(update_fields=list(record_fields))
+        if student is not None and student_fields:
+            await student.asave(update_fields=list(student_fields))
+        return
+    # Journaling fsyncs but never touches the database, so it need not wait for the ORM thread
+    await sync_to_async(buffer.submit, thread_sensitive=False)(record, record_fields, student, student_fields)
+
+
+def flush_pending():
+    """Synchronously apply buffered updates, e.g. before a bulk writer reads the same rows."""
+    buffer = get_write_behind()
+    if buffer is not None:
+        buffer.flush()
+
+
+def flush_pending_rows(record_pk=None, student_pk=None):
+    """Apply buffered updates to one row pair before writing it directly. Returns whether any were buffered."""
+    buffer = get_write_behind()
+    return buffer is not None and buffer.flush_rows(record_pk, student_pk)
+
+
+def overlay_record(record):
+    """Apply buffered-but-unflushed updates to a freshly loaded AttendanceRecord."""
+    buffer = get_write_behind()
+    if buffer is not None and record is not None:
+        for name, value in buffer.pending_record_fields(record.pk).items():
+            setattr(record, name, value)
+    return record
+
+
+def overlay_student(student):
+    """Apply buffered-but-unflushed updates to a freshly loaded Student."""
+    buffer = get_write_behind()
+    if buffer is not None and student is not None:
+        for name, value in buffer.pending_student_fields(student.pk).items():
+            setattr(student, name, value)
+    return student
@@ -1,4 +1,5 @@
 from rest_framework.permissions import BasePermission
+from attendance_management.scope import get_user_scope
     
 class BaseIsUserOrAbove(BasePermission):
     """
@@ -7,7 +8,8 @@ class BaseIsUserOrAbove(BasePermission):
     required_groups = []
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name__in=self.required_groups).exists() and request.user.is_active
+        # Groups come from the cached user scope the view itself reuses
+        return get_user_scope(request).has_group(*self.required_groups) and request.user.is_active
 
 class IsAdminUser(BaseIsUserOrAbove):
     """
@@ -317,4 +317,46 @@ LOGGING = {
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
+# Shared cache. Set REDIS_URL to share cached state (schedule index, idempotency keys,
+# dashboard responses) between workers; the in-process fallback is per worker.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': os.environ.get("CACHE_KEY_PREFIX", "iti-attendance"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Attendance write-behind buffer (attendance_management/write_behind.py). When enabled,
+# check-in/check-out updates are journaled locally and flushed to the database in batches.
+ATTENDANCE_WRITE_BEHIND = os.environ.get("ATTENDANCE_WRITE_BEHIND", "False") == "True"
+ATTENDANCE_WRITE_BEHIND_JOURNAL = os.environ.get(
+    "ATTENDANCE_WRITE_BEHIND_JOURNAL", os.path.join(LOG_DIR, 'checkin_journal.jsonl')
+)
+ATTENDANCE_WRITE_BEHIND_FLUSH_MS = int(os.environ.get("ATTENDANCE_WRITE_BEHIND_FLUSH_MS", 250))
+ATTENDANCE_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("ATTENDANCE_WRITE_BEHIND_BATCH_SIZE", 500))
+
+# Rollup/ledger stale marks (attendance_management/stale_marks.py): how often, in milliseconds,
+# the marks collected from check-ins are written. 0 writes them as each check-in commits.
+ATTENDANCE_STALE_MARK_INTERVAL_MS = int(os.environ.get("ATTENDANCE_STALE_MARK_INTERVAL_MS", 250))
+
+# Offline batch check-in (attendance_management/batch_checkin.py): oldest event, in seconds, a device may sync
+ATTENDANCE_BATCH_MAX_AGE = int(os.environ.get("ATTENDANCE_BATCH_MAX_AGE", 60 * 60 * 12))
+
+# Idempotency for check-in/check-out retries (attendance_management/idempotency.py)
+ATTENDANCE_IDEMPOTENCY_CACHE = os.environ.get("ATTENDANCE_IDEMPOTENCY_CACHE", "default")
+ATTENDANCE_IDEMPOTENCY_TTL = int(os.environ.get("ATTENDANCE_IDEMPOTENCY_TTL", 60 * 60 * 24))
+ATTENDANCE_IDEMPOTENCY_DERIVED_TTL = int(os.environ.get("ATTENDANCE_IDEMPOTENCY_DERIVED_TTL", 120))
+
+# Role-scoped dashboard response cache with ETags (attendance_management/response_cache.py)
+ATTENDANCE_RESPONSE_CACHE = os.environ.get("ATTENDANCE_RESPONSE_CACHE", "default")
+ATTENDANCE_RESPONSE_CACHE_TTL = int(os.environ.get("ATTENDANCE_RESPONSE_CACHE_TTL", 300))
@@ -5,4 +5,13 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',  # Use in-memory database for tests
     }
-} 
\ No newline at end of file
+} 
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Write stale marks as each write commits, so tests read what they wrote without a background thread
+ATTENDANCE_STALE_MARK_INTERVAL_MS = 0
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Check-in surge load test.
+
+Thin wrapper around the `loadtest_checkin` management command so it can be
+run directly, e.g. to see whether a change to AttendanceViewSet.check_in helps
+or hurts with 5,000 students arriving within 20 minutes:
+
+    python loadtest_checkin.py --students 5000 --window-minutes 20 --speedup 10
+    python loadtest_checkin.py --endpoints async --check-out
+    python loadtest_checkin.py --url http://127.0.0.1:8000   # against a running server
+
+Seeds (and afterwards deletes) its own students in the configured database,
+so point DJANGO_SETTINGS_MODULE / DATABASE_URL at a local or staging database.
+"""
+
+import os
+import sys
+
+import django
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from django.core.management import call_command
+
+if __name__ == '__main__':
+    call_command('loadtest_checkin', *sys.argv[1:])
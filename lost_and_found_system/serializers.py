@@ -80,4 +80,24 @@ class ItemSerializer(serializers.ModelSerializer):
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+_CREATED_AT = serializers.DateTimeField()
+
+
+def notification_rows(notifications):
+    """
+    NotificationSerializer(notifications, many=True).data for a Notification
+    queryset, built from `.values()` for the notification lists.
+    """
+    return [
+        {
+            'id': row['id'],
+            'message': row['message'],
+            'is_read': row['is_read'],
+            'created_at': _CREATED_AT.to_representation(row['created_at']),
+            'user': row['user_id'],
+            'matched_item': row['matched_item_id'],
+        }
+        for row in notifications.values('id', 'message', 'is_read', 'created_at', 'user_id', 'matched_item_id')
+    ]
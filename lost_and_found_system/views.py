@@ -2,7 +2,7 @@ from itertools import chain
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, permissions
 from .models import LostItem, FoundItem, MatchedItem, Notification, ItemStatusChoices
-from .serializers import LostItemSerializer, FoundItemSerializer, MatchedItemSerializer, ItemSerializer, NotificationSerializer
+from .serializers import LostItemSerializer, FoundItemSerializer, MatchedItemSerializer, ItemSerializer, NotificationSerializer, notification_rows
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.decorators import action
@@ -30,11 +30,11 @@ class AllItemsViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         
         if not self.request.user.is_staff:
-            LostItems = LostItem.objects.filter(user = self.request.user)
-            FoundItems = FoundItem.objects.filter(user = self.request.user)
+            LostItems = LostItem.objects.select_related('user').filter(user = self.request.user)
+            FoundItems = FoundItem.objects.select_related('user').filter(user = self.request.user)
         else:
-            LostItems = LostItem.objects.all()
-            FoundItems = FoundItem.objects.all()
+            LostItems = LostItem.objects.select_related('user').all()
+            FoundItems = FoundItem.objects.select_related('user').all()
         return list(chain(LostItems, FoundItems))
 
 class LostItemViewSet(viewsets.ModelViewSet):
@@ -374,13 +374,14 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return super().get_queryset().filter(user=self.request.user)
 
-    
+    def list(self, request, *args, **kwargs):
+        return Response(notification_rows(self.filter_queryset(self.get_queryset())))
+
     @action(detail=False, methods=["GET"])
     def unread(self, request):
         """Get unread notifications"""
         unread_notifications = self.get_queryset().filter(is_read=False)
-        serializer = self.get_serializer(unread_notifications, many=True)
-        return Response(serializer.data)
+        return Response(notification_rows(unread_notifications))
 
     @action(detail=True, methods=["POST"])
     def mark_as_read(self, request, pk=None):
@@ -16,6 +16,7 @@ from django.db.models import Q
 from django.utils.crypto import get_random_string
 # import from attendance_management
 from attendance_management import models as attend_models
+from attendance_management.scope import get_user_scope
 import os
 
 # Load environment variables
@@ -165,7 +166,7 @@ class UserViewSet(AbstractUserViewSet):
     @action(detail=False, methods=['get'], url_path='supervisors', permission_classes=[core_permissions.IsCoordinatorOrAboveUser])
     def supervisors_list(self, request):
         request_user = self.request.user
-        request_user_groups = request_user.groups.values_list('name', flat=True)
+        request_user_groups = get_user_scope(request).groups
         data = self.queryset.filter(groups__name="supervisor", is_active=True)
         if 'admin' in request_user_groups:
             serializer = self.get_serializer(data, many=True)
@@ -571,7 +572,7 @@ class StudentViewSet(AbstractUserViewSet):
         isactiveParam = self.request.query_params.get('is_active', None) # Use Only if user is a supervisor
         students = allUsers.filter(groups__name='student') # TODO not all students actually possess the student group, need to fix database later
         # select_related for performance
-        students = students.select_related('student_profile', 'student_profile__track', 'student_profile__track__default_branch')
+        students = students.select_related('student_profile', 'student_profile__track', 'student_profile__track__default_branch').prefetch_related('groups')
         if trackParam and trackParam != 'All':
             track = attend_models.Track.objects.get(id=trackParam) #TODO this might be a little too open
             students = students.filter(student_profile__track=track)